@@ -0,0 +1,304 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from protein_structure import ProteinStructure
+
+# 生物组装体: 不对称单元的原子只存一份，组装体由若干 (适用链, 变换矩阵组) 描述，
+# 显示时以变换矩阵实例化绘制，只有调用方显式要求时才展开为完整坐标
+
+
+class Assembly:
+    def __init__(self, generators: Sequence[Tuple[Optional[Iterable[bytes]], np.ndarray]],
+                 name: str = '1'):
+        """
+        生物组装体的变换描述 (PDB 的 REMARK 350 BIOMT 或 mmCIF 的 _pdbx_struct_assembly_gen)
+
+        参数:
+            generators: [(适用的链标识, (K,4,4) 变换矩阵)]，链标识为None表示全部链；
+                        矩阵按列向量约定 x' = R x + t
+            name: 组装体编号
+        """
+        self.name = name
+        self.generators: List[Tuple[Optional[frozenset], np.ndarray]] = []
+        for chains, matrices in generators:
+            matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+            if len(matrices) == 0:
+                continue
+            if chains is not None:
+                chains = frozenset(bytes(chain).strip() for chain in chains)
+            self.generators.append((chains or None, matrices))
+
+    @property
+    def n_copies(self) -> int:
+        """全部生成器的拷贝总数"""
+        return sum(len(matrices) for _, matrices in self.generators)
+
+    def chain_mask(self, chains: Optional[frozenset], chain_ids: np.ndarray) -> Optional[np.ndarray]:
+        """适用链对应的原子掩码，全部原子适用时为None"""
+        if chains is None:
+            return None
+        mask = np.isin(np.char.strip(chain_ids), list(chains))
+        return None if mask.all() else mask
+
+    def instancing(self, chain_ids: np.ndarray) -> Optional[Tuple[Optional[np.ndarray], np.ndarray]]:
+        """
+        能否把同一份原子数据以多个变换实例化绘制: 要求全部生成器作用于同一组链
+
+        参数:
+            chain_ids: (N,) 结构的链标识
+
+        返回:
+            tuple: ((N,) bool 参与组装的原子或None表示全部, (K,4,4) 变换矩阵)；
+                   只有一个拷贝 (与不对称单元相同) 或各生成器适用的链不同时返回None
+        """
+        if self.n_copies < 2 or len({chains for chains, _ in self.generators}) != 1:
+            return None
+        mask = self.chain_mask(self.generators[0][0], chain_ids)
+        if mask is not None and not mask.any():
+            return None
+        return mask, np.concatenate([matrices for _, matrices in self.generators])
+
+    def expand_coords(self, coords: np.ndarray, chain_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        展开组装体的全部坐标 (内存为拷贝数倍，只在调用方需要时使用)
+
+        参数:
+            coords: (N,3) 不对称单元坐标
+            chain_ids: (N,) 链标识
+
+        返回:
+            tuple: ((M,3) float32 展开后的坐标, (M,) 每个坐标对应的原子下标)
+        """
+        parts, atoms = [], []
+        for chains, matrices in self.generators:
+            mask = self.chain_mask(chains, chain_ids)
+            index = np.arange(len(coords)) if mask is None else np.flatnonzero(mask)
+            local = np.asarray(coords, dtype=np.float64)[index]
+            for matrix in matrices:
+                parts.append(local @ matrix[:3, :3].T + matrix[:3, 3])
+                atoms.append(index)
+        if not parts:
+            return np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts).astype(np.float32), np.concatenate(atoms)
+
+    def to_dict(self) -> dict:
+        """可写入 JSON 的表示 (结构缓存)"""
+        return {'name': self.name,
+                'generators': [{'chains': None if chains is None else sorted(c.decode() for c in chains),
+                                'matrices': matrices.tolist()}
+                               for chains, matrices in self.generators]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Assembly':
+        generators = [(None if g['chains'] is None else [c.encode() for c in g['chains']],
+                       np.asarray(g['matrices'], dtype=np.float64))
+                      for g in data['generators']]
+        return cls(generators, name=data.get('name', '1'))
+
+    def __repr__(self) -> str:
+        return f"Assembly(name={self.name!r}, copies={self.n_copies}, generators={len(self.generators)})"
+
+
+def parse_biomt(lines: Sequence[bytes]) -> Optional[Assembly]:
+    """
+    解析 PDB 的 REMARK 350 记录中的第一个生物分子
+
+    参数:
+        lines: REMARK 350 记录行 (按文件顺序)
+
+    返回:
+        Assembly对象，没有 BIOMT 矩阵时返回None
+    """
+    name = None
+    generators: List[Tuple[List[bytes], Dict[int, np.ndarray]]] = []
+    for line in lines:
+        text = line[10:].strip()
+        if text.startswith(b'BIOMOLECULE:'):
+            if name is not None:
+                break  # 只读取第一个生物分子
+            name = text.split(b':', 1)[1].strip().decode(errors='replace') or '1'
+        elif text.startswith(b'APPLY THE FOLLOWING TO CHAINS:'):
+            generators.append((_chain_list(text.split(b':', 1)[1]), {}))
+        elif text.startswith(b'AND CHAINS:') and generators:
+            generators[-1][0].extend(_chain_list(text.split(b':', 1)[1]))
+        elif text.startswith(b'BIOMT') and generators:
+            # 固定列: 行号 (19)、序号 (20-23)、矩阵行 (24-53) 和平移 (59-68)
+            try:
+                row = int(line[18:19]) - 1
+                serial = int(line[19:23])
+                values = [float(line[start:start + 10]) for start in (23, 33, 43, 58)]
+            except ValueError:
+                continue
+            matrix = generators[-1][1].setdefault(serial, np.eye(4))
+            if 0 <= row < 3:
+                matrix[row] = values
+    generators = [(chains, np.array([ops[k] for k in sorted(ops)]))
+                  for chains, ops in generators if ops]
+    if not generators:
+        return None
+    return Assembly(generators, name=name or '1')
+
+
+def _chain_list(text: bytes) -> List[bytes]:
+    """'A, B, C,' -> [b'A', b'B', b'C']"""
+    return [chain.strip() for chain in text.split(b',') if chain.strip()]
+
+
+def parse_oper_expression(expression: str) -> List[Tuple[str, ...]]:
+    """
+    展开 mmCIF 的 oper_expression，如 '1'、'1,2,5'、'(1-60)'、'(1-60)(61-88)'
+
+    多个括号组表示笛卡尔积，组合中靠右的操作先作用。
+
+    返回:
+        [(操作编号, ...)]，每个元组的变换按从左到右的顺序相乘
+    """
+    expression = expression.strip()
+    groups = []
+    if '(' in expression:
+        for part in expression.replace(')', '').split('(')[1:]:
+            groups.append(_oper_ids(part))
+    else:
+        groups.append(_oper_ids(expression))
+    combos: List[Tuple[str, ...]] = [()]
+    for ids in groups:
+        combos = [combo + (oper,) for combo in combos for oper in ids]
+    return combos
+
+
+def _oper_ids(text: str) -> List[str]:
+    ids = []
+    for item in text.split(','):
+        item = item.strip()
+        if '-' in item and all(part.strip().isdigit() for part in item.split('-', 1)):
+            first, last = (int(part) for part in item.split('-', 1))
+            ids.extend(str(i) for i in range(first, last + 1))
+        elif item:
+            ids.append(item)
+    return ids
+
+
+def _decode(value) -> str:
+    return value.decode(errors='replace') if isinstance(value, bytes) else str(value)
+
+
+def assembly_from_cif(assembly_gen: Dict[str, list], oper_list: Dict[str, list],
+                      chain_map: Dict[bytes, bytes]) -> Optional[Assembly]:
+    """
+    由 mmCIF 的 _pdbx_struct_assembly_gen 和 _pdbx_struct_oper_list 构建第一个组装体
+
+    参数:
+        assembly_gen: 列名 -> 值列表 (assembly_id, oper_expression, asym_id_list)
+        oper_list: 列名 -> 值列表 (id, matrix[i][j], vector[i])
+        chain_map: label_asym_id -> auth_asym_id (组装体按 label 链给出，原子按 auth 链存储)
+
+    返回:
+        Assembly对象，缺少所需的列时返回None
+    """
+    try:
+        operators = {}
+        for row, oper_id in enumerate(oper_list['id']):
+            matrix = np.eye(4)
+            for i in range(3):
+                for j in range(3):
+                    matrix[i, j] = float(oper_list[f'matrix[{i + 1}][{j + 1}]'][row])
+                matrix[i, 3] = float(oper_list[f'vector[{i + 1}]'][row])
+            operators[_decode(oper_id)] = matrix
+        assembly_ids = [_decode(value) for value in assembly_gen['assembly_id']]
+        expressions = assembly_gen['oper_expression']
+        asym_lists = assembly_gen['asym_id_list']
+    except (KeyError, ValueError, IndexError):
+        return None
+    if not assembly_ids:
+        return None
+
+    name = assembly_ids[0]
+    generators = []
+    for row, assembly_id in enumerate(assembly_ids):
+        if assembly_id != name:
+            continue
+        matrices = []
+        for combo in parse_oper_expression(_decode(expressions[row])):
+            if not all(oper in operators for oper in combo):
+                continue
+            matrix = np.eye(4)
+            for oper in combo:
+                matrix = matrix @ operators[oper]
+            matrices.append(matrix)
+        asym_ids = [asym.strip().encode() for asym in _decode(asym_lists[row]).split(',') if asym.strip()]
+        chains = {chain_map.get(asym, asym) for asym in asym_ids}
+        if matrices:
+            generators.append((chains, np.array(matrices)))
+    return Assembly(generators, name=name) if generators else None
+
+
+def assembly_instancing(structure: ProteinStructure
+                        ) -> Optional[Tuple[Optional[np.ndarray], np.ndarray]]:
+    """结构的组装体能否实例化绘制 (见 Assembly.instancing)，结果缓存在共享结构上"""
+    if structure.assembly is None:
+        return None
+    return structure.derived('assembly_instancing',
+                             lambda: structure.assembly.instancing(structure.chain_ids))
+
+
+def assembly_bounds(coords: np.ndarray, matrices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    实例化组装体的包围盒、中心和半径，逐个拷贝变换计算，内存只与不对称单元大小有关
+
+    参数:
+        coords: (N,3) 参与组装的原子坐标
+        matrices: (K,4,4) 变换矩阵
+
+    返回:
+        tuple: (最小角 (3,), 最大角 (3,), 全部拷贝的原子中心 (3,), 到中心的最大距离)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    centers = np.mean(coords, axis=0) @ matrices[:, :3, :3].transpose(0, 2, 1) + matrices[:, :3, 3]
+    center = centers.mean(axis=0)
+    lower, upper = np.full(3, np.inf), np.full(3, -np.inf)
+    max_dist = 0.0
+    for matrix in matrices:
+        copy = coords @ matrix[:3, :3].T + matrix[:3, 3]
+        lower = np.minimum(lower, copy.min(axis=0))
+        upper = np.maximum(upper, copy.max(axis=0))
+        max_dist = max(max_dist, float(np.max(np.linalg.norm(copy - center, axis=1))))
+    return lower, upper, center, max_dist
+
+
+def expand_structure(structure: ProteinStructure) -> ProteinStructure:
+    """
+    把结构的组装体展开为完整结构: 坐标按拷贝变换，其余各列和键连按拷贝重复
+
+    参数:
+        structure: 带组装体的结构 (没有组装体时原样返回)
+
+    返回:
+        新的ProteinStructure对象 (不再带组装体)
+    """
+    assembly = structure.assembly
+    if assembly is None:
+        return structure
+    coords, atoms = assembly.expand_coords(structure.coords, structure.chain_ids)
+    bonds = None
+    if structure.has_topology:
+        # 原子下标 -> 每个拷贝中的新下标；两端都在同一拷贝内的键随拷贝重复
+        parts = []
+        start = 0
+        for chains, matrices in assembly.generators:
+            mask = assembly.chain_mask(chains, structure.chain_ids)
+            index = np.arange(structure.n_atoms) if mask is None else np.flatnonzero(mask)
+            remap = np.full(structure.n_atoms, -1, dtype=np.int64)
+            remap[index] = np.arange(len(index))
+            local = remap[structure.bonds]
+            local = local[np.all(local >= 0, axis=1)]
+            for _ in range(len(matrices)):
+                parts.append(local + start)
+                start += len(index)
+        bonds = np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.int64)
+    return ProteinStructure(
+        coords, structure.element_codes[atoms], bonds,
+        atom_names=structure.atom_names[atoms], res_names=structure.res_names[atoms],
+        res_ids=structure.res_ids[atoms], chain_ids=structure.chain_ids[atoms],
+        ins_codes=structure.ins_codes[atoms], serials=structure.serials[atoms],
+        b_factors=structure.b_factors[atoms], occupancies=structure.occupancies[atoms],
+        hetero=structure.hetero[atoms], source=structure.source
+    )
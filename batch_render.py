@@ -0,0 +1,170 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from typing import Iterable, List, Optional, Tuple
+
+# 每个工作进程各自持有一个离屏画布 (一个GL上下文)，在该进程处理的所有文件间复用
+_canvas = None
+_visualizer = None
+_out_dir = None
+
+
+def collect_inputs(inputs: Iterable[str], pattern: str = '*.pdb', recursive: bool = False) -> List[str]:
+    """
+    展开输入: 文件直接使用，目录按通配符查找，以 @ 开头的参数视为每行一个路径的列表文件
+
+    参数:
+        inputs: 文件、目录或 @列表文件
+        pattern: 目录内匹配的文件名通配符
+        recursive: 是否递归子目录
+
+    返回:
+        去重后的文件路径列表 (保持输入顺序)
+    """
+    paths = []
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:]) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif os.path.isdir(item):
+            sub = os.path.join(item, '**' if recursive else '', pattern)
+            paths.extend(sorted(glob.glob(sub, recursive=recursive)))
+        else:
+            paths.append(item)
+    return list(dict.fromkeys(paths))
+
+
+def _init_worker(out_dir: str, size: Tuple[int, int], backend: str, representation: str):
+    """工作进程初始化: 选择离屏GL后端并创建可复用的画布和可视化器"""
+    global _canvas, _visualizer, _out_dir
+    if backend == 'egl':
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+    import vispy
+    vispy.use(app=backend)
+    from vispy import scene
+    from protein_visualizer import ProteinVisualizer
+
+    _out_dir = out_dir
+    _canvas = scene.SceneCanvas(size=size, show=False, bgcolor='black')
+    view = _canvas.central_widget.add_view()
+    view.camera = scene.TurntableCamera(fov=45, distance=30)
+    _visualizer = ProteinVisualizer(view)
+    _visualizer.set_representation(representation)
+
+
+def output_paths(pdb_file: str, out_dir: str) -> List[str]:
+    """四个标准视角对应的PNG路径: <out_dir>/<文件名>_view<1-4>.png"""
+    from protein_visualizer import STANDARD_CAMERA_VIEWS
+
+    stem = os.path.basename(pdb_file).split('.')[0]
+    return [os.path.join(out_dir, f"{stem}_view{i}.png")
+            for i in range(1, len(STANDARD_CAMERA_VIEWS) + 1)]
+
+
+def render_file(pdb_file: str) -> Tuple[str, float, Optional[str]]:
+    """
+    在当前工作进程中渲染一个结构的四个标准视角
+
+    返回:
+        tuple: (文件路径, 耗时秒数, 错误信息或None)
+    """
+    from vispy.io import write_png
+    from protein_draw import ProteinDataLoader
+    from protein_visualizer import STANDARD_CAMERA_VIEWS
+
+    start = time.perf_counter()
+    try:
+        structure = ProteinDataLoader(pdb_file).load_structure()
+        if structure is None:
+            return pdb_file, time.perf_counter() - start, "parse failed"
+        if structure.n_atoms == 0:
+            return pdb_file, time.perf_counter() - start, "no atoms"
+
+        _visualizer.set_structure(structure)
+        camera = _visualizer.view.camera
+        for path, (azimuth, elevation) in zip(output_paths(pdb_file, _out_dir),
+                                              STANDARD_CAMERA_VIEWS):
+            camera.azimuth = azimuth
+            camera.elevation = elevation
+            write_png(path, _canvas.render(alpha=False))
+        return pdb_file, time.perf_counter() - start, None
+    except Exception as e:
+        return pdb_file, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    finally:
+        # 释放当前结构的可视化对象，画布和GL上下文留给下一个文件
+        _visualizer.clear()
+
+
+def render_batch(paths: List[str], out_dir: str, jobs: int = 0, size: Tuple[int, int] = (512, 512),
+                 backend: str = 'egl', skip_existing: bool = False, verbose: bool = True,
+                 representation: str = 'points') -> List[Tuple[str, float, Optional[str]]]:
+    """
+    用进程池批量渲染，每个进程复用一个离屏GL上下文
+
+    参数:
+        paths: 结构文件路径
+        out_dir: PNG输出目录
+        jobs: 进程数，0 表示CPU核数
+        size: 图像尺寸 (宽, 高)
+        backend: vispy离屏后端 ('egl' 使用无窗口的软件或硬件GL)
+        skip_existing: 四张PNG都已存在的文件跳过
+        verbose: 是否逐文件打印结果
+        representation: 原子表示方式，见 styling.REPRESENTATIONS
+
+    返回:
+        每个文件的 (路径, 耗时, 错误信息或None)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if skip_existing:
+        paths = [p for p in paths if not all(os.path.exists(o) for o in output_paths(p, out_dir))]
+    jobs = jobs or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(paths)))
+
+    results = []
+    start = time.perf_counter()
+    # spawn: GL上下文只在子进程中创建，避免fork继承父进程的GL/线程状态
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(jobs, initializer=_init_worker, initargs=(out_dir, size, backend, representation)) as pool:
+        for path, seconds, error in pool.imap_unordered(render_file, paths, chunksize=4):
+            results.append((path, seconds, error))
+            if verbose:
+                status = 'ok' if error is None else f'FAILED ({error})'
+                print(f"{seconds:7.3f}s  {status}  {path}")
+
+    elapsed = time.perf_counter() - start
+    failed = sum(error is not None for _, _, error in results)
+    if verbose and results:
+        rate = len(results) / elapsed * 60
+        print(f"{len(results) - failed} rendered, {failed} failed in {elapsed:.1f}s "
+              f"({rate:.0f} structures/min, {jobs} workers)")
+    return results
+
+
+def main():
+    from styling import REPRESENTATIONS
+
+    parser = argparse.ArgumentParser(
+        description="Render the four standard views of many structures to PNG without a window")
+    parser.add_argument('inputs', nargs='+', help="structure files, directories or @list.txt")
+    parser.add_argument('-o', '--out-dir', default='renders')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help="worker processes (default: all cores)")
+    parser.add_argument('--size', type=int, nargs=2, default=(512, 512), metavar=('W', 'H'))
+    parser.add_argument('--pattern', default='*.pdb')
+    parser.add_argument('--recursive', action='store_true')
+    parser.add_argument('--backend', default='egl', help="vispy offscreen app backend")
+    parser.add_argument('--skip-existing', action='store_true')
+    parser.add_argument('--representation', default='points', choices=REPRESENTATIONS)
+    args = parser.parse_args()
+
+    paths = collect_inputs(args.inputs, args.pattern, args.recursive)
+    if not paths:
+        parser.error("no input structures found")
+    results = render_batch(paths, args.out_dir, args.jobs, tuple(args.size), args.backend,
+                           args.skip_existing, representation=args.representation)
+    raise SystemExit(1 if any(error is not None for _, _, error in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,717 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import tempfile
+import tracemalloc
+from element_data import element_symbols
+from bond_detection import detect_bonds, unique_bonds
+from pdb_reader import LINE_WIDTH, chain_order, read_pdb_columns
+from protein_structure import ProteinStructure
+from protein_draw import ProteinDataLoader
+from residue_topology import ResidueTopology, build_topology
+
+
+def tile_coords(coords: np.ndarray, codes: np.ndarray, copies: int
+                ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将结构平铺成规则网格，生成指定副本数的合成大组装体
+
+    参数:
+        coords: (N,3) 原子坐标
+        codes: (N,) 元素编码
+        copies: 副本数量
+
+    返回:
+        tuple: (平铺后的坐标, 平铺后的元素编码)
+    """
+    span = coords.max(axis=0) - coords.min(axis=0) + 5.0
+    side = int(np.ceil(copies ** (1 / 3)))
+    cells = np.stack(np.unravel_index(np.arange(copies), (side, side, side)), axis=1)
+    shifts = (cells * span).astype(np.float32)
+    tiled = (coords[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+    return tiled, np.tile(codes, copies)
+
+
+def legacy_detect_bonds(coords: np.ndarray, codes: np.ndarray,
+                        max_bond_length: float = 1.8) -> np.ndarray:
+    """原 ProteinDataLoader._detect_bonds_by_distance 的实现 (NeighborSearch + atoms.index)，仅作对照"""
+    from Bio.PDB.Atom import Atom
+    from Bio.PDB import NeighborSearch
+
+    symbols = element_symbols(codes)
+    atoms = [Atom(f"X{i}", xyz, 0.0, 1.0, ' ', f"X{i}", i, element=str(sym).upper())
+             for i, (xyz, sym) in enumerate(zip(coords, symbols))]
+    for i, atom in enumerate(atoms):
+        atom.full_id = ('bench', 0, 'A', (' ', i, ' '), (atom.get_name(), ' '))
+    ns = NeighborSearch(atoms)
+    bonds = set()
+    for i, atom in enumerate(atoms):
+        if atom.element == 'H':
+            continue
+        for neighbor in ns.search(atom.get_coord(), max_bond_length, level='A'):
+            j = atoms.index(neighbor)
+            if i < j and not (atom.element == 'H' and neighbor.element == 'H'):
+                bonds.add((i, j))
+    return np.array(sorted(bonds), dtype=int) if bonds else np.empty((0, 2), dtype=int)
+
+
+def time_call(func: Callable, *args, repeat: int = 1) -> float:
+    """返回多次调用中最快一次的耗时(秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_bonds(pdb_file: str, max_atoms: int, legacy_max: int):
+    """对比新旧键连检测在不同规模下的耗时"""
+    columns = read_pdb_columns(pdb_file)
+    coords, codes = columns.coords, columns.element_codes
+
+    print(f"{'atoms':>10} {'grid (s)':>10} {'legacy (s)':>11} {'speedup':>8}")
+    copies = 1
+    while len(coords) * copies <= max_atoms:
+        tiled, tiled_codes = tile_coords(coords, codes, copies)
+        grid_time = time_call(detect_bonds, tiled, tiled_codes, repeat=3 if copies == 1 else 1)
+        if len(tiled) <= legacy_max:
+            legacy_time = time_call(legacy_detect_bonds, tiled, tiled_codes)
+            speedup = f"{legacy_time / grid_time:7.1f}x"
+            legacy = f"{legacy_time:11.3f}"
+        else:
+            speedup = legacy = '-'
+        print(f"{len(tiled):>10} {grid_time:>10.3f} {legacy:>11} {speedup:>8}")
+        copies *= 4
+
+
+def biopython_parse(pdb_file: str):
+    """原 ProteinDataLoader.parse_pdb 的解析路径 (Bio.PDB 对象模型 + 逐原子取值)，仅作对照"""
+    from Bio.PDB import PDBParser, Selection
+
+    structure = PDBParser(QUIET=True).get_structure("protein", pdb_file)
+    atoms = list(Selection.unfold_entities(structure, 'A'))
+    coords = np.array([atom.get_coord() for atom in atoms])
+    elements = np.array([atom.element for atom in atoms])
+    return coords, elements
+
+
+def peak_memory(func: Callable, *args) -> int:
+    """返回调用期间的峰值内存分配(字节)"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def write_tiled_pdb(pdb_file: str, copies: int, out_file: str):
+    """把PDB文件的ATOM/HETATM记录重复 copies 次写入新文件，用于大文件解析测试"""
+    with open(pdb_file, 'rb') as f:
+        records = b''.join(line for line in f if line.startswith((b'ATOM  ', b'HETATM')))
+    with open(out_file, 'wb') as f:
+        for _ in range(copies):
+            f.write(records)
+        f.write(b'END\n')
+
+
+def bench_parse(pdb_file: str, max_atoms: int, biopython_max: int):
+    """
+    对比列式快速解析与Biopython对象模型解析的耗时和峰值内存，
+    out MB 为解析结果各列的大小，快速解析的峰值应只比它多出与块大小相关的常量
+    """
+    n_atoms = read_pdb_columns(pdb_file).n_atoms
+    print(f"{'atoms':>10} {'fast (s)':>9} {'fast MB':>8} {'out MB':>7} "
+          f"{'Bio (s)':>8} {'Bio MB':>7} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        copies = 1
+        while n_atoms * copies <= max_atoms:
+            path = pdb_file if copies == 1 else os.path.join(tmp, f"tiled_{copies}.pdb")
+            if copies > 1:
+                write_tiled_pdb(pdb_file, copies, path)
+            repeat = 5 if copies == 1 else 1
+            fast_time = time_call(read_pdb_columns, path, repeat=repeat)
+            fast_mem = peak_memory(read_pdb_columns, path) / 2**20
+            columns = read_pdb_columns(path)
+            out_mem = sum(getattr(columns, name).nbytes for name in vars(columns)
+                          if isinstance(getattr(columns, name), np.ndarray)) / 2**20
+            del columns
+            if n_atoms * copies <= biopython_max:
+                bio_time = time_call(biopython_parse, path, repeat=repeat)
+                bio_mem = peak_memory(biopython_parse, path) / 2**20
+                bio = f"{bio_time:8.3f} {bio_mem:7.1f} {bio_time / fast_time:7.1f}x"
+            else:
+                bio = f"{'-':>8} {'-':>7} {'-':>8}"
+            print(f"{n_atoms * copies:>10} {fast_time:>9.3f} {fast_mem:>8.1f} {out_mem:>7.1f} {bio}")
+            copies *= 4
+
+
+def synthetic_ensemble(coords: np.ndarray, n_frames: int, seed: int = 0) -> np.ndarray:
+    """
+    合成构象系综: 每个原子按随机游走的幅度沿固定方向位移 (相邻帧相似的整体运动) 并叠加
+    热噪声，再施加随机刚体变换
+
+    参数:
+        coords: (n,3) 参考坐标
+        n_frames: 帧数
+
+    返回:
+        (F,n,3) float64 坐标
+    """
+    rng = np.random.default_rng(seed)
+    coords = np.asarray(coords, dtype=np.float64)
+    drift = np.cumsum(rng.normal(size=(n_frames, 1, 3)) * 0.05, axis=0)
+    frames = (coords + drift * rng.normal(size=(1, len(coords), 3))
+              + rng.normal(size=(n_frames, len(coords), 3)) * 0.5)
+    # QR 分解得到随机正交矩阵，行列式为负时翻转一列得到旋转
+    q, r = np.linalg.qr(rng.normal(size=(n_frames, 3, 3)))
+    q *= np.sign(np.diagonal(r, axis1=1, axis2=2))[:, None, :]
+    q[np.linalg.det(q) < 0, :, 0] *= -1
+    return np.einsum('fij,fnj->fni', q, frames) + rng.normal(size=(n_frames, 1, 3)) * 10
+
+
+def pairwise_rmsd(a: np.ndarray, b: np.ndarray) -> float:
+    """逐对 Kabsch 叠合 (每对一次 SVD) 后的RMSD，即逐个结构叠合的做法，仅作对照"""
+    a = a - a.mean(axis=0)
+    b = b - b.mean(axis=0)
+    u, s, vt = np.linalg.svd(a.T @ b)
+    sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    residual = np.sum(a * a) + np.sum(b * b) - 2.0 * (s[0] + s[1] + sign * s[2])
+    return float(np.sqrt(max(residual, 0.0) / len(a)))
+
+
+def bench_superpose(pdb_file: str, max_frames: int, selection: str, block: int,
+                    workers: Optional[int], python_pairs: int):
+    """批量叠合和全对全RMSD矩阵在合成系综上的耗时，与逐对叠合的外推耗时对比"""
+    from superposition import alignment_atoms, kabsch, rmsd_matrix
+
+    structure = ProteinStructure.from_columns(read_pdb_columns(pdb_file), None, source=pdb_file)
+    atoms = alignment_atoms(structure, selection)
+    print(f"{len(atoms)} atoms ({selection}), {workers or os.cpu_count()} workers")
+    print(f"{'frames':>7} {'kabsch (s)':>11} {'matrix (s)':>11} {'Mpairs/s':>9} "
+          f"{'loop (s)':>9} {'speedup':>8} {'max err':>9}")
+    sizes = [size for size in (500, 1000, 2000, 5000, 10000) if size < max_frames] + [max_frames]
+    rng = np.random.default_rng(1)
+    for n_frames in sizes:
+        frames = synthetic_ensemble(structure.coords[atoms], n_frames)
+        kabsch_time = time_call(kabsch, frames, frames[0])
+        start = time.perf_counter()
+        matrix = rmsd_matrix(frames, block=block, workers=workers)
+        matrix_time = time.perf_counter() - start
+        n_pairs = n_frames * (n_frames - 1) // 2
+        # 逐对叠合只跑一部分帧对，按帧对数外推
+        sample = rng.integers(0, n_frames, size=(python_pairs, 2))
+        start = time.perf_counter()
+        reference = [pairwise_rmsd(frames[i], frames[j]) for i, j in sample]
+        loop_time = (time.perf_counter() - start) / python_pairs * n_pairs
+        error = float(np.max(np.abs(matrix[sample[:, 0], sample[:, 1]] - reference)))
+        print(f"{n_frames:>7} {kabsch_time:>11.3f} {matrix_time:>11.3f} "
+              f"{n_pairs / matrix_time / 1e6:>9.2f} {loop_time:>9.1f} "
+              f"{loop_time / matrix_time:>7.1f}x {error:>9.1e}")
+
+
+def bench_interactions(pdb_file: str, max_atoms: int, chunk_pairs: int, moved_residues: int):
+    """
+    相互作用分析在 1ake 及平铺合成组装体上的全量耗时和峰值内存，局部坐标改变后的
+    增量更新与全量重算的对比 (结果逐项核对)，以及全部原子移动的轨迹帧
+    """
+    from interactions import InteractionAnalyzer
+
+    n_atoms = read_pdb_columns(pdb_file).n_atoms
+    rng = np.random.default_rng(2)
+    print(f"{'atoms':>10} {'full (s)':>9} {'peak MB':>8} {'update (ms)':>12} {'speedup':>8} "
+          f"{'frame (s)':>10} {'contacts':>9} {'hbonds':>7} {'salt':>5} {'clashes':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        copies = 1
+        while n_atoms * copies <= max_atoms:
+            path = pdb_file
+            if copies > 1:
+                path = os.path.join(tmp, f"assembly_{copies}.pdb")
+                write_tiled_assembly(pdb_file, copies, path)
+            columns = read_pdb_columns(path)
+            structure = ProteinStructure.from_columns(columns, build_topology(columns), source=path)
+
+            analyzer = InteractionAnalyzer(structure, chunk_pairs=chunk_pairs)
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = analyzer.analyze()
+            full_time = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+            # 连续的若干聚合物残基抖动 (如一段柔性环)，只把这些原子作为移动的原子传入
+            offsets = structure.residue_offsets
+            polymer = np.flatnonzero(~structure.hetero[offsets[:-1]])
+            first = int(polymer[rng.integers(0, max(len(polymer) - moved_residues, 1))])
+            moved = np.arange(offsets[first], offsets[min(first + moved_residues, len(offsets) - 1)])
+            coords = structure.coords.copy()
+            coords[moved] += rng.normal(0, 0.5, (len(moved), 3)).astype(np.float32)
+            start = time.perf_counter()
+            updated = analyzer.update(coords, moved)
+            update_time = time.perf_counter() - start
+            reference = InteractionAnalyzer(structure, chunk_pairs=chunk_pairs).update(coords)
+            if updated.counts() != reference.counts() or not np.array_equal(
+                    updated.residue_pairs, reference.residue_pairs):
+                raise AssertionError("incremental update differs from full recomputation")
+
+            frame = coords + rng.normal(0, 0.3, coords.shape).astype(np.float32)
+            start = time.perf_counter()
+            analyzer.update(frame)
+            frame_time = time.perf_counter() - start
+
+            counts = result.counts()
+            print(f"{structure.n_atoms:>10} {full_time:>9.3f} {peak:>8.1f} {update_time * 1000:>12.1f} "
+                  f"{full_time / update_time:>7.1f}x {frame_time:>10.3f} {counts['contacts']:>9} "
+                  f"{counts['hbonds']:>7} {counts['salt_bridges']:>5} {counts['clashes']:>8}")
+            copies *= 8
+
+
+def bench_surface(pdb_file: str, target_atoms: int, workers: Optional[int]):
+    """
+    表面生成在约 target_atoms 个参与原子的平铺组装体上各表面类型、各分辨率级别的耗时
+    (单线程和线程池)，以及网格写入磁盘缓存后内存映射读回的耗时
+    """
+    from structure_cache import StructureCache
+    from surface import (SURFACE_KINDS, SURFACE_SPACINGS, SurfaceMesh, build_surface,
+                         surface_atoms, surface_cache_name, surface_level)
+
+    per_copy = len(surface_atoms(ProteinStructure.from_columns(read_pdb_columns(pdb_file), None)))
+    copies = max(1, round(target_atoms / per_copy))
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pdb_file
+        if copies > 1:
+            path = os.path.join(tmp, f"assembly_{copies}.pdb")
+            write_tiled_assembly(pdb_file, copies, path)
+        structure = ProteinStructure.from_columns(read_pdb_columns(path), None, source=path)
+        n_atoms = len(surface_atoms(structure))
+        default = surface_level(n_atoms)
+        cache = StructureCache(os.path.join(tmp, 'cache'))
+        print(f"{n_atoms} surface atoms ({copies} copies), {workers} workers, "
+              f"default spacing {SURFACE_SPACINGS[default]:g} A")
+        print(f"{'kind':>10} {'spacing':>8} {'vertices':>10} {'1 thread (s)':>13} "
+              f"{'pool (s)':>9} {'cached (ms)':>12}")
+        for kind in SURFACE_KINDS:
+            for level, spacing in enumerate(SURFACE_SPACINGS):
+                start = time.perf_counter()
+                build_surface(structure, kind, level, workers=1)
+                serial = time.perf_counter() - start
+                start = time.perf_counter()
+                mesh = build_surface(structure, kind, level, workers=workers)
+                pooled = time.perf_counter() - start
+
+                name = surface_cache_name(structure, kind, level, None)
+                cache.store_arrays(path, name, mesh.arrays())
+                start = time.perf_counter()
+                cached = SurfaceMesh.from_arrays(cache.load_arrays(path, name))
+                # 内存映射的数组首次访问时才读盘，与上传GPU一样完整读取一遍
+                for array in cached.arrays().values():
+                    array.sum()
+                cached_time = time.perf_counter() - start
+                marker = ' *' if level == default else ''
+                print(f"{kind:>10} {spacing:>8g} {mesh.n_vertices:>10} {serial:>13.3f} "
+                      f"{pooled:>9.3f} {cached_time * 1000:>12.1f}{marker}")
+
+
+def write_tiled_assembly(pdb_file: str, copies: int, out_file: str):
+    """
+    把PDB文件的ATOM/HETATM记录平铺为 copies 个互不重叠的副本写入新文件
+
+    坐标按 tile_coords 的网格平移，每个副本使用不同的链标识，
+    原子序号按 99999 回绕；按定宽字节矩阵整体改写，不逐行格式化。
+    """
+    # 与 read_pdb_columns 相同的筛选: 第一个模型、无标记或第一种交替构象
+    lines, altloc = [], None
+    with open(pdb_file, 'rb') as f:
+        for line in f:
+            if line.startswith(b'ENDMDL'):
+                break
+            if not line.startswith((b'ATOM  ', b'HETATM')):
+                continue
+            line = line.rstrip(b'\r\n').ljust(LINE_WIDTH)[:LINE_WIDTH]
+            if line[16:17] != b' ':
+                altloc = altloc or line[16:17]
+                if line[16:17] != altloc:
+                    continue
+            lines.append(line)
+    records = np.frombuffer(b''.join(lines), dtype=np.uint8).reshape(-1, LINE_WIDTH)
+    # 与 read_pdb_columns 输出的坐标一样按链分组
+    order = chain_order(records[:, 21])
+    if order is not None:
+        records = records[order]
+    columns = read_pdb_columns(pdb_file)
+    coords, _ = tile_coords(columns.coords, columns.element_codes, copies)
+
+    block = np.tile(records, (copies, 1))
+    # 链标识: 每个副本的每条原始链各分配一个字母 (循环使用)
+    chain_letters = np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789',
+                                  dtype=np.uint8)
+    _, chain_index = np.unique(records[:, 21], return_inverse=True)
+    n_chains = int(chain_index.max()) + 1 if len(chain_index) else 1
+    copy_index = np.repeat(np.arange(copies), len(records))
+    block[:, 21] = chain_letters[(copy_index * n_chains + np.tile(chain_index, copies))
+                                 % len(chain_letters)]
+    serials = (np.arange(len(block)) % 99999 + 1).astype('U5')
+    block[:, 6:11] = np.frombuffer(np.char.rjust(serials, 5).astype('S5').tobytes(),
+                                   dtype=np.uint8).reshape(-1, 5)
+    for axis in range(3):
+        text = np.char.mod('%8.3f', coords[:, axis]).astype('S8')
+        block[:, 30 + 8 * axis:38 + 8 * axis] = np.frombuffer(text.tobytes(), dtype=np.uint8).reshape(-1, 8)
+
+    with open(out_file, 'wb') as f:
+        out = np.concatenate([block, np.full((len(block), 1), ord('\n'), dtype=np.uint8)], axis=1)
+        f.write(out.tobytes())
+        f.write(b'END\n')
+
+
+def _render_context(backend: str):
+    """创建离屏画布、视图和可视化器，失败时返回None (例如没有可用的GL)"""
+    try:
+        if backend == 'egl':
+            os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+        import vispy
+        vispy.use(app=backend)
+        from vispy import scene
+        from protein_visualizer import ProteinVisualizer
+
+        canvas = scene.SceneCanvas(size=(800, 600), show=False, bgcolor='black')
+        view = canvas.central_widget.add_view()
+        view.camera = scene.TurntableCamera(fov=45, distance=30, elevation=20, azimuth=30)
+        canvas.render()
+        return canvas, ProteinVisualizer(view)
+    except Exception as e:
+        print(f"render stages skipped: {e}")
+        return None
+
+
+def _extract_atoms(pdb_file: str) -> Tuple[np.ndarray, np.ndarray]:
+    """从文件冷解析到原子坐标和元素编码 (加载器显示原子前的路径)"""
+    structure = ProteinStructure.from_columns(read_pdb_columns(pdb_file), None)
+    return structure.coords, structure.element_codes
+
+
+def pipeline_stages(pdb_file: str, render=None) -> List[Tuple[str, Callable, Callable]]:
+    """
+    加载和渲染管线的各阶段，每项为 (名称, 准备函数, 计时函数)
+
+    准备函数不计时，其返回值作为计时函数的参数，保证每次计时都从相同的状态开始
+    (例如不会命中结构上已缓存的派生数据)。
+    """
+    columns = read_pdb_columns(pdb_file)
+    bonds = build_topology(columns)
+    fresh = lambda: ProteinStructure.from_columns(columns, bonds, source=pdb_file)
+
+    stages = [
+        ('parse', lambda: pdb_file, read_pdb_columns),
+        # 冷解析到原子坐标和元素编码 (不含键连)，以及加载器的完整 parse_pdb 路径
+        ('atoms', lambda: pdb_file, _extract_atoms),
+        ('parse_pdb', lambda: ProteinDataLoader(pdb_file, use_cache=False),
+         lambda loader: loader.parse_pdb()),
+        ('bonds_distance', lambda: columns, lambda c: detect_bonds(c.coords, c.element_codes)),
+        ('bonds_conect', lambda: ResidueTopology(columns),
+         lambda t: unique_bonds(np.concatenate([t.template_bonds(), t.conect_bonds()]), t.n_atoms)),
+        ('peptide_links', lambda: ResidueTopology(columns), lambda t: t.link_bonds()),
+        ('topology', lambda: columns, build_topology),
+    ]
+    if render is not None:
+        canvas, visualizer = render
+
+        def style(structure):
+            return visualizer.styles.colors(structure, visualizer.color_scheme), \
+                visualizer.styles.sizes(structure)
+
+        def shown():
+            visualizer.clear()
+            structure = fresh()
+            visualizer.set_structure(structure)
+            return structure
+
+        def cleared():
+            visualizer.clear()
+            return fresh()
+
+        stages += [
+            ('style', fresh, style),
+            ('visuals', cleared, visualizer.set_structure),
+            ('auto_zoom', shown, lambda structure: visualizer._auto_zoom(structure)),
+            ('first_frame', shown, lambda structure: canvas.render()),
+        ]
+    return stages
+
+
+def _time_stage(setup: Callable, run: Callable, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_stage(setup: Callable, run: Callable) -> int:
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _environment() -> Dict[str, str]:
+    """记录结果对应的提交和运行环境，便于跨提交比较"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                                ).stdout.strip()
+    except OSError:
+        commit = ''
+    info = {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    if 'vispy' in sys.modules:
+        info['vispy'] = sys.modules['vispy'].__version__
+    return info
+
+
+def bench_pipeline(pdb_file: str, max_atoms: int, repeat: int, backend: Optional[str],
+                   output: Optional[str]) -> dict:
+    """逐阶段测量加载和渲染管线在 1ake 及平铺合成组装体上的耗时和峰值内存"""
+    render = _render_context(backend) if backend else None
+    n_atoms = read_pdb_columns(pdb_file).n_atoms
+    results = []
+    print(f"{'atoms':>10} {'stage':<15} {'seconds':>9} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        copies = 1
+        while True:
+            path = pdb_file
+            if copies > 1:
+                path = os.path.join(tmp, f"assembly_{copies}.pdb")
+                write_tiled_assembly(pdb_file, copies, path)
+            stage_repeat = repeat if copies == 1 else 1
+            for name, setup, run in pipeline_stages(path, render):
+                seconds = _time_stage(setup, run, stage_repeat)
+                peak = _peak_stage(setup, run) / 2**20
+                results.append({'atoms': n_atoms * copies, 'stage': name,
+                                'seconds': seconds, 'peak_mb': peak})
+                print(f"{n_atoms * copies:>10} {name:<15} {seconds:>9.4f} {peak:>8.1f}")
+            if n_atoms * copies >= max_atoms:
+                break
+            # 每步 4 倍，最后一步取刚好达到 max_atoms 的副本数
+            copies = min(copies * 4, -(-max_atoms // n_atoms))
+
+    report = {'environment': _environment(), 'pdb_file': pdb_file, 'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {output}")
+    return report
+
+
+# 启动到第一帧 (空视图) 的目标耗时 (秒)，含解释器启动
+STARTUP_TARGET_SECONDS = 1.0
+# 启动时不应导入的模块 (只在显式需要时延迟导入)
+STARTUP_FORBIDDEN_IMPORTS = ('Bio', 'msgpack')
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """解析 -X importtime 输出，返回顶层导入的模块 -> 累计秒数"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # 表头
+        name = fields[2].rstrip()[1:]  # 分隔符后的一个空格，其后每级缩进两个空格
+        if name.lstrip() == name:
+            imports[name.strip()] = int(fields[1]) / 1e6
+        elif name.strip().split('.')[0] in STARTUP_FORBIDDEN_IMPORTS:
+            imports.setdefault(name.strip().split('.')[0], 0.0)
+    return imports
+
+
+def bench_startup(pdb_file: Optional[str], repeat: int, timeout: float, target: float,
+                  output: Optional[str]) -> int:
+    """
+    以 -X importtime 启动 main.py，测量解释器启动、窗口显示、视图创建、第一帧和结构第一帧的时间，
+    以及顶层导入的耗时；需要可用的显示和GL (无显示时可在 Xvfb 中运行)
+
+    返回:
+        int: 进程退出码，第一帧超出目标或启动时导入了不应导入的模块时为1
+    """
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    n_atoms = read_pdb_columns(pdb_file).n_atoms if pdb_file else 0
+    best: Dict[str, float] = {}
+    forbidden = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = os.path.join(tmp, 'startup.json')
+        for _ in range(repeat):
+            command = [sys.executable, '-X', 'importtime', main_path]
+            if pdb_file:
+                command.append(pdb_file)
+            command += ['--startup-report', report_path, '--startup-timeout', str(timeout)]
+            launched = time.time()
+            process = subprocess.run(command, capture_output=True, text=True, timeout=timeout + 60)
+            if not os.path.exists(report_path):
+                print(f"main.py wrote no startup report (exit code {process.returncode})")
+                print(process.stderr[-2000:])
+                return 1
+            with open(report_path) as f:
+                report = json.load(f)
+            os.remove(report_path)
+            interpreter = report['started'] - launched
+            stages = {'interpreter': interpreter}
+            stages.update({name: interpreter + seconds for name, seconds in report['times'].items()})
+            imports = parse_importtime(process.stderr)
+            forbidden.update(name for name in imports if name in STARTUP_FORBIDDEN_IMPORTS)
+            stages.update({f'import {name}': seconds for name, seconds in imports.items()
+                           if seconds >= 0.001})
+            for name, seconds in stages.items():
+                best[name] = min(best.get(name, float('inf')), seconds)
+
+    results = [{'atoms': n_atoms, 'stage': name, 'seconds': seconds} for name, seconds in best.items()]
+    print(f"{'stage':<36} {'seconds':>9}")
+    for r in sorted(results, key=lambda r: r['seconds']):
+        print(f"{r['stage']:<36} {r['seconds']:>9.4f}")
+
+    status = 0
+    first_frame = best.get('first_frame')
+    if first_frame is None:
+        print("first frame was not drawn (no display or GL context?); target not checked")
+    elif first_frame > target:
+        print(f"time to first frame {first_frame:.3f}s exceeds the {target:.3f}s target")
+        status = 1
+    else:
+        print(f"time to first frame {first_frame:.3f}s (target {target:.3f}s)")
+    if forbidden:
+        print(f"imported at startup but should be deferred: {', '.join(sorted(forbidden))}")
+        status = 1
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'environment': _environment(), 'pdb_file': pdb_file, 'target': target,
+                       'results': results}, f, indent=2)
+        print(f"results written to {output}")
+    return status
+
+
+def compare_results(baseline: str, current: str):
+    """比较两次 pipeline 或 startup 结果，输出每个阶段的耗时比值 (>1 表示变慢)"""
+    with open(baseline) as f:
+        old = json.load(f)
+    with open(current) as f:
+        new = json.load(f)
+    old_times = {(r['atoms'], r['stage']): r['seconds'] for r in old['results']}
+    print(f"baseline {old['environment'].get('commit', '?')} -> "
+          f"current {new['environment'].get('commit', '?')}")
+    print(f"{'atoms':>10} {'stage':<15} {'before':>9} {'after':>9} {'ratio':>7}")
+    for r in new['results']:
+        before = old_times.get((r['atoms'], r['stage']))
+        if before is None:
+            continue
+        ratio = r['seconds'] / before if before > 0 else float('inf')
+        print(f"{r['atoms']:>10} {r['stage']:<15} {before:>9.4f} {r['seconds']:>9.4f} {ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ProteinCodeShell performance benchmarks")
+    sub = parser.add_subparsers(dest='suite', required=True)
+
+    bonds = sub.add_parser('bonds', help="bond detection: spatial grid vs legacy NeighborSearch")
+    bonds.add_argument('pdb_file', nargs='?', default='1ake.pdb')
+    bonds.add_argument('--max-atoms', type=int, default=2_000_000)
+    bonds.add_argument('--legacy-max', type=int, default=16_000,
+                       help="largest size to run the quadratic legacy path on")
+
+    parse = sub.add_parser('parse', help="PDB parsing: columnar reader vs Bio.PDB object model")
+    parse.add_argument('pdb_file', nargs='?', default='1ake.pdb')
+    parse.add_argument('--max-atoms', type=int, default=1_000_000)
+    parse.add_argument('--biopython-max', type=int, default=250_000,
+                       help="largest size to run the Bio.PDB parser on")
+
+    pipeline = sub.add_parser('pipeline', help="per-stage load/render timings and peak memory")
+    pipeline.add_argument('pdb_file', nargs='?', default='1ake.pdb')
+    pipeline.add_argument('--max-atoms', type=int, default=1_000_000,
+                          help="size the largest synthetic assembly reaches (1ake tiled in steps "
+                               "of 4x, the last step sized to reach it)")
+    pipeline.add_argument('--repeat', type=int, default=5)
+    pipeline.add_argument('--gl-backend', default='egl',
+                          help="vispy app backend for render stages (egl = headless software GL)")
+    pipeline.add_argument('--no-render', action='store_true', help="skip the render stages")
+    pipeline.add_argument('-o', '--output', help="write results as JSON")
+
+    startup = sub.add_parser('startup', help="time to first frame and import costs of main.py")
+    startup.add_argument('pdb_file', nargs='?', default='1ake.pdb',
+                         help="structure to open ('' for empty views only)")
+    startup.add_argument('--repeat', type=int, default=3)
+    startup.add_argument('--timeout', type=float, default=30.0,
+                         help="seconds to wait for the structure's first frame")
+    startup.add_argument('--target', type=float, default=STARTUP_TARGET_SECONDS,
+                         help="maximum seconds from launch to the first frame")
+    startup.add_argument('-o', '--output', help="write results as JSON")
+
+    superpose = sub.add_parser('superpose', help="batched Kabsch and all-vs-all RMSD matrix "
+                                                 "on a synthetic ensemble")
+    superpose.add_argument('pdb_file', nargs='?', default='1ake.pdb')
+    superpose.add_argument('--frames', type=int, default=5000, help="largest ensemble size")
+    superpose.add_argument('--selection', default='name CA')
+    superpose.add_argument('--block', type=int, default=256,
+                           help="frames per RMSD block (memory per block ~ block^2 * 160 bytes)")
+    superpose.add_argument('--workers', type=int, help="threads for the RMSD blocks (default: all cores)")
+    superpose.add_argument('--python-pairs', type=int, default=2000,
+                           help="pairs superposed one at a time to extrapolate the loop baseline")
+
+    interactions = sub.add_parser('interactions', help="contact/clash/H-bond/interface analysis: "
+                                  "full, incremental and per-frame timings")
+    interactions.add_argument('pdb_file', nargs='?', default='1ake.pdb')
+    interactions.add_argument('--max-atoms', type=int, default=2_000_000,
+                              help="largest tiled assembly (copies grow 8x per step)")
+    interactions.add_argument('--chunk-pairs', type=int, default=1 << 18,
+                              help="candidate atom pairs per chunk in the full pass")
+    interactions.add_argument('--moved-residues', type=int, default=20,
+                              help="consecutive residues perturbed for the incremental update")
+
+    surface = sub.add_parser('surface', help="Gaussian surface generation per kind and resolution, "
+                             "serial vs thread pool, cached reload")
+    surface.add_argument('pdb_file', nargs='?', default='1ake.pdb')
+    surface.add_argument('--atoms', type=int, default=50_000,
+                         help="surface atoms in the tiled assembly")
+    surface.add_argument('--workers', type=int, help="threads for the blocks (default: all cores)")
+
+    compare = sub.add_parser('compare', help="compare two pipeline or startup JSON results")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+
+    args = parser.parse_args()
+    if args.suite == 'pipeline':
+        bench_pipeline(args.pdb_file, args.max_atoms, args.repeat,
+                       None if args.no_render else args.gl_backend, args.output)
+    elif args.suite == 'startup':
+        sys.exit(bench_startup(args.pdb_file or None, args.repeat, args.timeout, args.target,
+                               args.output))
+    elif args.suite == 'compare':
+        compare_results(args.baseline, args.current)
+    elif args.suite == 'bonds':
+        bench_bonds(args.pdb_file, args.max_atoms, args.legacy_max)
+    elif args.suite == 'parse':
+        bench_parse(args.pdb_file, args.max_atoms, args.biopython_max)
+    elif args.suite == 'superpose':
+        bench_superpose(args.pdb_file, args.frames, args.selection, args.block, args.workers,
+                        args.python_pairs)
+    elif args.suite == 'interactions':
+        bench_interactions(args.pdb_file, args.max_atoms, args.chunk_pairs, args.moved_residues)
+    elif args.suite == 'surface':
+        bench_surface(args.pdb_file, args.atoms, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+from typing import Optional
+from element_data import COVALENT_RADII, ELEMENT_H
+from spatial_grid import CellGrid
+
+# 判定共价键时在共价半径之和上允许的误差 (Å)
+DEFAULT_BOND_TOLERANCE = 0.45
+# 小于该距离的原子对视为重叠/交替构象，不成键 (Å)
+MIN_BOND_DISTANCE = 0.4
+
+
+def detect_bonds(coords: np.ndarray, codes: np.ndarray,
+                 tolerance: float = DEFAULT_BOND_TOLERANCE,
+                 chunk_pairs: int = 1 << 22,
+                 subset: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    基于空间网格和元素共价半径检测共价键，排除氢原子之间的键联
+
+    当 d(i,j) <= r_i + r_j + tolerance 时认为 i、j 成键，
+    复杂度随原子数近线性增长。
+
+    参数:
+        coords: (N,3) 原子坐标
+        codes: (N,) uint8 元素编码
+        tolerance: 共价半径之和的允许误差 (Å)
+        chunk_pairs: 每块检查的候选原子对数量，用于限制峰值内存
+        subset: 原子下标，给出时只返回至少一端属于该子集的键
+
+    返回:
+        (M,2) int32 数组，每行 i < j，按行排序
+    """
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+    codes = np.asarray(codes, dtype=np.uint8)
+    if len(coords) < 2:
+        return np.empty((0, 2), dtype=np.int32)
+
+    radii = COVALENT_RADII[codes]
+    # 网格单元只需覆盖实际可能出现的最长键: 两个最大半径之和(单个金属离子不会放大网格)
+    counts = np.bincount(codes, minlength=len(COVALENT_RADII))[:len(COVALENT_RADII)]
+    largest = np.repeat(COVALENT_RADII, np.minimum(counts, 2))
+    largest = np.sort(largest)[-2:]
+    cutoff = float(largest.sum()) + tolerance
+    if subset is not None:
+        return _detect_subset_bonds(coords, codes, radii, np.asarray(subset, dtype=np.int64),
+                                    cutoff, tolerance)
+    grid = CellGrid(coords, cutoff)
+
+    found = []
+    for i, j, dist_sq in grid.pairs_within(cutoff, chunk_pairs=chunk_pairs):
+        limit = radii[i] + radii[j] + tolerance
+        ok = (dist_sq <= limit * limit) & (dist_sq >= MIN_BOND_DISTANCE ** 2)
+        ok &= ~((codes[i] == ELEMENT_H) & (codes[j] == ELEMENT_H))
+        found.append(np.stack([i[ok], j[ok]], axis=1))
+
+    if not found:
+        return np.empty((0, 2), dtype=np.int32)
+    return unique_bonds(np.concatenate(found), len(coords))
+
+
+def _detect_subset_bonds(coords: np.ndarray, codes: np.ndarray, radii: np.ndarray,
+                         subset: np.ndarray, cutoff: float, tolerance: float) -> np.ndarray:
+    """只以子集原子为查询点做半径搜索，子集很小时避免枚举全部原子对"""
+    if len(subset) == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    cutoff = min(cutoff, float(radii[subset].max() + radii.max()) + tolerance)
+    grid = CellGrid(coords, cutoff)
+    q, j, dist_sq = grid.query_radius(coords[subset], cutoff)
+    i = subset[q]
+    limit = radii[i] + radii[j] + tolerance
+    ok = (dist_sq <= limit * limit) & (dist_sq >= MIN_BOND_DISTANCE ** 2) & (i != j)
+    ok &= ~((codes[i] == ELEMENT_H) & (codes[j] == ELEMENT_H))
+    return unique_bonds(np.stack([i[ok], j[ok]], axis=1), len(coords))
+
+
+def unique_bonds(bonds: np.ndarray, n_atoms: int) -> np.ndarray:
+    """
+    规范化键连数组: 每行 i < j，去除自环和重复项并按行排序
+
+    参数:
+        bonds: (M,2) 原子索引对
+        n_atoms: 原子总数
+
+    返回:
+        (K,2) int32 数组
+    """
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+    lo = bonds.min(axis=1)
+    hi = bonds.max(axis=1)
+    keys = np.sort(lo[lo != hi] * n_atoms + hi[lo != hi])
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+    return np.stack([keys // n_atoms, keys % n_atoms], axis=1).astype(np.int32)
@@ -0,0 +1,380 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from vispy import gloo
+from vispy.visuals.visual import Visual
+from protein_structure import ProteinStructure
+from secondary_structure import (SS_HELIX, SS_STRAND, backbone_atoms, backbone_links,
+                                 secondary_structure)
+from shared_visuals import clip_matrix
+
+# 截面尺寸 (Å): 卷曲和转角为圆管，螺旋和折叠为扁平带，折叠末端为箭头
+COIL_RADIUS = 0.3
+HELIX_HALF_WIDTH = 1.3
+STRAND_HALF_WIDTH = 1.0
+ARROW_HALF_WIDTH = 1.7
+RIBBON_HALF_THICKNESS = 0.25
+
+# 细分级别: (每个残基的样条采样数, 截面边数)，级别越高越粗糙
+CARTOON_LEVELS = ((8, 12), (4, 8), (2, 4))
+# 残基数达到这些阈值时默认使用更粗糙的级别
+CARTOON_LEVEL_RESIDUES = (5_000, 40_000)
+
+
+class CartoonMesh:
+    def __init__(self, vertices: np.ndarray, normals: np.ndarray, faces: np.ndarray,
+                 residues: np.ndarray):
+        """
+        卡通三角网格
+
+        参数:
+            vertices: (V,3) float32 顶点坐标
+            normals: (V,3) float32 顶点法线
+            faces: (F,3) uint32 三角形顶点下标
+            residues: (V,) int64 顶点所属残基 (用于按残基着色)
+        """
+        self.vertices = vertices
+        self.normals = normals
+        self.faces = faces
+        self.residues = residues
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.vertices)
+
+
+def cartoon_level(n_residues: int) -> int:
+    """按残基数选择默认细分级别 (CARTOON_LEVELS 的下标)"""
+    return int(np.searchsorted(CARTOON_LEVEL_RESIDUES, n_residues, side='right'))
+
+
+def _normalize(v: np.ndarray) -> np.ndarray:
+    return v / np.maximum(np.linalg.norm(v, axis=-1, keepdims=True), 1e-12)
+
+
+def _catmull_rom(points: np.ndarray, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    经过全部控制点的均匀 Catmull-Rom 样条，两端外推一个控制点
+
+    参数:
+        points: (L,3) 控制点 (L >= 2)
+        t: (S,) 采样参数，范围 [0, L-1]
+
+    返回:
+        tuple: (位置 (S,3), 切线 (S,3))
+    """
+    padded = np.concatenate([2 * points[:1] - points[1:2], points,
+                             2 * points[-1:] - points[-2:-1]])
+    segment = np.minimum(np.floor(t).astype(np.int64), len(points) - 2)
+    u = (t - segment)[:, None]
+    p0, p1, p2, p3 = (padded[segment + k] for k in range(4))
+    a = 2 * p1
+    b = p2 - p0
+    c = 2 * p0 - 5 * p1 + 4 * p2 - p3
+    d = 3 * (p1 - p2) + p3 - p0
+    position = 0.5 * (a + b * u + c * u * u + d * u * u * u)
+    tangent = 0.5 * (b + 2 * c * u + 3 * d * u * u)
+    return position, tangent
+
+
+def _section_sizes(ss: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每个残基的截面半宽和半厚"""
+    width = np.full(len(ss), COIL_RADIUS, dtype=np.float64)
+    thickness = np.full(len(ss), COIL_RADIUS, dtype=np.float64)
+    width[ss == SS_HELIX] = HELIX_HALF_WIDTH
+    width[ss == SS_STRAND] = STRAND_HALF_WIDTH
+    thickness[(ss == SS_HELIX) | (ss == SS_STRAND)] = RIBBON_HALF_THICKNESS
+    return width, thickness
+
+
+def _tube(ca: np.ndarray, side: np.ndarray, ss: np.ndarray, subdivisions: int, sides: int
+          ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    一段连续主链的卡通网格: 沿 CA 样条扫掠随二级结构变化的椭圆截面，两端封口
+
+    参数:
+        ca: (L,3) CA 坐标
+        side: (L,3) 带宽方向 (羰基方向，已统一朝向)
+        ss: (L,) 二级结构编码
+        subdivisions: 每个残基的采样数
+        sides: 截面边数
+
+    返回:
+        tuple: (顶点, 法线, 三角形, 顶点所属的段内残基序号)
+    """
+    n_res = len(ca)
+    t = np.linspace(0, n_res - 1, (n_res - 1) * subdivisions + 1)
+    center, tangent = _catmull_rom(ca, t)
+    tangent = _normalize(tangent)
+
+    # 带宽方向在残基间线性插值后与切线正交化，厚度方向与两者垂直
+    segment = np.minimum(np.floor(t).astype(np.int64), n_res - 2)
+    u = t - segment
+    guide = side[segment] * (1 - u)[:, None] + side[segment + 1] * u[:, None]
+    binormal = _normalize(guide - tangent * np.einsum('ij,ij->i', guide, tangent)[:, None])
+    normal = np.cross(tangent, binormal)
+
+    width, thickness = _section_sizes(ss)
+    w = width[segment] * (1 - u) + width[segment + 1] * u
+    h = thickness[segment] * (1 - u) + thickness[segment + 1] * u
+    # 折叠的最后一个残基到下一个残基之间画箭头: 宽度从箭头宽收窄到圆管
+    strand = ss == SS_STRAND
+    last_strand = np.zeros(n_res, dtype=bool)
+    last_strand[:-1] = strand[:-1] & ~strand[1:]
+    arrow = last_strand[segment] & (u < 1)
+    w[arrow] = ARROW_HALF_WIDTH * (1 - u[arrow]) + COIL_RADIUS * u[arrow]
+    h[arrow] = RIBBON_HALF_THICKNESS
+    residue = np.rint(t).astype(np.int64)
+    residue[arrow] = segment[arrow]
+
+    angle = 2 * np.pi * np.arange(sides) / sides
+    cos, sin = np.cos(angle)[None, :, None], np.sin(angle)[None, :, None]
+    vertices = (center[:, None] + binormal[:, None] * (w[:, None, None] * cos)
+                + normal[:, None] * (h[:, None, None] * sin))
+    # 椭圆截面的外法线
+    normals = _normalize(binormal[:, None] * (cos / w[:, None, None])
+                         + normal[:, None] * (sin / h[:, None, None]))
+
+    n_rings = len(t)
+    ring = np.arange(n_rings - 1)[:, None] * sides
+    m = np.arange(sides)[None, :]
+    a, b = ring + m, ring + (m + 1) % sides
+    c, d = a + sides, b + sides
+    faces = np.concatenate([np.stack([a, c, b], axis=-1).reshape(-1, 3),
+                            np.stack([b, c, d], axis=-1).reshape(-1, 3)])
+
+    # 两端封口: 各加一个中心顶点，与端环构成扇形
+    n_ring_vertices = n_rings * sides
+    caps_vertices = np.stack([center[0], center[-1]])
+    caps_normals = np.stack([-tangent[0], tangent[-1]])
+    m = np.arange(sides)
+    start_cap = np.stack([np.full(sides, n_ring_vertices), (m + 1) % sides, m], axis=1)
+    end_ring = (n_rings - 1) * sides
+    end_cap = np.stack([np.full(sides, n_ring_vertices + 1), end_ring + m,
+                        end_ring + (m + 1) % sides], axis=1)
+
+    vertices = np.concatenate([vertices.reshape(-1, 3), caps_vertices])
+    normals = np.concatenate([normals.reshape(-1, 3), caps_normals])
+    faces = np.concatenate([faces, start_cap, end_cap])
+    residues = np.concatenate([np.repeat(residue, sides), [residue[0], residue[-1]]])
+    return vertices, normals, faces, residues
+
+
+def backbone_runs(structure: ProteinStructure, coords: Optional[np.ndarray] = None
+                  ) -> List[np.ndarray]:
+    """
+    连续主链片段 (链断裂或非蛋白残基处分开)，每段至少两个残基
+
+    返回:
+        每段在 backbone_atoms 返回数组中的位置
+    """
+    coords = structure.coords if coords is None else coords
+    residues, atoms = backbone_atoms(structure)
+    if len(residues) < 2:
+        return []
+    linked = backbone_links(structure, residues, atoms, coords)
+    runs = np.split(np.arange(len(residues)), np.flatnonzero(~linked) + 1)
+    return [run for run in runs if len(run) >= 2]
+
+
+def build_cartoon(structure: ProteinStructure, level: int = 0,
+                  coords: Optional[np.ndarray] = None) -> CartoonMesh:
+    """
+    生成卡通网格，各主链片段 (不同链) 在线程池中并行扫掠
+
+    参数:
+        structure: 结构
+        level: 细分级别，CARTOON_LEVELS 的下标
+        coords: (N,3) 使用的坐标 (轨迹帧)，None 使用结构自身坐标；二级结构沿用结构的缓存
+
+    返回:
+        CartoonMesh
+    """
+    coords = structure.coords if coords is None else coords
+    subdivisions, sides = CARTOON_LEVELS[level]
+    residues, atoms = backbone_atoms(structure)
+    ss = secondary_structure(structure)
+    ca = coords[atoms[:, 1]].astype(np.float64) if len(atoms) else np.zeros((0, 3))
+
+    def sweep(run: np.ndarray):
+        carbonyl = _normalize(coords[atoms[run, 3]].astype(np.float64)
+                              - coords[atoms[run, 2]])
+        # 折叠中相邻羰基交替反向，翻转使带宽方向连续
+        flip = np.einsum('ij,ij->i', carbonyl[1:], carbonyl[:-1]) < 0
+        sign = np.where(np.concatenate(([0], np.cumsum(flip))) % 2, -1.0, 1.0)
+        vertices, normals, faces, local = _tube(ca[run], carbonyl * sign[:, None],
+                                                ss[residues[run]], subdivisions, sides)
+        return vertices, normals, faces, residues[run][local]
+
+    runs = backbone_runs(structure, coords)
+    if len(runs) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(runs), os.cpu_count() or 1)) as pool:
+            parts = list(pool.map(sweep, runs))
+    else:
+        parts = [sweep(run) for run in runs]
+    if not parts:
+        return CartoonMesh(np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32),
+                           np.zeros((0, 3), np.uint32), np.zeros(0, np.int64))
+
+    offsets = np.cumsum([0] + [len(part[0]) for part in parts[:-1]])
+    return CartoonMesh(
+        np.concatenate([part[0] for part in parts]).astype(np.float32),
+        np.concatenate([part[1] for part in parts]).astype(np.float32),
+        np.concatenate([part[2] + offset for part, offset in zip(parts, offsets)]
+                       ).astype(np.uint32),
+        np.concatenate([part[3] for part in parts]))
+
+
+def cartoon_mesh(structure: ProteinStructure, level: Optional[int] = None) -> CartoonMesh:
+    """
+    卡通网格，按细分级别缓存在共享结构上
+
+    参数:
+        structure: 结构
+        level: 细分级别，None 按残基数选择
+    """
+    if level is None:
+        level = cartoon_level(len(backbone_atoms(structure)[0]))
+    return structure.derived(f'cartoon:{level}', lambda: build_cartoon(structure, level))
+
+
+class CartoonVisual(Visual):
+    """卡通网格可视化: 顶点、法线和颜色缓冲绑定在共享程序上，可被多个视图节点共用"""
+
+    _vertex_shader = """
+        uniform vec4 u_eye;
+        attribute vec3 a_position;
+        attribute vec3 a_normal;
+        attribute vec4 a_color;
+        varying vec3 v_normal;
+        varying vec3 v_to_eye;
+        varying vec4 v_color;
+        void main(void) {
+            gl_Position = $transform(vec4(a_position, 1.0));
+            v_normal = a_normal;
+            v_to_eye = u_eye.xyz - a_position * u_eye.w;
+            v_color = a_color;
+        }
+    """
+    # 双面头灯光照，draft 时只用漫反射 (与冒名顶替体一致)
+    _fragment_shader = """
+        uniform float u_draft;
+        varying vec3 v_normal;
+        varying vec3 v_to_eye;
+        varying vec4 v_color;
+        void main() {
+            float diffuse = abs(dot(normalize(v_normal), normalize(v_to_eye)));
+            float specular = u_draft > 0.5 ? 0.0 : pow(diffuse, 40.0);
+            gl_FragColor = vec4(v_color.rgb * (0.35 + 0.65 * diffuse) + 0.3 * specular,
+                                v_color.a);
+        }
+    """
+
+    def __init__(self, mesh: CartoonMesh, residue_colors: np.ndarray):
+        """
+        参数:
+            mesh: 卡通网格
+            residue_colors: (R,4) 残基颜色
+        """
+        self._position_vbo = gloo.VertexBuffer()
+        self._normal_vbo = gloo.VertexBuffer()
+        self._color_vbo = gloo.VertexBuffer()
+        self._faces_ibo = gloo.IndexBuffer()
+        self.mesh = None
+        self._residue_colors = residue_colors
+        # 显示的残基 (R,) bool，None 表示全部显示
+        self._residue_mask = None
+        self._n_faces = 0
+        Visual.__init__(self, vcode=self._vertex_shader, fcode=self._fragment_shader)
+        self.set_gl_state('translucent', depth_test=True, cull_face=False)
+        self._draw_mode = 'triangles'
+        self.shared_program['u_draft'] = 0.0
+        self.set_mesh(mesh)
+
+    def set_mesh(self, mesh: CartoonMesh):
+        """更换网格 (轨迹帧)，颜色沿用当前的残基颜色"""
+        self.mesh = mesh
+        if mesh.n_vertices:
+            self._position_vbo.set_data(mesh.vertices)
+            self._normal_vbo.set_data(mesh.normals)
+            self.shared_program['a_position'] = self._position_vbo
+            self.shared_program['a_normal'] = self._normal_vbo
+        self._upload_faces()
+        self.set_colors(self._residue_colors)
+
+    def set_residue_mask(self, residue_mask: Optional[np.ndarray]):
+        """只绘制选中残基的三角形，顶点缓冲不变 (隐藏/显示选择)"""
+        self._residue_mask = residue_mask
+        self._upload_faces()
+        self.update()
+
+    def _upload_faces(self):
+        faces = self.mesh.faces
+        if self._residue_mask is not None and len(faces):
+            faces = faces[self._residue_mask[self._owners()[faces[:, 0]]]]
+        self._n_faces = len(faces)
+        if self._n_faces:
+            self._faces_ibo.set_data(np.ascontiguousarray(faces, dtype=np.uint32))
+            self._index_buffer = self._faces_ibo
+
+    def set_colors(self, residue_colors: np.ndarray):
+        """原地更新颜色缓冲 (切换配色方案)"""
+        self._residue_colors = residue_colors
+        if self.mesh.n_vertices:
+            self._color_vbo.set_data(np.ascontiguousarray(residue_colors[self._owners()],
+                                                          dtype=np.float32))
+            self.shared_program['a_color'] = self._color_vbo
+        self.update()
+
+    def _owners(self) -> np.ndarray:
+        """顶点所属的着色和显示单元 (卡通为残基)，颜色和显示掩码按它索引"""
+        return self.mesh.residues
+
+    def set_draft(self, draft: bool):
+        """低开销绘制: 交互期间只保留漫反射光照"""
+        self.shared_program['u_draft'] = 1.0 if draft else 0.0
+        self.update()
+
+    def _prepare_transforms(self, view):
+        view.view_program.vert['transform'] = view.transforms.get_transform()
+
+    def _prepare_draw(self, view):
+        if self._n_faces == 0:
+            return False
+        # 视点: 投影后 w=0 且位于光轴上的点，正交投影时为无穷远方向 (w=0)
+        eye = np.linalg.inv(clip_matrix(view))[2]
+        if abs(eye[3]) > 1e-6 * np.linalg.norm(eye[:3]):
+            eye = np.append(eye[:3] / eye[3], 1.0)
+        else:
+            eye = np.append(eye[:3], 0.0)
+        view.view_program['u_eye'] = eye.astype(np.float32)
+
+    def _compute_bounds(self, axis, view):
+        return None
+
+
+_WATER_NAMES = (b'HOH', b'WAT', b'DOD')
+
+
+def cartoon_ligand_atoms(structure: ProteinStructure) -> np.ndarray:
+    """卡通模式下仍按原子显示的原子: 不属于任何主链片段的非水残基 (配体、离子等)"""
+    def build():
+        in_cartoon = np.zeros(len(structure.residue_offsets) - 1, dtype=bool)
+        residues, _ = backbone_atoms(structure)
+        for run in backbone_runs(structure):
+            in_cartoon[residues[run]] = True
+        residue = np.repeat(np.arange(len(in_cartoon)), np.diff(structure.residue_offsets))
+        water = np.isin(structure.res_names, _WATER_NAMES)
+        return np.flatnonzero(~in_cartoon[residue] & ~water)
+    return structure.derived('cartoon_ligand_atoms', build)
+
+
+def cartoon_ligand_bonds(structure: ProteinStructure) -> np.ndarray:
+    """两端都是卡通模式下按原子显示的原子的键"""
+    def build():
+        shown = np.zeros(structure.n_atoms, dtype=bool)
+        shown[cartoon_ligand_atoms(structure)] = True
+        bonds = structure.bonds
+        return bonds[shown[bonds[:, 0]] & shown[bonds[:, 1]]]
+    return structure.derived('cartoon_ligand_bonds', build, uses_bonds=True)
@@ -0,0 +1,104 @@
+import numpy as np
+from typing import Iterable
+
+# 元素符号，下标即元素编码(原子序数)，0 表示未知元素
+ELEMENT_SYMBOLS = (
+    'X',
+    'H', 'He',
+    'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne',
+    'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar',
+    'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn',
+    'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr',
+    'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd',
+    'In', 'Sn', 'Sb', 'Te', 'I', 'Xe',
+    'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy',
+    'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt',
+    'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn',
+    'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf',
+    'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds',
+    'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+
+ELEMENT_H = 1
+ELEMENT_C = 6
+ELEMENT_N = 7
+ELEMENT_O = 8
+ELEMENT_P = 15
+ELEMENT_S = 16
+
+# 共价半径 (Å)，Cordero et al. 2008，按元素编码索引
+_COVALENT_RADII = {
+    'H': 0.31, 'He': 0.28, 'Li': 1.28, 'Be': 0.96, 'B': 0.84, 'C': 0.76,
+    'N': 0.71, 'O': 0.66, 'F': 0.57, 'Ne': 0.58, 'Na': 1.66, 'Mg': 1.41,
+    'Al': 1.21, 'Si': 1.11, 'P': 1.07, 'S': 1.05, 'Cl': 1.02, 'Ar': 1.06,
+    'K': 2.03, 'Ca': 1.76, 'Sc': 1.70, 'Ti': 1.60, 'V': 1.53, 'Cr': 1.39,
+    'Mn': 1.39, 'Fe': 1.32, 'Co': 1.26, 'Ni': 1.24, 'Cu': 1.32, 'Zn': 1.22,
+    'Ga': 1.22, 'Ge': 1.20, 'As': 1.19, 'Se': 1.20, 'Br': 1.20, 'Kr': 1.16,
+    'Rb': 2.20, 'Sr': 1.95, 'Y': 1.90, 'Zr': 1.75, 'Nb': 1.64, 'Mo': 1.54,
+    'Tc': 1.47, 'Ru': 1.46, 'Rh': 1.42, 'Pd': 1.39, 'Ag': 1.45, 'Cd': 1.44,
+    'In': 1.42, 'Sn': 1.39, 'Sb': 1.39, 'Te': 1.38, 'I': 1.39, 'Xe': 1.40,
+    'Cs': 2.44, 'Ba': 2.15, 'La': 2.07, 'Ce': 2.04, 'Pr': 2.03, 'Nd': 2.01,
+    'Pm': 1.99, 'Sm': 1.98, 'Eu': 1.98, 'Gd': 1.96, 'Tb': 1.94, 'Dy': 1.92,
+    'Ho': 1.92, 'Er': 1.89, 'Tm': 1.90, 'Yb': 1.87, 'Lu': 1.87, 'Hf': 1.75,
+    'Ta': 1.70, 'W': 1.62, 'Re': 1.51, 'Os': 1.44, 'Ir': 1.41, 'Pt': 1.36,
+    'Au': 1.36, 'Hg': 1.32, 'Tl': 1.45, 'Pb': 1.46, 'Bi': 1.48, 'Po': 1.40,
+    'At': 1.50, 'Rn': 1.50, 'Fr': 2.60, 'Ra': 2.21, 'Ac': 2.15, 'Th': 2.06,
+    'Pa': 2.00, 'U': 1.96, 'Np': 1.90, 'Pu': 1.87, 'Am': 1.80, 'Cm': 1.69,
+}
+DEFAULT_COVALENT_RADIUS = 1.50
+
+COVALENT_RADII = np.array(
+    [_COVALENT_RADII.get(sym, DEFAULT_COVALENT_RADIUS) for sym in ELEMENT_SYMBOLS],
+    dtype=np.float32
+)
+
+# 范德华半径 (Å)，Bondi 1964 (H 取 Rowland & Taylor 1996)，未列出的元素取默认值
+_VDW_RADII = {
+    'H': 1.10, 'He': 1.40, 'Li': 1.82, 'C': 1.70, 'N': 1.55, 'O': 1.52,
+    'F': 1.47, 'Ne': 1.54, 'Na': 2.27, 'Mg': 1.73, 'Si': 2.10, 'P': 1.80,
+    'S': 1.80, 'Cl': 1.75, 'Ar': 1.88, 'K': 2.75, 'Ni': 1.63, 'Cu': 1.40,
+    'Zn': 1.39, 'Ga': 1.87, 'As': 1.85, 'Se': 1.90, 'Br': 1.85, 'Kr': 2.02,
+    'Pd': 1.63, 'Ag': 1.72, 'Cd': 1.58, 'In': 1.93, 'Sn': 2.17, 'Te': 2.06,
+    'I': 1.98, 'Xe': 2.16, 'Pt': 1.72, 'Au': 1.66, 'Hg': 1.55, 'Tl': 1.96,
+    'Pb': 2.02, 'U': 1.86,
+}
+DEFAULT_VDW_RADIUS = 2.00
+
+VDW_RADII = np.array(
+    [_VDW_RADII.get(sym, DEFAULT_VDW_RADIUS) for sym in ELEMENT_SYMBOLS],
+    dtype=np.float32
+)
+
+_SYMBOL_TO_CODE = {sym.upper(): code for code, sym in enumerate(ELEMENT_SYMBOLS)}
+_SYMBOL_TO_CODE['D'] = ELEMENT_H  # 氘按氢处理
+
+
+def element_code(symbol: str) -> int:
+    """将元素符号转换为元素编码，未知元素返回0"""
+    if isinstance(symbol, bytes):
+        symbol = symbol.decode('ascii', 'ignore')
+    return _SYMBOL_TO_CODE.get(str(symbol).strip().upper(), 0)
+
+
+def element_codes(symbols: Iterable[str]) -> np.ndarray:
+    """
+    将元素符号数组转换为 uint8 元素编码数组
+
+    参数:
+        symbols: 元素符号序列
+
+    返回:
+        (N,) uint8 数组
+    """
+    symbols = np.asarray(symbols)
+    if symbols.size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    # 只对不同的符号做字典查找
+    unique, inverse = np.unique(symbols, return_inverse=True)
+    codes = np.array([element_code(sym) for sym in unique], dtype=np.uint8)
+    return codes[inverse.reshape(-1)]
+
+
+def element_symbols(codes: np.ndarray) -> np.ndarray:
+    """将元素编码数组转换回元素符号数组"""
+    return np.asarray(ELEMENT_SYMBOLS)[np.asarray(codes, dtype=np.intp)]
@@ -0,0 +1,113 @@
+import numpy as np
+from typing import Dict, List, Tuple
+from protein_structure import ProteinStructure
+
+
+def intern_names(names: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    名称驻留: 把定长字节串列压缩为 (去重名称表, 每项在表中的编码)
+
+    S4 列按 uint32 视图去重，比逐个比较字节串快一个数量级。
+
+    参数:
+        names: (N,) 定长字节串数组
+
+    返回:
+        tuple: (名称表 (U,)，编码 (N,) int32)
+    """
+    names = np.ascontiguousarray(names)
+    width = names.dtype.itemsize
+    if width in (1, 2, 4, 8) and len(names):
+        keys = names.view(f'u{width}')
+        _, first, codes = np.unique(keys, return_index=True, return_inverse=True)
+        table = names[first]
+    else:
+        table, codes = np.unique(names, return_inverse=True)
+    return table, codes.astype(np.int32).reshape(-1)
+
+
+class HierarchyIndex:
+    def __init__(self, structure: ProteinStructure):
+        """
+        链 -> 残基 -> 原子 的紧凑层级索引: CSR 偏移数组 + 驻留的名称表，
+        残基和链级别的属性各存一份，按原子展开只需一次下标运算
+
+        参数:
+            structure: 结构
+        """
+        self.residue_offsets = structure.residue_offsets
+        self.chain_offsets = structure.chain_offsets
+        n_residues = len(self.residue_offsets) - 1
+        n_chains = len(self.chain_offsets) - 1
+        residue_starts = self.residue_offsets[:-1]
+
+        # 原子 -> 残基 -> 链段 的反向索引
+        self.atom_residue = np.repeat(np.arange(n_residues, dtype=np.int32),
+                                      np.diff(self.residue_offsets))
+        self.residue_chain = np.repeat(np.arange(n_chains, dtype=np.int32),
+                                       np.diff(self.chain_offsets))
+
+        # 按原子的名称驻留为编码，残基名、残基号、链标识每个残基/链段只存一份
+        self.atom_name_table, self.atom_name_codes = intern_names(structure.atom_names)
+        self.res_name_table, self.res_name_codes = intern_names(structure.res_names[residue_starts])
+        self.res_ids = structure.res_ids[residue_starts]
+        self.ins_codes = structure.ins_codes[residue_starts]
+        self.chain_id_table, self.chain_codes = intern_names(
+            structure.chain_ids[residue_starts[self.chain_offsets[:-1]]])
+
+    @property
+    def n_atoms(self) -> int:
+        return len(self.atom_residue)
+
+    @property
+    def n_residues(self) -> int:
+        return len(self.residue_offsets) - 1
+
+    @property
+    def n_chains(self) -> int:
+        return len(self.chain_offsets) - 1
+
+    def residue_any(self, atom_mask: np.ndarray) -> np.ndarray:
+        """(R,) 残基中是否有原子被选中"""
+        if self.n_residues == 0:
+            return np.zeros(0, dtype=bool)
+        return np.logical_or.reduceat(atom_mask, self.residue_offsets[:-1])
+
+    def chain_any(self, residue_mask: np.ndarray) -> np.ndarray:
+        """(C,) 链段中是否有残基被选中"""
+        if self.n_chains == 0:
+            return np.zeros(0, dtype=bool)
+        return np.logical_or.reduceat(residue_mask, self.chain_offsets[:-1])
+
+    def residue_atoms(self, residue_mask: np.ndarray) -> np.ndarray:
+        """残基掩码展开为 (N,) 原子掩码"""
+        return residue_mask[self.atom_residue]
+
+    def chain_atoms(self, chain_mask: np.ndarray) -> np.ndarray:
+        """链段掩码展开为 (N,) 原子掩码"""
+        return chain_mask[self.residue_chain][self.atom_residue]
+
+    def chain_info(self) -> List[Dict]:
+        """
+        每个链段的摘要
+
+        返回:
+            列表，每项为 {'chain': 链标识, 'residues': 残基数, 'atoms': 原子数,
+            'first_residue': 首残基号, 'last_residue': 末残基号}
+        """
+        info = []
+        for c in range(self.n_chains):
+            first, last = self.chain_offsets[c], self.chain_offsets[c + 1]
+            info.append({
+                'chain': self.chain_id_table[self.chain_codes[c]].decode(),
+                'residues': int(last - first),
+                'atoms': int(self.residue_offsets[last] - self.residue_offsets[first]),
+                'first_residue': int(self.res_ids[first]),
+                'last_residue': int(self.res_ids[last - 1]),
+            })
+        return info
+
+
+def hierarchy_index(structure: ProteinStructure) -> HierarchyIndex:
+    """层级索引，缓存在共享结构上"""
+    return structure.derived('hierarchy_index', lambda: HierarchyIndex(structure))
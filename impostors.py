@@ -0,0 +1,397 @@
+import numpy as np
+from typing import List, Optional
+from vispy import gloo
+from vispy.visuals.visual import Visual
+from element_data import COVALENT_RADII, VDW_RADII
+from protein_structure import ProteinStructure
+from shared_visuals import clip_matrix, gpu_nbytes
+from styling import REPRESENTATION_SPACEFILL
+
+# 球棍模型的原子半径为共价半径乘以该系数，键圆柱半径 (Å)
+BALL_RADIUS_SCALE = 0.5
+STICK_RADIUS = 0.12
+
+# 原子数据纹理每行的原子数 (2的幂，下标换算为纹理坐标时没有舍入误差)
+ATOM_TEXTURE_WIDTH = 2048
+
+# 冒名顶替体 (impostor): 每个球或键只画一个朝向视点、包住其投影的三角形，片元着色器
+# 沿视线求交得到精确的球面/圆柱面、法线和深度，几何形状不随缩放而失真。
+# 原子坐标、半径和颜色存在纹理中，顶点属性只有原子下标和三角形角点编号，
+# 顶点着色器按下标从纹理读取数据，坐标只上传一次，所有球、键和视图共用
+# (vispy 默认的 gl2 后端没有实例化绘制，不依赖 PyOpenGL 的 gl+ 后端)
+
+# 顶点着色器公共部分:
+#   u_positions 纹理的 xyz 为坐标、w 为半径；u_mvp 为数据坐标到裁剪坐标的完整变换
+#   (含ViewBox在画布中的位置)。视点是投影后 w=0 且位于光轴上的点，正交投影时
+#   view_direction 返回 -1。角点输出 w=1 的位置，使视线端点 (齐次坐标) 在屏幕上线性插值，
+#   深度由片元着色器写入；角点在视点之后时整个实例被移出裁剪范围
+_COMMON = """
+uniform sampler2D u_positions;
+uniform sampler2D u_colors;
+uniform vec2 u_texture_shape;
+uniform mat4 u_mvp;
+uniform mat4 u_mvp_inv;
+
+vec2 atom_uv(float index) {
+    float row = floor(index / u_texture_shape.x);
+    float col = index - row * u_texture_shape.x;
+    return (vec2(col, row) + 0.5) / u_texture_shape;
+}
+
+float view_direction(vec3 p, out vec3 dir) {
+    vec4 eye = u_mvp_inv * vec4(0.0, 0.0, 1.0, 0.0);
+    if (abs(eye.w) < 1e-6 * length(eye.xyz)) {
+        dir = normalize(eye.xyz);
+        return -1.0;
+    }
+    vec3 to_p = p - eye.xyz / eye.w;
+    float dist = length(to_p);
+    dir = to_p / dist;
+    return dist;
+}
+
+void emit_corner(vec3 corner, out vec4 near, out vec4 far) {
+    vec4 clip = u_mvp * vec4(corner, 1.0);
+    vec2 ndc = clip.xy / clip.w;
+    gl_Position = clip.w > 0.0 ? vec4(ndc, 0.0, 1.0) : vec4(2.0, 2.0, 2.0, 1.0);
+    near = u_mvp_inv * vec4(ndc, -1.0, 1.0);
+    far = u_mvp_inv * vec4(ndc, 0.0, 1.0);
+}
+
+void orthonormal_basis(vec3 dir, out vec3 u, out vec3 v) {
+    vec3 up = abs(dir.z) < 0.9 ? vec3(0.0, 0.0, 1.0) : vec3(1.0, 0.0, 0.0);
+    u = normalize(cross(dir, up));
+    v = cross(dir, u);
+}
+"""
+
+# 片元着色器公共部分: 头灯光照 (draft 时只用漫反射)、写入求交点的深度；
+# 视线起点移到实例中心附近，以减少远处求交时的浮点抵消
+_SHADE = """
+uniform mat4 u_mvp;
+uniform float u_draft;
+
+vec4 shade(vec4 color, vec3 normal, vec3 rd) {
+    float diffuse = max(dot(normal, -rd), 0.0);
+    float specular = u_draft > 0.5 ? 0.0 : pow(diffuse, 40.0);
+    return vec4(color.rgb * (0.35 + 0.65 * diffuse) + 0.3 * specular, color.a);
+}
+
+void write_depth(vec3 hit) {
+    vec4 clip = u_mvp * vec4(hit, 1.0);
+    gl_FragDepth = clamp(0.5 * clip.z / clip.w + 0.5, 0.0, 1.0);
+}
+
+void pixel_ray(vec4 near, vec4 far, vec3 anchor, out vec3 ro, out vec3 rd) {
+    vec3 p0 = near.xyz / near.w;
+    rd = normalize(far.xyz / far.w - p0);
+    ro = p0 + rd * dot(anchor - p0, rd);
+}
+"""
+
+# 球: 三角形取过球心、垂直视线的平面上切锥截得的圆的外切正三角形；视点在球内时不绘制
+_SPHERE_VERTEX = _COMMON + """
+uniform float u_radius_scale;
+attribute vec2 a_vertex;
+varying vec4 v_color;
+varying vec4 v_sphere;
+varying vec4 v_near;
+varying vec4 v_far;
+
+void main() {
+    vec2 uv = atom_uv(a_vertex.x);
+    vec4 atom = texture2D(u_positions, uv);
+    float radius = atom.w * u_radius_scale;
+    v_color = texture2D(u_colors, uv);
+    v_sphere = vec4(atom.xyz, radius);
+
+    vec3 dir;
+    float dist = view_direction(atom.xyz, dir);
+    if (dist >= 0.0 && dist <= radius) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        return;
+    }
+    float extent = dist < 0.0 ? radius : radius * dist / sqrt(dist * dist - radius * radius);
+    vec3 u, v;
+    orthonormal_basis(dir, u, v);
+    vec2 corner = a_vertex.y < 0.5 ? vec2(-1.7320508, -1.0)
+                : (a_vertex.y < 1.5 ? vec2(1.7320508, -1.0) : vec2(0.0, 2.0));
+    emit_corner(atom.xyz + (corner.x * u + corner.y * v) * extent, v_near, v_far);
+}
+"""
+
+_SPHERE_FRAGMENT = _SHADE + """
+varying vec4 v_color;
+varying vec4 v_sphere;
+varying vec4 v_near;
+varying vec4 v_far;
+
+void main() {
+    vec3 ro, rd;
+    pixel_ray(v_near, v_far, v_sphere.xyz, ro, rd);
+    vec3 offset = ro - v_sphere.xyz;
+    float h = v_sphere.w * v_sphere.w - dot(offset, offset);
+    if (h < 0.0)
+        discard;
+    vec3 hit = ro - rd * sqrt(h);
+    gl_FragColor = shade(v_color, (hit - v_sphere.xyz) / v_sphere.w, rd);
+    write_depth(hit);
+}
+"""
+
+# 圆柱: 三角形包住圆柱在过中点、垂直视线的平面上的投影矩形 (面积为矩形的两倍)，
+# 透视下按最靠近视点处放大
+_CYLINDER_VERTEX = _COMMON + """
+uniform float u_radius;
+attribute vec3 a_vertex;
+varying vec4 v_color_a;
+varying vec4 v_color_b;
+varying vec3 v_start;
+varying vec3 v_end;
+varying vec4 v_near;
+varying vec4 v_far;
+
+void main() {
+    vec2 uv_a = atom_uv(a_vertex.x);
+    vec2 uv_b = atom_uv(a_vertex.y);
+    v_start = texture2D(u_positions, uv_a).xyz;
+    v_end = texture2D(u_positions, uv_b).xyz;
+    v_color_a = texture2D(u_colors, uv_a);
+    v_color_b = texture2D(u_colors, uv_b);
+
+    vec3 mid = 0.5 * (v_start + v_end);
+    vec3 axis = v_end - v_start;
+    float half_length = 0.5 * length(axis);
+    vec3 dir;
+    float dist = view_direction(mid, dir);
+    float reach = half_length + u_radius;
+    if (dist >= 0.0 && dist <= reach) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        return;
+    }
+    float scale = dist < 0.0 ? 1.0 : dist / (dist - reach);
+    vec3 across = axis - dir * dot(axis, dir);
+    float across_length = length(across);
+    vec3 u, v;
+    if (across_length < 1e-4 * (half_length + 1e-6)) {
+        orthonormal_basis(dir, u, v);
+    } else {
+        u = across / across_length;
+        v = cross(dir, u);
+    }
+    vec2 corner = a_vertex.z < 0.5 ? vec2(-1.0, -1.0)
+                : (a_vertex.z < 1.5 ? vec2(3.0, -1.0) : vec2(-1.0, 3.0));
+    emit_corner(mid + u * (corner.x * (0.5 * across_length + u_radius) * scale)
+                    + v * (corner.y * u_radius * scale), v_near, v_far);
+}
+"""
+
+# 带端面的圆柱求交 (Quilez)，两半分别取所连原子的颜色
+_CYLINDER_FRAGMENT = _SHADE + """
+uniform float u_radius;
+varying vec4 v_color_a;
+varying vec4 v_color_b;
+varying vec3 v_start;
+varying vec3 v_end;
+varying vec4 v_near;
+varying vec4 v_far;
+
+void main() {
+    vec3 ro, rd;
+    pixel_ray(v_near, v_far, 0.5 * (v_start + v_end), ro, rd);
+    vec3 ba = v_end - v_start;
+    vec3 oc = ro - v_start;
+    float baba = dot(ba, ba);
+    float bard = dot(ba, rd);
+    float baoc = dot(ba, oc);
+    float k2 = baba - bard * bard;
+    float k1 = baba * dot(oc, rd) - baoc * bard;
+    float k0 = baba * dot(oc, oc) - baoc * baoc - u_radius * u_radius * baba;
+    float h = k1 * k1 - k2 * k0;
+    if (h < 0.0 || baba == 0.0)
+        discard;
+    h = sqrt(h);
+    float t = (-k1 - h) / k2;
+    float y = baoc + t * bard;
+    vec3 normal;
+    if (y > 0.0 && y < baba) {
+        normal = (oc + t * rd - ba * y / baba) / u_radius;
+    } else {
+        t = ((y < 0.0 ? 0.0 : baba) - baoc) / bard;
+        if (abs(k1 + k2 * t) >= h)
+            discard;
+        y = y < 0.0 ? 0.0 : baba;
+        normal = ba * sign(y - 0.5 * baba) / sqrt(baba);
+    }
+    vec4 color = y < 0.5 * baba ? v_color_a : v_color_b;
+    vec3 hit = ro + t * rd;
+    gl_FragColor = shade(color, normal, rd);
+    write_depth(hit);
+}
+"""
+
+# 每个球或键的三角形角点编号
+_CORNERS = np.arange(3, dtype=np.float32)
+
+
+def atom_radii(structure: ProteinStructure, representation: str) -> np.ndarray:
+    """
+    按表示方式查表得到原子半径 (Å)，缓存在共享结构上
+
+    参数:
+        structure: 结构
+        representation: REPRESENTATION_SPACEFILL 取范德华半径，其余取缩小的共价半径
+
+    返回:
+        (N,) float32 只读数组
+    """
+    if representation == REPRESENTATION_SPACEFILL:
+        return structure.derived('radii:vdw', lambda: VDW_RADII[structure.element_codes])
+    return structure.derived(
+        'radii:ball', lambda: COVALENT_RADII[structure.element_codes] * BALL_RADIUS_SCALE)
+
+
+def _texture_rows(n_atoms: int) -> int:
+    return max(1, -(-n_atoms // ATOM_TEXTURE_WIDTH))
+
+
+class AtomTextures:
+    def __init__(self, coords: np.ndarray, colors: np.ndarray, radii: np.ndarray):
+        """
+        原子坐标、半径和颜色的GPU纹理，由球和键的冒名顶替体按原子下标读取，
+        各表示方式和各视图共用同一份数据
+
+        参数:
+            coords: (N,3) 原子坐标
+            colors: (N,4) 原子颜色
+            radii: (N,) 原子半径 (Å)
+        """
+        self.n_atoms = len(coords)
+        self.shape = (ATOM_TEXTURE_WIDTH, _texture_rows(self.n_atoms))
+        texture_shape = (self.shape[1], self.shape[0], 4)
+        self.positions = gloo.Texture2D(shape=texture_shape, format='rgba',
+                                        internalformat='rgba32f', interpolation='nearest')
+        self.colors = gloo.Texture2D(shape=texture_shape, format='rgba', interpolation='nearest')
+        self._positions = np.zeros((self.shape[0] * self.shape[1], 4), dtype=np.float32)
+        self._colors = np.zeros((self.shape[0] * self.shape[1], 4), dtype=np.uint8)
+        self._visuals: List[Visual] = []
+        self._positions[:self.n_atoms, 3] = radii
+        self.set_coords(coords)
+        self.set_colors(colors)
+
+    @property
+    def nbytes(self) -> int:
+        """纹理和CPU端副本的字节数"""
+        return (gpu_nbytes(self.positions) + gpu_nbytes(self.colors)
+                + self._positions.nbytes + self._colors.nbytes)
+
+    def add_visual(self, visual: Visual):
+        """登记读取这些纹理的可视化对象，数据变化时通知其重绘"""
+        self._visuals.append(visual)
+
+    def set_coords(self, coords: np.ndarray):
+        """原地更新原子坐标 (轨迹播放)，原子数须不变"""
+        self._positions[:self.n_atoms, :3] = coords
+        self._upload(self.positions, self._positions)
+
+    def set_colors(self, colors: np.ndarray):
+        """原地更新原子颜色 (切换配色方案)"""
+        self._colors[:self.n_atoms] = np.round(np.asarray(colors)[:, :4] * 255)
+        self._upload(self.colors, self._colors)
+
+    def _upload(self, texture: gloo.Texture2D, data: np.ndarray):
+        texture.set_data(data.reshape(self.shape[1], self.shape[0], 4))
+        for visual in self._visuals:
+            visual.update()
+
+
+class _ImpostorVisual(Visual):
+    """球和圆柱冒名顶替体的公共部分: 下标顶点流、每个视图的投影矩阵和低开销绘制开关"""
+
+    def __init__(self, atoms: AtomTextures, vertex_shader: str, fragment_shader: str):
+        self.atoms = atoms
+        self._n_vertices = 0
+        self._vbo = gloo.VertexBuffer()
+        Visual.__init__(self, vcode=vertex_shader, fcode=fragment_shader)
+        self.set_gl_state('translucent', depth_test=True, cull_face=False)
+        self._draw_mode = 'triangles'
+        program = self.shared_program
+        program['u_positions'] = atoms.positions
+        program['u_colors'] = atoms.colors
+        program['u_texture_shape'] = atoms.shape
+        program['u_draft'] = 0.0
+        atoms.add_visual(self)
+
+    def set_draft(self, draft: bool):
+        """低开销绘制: 交互期间只保留漫反射光照"""
+        self.shared_program['u_draft'] = 1.0 if draft else 0.0
+        self.update()
+
+    def _set_items(self, items: np.ndarray):
+        """
+        上传要绘制的球或键: 每项展开为三个顶点，属性为该项的原子下标加角点编号
+
+        参数:
+            items: (K,) 原子下标或 (K,2) 键两端的原子下标
+        """
+        items = np.asarray(items, dtype=np.float32).reshape(len(items), -1)
+        vertices = np.empty((len(items), len(_CORNERS), items.shape[1] + 1), dtype=np.float32)
+        vertices[:, :, :-1] = items[:, None, :]
+        vertices[:, :, -1] = _CORNERS
+        self._n_vertices = vertices.shape[0] * vertices.shape[1]
+        if self._n_vertices:
+            self._vbo.set_data(vertices.reshape(self._n_vertices, -1))
+            self.shared_program['a_vertex'] = self._vbo
+        self.update()
+
+    def _prepare_transforms(self, view):
+        pass
+
+    def _prepare_draw(self, view):
+        if self._n_vertices == 0:
+            return False
+        matrix = clip_matrix(view)
+        view.view_program['u_mvp'] = matrix.astype(np.float32)
+        view.view_program['u_mvp_inv'] = np.linalg.inv(matrix).astype(np.float32)
+
+    def _compute_bounds(self, axis, view):
+        return None
+
+
+class SphereImpostorVisual(_ImpostorVisual):
+    def __init__(self, atoms: AtomTextures, indices: Optional[np.ndarray] = None,
+                 radius_scale: float = 1.0):
+        """
+        光线求交球体: 一次绘制调用画出全部原子
+
+        参数:
+            atoms: 原子纹理 (坐标、半径、颜色)
+            indices: 要绘制的原子下标，None 表示全部原子
+            radius_scale: 半径缩放系数
+        """
+        _ImpostorVisual.__init__(self, atoms, _SPHERE_VERTEX, _SPHERE_FRAGMENT)
+        self.shared_program['u_radius_scale'] = radius_scale
+        self.set_indices(np.arange(atoms.n_atoms) if indices is None else indices)
+
+    def set_indices(self, indices: np.ndarray):
+        """更换要绘制的原子子集"""
+        self._set_items(indices)
+
+
+class CylinderImpostorVisual(_ImpostorVisual):
+    def __init__(self, atoms: AtomTextures, bonds: np.ndarray, radius: float = STICK_RADIUS):
+        """
+        光线求交圆柱 (键): 顶点属性只有两端原子的下标，端点坐标和颜色从原子纹理读取
+
+        参数:
+            atoms: 原子纹理 (坐标、颜色)
+            bonds: (M,2) 键两端的原子下标
+            radius: 圆柱半径 (Å)
+        """
+        _ImpostorVisual.__init__(self, atoms, _CYLINDER_VERTEX, _CYLINDER_FRAGMENT)
+        self.shared_program['u_radius'] = radius
+        self.set_bonds(bonds)
+
+    def set_bonds(self, bonds: np.ndarray):
+        """更换要绘制的键"""
+        self._set_items(np.asarray(bonds).reshape(-1, 2))
@@ -0,0 +1,452 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from element_data import ELEMENT_H, ELEMENT_N, ELEMENT_O, VDW_RADII
+from hierarchy import hierarchy_index
+from protein_structure import ProteinStructure
+from spatial_grid import CellGrid
+
+# 分析类型
+INTERACTION_CONTACTS = 'contacts'
+INTERACTION_INTERFACES = 'interfaces'
+INTERACTION_HBONDS = 'hbonds'
+INTERACTION_SALT_BRIDGES = 'salt_bridges'
+INTERACTION_CLASHES = 'clashes'
+INTERACTION_KINDS = (INTERACTION_CONTACTS, INTERACTION_INTERFACES, INTERACTION_HBONDS,
+                     INTERACTION_SALT_BRIDGES, INTERACTION_CLASHES)
+
+# 残基接触: 两个残基的重原子最短距离不超过该值 (Å)
+CONTACT_CUTOFF = 4.5
+# 链间界面: 不同链的两个残基重原子最短距离不超过该值 (Å)
+INTERFACE_CUTOFF = 5.0
+# 氢键候选: 供体/受体重原子 (N、O) 之间的距离上限 (Å)
+HBOND_CUTOFF = 3.5
+# 盐桥候选: 带正电 (Lys NZ, Arg NE/NH1/NH2) 与带负电 (Asp OD1/OD2, Glu OE1/OE2) 原子的距离上限 (Å)
+SALT_BRIDGE_CUTOFF = 4.0
+# 空间冲突: 范德华半径之和与距离之差 (重叠) 不小于该值 (Å)
+CLASH_OVERLAP = 0.5
+# 可形成氢键的原子对 (N、O 之间) 允许的额外重叠 (Å)，短氢键不计为冲突
+HBOND_OVERLAP_ALLOWANCE = 0.6
+# 邻居搜索半径，也是网格单元边长: 各项分析阈值中的最大值 (冲突只在该范围内查找)
+SEARCH_CUTOFF = max(CONTACT_CUTOFF, INTERFACE_CUTOFF, HBOND_CUTOFF, SALT_BRIDGE_CUTOFF)
+# 全量计算时每块检查的候选原子对数量，增量计算时每块的查询原子数，用于限制峰值内存
+CHUNK_PAIRS = 1 << 18
+QUERY_CHUNK = 1 << 14
+# 增量更新: 受影响的原子超过该比例时改为全量计算；网格中过时的原子超过该比例时按当前坐标重建网格
+INCREMENTAL_MAX_FRACTION = 0.25
+GRID_REBUILD_FRACTION = 0.05
+
+# 叠加显示的颜色
+INTERACTION_COLORS = {
+    INTERACTION_CONTACTS: (0.6, 0.9, 0.6, 0.5),
+    INTERACTION_INTERFACES: (1.0, 0.85, 0.2, 0.8),
+    INTERACTION_HBONDS: (0.3, 0.8, 1.0, 1.0),
+    INTERACTION_SALT_BRIDGES: (1.0, 0.3, 1.0, 1.0),
+    INTERACTION_CLASHES: (1.0, 0.1, 0.1, 1.0),
+}
+
+_WATER_NAMES = (b'HOH', b'WAT', b'DOD')
+_CATION_ATOMS = {b'LYS': (b'NZ',), b'ARG': (b'NE', b'NH1', b'NH2')}
+_ANION_ATOMS = {b'ASP': (b'OD1', b'OD2'), b'GLU': (b'OE1', b'OE2')}
+
+
+class _AtomTable:
+    def __init__(self, structure: ProteinStructure):
+        """参与分析的原子 (非水的重原子) 及其残基、范德华半径、极性和电荷"""
+        index = hierarchy_index(structure)
+        codes = structure.element_codes
+        keep = (codes != ELEMENT_H) & ~np.isin(structure.res_names, _WATER_NAMES)
+        self.atoms = np.flatnonzero(keep)
+        self.residue = index.atom_residue[self.atoms].astype(np.int64)
+        self.n_residues = index.n_residues
+        self.radii = VDW_RADII[codes[self.atoms]]
+        self.polar = np.isin(codes[self.atoms], (ELEMENT_N, ELEMENT_O))
+        self.charge = np.zeros(len(self.atoms), dtype=np.int8)
+        res_names = structure.res_names[self.atoms]
+        atom_names = structure.atom_names[self.atoms]
+        for sign, groups in ((1, _CATION_ATOMS), (-1, _ANION_ATOMS)):
+            for res_name, names in groups.items():
+                self.charge[(res_names == res_name) & np.isin(atom_names, names)] = sign
+
+
+def _atom_table(structure: ProteinStructure) -> _AtomTable:
+    return structure.derived('interaction_atoms', lambda: _AtomTable(structure))
+
+
+def _bonded_residues(structure: ProteinStructure) -> np.ndarray:
+    """
+    共价相连的残基对的键 (lo * R + hi，已排序)，其间的原子对不计冲突和氢键。
+    没有拓扑时退回同一链段中序号相邻的残基
+    """
+    def keys():
+        index = hierarchy_index(structure)
+        n_residues = index.n_residues
+        if structure.has_topology:
+            lo, hi = index.atom_residue[structure.bonds].astype(np.int64).T
+        else:
+            lo = np.flatnonzero(index.residue_chain[:-1] == index.residue_chain[1:]).astype(np.int64)
+            hi = lo + 1
+        first, second = np.minimum(lo, hi), np.maximum(lo, hi)
+        inter = first != second
+        return np.unique(first[inter] * n_residues + second[inter])
+    return structure.derived('interaction_bonded_residues', keys, uses_bonds=True)
+
+
+def _sorted_isin(values: np.ndarray, table: np.ndarray) -> np.ndarray:
+    if len(table) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(table, values), len(table) - 1)
+    return table[pos] == values
+
+
+def _closest_per_key(keys: np.ndarray, atoms: np.ndarray, values: np.ndarray):
+    """每个残基对只保留距离最短的原子对 (距离不超过 SEARCH_CUTOFF，与键合成一个排序键)"""
+    order = np.argsort(keys * 8.0 + values)
+    keys = keys[order]
+    first = order[np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])] if len(keys) else order
+    return atoms[first], values[first]
+
+
+# 分析结果按表存放: 表名 -> (原子对 (n,2) 结构中的原子下标, 每对的数值)
+_TABLES = ('residue', 'clash', 'hbond', 'salt')
+
+
+class Interactions:
+    def __init__(self, structure: ProteinStructure, coords: np.ndarray,
+                 tables: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        """
+        一组坐标下的相互作用分析结果 (只读数组)
+
+        参数:
+            structure: 结构
+            coords: 分析所用的 (N,3) 坐标 (结构自身坐标或轨迹帧)
+            tables: InteractionAnalyzer 维护的结果表
+        """
+        self.structure = structure
+        self.coords = coords
+        index = hierarchy_index(structure)
+        atoms, distances = tables['residue']
+        residues = index.atom_residue[atoms].astype(np.int64)
+        order = np.lexsort((residues[:, 1], residues[:, 0]))
+        # 相距不超过 INTERFACE_CUTOFF 的残基对 (lo < hi)、重原子最短距离及取得最短距离的原子对
+        self.residue_pairs = residues[order]
+        self.residue_distances = distances[order]
+        self.closest_atoms = atoms[order]
+        # 空间冲突的原子对及重叠量
+        self.clashes, self.clash_overlaps = tables['clash']
+        # 氢键候选的 (N/O, N/O) 原子对及距离
+        self.hbonds, self.hbond_distances = tables['hbond']
+        # 盐桥候选的 (正电原子, 负电原子) 及距离
+        self.salt_bridges, self.salt_bridge_distances = tables['salt']
+        self._residue_chain = index.chain_codes[index.residue_chain]
+        self._chain_names = index.chain_id_table
+
+    def contacts(self, cutoff: float = CONTACT_CUTOFF) -> np.ndarray:
+        """
+        残基接触
+
+        参数:
+            cutoff: 重原子最短距离阈值 (Å)，不超过 INTERFACE_CUTOFF
+
+        返回:
+            (C,2) 残基下标对 (lo < hi)
+        """
+        return self.residue_pairs[self.residue_distances <= cutoff]
+
+    def contact_map(self, cutoff: float = CONTACT_CUTOFF) -> np.ndarray:
+        """
+        稠密的残基接触图 (R×R 字节，只适合中小结构；大结构用 contacts 的稀疏对)
+
+        返回:
+            (R,R) bool 对称矩阵
+        """
+        n_residues = len(self.structure.residue_offsets) - 1
+        contact_map = np.zeros((n_residues, n_residues), dtype=bool)
+        pairs = self.contacts(cutoff)
+        contact_map[pairs[:, 0], pairs[:, 1]] = True
+        contact_map[pairs[:, 1], pairs[:, 0]] = True
+        return contact_map
+
+    def _interchain(self, cutoff: float) -> np.ndarray:
+        chains = self._residue_chain[self.residue_pairs]
+        return (chains[:, 0] != chains[:, 1]) & (self.residue_distances <= cutoff)
+
+    def interfaces(self, cutoff: float = INTERFACE_CUTOFF) -> Dict[Tuple[str, str], np.ndarray]:
+        """
+        链间界面: 不同链标识的残基接触按链对分组
+
+        参数:
+            cutoff: 重原子最短距离阈值 (Å)
+
+        返回:
+            字典 {(链A, 链B): (P,2) 残基下标对，第一列属于链A}，链A < 链B
+        """
+        pairs = self.residue_pairs[self._interchain(cutoff)]
+        chains = self._residue_chain[pairs]
+        names = self._chain_names[chains]
+        swap = names[:, 0] > names[:, 1]
+        pairs = np.where(swap[:, None], pairs[:, ::-1], pairs)
+        names = np.where(swap[:, None], names[:, ::-1], names)
+        interfaces = {}
+        for name_a, name_b in sorted(set(map(tuple, names.tolist()))):
+            hit = (names[:, 0] == name_a) & (names[:, 1] == name_b)
+            interfaces[(name_a.decode(), name_b.decode())] = pairs[hit]
+        return interfaces
+
+    def interface_residues(self, cutoff: float = INTERFACE_CUTOFF) -> np.ndarray:
+        """位于任一链间界面上的残基，(R,) bool"""
+        mask = np.zeros(len(self.structure.residue_offsets) - 1, dtype=bool)
+        mask[self.residue_pairs[self._interchain(cutoff)].ravel()] = True
+        return mask
+
+    def atom_pairs(self, kind: str) -> np.ndarray:
+        """
+        一类相互作用在原子层面的连线 (接触和界面取每个残基对的最近原子对)
+
+        参数:
+            kind: 分析类型，见 INTERACTION_KINDS
+
+        返回:
+            (M,2) 原子下标对
+        """
+        if kind == INTERACTION_CONTACTS:
+            return self.closest_atoms[self.residue_distances <= CONTACT_CUTOFF]
+        if kind == INTERACTION_INTERFACES:
+            return self.closest_atoms[self._interchain(INTERFACE_CUTOFF)]
+        if kind == INTERACTION_HBONDS:
+            return self.hbonds
+        if kind == INTERACTION_SALT_BRIDGES:
+            return self.salt_bridges
+        if kind == INTERACTION_CLASHES:
+            return self.clashes
+        raise ValueError(f"unknown interaction kind: {kind!r}")
+
+    def counts(self) -> Dict[str, int]:
+        """各类相互作用的数量 (界面为链间接触的残基对数)"""
+        return {kind: len(self.atom_pairs(kind)) for kind in INTERACTION_KINDS}
+
+
+class InteractionAnalyzer:
+    def __init__(self, structure: ProteinStructure, chunk_pairs: int = CHUNK_PAIRS):
+        """
+        残基接触、空间冲突、氢键/盐桥候选和链间界面的分析器。
+
+        邻居搜索使用按坐标构建、在更新之间保留的单元网格 (结构自身坐标的网格缓存在
+        共享结构上)。全量计算分块枚举原子对，每块立即归约为结果表，峰值内存与块大小
+        而非原子对总数成正比。只有部分坐标改变时，丢弃涉及这些原子所在残基的结果，
+        只对这些残基的原子重新查询邻居；网格中坐标已过时的原子改用小网格按当前坐标配对，
+        过时的原子积累到一定比例才重建网格。
+
+        参数:
+            structure: 结构 (冲突和氢键不计共价相连的残基之间的原子对，需要拓扑)
+            chunk_pairs: 全量计算时每块检查的候选原子对数量
+        """
+        self.structure = structure
+        self.chunk_pairs = chunk_pairs
+        self.coords = structure.coords
+        self._table = _atom_table(structure)
+        self._bonded = _bonded_residues(structure)
+        self._atom_residue = hierarchy_index(structure).atom_residue
+        self._grid: Optional[CellGrid] = None
+        # 网格中坐标已过时 (网格构建后移动过) 的参与分析原子
+        self._stale = np.zeros(len(self._table.atoms), dtype=bool)
+        self._tables: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+        self._result: Optional[Interactions] = None
+
+    def analyze(self) -> Interactions:
+        """当前坐标下的分析结果，首次调用时全量计算"""
+        if self._result is None:
+            self._compute_all()
+        return self._result
+
+    def update(self, coords: np.ndarray, moved: Optional[np.ndarray] = None) -> Interactions:
+        """
+        更新坐标并返回新的分析结果，只重新计算受影响的残基
+
+        参数:
+            coords: (N,3) 新坐标 (如轨迹帧)
+            moved: 坐标改变的原子下标或 (N,) 掩码，None 时与上一组坐标逐原子比较
+
+        返回:
+            分析结果
+        """
+        if coords is self.coords:
+            return self.analyze()
+        coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        if len(coords) != self.structure.n_atoms:
+            raise ValueError(f"coords must have shape ({self.structure.n_atoms}, 3)")
+        if moved is None:
+            changed = np.any(coords != self.coords, axis=1)
+        else:
+            moved = np.asarray(moved)
+            changed = moved if moved.dtype == bool else np.zeros(len(coords), dtype=bool)
+            if moved.dtype != bool:
+                changed[moved] = True
+        self.coords = np.array(coords)
+        changed = changed[self._table.atoms]
+        if self._tables is None:
+            self._compute_all()
+            return self._result
+        if not changed.any():
+            return self._result
+
+        # 受影响的残基的全部原子都要重新查询 (残基对的最短距离可能来自未移动的原子)
+        dirty = np.zeros(self._table.n_residues, dtype=bool)
+        dirty[self._table.residue[changed]] = True
+        query = np.flatnonzero(dirty[self._table.residue])
+        self._stale |= changed
+        if len(query) > INCREMENTAL_MAX_FRACTION * len(self._table.atoms):
+            self._compute_all()
+        else:
+            self._compute_residues(dirty, query)
+        return self._result
+
+    def _compute_all(self):
+        """按当前坐标重建网格并全量计算"""
+        table = self._table
+        if self.coords is self.structure.coords:
+            self._grid = self.structure.derived(
+                'interaction_grid', lambda: CellGrid(self.coords[table.atoms], SEARCH_CUTOFF))
+        else:
+            self._grid = CellGrid(self.coords[table.atoms], SEARCH_CUTOFF)
+        self._stale[:] = False
+        parts = [self._reduce(i, j, dist_sq) for i, j, dist_sq in
+                 self._grid.pairs_within(SEARCH_CUTOFF, chunk_pairs=self.chunk_pairs)]
+        self._tables = self._merge(parts)
+        self._result = Interactions(self.structure, self.coords, self._tables)
+
+    def _compute_residues(self, dirty: np.ndarray, query: np.ndarray):
+        """
+        增量计算: 丢弃涉及 dirty 残基的结果，只为这些残基的原子 (query) 重新配对
+
+        参数:
+            dirty: (R,) 坐标改变的残基
+            query: 这些残基中参与分析的原子 (在原子表中的下标)
+        """
+        table = self._table
+        coords = self.coords[table.atoms]
+        if self._stale.sum() > GRID_REBUILD_FRACTION * len(table.atoms):
+            self._grid = CellGrid(coords, SEARCH_CUTOFF)
+            self._stale[:] = False
+
+        in_query = np.zeros(len(table.atoms), dtype=bool)
+        in_query[query] = True
+        # 网格里查到的原子只有既不在查询中 (避免重复) 也未过时 (网格坐标仍有效) 的才可用
+        skip = in_query | self._stale
+        parts = []
+        for start in range(0, len(query), QUERY_CHUNK):
+            chunk = query[start:start + QUERY_CHUNK]
+            q, found, dist_sq = self._grid.query_radius(coords[chunk], SEARCH_CUTOFF)
+            keep = ~skip[found]
+            parts.append(self._reduce(chunk[q[keep]], found[keep], dist_sq[keep]))
+        # 查询原子之间及其与过时原子之间的原子对按当前坐标另建小网格枚举
+        local = np.flatnonzero(skip)
+        grid = CellGrid(coords[local], SEARCH_CUTOFF)
+        for i, j, dist_sq in grid.pairs_within(SEARCH_CUTOFF, chunk_pairs=self.chunk_pairs):
+            i, j = local[i], local[j]
+            keep = in_query[i] | in_query[j]
+            parts.append(self._reduce(i[keep], j[keep], dist_sq[keep]))
+
+        # 保留的结果不涉及 dirty 残基，与新结果没有重复的残基对，只需归约新结果
+        new = self._merge(parts)
+        for name, (atoms, values) in self._tables.items():
+            residues = self._atom_residue[atoms]
+            keep = ~(dirty[residues[:, 0]] | dirty[residues[:, 1]])
+            new[name] = (np.concatenate([atoms[keep], new[name][0]]),
+                         np.concatenate([values[keep], new[name][1]]))
+        self._tables = new
+        self._result = Interactions(self.structure, self.coords, self._tables)
+
+    def _reduce(self, i: np.ndarray, j: np.ndarray, dist_sq: np.ndarray
+                ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        把一块原子对 (原子表中的下标) 归约为结果表
+
+        返回:
+            表名 -> (原子对 (n,2) 结构中的原子下标, 数值)
+        """
+        table = self._table
+        ri, rj = table.residue[i], table.residue[j]
+        keep = ri != rj
+        i, j, ri, rj = i[keep], j[keep], ri[keep], rj[keep]
+        distances = np.sqrt(dist_sq[keep]).astype(np.float32)
+        # 按残基下标排列原子对 (残基小的在前)
+        swap = ri > rj
+        i, j = np.where(swap, j, i), np.where(swap, i, j)
+        keys = np.minimum(ri, rj) * table.n_residues + np.maximum(ri, rj)
+        bonded = _sorted_isin(keys, self._bonded)
+        atoms = np.stack([table.atoms[i], table.atoms[j]], axis=1)
+
+        tables = {'residue': _closest_per_key(keys, atoms, distances)}
+        polar = table.polar[i] & table.polar[j]
+        overlaps = table.radii[i] + table.radii[j] - distances
+        clash = ~bonded & (overlaps >= CLASH_OVERLAP + np.where(polar, HBOND_OVERLAP_ALLOWANCE, 0))
+        tables['clash'] = (atoms[clash], overlaps[clash])
+        hbond = ~bonded & polar & (distances <= HBOND_CUTOFF)
+        tables['hbond'] = (atoms[hbond], distances[hbond])
+        charges = table.charge[i] * table.charge[j]
+        salt = (charges < 0) & (distances <= SALT_BRIDGE_CUTOFF)
+        cation_first = table.charge[i][salt] > 0
+        tables['salt'] = (np.where(cation_first[:, None], atoms[salt], atoms[salt][:, ::-1]),
+                          distances[salt])
+        return tables
+
+    def _merge(self, parts: List[Dict[str, Tuple[np.ndarray, np.ndarray]]]
+               ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """合并各块的结果表，同一残基对出现在多个块中时保留最短距离"""
+        merged = {}
+        for name in _TABLES:
+            atoms = [part[name][0] for part in parts]
+            values = [part[name][1] for part in parts]
+            atoms = np.concatenate(atoms) if atoms else np.empty((0, 2), dtype=np.int64)
+            values = np.concatenate(values) if values else np.empty(0, dtype=np.float32)
+            if name == 'residue':
+                residues = self._atom_residue[atoms].astype(np.int64)
+                keys = residues.min(axis=1) * self._table.n_residues + residues.max(axis=1)
+                atoms, values = _closest_per_key(keys, atoms, values)
+            merged[name] = (atoms.reshape(-1, 2), values)
+        return merged
+
+
+def analyze_interactions(structure: ProteinStructure,
+                         coords: Optional[np.ndarray] = None) -> Interactions:
+    """
+    一次性分析一组坐标 (默认结构自身坐标，结果缓存在共享结构上)；
+    轨迹等连续更新用 InteractionAnalyzer
+
+    参数:
+        structure: 结构
+        coords: (N,3) 坐标，None 为结构自身坐标
+
+    返回:
+        分析结果
+    """
+    if coords is None:
+        return structure.derived(
+            'interactions', lambda: InteractionAnalyzer(structure).analyze(), uses_bonds=True)
+    analyzer = InteractionAnalyzer(structure)
+    return analyzer.update(coords)
+
+
+def overlay_segments(result: Interactions, kinds: Sequence[str],
+                     shown: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    叠加显示用的连线: 各类相互作用的原子对及其颜色
+
+    参数:
+        result: 分析结果
+        kinds: 要显示的分析类型
+        shown: (N,) 显示的原子掩码，两端都显示的连线才保留；None 表示全部
+
+    返回:
+        tuple: (原子对 (M,2), 颜色 (M,4) float32)
+    """
+    pairs, colors = [], []
+    for kind in kinds:
+        atoms = result.atom_pairs(kind)
+        if shown is not None:
+            atoms = atoms[shown[atoms[:, 0]] & shown[atoms[:, 1]]]
+        pairs.append(atoms)
+        colors.append(np.tile(np.asarray(INTERACTION_COLORS[kind], dtype=np.float32), (len(atoms), 1)))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64), np.empty((0, 4), dtype=np.float32)
+    return np.concatenate(pairs), np.concatenate(colors)
@@ -0,0 +1,82 @@
+import threading
+from PyQt6.QtCore import QObject, QThread, Qt, pyqtSignal
+from protein_draw import LoadCancelled, ProteinDataLoader
+from trajectory import Trajectory
+
+
+class StructureLoadWorker(QObject):
+    """在后台线程中解析结构并计算拓扑，通过Qt信号把结果交回GUI线程"""
+
+    progress = pyqtSignal(int, str)       # 百分比, 阶段名称
+    atoms_ready = pyqtSignal(object)      # 仅含原子的ProteinStructure
+    finished = pyqtSignal(object)         # 含拓扑的完整ProteinStructure
+    trajectory_ready = pyqtSignal(object) # 多模型文件的Trajectory (在finished之后发出)
+    failed = pyqtSignal(str)              # 错误信息
+    done = pyqtSignal()                   # 无论成功、失败或取消都会发出
+
+    def __init__(self, pdb_file: str):
+        super().__init__()
+        self.pdb_file = pdb_file
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """请求取消，加载会在下一个检查点停止"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def _report(self, percent: int, stage: str):
+        if self._cancel_event.is_set():
+            raise LoadCancelled()
+        self.progress.emit(percent, stage)
+
+    def _emit_atoms(self, structure):
+        if self._cancel_event.is_set():
+            raise LoadCancelled()
+        self.atoms_ready.emit(structure)
+
+    def run(self):
+        """线程入口"""
+        try:
+            structure = ProteinDataLoader(self.pdb_file).load_structure(
+                progress=self._report, on_atoms=self._emit_atoms)
+            if self._cancel_event.is_set():
+                return
+            if structure is None:
+                self.failed.emit(f"无法解析 {self.pdb_file}")
+            else:
+                self.finished.emit(structure)
+                # 建立模型偏移索引，只有多于一帧时才通知
+                try:
+                    trajectory = Trajectory(structure, self.pdb_file)
+                except OSError:
+                    trajectory = None
+                if trajectory is not None and trajectory.n_frames > 1 and not self._cancel_event.is_set():
+                    self.trajectory_ready.emit(trajectory)
+        except LoadCancelled:
+            pass
+        finally:
+            self.done.emit()
+
+
+def create_load_thread(pdb_file: str, parent: QObject = None):
+    """
+    创建后台加载线程 (尚未启动)
+
+    参数:
+        pdb_file: 结构文件路径
+        parent: 线程的父对象
+
+    返回:
+        tuple: (worker, thread)，调用方连接好信号后再调用 thread.start()，
+               并在线程结束前保持worker的引用
+    """
+    thread = QThread(parent)
+    worker = StructureLoadWorker(pdb_file)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    # quit()是线程安全的，直接连接可避免GUI线程在wait()中等待时死锁
+    worker.done.connect(thread.quit, Qt.ConnectionType.DirectConnection)
+    return worker, thread
@@ -0,0 +1,469 @@
+import numpy as np
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+from vispy import scene, visuals
+from protein_structure import ProteinStructure
+from shared_visuals import SegmentsVisual, SharedVisual
+from styling import recolor_markers
+
+# 原子数不少于该值时启用细节层次 (LOD)，小结构始终绘制全部原子
+LOD_MIN_ATOMS = 200_000
+# 每个空间分块的平均原子数，分块数上限为 MAX_CHUNKS_PER_AXIS**3
+CHUNK_ATOMS = 16_384
+MAX_CHUNKS_PER_AXIS = 8
+# 可见原子数不超过该预算时绘制全部原子
+ATOM_BUDGET = 100_000
+# 每埃对应的屏幕像素数阈值: 高于 ATOM_ 绘制原子，高于 BEAD_ 绘制残基珠子，否则绘制主链
+ATOM_PIXELS_PER_ANGSTROM = 3.0
+BEAD_PIXELS_PER_ANGSTROM = 0.8
+
+LEVEL_TRACE = 'trace'
+LEVEL_BEADS = 'beads'
+LEVEL_ATOMS = 'atoms'
+
+# 主链代表原子及相邻代表原子的最大间距 (Å)，超过视为链断裂
+_TRACE_ATOMS = ((b'CA', 4.2), (b'P', 7.5))
+_WATER_NAMES = (b'HOH', b'WAT', b'DOD')
+
+
+def residue_representatives(structure: ProteinStructure) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每个残基的主链代表原子 (氨基酸取CA，核苷酸取P) 以及主链相邻代表原子的连线
+
+    返回:
+        tuple: (代表原子下标 (K,), 连线 (L,2) 为代表原子数组内的下标)
+    """
+    residue_offsets, chain_offsets = structure.residue_offsets, structure.chain_offsets
+    n_residues = len(residue_offsets) - 1
+    residue = np.repeat(np.arange(n_residues), np.diff(residue_offsets))
+    segment = np.repeat(np.arange(len(chain_offsets) - 1), np.diff(chain_offsets))
+
+    rep = np.full(n_residues, -1, dtype=np.int64)
+    max_gap = np.zeros(n_residues, dtype=np.float32)
+    for name, gap in reversed(_TRACE_ATOMS):
+        idx = np.flatnonzero(structure.atom_names == name)[::-1]
+        rep[residue[idx]] = idx
+        max_gap[residue[idx]] = gap
+    has_rep = np.flatnonzero(rep >= 0)
+    atoms = rep[has_rep]
+
+    # 同一链段内相邻、距离不超过阈值的代表原子相连
+    diff = structure.coords[atoms[1:]] - structure.coords[atoms[:-1]]
+    dist = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    link = ((segment[has_rep[1:]] == segment[has_rep[:-1]])
+            & (has_rep[1:] - has_rep[:-1] == 1)
+            & (dist <= max_gap[has_rep[:-1]]))
+    first = np.flatnonzero(link)
+    return atoms, np.stack([first, first + 1], axis=1).astype(np.uint32)
+
+
+def residue_beads(structure: ProteinStructure, coords: Optional[np.ndarray] = None
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每个非水残基一个珠子，位于残基原子的质心
+
+    返回:
+        tuple: (残基编号 (K,), 珠子坐标 (K,3))
+    """
+    coords = structure.coords if coords is None else coords
+    residue_offsets = structure.residue_offsets
+    starts = residue_offsets[:-1]
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3), dtype=np.float32)
+    counts = np.diff(residue_offsets)
+    centroids = np.add.reduceat(coords.astype(np.float64), starts, axis=0) / counts[:, None]
+    keep = np.flatnonzero(~np.isin(structure.res_names[starts], _WATER_NAMES))
+    return keep, centroids[keep].astype(np.float32)
+
+
+def spatial_chunks(coords: np.ndarray, target_atoms: int = CHUNK_ATOMS
+                   ) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    把原子按规则网格划分为空间分块，用于视锥剔除
+
+    返回:
+        tuple: (每个分块的原子下标列表, (C,2,3) 各分块的包围盒 [最小角, 最大角])
+    """
+    n_atoms = len(coords)
+    per_axis = int(np.clip(np.ceil((n_atoms / target_atoms) ** (1 / 3)), 1, MAX_CHUNKS_PER_AXIS))
+    lo = coords.min(axis=0)
+    span = np.maximum(coords.max(axis=0) - lo, 1e-3)
+    cell = np.minimum(((coords - lo) / span * per_axis).astype(np.int64), per_axis - 1)
+    keys = (cell[:, 0] * per_axis + cell[:, 1]) * per_axis + cell[:, 2]
+
+    order = np.argsort(keys, kind='stable')
+    _, starts = np.unique(keys[order], return_index=True)
+    chunks = np.split(order, starts[1:])
+    boxes = np.array([[coords[c].min(axis=0), coords[c].max(axis=0)] for c in chunks],
+                     dtype=np.float32)
+    return chunks, boxes
+
+
+def chunk_bonds(chunks: List[np.ndarray], bonds: np.ndarray, n_atoms: int) -> List[np.ndarray]:
+    """按第一个原子所在分块分配键连"""
+    owner = np.empty(n_atoms, dtype=np.int64)
+    for index, atoms in enumerate(chunks):
+        owner[atoms] = index
+    if len(bonds) == 0:
+        return [bonds[:0] for _ in chunks]
+    bond_owner = owner[bonds[:, 0]]
+    order = np.argsort(bond_owner, kind='stable')
+    bounds = np.searchsorted(bond_owner[order], np.arange(len(chunks) + 1))
+    return [bonds[order[bounds[c]:bounds[c + 1]]] for c in range(len(chunks))]
+
+
+def project_boxes(transform, boxes: np.ndarray, viewport: Tuple[float, float],
+                  instances: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将包围盒投影到视图像素坐标，判断是否与视口相交
+
+    参数:
+        transform: 场景 -> 视图像素 的变换 (view.scene.transform)
+        boxes: (C,2,3) 包围盒
+        viewport: 视图宽高 (像素)
+        instances: (K,4,4) 实例变换矩阵 (列向量约定)，给出时按每个实例分别投影
+
+    返回:
+        tuple: (C,) 是否可见, (C,) 包围盒投影的屏幕尺寸 (像素)；给出实例时均为 (K,C)
+    """
+    corners = np.stack(np.meshgrid([0, 1], [0, 1], [0, 1], indexing='ij'), axis=-1).reshape(8, 3)
+    points = np.where(corners[None, :, :] == 0, boxes[:, None, 0, :], boxes[:, None, 1, :])
+    if instances is not None:
+        points = (np.einsum('kij,cpj->kcpi', instances[:, :3, :3], points)
+                  + instances[:, None, None, :3, 3])
+    mapped = transform.map(points.reshape(-1, 3).astype(np.float32)).reshape(points.shape[:-1] + (4,))
+    w = mapped[..., 3]
+    in_front = w > 1e-6
+    behind = ~np.all(in_front, axis=-1)
+    xy = mapped[..., :2] / np.where(in_front, w, 1.0)[..., None]
+    lo, hi = xy.min(axis=-2), xy.max(axis=-2)
+    inside = np.all((hi >= 0) & (lo <= np.asarray(viewport, dtype=np.float64)), axis=-1)
+    # 部分角点位于相机后方时无法可靠投影，保守地视为可见且足够近；完全在后方的剔除
+    extent = np.where(behind, np.inf, np.max(hi - lo, axis=-1))
+    return (inside | behind) & np.any(in_front, axis=-1), extent
+
+
+def choose_level(pixels_per_angstrom: float, visible_atoms: int) -> str:
+    """根据屏幕上每埃的像素数和可见原子数选择细节层次"""
+    if visible_atoms <= ATOM_BUDGET or pixels_per_angstrom >= ATOM_PIXELS_PER_ANGSTROM:
+        return LEVEL_ATOMS
+    if pixels_per_angstrom >= BEAD_PIXELS_PER_ANGSTROM:
+        return LEVEL_BEADS
+    return LEVEL_TRACE
+
+
+class LODRenderer:
+    def __init__(self, views: Sequence[scene.ViewBox], structure: ProteinStructure,
+                 colors: np.ndarray, sizes: np.ndarray,
+                 atom_mask: Optional[np.ndarray] = None,
+                 instances: Optional[np.ndarray] = None,
+                 parents: Optional[Sequence[scene.Node]] = None,
+                 shown: Optional[Sequence[bool]] = None,
+                 bond_color: Optional[Tuple[float, float, float, float]] = (0.7, 0.7, 0.7, 1)):
+        """
+        大结构的细节层次渲染: 远处绘制主链/残基珠子，靠近时按空间分块绘制全部原子，
+        视野外的分块被剔除；每个视图根据自身相机独立选择，各层次的顶点缓冲在视图间共用
+
+        实例化绘制组装体时分块按每个拷贝分别剔除，视野外的整个拷贝不绘制。
+
+        参数:
+            views: 同一画布上的ViewBox
+            structure: 要显示的结构 (可以尚无拓扑)
+            colors: (N,4) 原子颜色
+            sizes: (N,) 原子尺寸
+            atom_mask: (N,) bool 显示的原子 (隐藏选择)，None 表示全部显示
+            instances: (K,4,4) 组装体拷贝的变换矩阵，None 表示只绘制一份
+            parents: 每个视图中可视化对象的父节点，None 直接挂在各视图的场景下
+            shown: 每个视图是否显示本结构 (父节点未挂在视图中时不参与绘制)，None 表示全部显示
+            bond_color: 分块键连的统一颜色 (按元素配色)，None 时每个端点取所连原子的颜色
+        """
+        self.views = list(views)
+        self.parents = [view.scene for view in self.views] if parents is None else list(parents)
+        self.instances = instances
+        self.structure = structure
+        self.colors = colors
+        self.sizes = sizes
+        self.bond_color = bond_color
+        self.coords = structure.coords
+
+        # 派生数据挂在共享结构上，只计算一次
+        self.chunks, self.boxes = structure.derived(
+            'lod_chunks', lambda: spatial_chunks(structure.coords))
+        self.rep_atoms, self.rep_links = structure.derived(
+            'lod_trace', lambda: residue_representatives(structure))
+        self.bead_residues, _ = structure.derived('lod_beads', lambda: residue_beads(structure))
+        self._chunk_bonds = None
+        # 部分原子被隐藏时，分块、主链连线和珠子只保留显示的部分 (分块包围盒不变)
+        self.atom_mask = atom_mask
+        self._bead_keep = slice(None)
+        if atom_mask is not None:
+            self.chunks = [chunk[atom_mask[chunk]] for chunk in self.chunks]
+            links = self.rep_links
+            self.rep_links = links[atom_mask[self.rep_atoms[links[:, 0]]]
+                                   & atom_mask[self.rep_atoms[links[:, 1]]]]
+            if structure.n_atoms:
+                shown = np.logical_or.reduceat(atom_mask, structure.residue_offsets[:-1])
+                self._bead_keep = shown[self.bead_residues]
+                self.bead_residues = self.bead_residues[self._bead_keep]
+
+        self._chunk_sizes = np.array([len(chunk) for chunk in self.chunks], dtype=np.int64)
+
+        self.trace_visual = None
+        self.beads_visual = None
+        self.atom_visuals: Dict[int, SharedVisual] = {}
+        self.bond_visuals: Dict[int, SharedVisual] = {}
+        # 每个视图当前的层次、每个拷贝的可见分块及是否参与绘制
+        n_copies = 1 if instances is None else len(instances)
+        self.levels: List[Optional[str]] = [None] * len(self.views)
+        self.visible = [np.zeros((n_copies, len(self.chunks)), dtype=bool) for _ in self.views]
+        self.active = [bool(view.visible) and (shown is None or shown[index])
+                       for index, view in enumerate(self.views)]
+        # 交互期间原子使用低开销绘制、隐藏分块键连
+        self.interactive = False
+
+        # 相机在组装完整变换后才调用 ViewBox.update，此时再按新变换选择层次
+        # (变换链的 changed 事件在组装中途就会发出，读到的是过时的投影)
+        self._callbacks = [partial(self._on_view_update, index)
+                           for index in range(len(self.views))]
+        for view, callback in zip(self.views, self._callbacks):
+            view.events.update.connect(callback)
+        self.update()
+
+    def set_structure(self, structure: ProteinStructure):
+        """拓扑计算完成后切换到含键连的结构 (原子坐标与分块不变)"""
+        self.structure = structure
+        self._chunk_bonds = None
+        for visual in self.bond_visuals.values():
+            visual.detach()
+        self.bond_visuals = {}
+        self.update(force=True)
+
+    def set_frame(self, coords: np.ndarray):
+        """原地更新已创建可视化对象的坐标 (分块划分沿用第0帧)"""
+        self.coords = coords
+        for index, visual in self.atom_visuals.items():
+            atoms = self.chunks[index]
+            visual.visual.set_data(pos=coords[atoms], size=self.sizes[atoms],
+                                   face_color=self.colors[atoms],
+                                   edge_color=(0, 0, 0, 0.5), edge_width=0.3)
+        for index, visual in self.bond_visuals.items():
+            visual.visual.set_data(pos=coords[self._bonds_of(index)].reshape(-1, 3))
+        if self.trace_visual is not None:
+            self.trace_visual.visual.set_data(pos=coords[self.rep_atoms])
+        if self.beads_visual is not None:
+            self.beads_visual.visual.set_data(pos=self._bead_positions(), size=10,
+                                              face_color=self.colors[self._bead_atoms()],
+                                              edge_width=0)
+
+    def set_colors(self, colors: np.ndarray,
+                   bond_color: Optional[Tuple[float, float, float, float]] = None):
+        """
+        原地更新已创建可视化对象的颜色 (切换配色方案)
+
+        参数:
+            colors: (N,4) 原子颜色
+            bond_color: 分块键连的统一颜色，None 时每个端点取所连原子的颜色
+        """
+        self.colors = colors
+        self.bond_color = bond_color
+        for index, visual in self.atom_visuals.items():
+            recolor_markers(visual.visual, colors[self.chunks[index]])
+        for index, visual in self.bond_visuals.items():
+            visual.visual.set_data(color=self._bond_segment_colors(self._bonds_of(index)))
+        if self.trace_visual is not None:
+            self.trace_visual.visual.set_data(color=colors[self.rep_atoms])
+        if self.beads_visual is not None:
+            recolor_markers(self.beads_visual.visual, colors[self._bead_atoms()])
+
+    def set_interactive(self, interactive: bool):
+        """
+        切换交互画质: 交互期间超出预算的原子层次降为残基珠子，原子关闭抗锯齿和
+        球面着色、隐藏分块键连；已创建和之后创建的分块都按当前状态绘制
+        """
+        self.interactive = interactive
+        for visual in list(self.atom_visuals.values()) + [self.beads_visual]:
+            if visual is not None:
+                visual.set_draft(interactive)
+        for visual in self.bond_visuals.values():
+            visual.set_enabled(not interactive)
+        self.update(force=True)
+
+    def set_view_active(self, index: int, active: bool):
+        """
+        暂停或恢复一个视图: 暂停的视图不再随相机创建分块，恢复时按当前相机重新选择
+
+        参数:
+            index: 视图序号
+            active: 是否参与绘制
+        """
+        self.active[index] = active
+        if active:
+            self._update_view(index, force=True)
+
+    @property
+    def nbytes(self) -> int:
+        """已创建的各层次 (主链、珠子、分块原子和键连) 的GPU缓冲字节数"""
+        visuals = [self.trace_visual, self.beads_visual]
+        visuals += list(self.atom_visuals.values()) + list(self.bond_visuals.values())
+        return sum(visual.nbytes for visual in visuals if visual is not None)
+
+    def clear(self):
+        """移除全部可视化对象并断开相机事件"""
+        for view, callback in zip(self.views, self._callbacks):
+            view.events.update.disconnect(callback)
+        visuals = [self.trace_visual, self.beads_visual]
+        visuals += list(self.atom_visuals.values()) + list(self.bond_visuals.values())
+        for visual in visuals:
+            if visual is not None:
+                visual.detach()
+        self.trace_visual = self.beads_visual = None
+        self.atom_visuals, self.bond_visuals = {}, {}
+
+    def _on_view_update(self, index: int, event=None):
+        self._update_view(index)
+
+    def update(self, force: bool = False):
+        """根据各视图当前相机重新选择细节层次和可见分块"""
+        for index in range(len(self.views)):
+            self._update_view(index, force)
+
+    def _update_view(self, index: int, force: bool = False):
+        """为一个视图选择细节层次和可见分块，只在结果变化时修改该视图的节点可见性"""
+        if not self.active[index]:
+            return
+        view = self.views[index]
+        viewport = tuple(view.size)
+        transform = view.scene.transform
+        if self.parents[index] is not view.scene:
+            # 父节点 (如叠合显示的图层) 自身的变换先作用
+            transform = transform * self.parents[index].transform
+        visible, extent = project_boxes(transform, self.boxes, viewport, self.instances)
+        # 未实例化时视为只有一个拷贝: (拷贝数, 分块数)
+        visible, extent = np.atleast_2d(visible), np.atleast_2d(extent)
+        spans = np.broadcast_to(np.max(self.boxes[:, 1] - self.boxes[:, 0], axis=1), visible.shape)
+        shown = visible & (spans > 0)
+        pixels_per_angstrom = float(np.max(extent[shown] / spans[shown])) if np.any(shown) else 0.0
+        visible_atoms = int(np.sum(visible * self._chunk_sizes))
+        level = choose_level(pixels_per_angstrom, visible_atoms)
+        if self.interactive and level == LEVEL_ATOMS and visible_atoms > ATOM_BUDGET:
+            level = LEVEL_BEADS  # 交互期间不绘制超出预算的原子
+        if level == LEVEL_TRACE and len(self.rep_links) == 0:
+            level = LEVEL_BEADS  # 没有可连接的主链 (如纯配体/溶剂)
+
+        if not force and level == self.levels[index] and (
+                level != LEVEL_ATOMS or np.array_equal(visible, self.visible[index])):
+            return
+        self.levels[index], self.visible[index] = level, visible
+
+        # 主链和珠子按拷贝整体显示，没有任何可见分块的拷贝不绘制
+        copies = visible.any(axis=1)
+        if level == LEVEL_TRACE:
+            self._ensure_trace().set_visible(copies, index)
+        elif self.trace_visual is not None:
+            self.trace_visual.set_visible(False, index)
+        if level == LEVEL_BEADS:
+            self._ensure_beads().set_visible(copies, index)
+        elif self.beads_visual is not None:
+            self.beads_visual.set_visible(False, index)
+
+        show_atoms = visible if level == LEVEL_ATOMS else np.zeros_like(visible)
+        for chunk in np.flatnonzero(show_atoms.any(axis=0)):
+            self._ensure_chunk(chunk)
+        for chunk, visual in self.atom_visuals.items():
+            visual.set_visible(show_atoms[:, chunk], index)
+        for chunk, visual in self.bond_visuals.items():
+            visual.set_visible(show_atoms[:, chunk], index)
+
+    def _shared(self, visual, hide_while_interactive: bool = False) -> SharedVisual:
+        """
+        新建的共享可视化对象先在所有视图中隐藏，由各视图的选择结果决定是否显示
+
+        参数:
+            visual: 源可视化对象
+            hide_while_interactive: 交互期间是否停用 (分块键连)，否则使用低开销绘制
+        """
+        shared = SharedVisual(visual, self.parents, self.instances)
+        shared.set_visible(False)
+        if self.interactive:
+            if hide_while_interactive:
+                shared.set_enabled(False)
+            else:
+                shared.set_draft(True)
+        return shared
+
+    def _bead_atoms(self) -> np.ndarray:
+        """用于珠子配色的原子: 残基的第一个原子"""
+        return self.structure.residue_offsets[:-1][self.bead_residues]
+
+    def _bead_positions(self) -> np.ndarray:
+        if self.coords is self.structure.coords:
+            positions = self.structure.derived('lod_beads', lambda: residue_beads(self.structure))[1]
+        else:
+            positions = residue_beads(self.structure, self.coords)[1]
+        return positions[self._bead_keep]
+
+    def _ensure_trace(self) -> SharedVisual:
+        if self.trace_visual is None:
+            self.trace_visual = self._shared(SegmentsVisual(
+                pos=self.coords[self.rep_atoms],
+                connect=self.rep_links,
+                color=self.colors[self.rep_atoms],
+                width=2.0
+            ))
+        return self.trace_visual
+
+    def _ensure_beads(self) -> SharedVisual:
+        if self.beads_visual is None:
+            self.beads_visual = self._shared(visuals.MarkersVisual(
+                pos=self._bead_positions(),
+                size=10,
+                face_color=self.colors[self._bead_atoms()],
+                edge_width=0,
+                spherical=True
+            ))
+        return self.beads_visual
+
+    def _bonds_of(self, index: int) -> np.ndarray:
+        if self._chunk_bonds is None:
+            structure = self.structure
+            if self.atom_mask is None:
+                self._chunk_bonds = structure.derived(
+                    'lod_chunk_bonds',
+                    lambda: chunk_bonds(self.chunks, structure.bonds, structure.n_atoms),
+                    uses_bonds=True)
+            else:
+                bonds = structure.bonds
+                bonds = bonds[self.atom_mask[bonds[:, 0]] & self.atom_mask[bonds[:, 1]]]
+                self._chunk_bonds = chunk_bonds(self.chunks, bonds, structure.n_atoms)
+        return self._chunk_bonds[index]
+
+    def _bond_segment_colors(self, bonds: np.ndarray):
+        """键线段颜色: 统一颜色，或 (2M,4) 两端原子的颜色"""
+        if self.bond_color is not None:
+            return self.bond_color
+        return self.colors[bonds].reshape(-1, 4)
+
+    def _ensure_chunk(self, index: int):
+        """分块首次在任一视图中可见时才创建其可视化对象"""
+        if len(self.chunks[index]) == 0:
+            return
+        if index not in self.atom_visuals:
+            atoms = self.chunks[index]
+            self.atom_visuals[index] = self._shared(visuals.MarkersVisual(
+                pos=self.coords[atoms],
+                size=self.sizes[atoms],
+                face_color=self.colors[atoms],
+                edge_color=(0, 0, 0, 0.5),
+                edge_width=0.3,
+                spherical=True,
+                antialias=1
+            ))
+        if index not in self.bond_visuals and self.structure.has_topology:
+            bonds = self._bonds_of(index)
+            if len(bonds):
+                self.bond_visuals[index] = self._shared(SegmentsVisual(
+                    pos=self.coords[bonds].reshape(-1, 3),
+                    color=self._bond_segment_colors(bonds),
+                    width=2.5,
+                    antialias=True
+                ), hide_while_interactive=True)
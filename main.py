@@ -1,27 +1,122 @@
 import sys
-from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
-from multi_view_window import MultiViewWindow
+import time
+
+# 启动计时的起点，早于任何重量级导入
+_START = time.perf_counter()
+
+import argparse
+import json
+from typing import Optional, Sequence
+from PyQt6.QtCore import QEvent, Qt, QTimer
+from PyQt6.QtWidgets import QApplication, QLabel, QMainWindow
+
+# 写启动计时报告时，结构迟迟没有画出的最长等待 (秒)
+STARTUP_REPORT_TIMEOUT = 30.0
+# 占位画面一直没有绘制 (如窗口被遮挡) 时，显示窗口后最迟多久创建视图 (毫秒)
+CREATE_VIEWS_FALLBACK_MS = 250
 
-# 在主程序中使用
-from PyQt6.QtWidgets import QApplication, QMainWindow
-import sys
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, structure_paths: Optional[Sequence[str]] = None,
+                 startup_report: Optional[str] = None,
+                 report_timeout: float = STARTUP_REPORT_TIMEOUT):
+        """
+        主窗口: 先显示窗口，占位画面画出后再导入 vispy 和 NumPy 并创建空视图，
+        结构在后台线程中解析后分阶段显示
+
+        参数:
+            structure_paths: 启动时打开的结构文件 (PDB、mmCIF、BinaryCIF)，一个文件显示在所有视图中，
+                             多个文件依次分配给各视图；None 只显示空视图
+            startup_report: 启动计时 (JSON) 的输出路径，写出后退出程序；None 不写
+            report_timeout: 写报告前等待结构画出的最长时间 (秒)
+        """
         super().__init__()
         self.setWindowTitle("proteincode.tech")
-        
-        # 创建多视图窗口
+        self.resize(1000, 800)
+        self.structure_paths = list(structure_paths or [])
+        self.startup_report = startup_report
+        self.report_timeout = report_timeout
+        # 启动各里程碑距进程内计时起点的秒数
+        self.startup_times = {}
+        self.multi_view = None
+
+        # 视图创建前的占位，画出后再导入绘图模块，窗口不会在导入期间空白
+        self.placeholder = QLabel("正在初始化视图…")
+        self.placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.placeholder.installEventFilter(self)
+        self.setCentralWidget(self.placeholder)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if 'window_shown' not in self.startup_times:
+            self._mark('window_shown')
+            QTimer.singleShot(CREATE_VIEWS_FALLBACK_MS, self._create_views)
+
+    def eventFilter(self, obj, event) -> bool:
+        if obj is self.placeholder and event.type() == QEvent.Type.Paint:
+            QTimer.singleShot(0, self._create_views)
+        return False
+
+    def _create_views(self):
+        """导入绘图模块并创建多视图窗口，随后在后台加载结构"""
+        if self.multi_view is not None:
+            return
+        from multi_view_window import MultiViewWindow
+
         self.multi_view = MultiViewWindow()
+        self.placeholder.removeEventFilter(self)
         self.setCentralWidget(self.multi_view)
-        
-        # 加载PDB文件
-        self.multi_view.load_protein("1ake.pdb")  # 替换为您的PDB文件
+        self._mark('views_created')
+        self.multi_view.canvas.events.draw.connect(self._on_draw, position='last')
+        if self.structure_paths:
+            self.multi_view.open_files(self.structure_paths)
+        if self.startup_report:
+            QTimer.singleShot(int(self.report_timeout * 1000), self._write_startup_report)
+
+    def _on_draw(self, event=None):
+        """记录第一帧 (空视图) 和第一帧含结构的画面"""
+        if 'first_frame' not in self.startup_times:
+            self._mark('first_frame')
+        if self.multi_view.visualizer.structure is not None:
+            self._mark('structure_frame')
+        if 'structure_frame' in self.startup_times or not self.structure_paths:
+            self.multi_view.canvas.events.draw.disconnect(self._on_draw)
+            if self.startup_report:
+                QTimer.singleShot(0, self._write_startup_report)
+
+    def _mark(self, name: str):
+        self.startup_times.setdefault(name, time.perf_counter() - _START)
+
+    def _write_startup_report(self):
+        """写出启动计时并退出 (进程内计时起点的绝对时间便于外部换算总启动时间)"""
+        if self.startup_report is None:
+            return
+        report = {'started': time.time() - (time.perf_counter() - _START),
+                  'structure': self.structure_paths[0] if self.structure_paths else None,
+                  'times': self.startup_times,
+                  'modules': sorted(name for name in ('Bio', 'vispy', 'numpy', 'msgpack')
+                                    if name in sys.modules)}
+        with open(self.startup_report, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.startup_report = None
+        QApplication.instance().quit()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ProteinCodeShell multi-view protein viewer")
+    parser.add_argument('structures', nargs='*', metavar='structure',
+                        help="structure files to open (.pdb, .cif, .bcif, optionally .gz); "
+                             "several files are spread over the four views")
+    parser.add_argument('--startup-report', metavar='PATH',
+                        help="write startup timings (window, views, first frame) as JSON and exit")
+    parser.add_argument('--startup-timeout', type=float, default=STARTUP_REPORT_TIMEOUT,
+                        help="seconds to wait for the structure's first frame before reporting")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
+    args = parse_args()
     app = QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(args.structures, args.startup_report, args.startup_timeout)
     window.show()
     sys.exit(app.exec())
-
-
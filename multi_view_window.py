@@ -1,53 +1,70 @@
+import os
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, 
-                            QLabel, QFrame, QSplitter, 
-                            QToolBar, QPushButton)
-from PyQt6.QtCore import Qt
+                            QLabel, QFrame, 
+                            QToolBar, QPushButton, QSlider, QComboBox, QLineEdit,
+                            QFileDialog)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
+from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QAction
+from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from vispy import scene
-from protein_visualizer import ProteinVisualizer
+from protein_visualizer import ProteinVisualizer, STANDARD_CAMERA_VIEWS
+from protein_structure import ProteinStructure
+from load_worker import create_load_thread
+from trajectory import Trajectory
+from trajectory_player import TrajectoryPlayer
+from styling import (REPRESENTATION_BALL_AND_STICK, REPRESENTATION_CARTOON, REPRESENTATION_POINTS,
+                     REPRESENTATION_SAS, REPRESENTATION_SPACEFILL, REPRESENTATION_SURFACE,
+                     SCHEME_BFACTOR, SCHEME_CHAIN, SCHEME_ELEMENT, SCHEME_RESIDUE,
+                     SELECTION_HIGHLIGHT_COLOR)
+from redraw_scheduler import InteractionTracker, ScheduledCanvas
+from selection import SelectionError
+from picking import describe_atom
+from assembly import assembly_instancing
+from profiler import get_profiler
+from workspace import Workspace, WorkspaceEntry
+from interactions import (INTERACTION_CLASHES, INTERACTION_HBONDS, INTERACTION_INTERFACES,
+                          INTERACTION_SALT_BRIDGES)
+from superposition import (alignment_atoms, apply_transform, ensemble_structure, kabsch,
+                           matched_atoms, read_frames)
 
+# 按下和松开之间移动不超过该距离 (逻辑像素) 视为点击而不是拖动
+CLICK_TOLERANCE = 3
+# 性能信息在状态标签中的刷新间隔 (毫秒)
+PROFILE_REFRESH_MS = 500
+# 左上角视图标签的底色: 普通视图和当前视图 (上一个/下一个、结构列表作用的视图)
+WIN_LABEL_COLOR = '#C0C0C0'
+CURRENT_WIN_LABEL_COLOR = '#F0C040'
+# 叠合显示多模型文件时最多同时绘制的模型数 (超出时均匀抽取)
+OVERLAY_MAX_FRAMES = 50
+# 相互作用按钮显示的分析类型 (残基接触连线过密，只通过 ProteinVisualizer.set_interactions 开启)
+INTERACTION_OVERLAY_KINDS = (INTERACTION_INTERFACES, INTERACTION_HBONDS, INTERACTION_SALT_BRIDGES,
+                             INTERACTION_CLASHES)
 
-class ProteinViewWindow(QWidget):
-    """单个蛋白质视图窗口"""
-    def __init__(self, window_id: int, parent=None):
-        super().__init__(parent)
+
+class ProteinViewWindow:
+    """共享画布上的单个蛋白质视图: ViewBox、相机和覆盖在画布上的信息标签"""
+    def __init__(self, window_id: int, canvas: ScheduledCanvas, overlay: QWidget):
+        """
+        参数:
+            window_id: 视图编号 (1-4)
+            canvas: 所有视图共用的画布
+            overlay: 承载画布的容器，标签作为其子控件显示在画布上方
+        """
         self.window_id = window_id
-        self.setup_ui()
-        self.setup_visualizer()
+        self.overlay = overlay
+        self.setup_view(canvas)
         self.add_labels()
     
-    def setup_ui(self):
-        """初始化UI界面"""
-        self.setMinimumSize(400, 300)
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(2, 2, 2, 2)
-        
-        # 带边框的画布容器
-        self.canvas_frame = QFrame()
-        self.canvas_frame.setFrameShape(QFrame.Shape.Box)
-        self.canvas_frame.setLineWidth(2)
-        self.canvas_frame.setStyleSheet("""
-            QFrame {
-                border: 2px solid #C0C0C0;
-                background-color: black;
-            }
-        """)
-        layout.addWidget(self.canvas_frame)
-        
-        # 画布布局
-        canvas_layout = QVBoxLayout(self.canvas_frame)
-        canvas_layout.setContentsMargins(0, 0, 0, 0)
-        
-        # VisPy画布
-        self.canvas = scene.SceneCanvas(
-            keys='interactive',
-            bgcolor='black',
-            parent=self.canvas_frame
+    def setup_view(self, canvas: scene.SceneCanvas):
+        """在共享画布上创建ViewBox和3D相机"""
+        self.view = scene.widgets.ViewBox(
+            parent=canvas.scene,
+            border_color='#C0C0C0',
+            border_width=2
         )
-        canvas_layout.addWidget(self.canvas.native)
-        
-        # 3D视图设置
-        self.view = self.canvas.central_widget.add_view()
         self.view.camera = scene.TurntableCamera(
             fov=45,
             distance=30,
@@ -55,23 +72,71 @@ class ProteinViewWindow(QWidget):
             azimuth=30 * self.window_id  # 每个窗口不同初始角度
         )
     
-    def setup_visualizer(self):
-        """设置蛋白质可视化器"""
-        self.visualizer = ProteinVisualizer(self.view)
+    def set_rect(self, x: float, y: float, width: float, height: float):
+        """设置视图在画布中的位置和大小 (逻辑像素)"""
+        self.view.pos = (x, y)
+        self.view.size = (width, height)
+        self.update_label_position()
     
-    def load_protein(self, pdb_path: str) -> bool:
-        """加载PDB文件"""
-        success = self.visualizer.load_protein(pdb_path)
-        if success:
-            self.status_label.setText(f"已加载: {pdb_path.split('/')[-1]}")
-        else:
-            self.status_label.setText("加载失败")
-        return success
+    def set_visible(self, visible: bool):
+        """显示或隐藏视图标签 (ViewBox本身由可视化器暂停)"""
+        self.status_label.setVisible(visible)
+        self.win_label.setVisible(visible)
+    
+    def set_status(self, text: str):
+        """更新右下角状态标签"""
+        self.status_text = text
+        self._show_status(text)
+    
+    def set_hover(self, text: Optional[str]):
+        """在状态标签中临时显示悬停原子的信息，None 恢复原状态"""
+        self.hover_text = text
+        self._show_status(self.status_text if text is None else text)
+    
+    def set_profile(self, text: Optional[str]):
+        """在状态标签下方显示性能信息 (帧时间、加载阶段)，None 隐藏"""
+        self.profile_text = text
+        self._show_status(self.status_text if self.hover_text is None else self.hover_text)
+    
+    def set_title(self, name: Optional[str]):
+        """在左上角标签中显示视图编号和所显示的文件名"""
+        self.win_label.setText(f"win{self.window_id}" if not name else f"win{self.window_id}  {name}")
+        self.win_label.adjustSize()
+    
+    def set_current(self, current: bool):
+        """标记或取消标记为当前视图"""
+        color = CURRENT_WIN_LABEL_COLOR if current else WIN_LABEL_COLOR
+        self.win_label.setStyleSheet(f"""
+            QLabel {{
+                color: black;
+                font-size: 16px;
+                background-color: {color};
+                padding: 3px;
+                border: 2px solid {color};
+                border-bottom-right-radius: 5px;
+            }}
+        """)
+    
+    def contains(self, pos) -> bool:
+        """画布坐标是否落在视图内"""
+        x, y = self.view.pos
+        width, height = self.view.size
+        return x <= pos[0] < x + width and y <= pos[1] < y + height
+    
+    def _show_status(self, text: str):
+        if self.profile_text:
+            text = f"{text}\n{self.profile_text}"
+        self.status_label.setText(text)
+        self.status_label.adjustSize()
+        self.update_label_position()
     
     def add_labels(self):
         """添加信息标签"""
-        # 右下角状态标签
-        self.status_label = QLabel("就绪", self.canvas_frame)
+        # 右下角状态标签，性能信息开启时附在状态下方
+        self.status_text = "就绪"
+        self.hover_text = None
+        self.profile_text = None
+        self.status_label = QLabel(self.status_text, self.overlay)
         self.status_label.setStyleSheet("""
             QLabel {
                 color: white;
@@ -82,47 +147,65 @@ class ProteinViewWindow(QWidget):
             }
         """)
         self.status_label.adjustSize()
-        self.update_label_position()
         self.status_label.raise_()
         
         # 左上角win标签
-        self.win_label = QLabel(f"win{self.window_id}", self.canvas_frame)
-        self.win_label.setStyleSheet("""
-            QLabel {
-                color: black;
-                font-size: 16px;
-                background-color: #C0C0C0;
-                padding: 3px;
-                border: 2px solid #C0C0C0;
-                border-bottom-right-radius: 5px;
-            }
-        """)
+        self.win_label = QLabel(f"win{self.window_id}", self.overlay)
+        self.set_current(False)
         self.win_label.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
         self.win_label.adjustSize()
-        self.win_label.move(0, 0)
         self.win_label.raise_()
+        self.update_label_position()
     
     def update_label_position(self):
-        """更新标签位置"""
-        if hasattr(self, 'status_label'):
+        """按视图矩形更新标签位置"""
+        if hasattr(self, 'win_label'):
             margin = 5
-            frame_size = self.canvas_frame.size()
+            x, y = (int(v) for v in self.view.pos)
+            width, height = (int(v) for v in self.view.size)
+            self.win_label.move(x, y)
             self.status_label.move(
-                frame_size.width() - self.status_label.width() - margin,
-                frame_size.height() - self.status_label.height() - margin
+                x + width - self.status_label.width() - margin,
+                y + height - self.status_label.height() - margin
             )
-    
-    def resizeEvent(self, event):
-        """窗口大小改变时更新标签位置"""
-        super().resizeEvent(event)
-        self.update_label_position()
 
 class MultiViewWindow(QWidget):
     """包含4个视图和切换功能的主窗口"""
+    
+    # 结构加载完成 (含拓扑) 时发出
+    structure_loaded = pyqtSignal(object)
+    # 点击选中原子时发出原子下标
+    atom_picked = pyqtSignal(int)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_mode = "quad"  # 初始为四窗格模式
         self.active_single_view = None
+        
+        # 多结构工作区: 每个视图可以显示不同的文件，已解析的结构和可视化对象按预算缓存
+        self.workspace = Workspace()
+        # 各视图请求显示的文件 (规范化路径) 和实际显示的缓存项
+        self.view_paths = [None] * 4
+        self.view_entries = [None] * 4
+        # 上一个/下一个和结构列表作用的视图 (0-3)
+        self.current_view = 0
+        # 叠合显示: 各视图中叠加在所显示结构上的 (缓存项, 可视化器)
+        self.overlay = False
+        self.view_overlays = [[] for _ in range(4)]
+        
+        # 后台加载状态: 文件 -> worker，预加载的文件另行记录
+        self._loads = {}
+        self._prefetching = set()
+        self._load_threads = []
+        
+        # 轨迹播放器，播放当前视图所显示结构的轨迹
+        self.player = TrajectoryPlayer(self)
+        self._player_entry = None
+        self.player.frame_changed.connect(self._on_frame_changed)
+        self.player.state_changed.connect(self._on_play_state_changed)
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(lambda: self.cancel_loading(wait=True))
         self.setup_ui()
         self.setup_views()
         self.setup_toolbar()
@@ -153,58 +236,186 @@ class MultiViewWindow(QWidget):
         self.view_container_layout = QVBoxLayout(self.view_container)
         self.view_container_layout.setContentsMargins(5, 5, 5, 5)
         
+        # 画布容器，视图标签覆盖在画布上方
+        self.canvas_frame = QFrame()
+        self.canvas_frame.setStyleSheet("""
+            QFrame {
+                background-color: black;
+            }
+        """)
+        canvas_layout = QVBoxLayout(self.canvas_frame)
+        canvas_layout.setContentsMargins(0, 0, 0, 0)
+        self.view_container_layout.addWidget(self.canvas_frame)
+        
+        # 四个视图共用一个画布 (一个GL上下文)，顶点数据只上传一次；
+        # 重绘请求按帧合并，只重绘相机或数据发生变化的视图
+        self.canvas = ScheduledCanvas(
+            keys='interactive',
+            bgcolor='black',
+            parent=self.canvas_frame
+        )
+        if isinstance(self.canvas.native, QOpenGLWidget):
+            # 保留两次绘制之间的帧缓冲，未变化的视图无需重绘
+            self.canvas.native.setUpdateBehavior(QOpenGLWidget.UpdateBehavior.PartialUpdate)
+            self.canvas.partial_redraw = True
+        canvas_layout.addWidget(self.canvas.native)
+        
         # 创建四个视图
-        self.view1 = ProteinViewWindow(1)
-        self.view2 = ProteinViewWindow(2)
-        self.view3 = ProteinViewWindow(3)
-        self.view4 = ProteinViewWindow(4)
+        self.view1 = ProteinViewWindow(1, self.canvas, self.canvas_frame)
+        self.view2 = ProteinViewWindow(2, self.canvas, self.canvas_frame)
+        self.view3 = ProteinViewWindow(3, self.canvas, self.canvas_frame)
+        self.view4 = ProteinViewWindow(4, self.canvas, self.canvas_frame)
+        self.views = [self.view1, self.view2, self.view3, self.view4]
+        # 没有显示结构时的可视化器: 保存当前的表示方式、配色和组装体设置，并用于预热着色器
+        self.idle_visualizer = ProteinVisualizer([view.view for view in self.views])
+        self.canvas.set_views([view.view for view in self.views])
+        self.canvas.events.resize.connect(self.layout_views)
+        self.views[self.current_view].set_current(True)
+        
+        # 拖动相机期间降低画质，可选联动所有视图的相机
+        self.interaction = InteractionTracker(
+            self.canvas, [view.view for view in self.views], self._set_interactive)
+        
+        # 首帧画出后在空闲时预热当前表示方式的着色器，与后台解析并行
+        self.canvas.events.draw.connect(self._on_first_draw, position='last')
+        
+        # 悬停显示原子信息，点击选中原子
+        self._hover_view = None
+        self.canvas.events.mouse_press.connect(self._on_mouse_press)
+        self.canvas.events.mouse_move.connect(self._on_mouse_move)
+        self.canvas.events.mouse_release.connect(self._on_mouse_release)
         
         # 初始四视图布局
         self.setup_quad_view()
         
         self.main_layout.addWidget(self.view_container)
     
+    @property
+    def visualizer(self) -> ProteinVisualizer:
+        """当前视图所显示结构的可视化器，没有显示结构时为 idle_visualizer"""
+        entry = self.view_entries[self.current_view]
+        return self.idle_visualizer if entry is None else entry.visualizer
+    
+    def _visualizers(self):
+        """全部可视化器 (含缓存中未显示的结构)"""
+        return [self.idle_visualizer] + [entry.visualizer for entry in self.workspace.entries
+                                         if entry.visualizer is not None]
+    
+    def _shown_visualizers(self):
+        """正在某个视图中显示的可视化器 (含叠合显示的，每个只出现一次)"""
+        shown = {id(entry.visualizer): entry.visualizer
+                 for entry in self.view_entries if entry is not None}
+        for overlays in self.view_overlays:
+            shown.update((id(visualizer), visualizer) for _, visualizer in overlays)
+        return list(shown.values())
+    
     def setup_quad_view(self):
         """设置四视图布局"""
-        # 清除当前布局
-        while self.view_container_layout.count():
-            item = self.view_container_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.hide()
-        
-        # 创建新的分割器
-        self.splitter = QSplitter(Qt.Orientation.Vertical)
-        self.h_splitter1 = QSplitter(Qt.Orientation.Horizontal)
-        self.h_splitter2 = QSplitter(Qt.Orientation.Horizontal)
-        
-        # 添加视图到分割器
-        self.h_splitter1.addWidget(self.view1)
-        self.h_splitter1.addWidget(self.view2)
-        self.h_splitter2.addWidget(self.view3)
-        self.h_splitter2.addWidget(self.view4)
-        
-        # 设置分割比例 (1:1)
-        self.h_splitter1.setSizes([1, 1])
-        self.h_splitter2.setSizes([1, 1])
-        
-        self.splitter.addWidget(self.h_splitter1)
-        self.splitter.addWidget(self.h_splitter2)
-        
-        # 设置垂直分割比例 (1:1)
-        self.splitter.setSizes([1, 1])
-        
-        self.view_container_layout.addWidget(self.splitter)
+        self.active_single_view = None
+        self.layout_views()
+    
+    def layout_views(self, event=None):
+        """
+        按当前模式排列画布中的视图: 四视图模式为2x2网格，单视图模式下选定视图
+        占满画布，其余视图隐藏并暂停绘制
+        """
+        width, height = self.canvas.size
+        gap = 4  # 视图间距 (逻辑像素)
+        for index, view in enumerate(self.views):
+            if self.active_single_view is not None:
+                shown = view is self.active_single_view
+                rect = (0, 0, width, height)
+            else:
+                shown = True
+                cell_width, cell_height = (width - gap) / 2, (height - gap) / 2
+                rect = ((index % 2) * (cell_width + gap), (index // 2) * (cell_height + gap),
+                        cell_width, cell_height)
+            if shown:
+                view.set_rect(*rect)
+            view.set_visible(shown)
+            for visualizer in self._visualizers():
+                visualizer.set_view_active(index, shown)
+        self.canvas.request_full_redraw()
+    
+    def _pick_at(self, pos):
+        """
+        画布位置下的原子
         
-        # 显示所有视图
-        for view in [self.view1, self.view2, self.view3, self.view4]:
-            view.show()
+        返回:
+            tuple: (视图, (原子下标, 状态栏描述) 或None)，位置不在任何可见视图内时视图为None
+        """
+        for index, view in enumerate(self.views):
+            if self.active_single_view not in (None, view) or not view.contains(pos):
+                continue
+            entry = self.view_entries[index]
+            if entry is None:
+                return view, None
+            visualizer = entry.visualizer
+            hit = visualizer.pick_instance(index, pos)
+            if hit is None:
+                return view, None
+            text = describe_atom(visualizer.structure, hit[0])
+            if visualizer.instances is not None:
+                text += f" [拷贝 {hit[1] + 1}]"
+            return view, (hit[0], text)
+        return None, None
+    
+    def _on_mouse_press(self, event):
+        for index, view in enumerate(self.views):
+            if self.active_single_view in (None, view) and view.contains(event.pos):
+                self.set_current_view(index)
+                return
+    
+    def _on_mouse_move(self, event):
+        if event.buttons:
+            return  # 拖动相机时不拾取
+        view, hit = self._pick_at(event.pos)
+        if self._hover_view is not None and self._hover_view is not view:
+            self._hover_view.set_hover(None)
+        self._hover_view = view
+        if view is not None:
+            view.set_hover(None if hit is None else hit[1])
+    
+    def _on_mouse_release(self, event):
+        press = event.press_event
+        if press is None or event.button != 1:
+            return
+        if max(abs(event.pos[0] - press.pos[0]), abs(event.pos[1] - press.pos[1])) > CLICK_TOLERANCE:
+            return
+        view, hit = self._pick_at(event.pos)
+        if hit is None:
+            return
+        view.set_status(f"选中 {hit[1]}")
+        self.atom_picked.emit(hit[0])
     
     def setup_toolbar(self):
         """设置底部工具栏"""
         self.toolbar = QToolBar()
         self.toolbar.setMovable(False)
         
+        # 工作区: 打开一个或多个文件，在当前视图中切换列表中的结构
+        self.open_btn = QAction("打开", self)
+        self.open_btn.triggered.connect(lambda: self.open_files())
+        self.toolbar.addAction(self.open_btn)
+        self.prev_btn = QAction("上一个", self)
+        self.prev_btn.triggered.connect(lambda: self.step_structure(-1))
+        self.next_btn = QAction("下一个", self)
+        self.next_btn.triggered.connect(lambda: self.step_structure(1))
+        self.structure_box = QComboBox()
+        self.structure_box.setMinimumContentsLength(12)
+        self.structure_box.activated.connect(
+            lambda index: self.show_in_current_view(self.structure_box.itemData(index)))
+        self.toolbar.addAction(self.prev_btn)
+        self.toolbar.addWidget(self.structure_box)
+        self.toolbar.addAction(self.next_btn)
+        # 叠合: 其他已加载的结构和多模型文件的其余模型按 Cα 叠合后叠加显示
+        self.overlay_btn = QAction("叠合", self)
+        self.overlay_btn.setCheckable(True)
+        self.overlay_btn.toggled.connect(self.set_overlay)
+        self.toolbar.addAction(self.overlay_btn)
+        self._update_workspace_controls()
+        self.toolbar.addSeparator()
+        
         # 添加模式切换按钮
         self.quad_view_btn = QAction("四视图模式", self)
         self.quad_view_btn.triggered.connect(self.switch_to_quad_view)
@@ -228,6 +439,90 @@ class MultiViewWindow(QWidget):
         self.toolbar.addAction(self.single_view3_btn)
         self.toolbar.addAction(self.single_view4_btn)
         
+        # 相机联动: 拖动任一视图时其他视图按相同的变化量转动、缩放和平移
+        self.toolbar.addSeparator()
+        self.link_cameras_btn = QAction("联动相机", self)
+        self.link_cameras_btn.setCheckable(True)
+        self.link_cameras_btn.toggled.connect(self.interaction.set_linked)
+        self.toolbar.addAction(self.link_cameras_btn)
+        
+        # 配色方案，切换时原地更新所有视图的颜色缓冲
+        self.toolbar.addSeparator()
+        self.color_scheme_box = QComboBox()
+        for label, scheme in [("按元素", SCHEME_ELEMENT), ("按链", SCHEME_CHAIN),
+                              ("按B因子", SCHEME_BFACTOR), ("按残基类型", SCHEME_RESIDUE)]:
+            self.color_scheme_box.addItem(label, scheme)
+        self.color_scheme_box.currentIndexChanged.connect(
+            lambda: self.set_color_scheme(self.color_scheme_box.currentData()))
+        self.toolbar.addWidget(self.color_scheme_box)
+        
+        # 原子表示方式，四个视图共用同一组原子纹理或卡通网格
+        self.representation_box = QComboBox()
+        for label, representation in [("点", REPRESENTATION_POINTS),
+                                      ("球棍", REPRESENTATION_BALL_AND_STICK),
+                                      ("空间填充", REPRESENTATION_SPACEFILL),
+                                      ("卡通", REPRESENTATION_CARTOON),
+                                      ("表面", REPRESENTATION_SURFACE),
+                                      ("溶剂可及表面", REPRESENTATION_SAS)]:
+            self.representation_box.addItem(label, representation)
+        self.representation_box.currentIndexChanged.connect(
+            lambda: self.set_representation(self.representation_box.currentData()))
+        self.toolbar.addWidget(self.representation_box)
+        
+        # 生物组装体: 按对称拷贝的变换实例化绘制，只有带组装体的结构才启用
+        self.assembly_btn = QAction("组装体", self)
+        self.assembly_btn.setCheckable(True)
+        self.assembly_btn.setChecked(True)
+        self.assembly_btn.setEnabled(False)
+        self.assembly_btn.toggled.connect(self.set_show_assembly)
+        self.toolbar.addAction(self.assembly_btn)
+        
+        # 相互作用: 链间界面、氢键和盐桥候选、空间冲突的连线，轨迹播放时随帧增量更新
+        self.interactions_btn = QAction("相互作用", self)
+        self.interactions_btn.setCheckable(True)
+        self.interactions_btn.toggled.connect(self.set_show_interactions)
+        self.toolbar.addAction(self.interactions_btn)
+        
+        # 性能记录: 各视图状态标签显示帧时间和最近一次加载的阶段耗时，可导出跟踪文件
+        self.profile_btn = QAction("性能", self)
+        self.profile_btn.setCheckable(True)
+        self.profile_btn.setChecked(get_profiler().enabled)
+        self.profile_btn.toggled.connect(self.set_profiling)
+        self.toolbar.addAction(self.profile_btn)
+        self.export_trace_btn = QAction("导出跟踪", self)
+        self.export_trace_btn.triggered.connect(lambda: self.export_trace())
+        self.toolbar.addAction(self.export_trace_btn)
+        self._profile_timer = QTimer(self)
+        self._profile_timer.setInterval(PROFILE_REFRESH_MS)
+        self._profile_timer.timeout.connect(self._update_profile_labels)
+        if get_profiler().enabled:
+            self._profile_timer.start()
+        
+        # 原子选择: 输入选择表达式后隐藏、显示或高亮，不重新解析文件
+        self.toolbar.addSeparator()
+        self.selection_edit = QLineEdit()
+        self.selection_edit.setPlaceholderText("选择, 如 chain A and resname LYS")
+        self.selection_edit.setMaximumWidth(240)
+        self.toolbar.addWidget(self.selection_edit)
+        for label, slot in [("隐藏", self.hide_selection), ("显示", self.show_selection),
+                            ("高亮", self.highlight_selection), ("重置", self.clear_selections)]:
+            button = QAction(label, self)
+            button.triggered.connect(slot)
+            self.toolbar.addAction(button)
+        
+        # 轨迹播放控件，只有多模型文件才启用
+        self.toolbar.addSeparator()
+        self.play_btn = QAction("播放", self)
+        self.play_btn.triggered.connect(self.player.toggle)
+        self.frame_slider = QSlider(Qt.Orientation.Horizontal)
+        self.frame_slider.setMaximumWidth(300)
+        self.frame_slider.valueChanged.connect(self.player.seek)
+        self.frame_label = QLabel()
+        self.toolbar.addAction(self.play_btn)
+        self.toolbar.addWidget(self.frame_slider)
+        self.toolbar.addWidget(self.frame_label)
+        self._set_trajectory_controls(None)
+        
         self.main_layout.addWidget(self.toolbar)
     
     def switch_to_quad_view(self):
@@ -245,69 +540,577 @@ class MultiViewWindow(QWidget):
         
         self.current_mode = view_num
         
-        # 隐藏所有视图
-        for view in [self.view1, self.view2, self.view3, self.view4]:
-            view.hide()
-        
-        # 清除当前布局
-        while self.view_container_layout.count():
-            item = self.view_container_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.hide()
-        
-        # 显示选定的视图
-        view_map = {
-            1: self.view1,
-            2: self.view2,
-            3: self.view3,
-            4: self.view4
-        }
-        self.active_single_view = view_map[view_num]
-        self.view_container_layout.addWidget(self.active_single_view)
-        self.active_single_view.show()
+        # 选定视图占满画布，其余视图隐藏
+        self.active_single_view = self.views[view_num - 1]
+        self.layout_views()
+        self.set_current_view(view_num - 1)
+    
+    def set_current_view(self, index: int):
+        """设置当前视图 (上一个/下一个、结构列表和轨迹播放作用的视图)"""
+        if index == self.current_view:
+            return
+        self.views[self.current_view].set_current(False)
+        self.current_view = index
+        self.views[index].set_current(True)
+        self._update_current_controls()
+    
+    def set_color_scheme(self, scheme: str):
+        """为所有视图切换配色方案 (颜色缓冲共用，只改写一次；缓存中的结构显示时再切换)"""
+        self.idle_visualizer.set_color_scheme(scheme)
+        for visualizer in self._shown_visualizers():
+            visualizer.set_color_scheme(scheme)
+    
+    def set_representation(self, representation: str):
+        """为所有视图切换原子表示方式 (缓存中的结构显示时再重建)"""
+        self.idle_visualizer.set_representation(representation)
+        for visualizer in self._shown_visualizers():
+            visualizer.set_representation(representation)
+    
+    def set_show_assembly(self, show: bool):
+        """显示生物组装体的全部拷贝或只显示不对称单元"""
+        self.idle_visualizer.set_show_assembly(show)
+        for visualizer in self._shown_visualizers():
+            visualizer.set_show_assembly(show)
+    
+    def set_show_interactions(self, show: bool):
+        """在各视图显示的结构上叠加或移除相互作用连线 (叠合显示的结构不画)"""
+        kinds = INTERACTION_OVERLAY_KINDS if show else ()
+        self.idle_visualizer.set_interactions(kinds)
+        for entry in self.view_entries:
+            if entry is not None:
+                entry.visualizer.set_interactions(kinds)
+    
+    def set_overlay(self, enabled: bool):
+        """
+        叠合显示: 每个视图中叠加显示工作区中其他已加载的结构和多模型文件的其余模型，
+        均按 Cα 叠合到该视图所显示的结构上；轨迹播放时当前帧也叠合到第0帧
+        
+        参数:
+            enabled: 是否叠合显示
+        """
+        if enabled == self.overlay:
+            return
+        self.overlay = enabled
+        self._update_overlays()
+        self._evict()
+        if self.player.trajectory is not None:
+            self.player.seek(self.player.current)
+    
+    def _set_interactive(self, interactive: bool):
+        self.idle_visualizer.set_interactive(interactive)
+        for visualizer in self._shown_visualizers():
+            visualizer.set_interactive(interactive)
+    
+    def _sync_settings(self, visualizer: ProteinVisualizer, interactions: bool = True):
+        """
+        让缓存中的可视化器跟上显示期间改变的表示方式、配色、组装体和相互作用设置
+        
+        参数:
+            visualizer: 可视化器
+            interactions: 是否按设置显示相互作用；叠合显示的结构不画 (叠合的模型彼此重叠，
+                          连线只会遮挡视图所显示的结构)
+        """
+        settings = self.idle_visualizer
+        visualizer.set_interactive(settings.interactive)
+        visualizer.set_show_assembly(settings.show_assembly)
+        visualizer.set_representation(settings.representation)
+        visualizer.set_interactions(settings.interaction_kinds if interactions else ())
+        if visualizer.color_scheme != settings.color_scheme:
+            visualizer.set_color_scheme(settings.color_scheme)
+    
+    def hide_selection(self):
+        """在所有显示的结构中隐藏输入框中选择的原子"""
+        self._apply_selection(lambda visualizer, text: visualizer.hide(text))
+    
+    def show_selection(self):
+        """重新显示输入框中选择的原子"""
+        self._apply_selection(lambda visualizer, text: visualizer.show(text))
+    
+    def highlight_selection(self):
+        """用高亮色覆盖输入框中选择的原子"""
+        self._apply_selection(
+            lambda visualizer, text: visualizer.color_selection(text, SELECTION_HIGHLIGHT_COLOR))
+    
+    def clear_selections(self):
+        """恢复全部原子显示并移除高亮"""
+        for visualizer in self._shown_visualizers():
+            visualizer.clear_selections()
+    
+    def _apply_selection(self, action):
+        """对输入框中的选择表达式在每个显示的结构上执行操作，语法错误显示在输入框提示中"""
+        text = self.selection_edit.text().strip()
+        if not text:
+            return
+        try:
+            for visualizer in self._shown_visualizers():
+                action(visualizer, text)
+            self.selection_edit.setToolTip("")
+        except SelectionError as error:
+            self.selection_edit.setToolTip(str(error))
+            print(f"选择表达式错误: {error}")
+    
+    def _on_first_draw(self, event=None):
+        self.canvas.events.draw.disconnect(self._on_first_draw)
+        QTimer.singleShot(0, self.idle_visualizer.warm_up)
+    
+    def set_profiling(self, enabled: bool):
+        """运行时开启或关闭性能记录和状态标签中的性能信息"""
+        get_profiler().enable(enabled)
+        if enabled:
+            self._profile_timer.start()
+            self.canvas.request_full_redraw()
+        else:
+            self._profile_timer.stop()
+        self._update_profile_labels()
+    
+    def export_trace(self, path: Optional[str] = None):
+        """
+        导出 Chrome/Perfetto 跟踪 JSON
+        
+        参数:
+            path: 输出路径，None 时弹出保存对话框
+        """
+        if not path:
+            path, _ = QFileDialog.getSaveFileName(self, "导出跟踪", "trace.json", "跟踪 (*.json)")
+            if not path:
+                return
+        try:
+            get_profiler().export_trace(path)
+        except OSError as error:
+            print(f"导出跟踪失败: {error}")
+    
+    def _update_profile_labels(self):
+        profiler = get_profiler()
+        for index, view in enumerate(self.views):
+            view.set_profile(profiler.overlay_text(index) if profiler.enabled else None)
     
     def setup_views(self):
         """设置每个视图的初始相机位置"""
-        # 视图1: 默认视角
-        self.view1.view.camera.azimuth = 30
-        self.view1.view.camera.elevation = 20
-        
-        # 视图2: 旋转90度
-        self.view2.view.camera.azimuth = 120
-        self.view2.view.camera.elevation = 20
-        
-        # 视图3: 俯视角度
-        self.view3.view.camera.azimuth = 30
-        self.view3.view.camera.elevation = 70
-        
-        # 视图4: 侧视角度
-        self.view4.view.camera.azimuth = -60
-        self.view4.view.camera.elevation = 0
-    
-    def load_protein(self, pdb_path: str):
-        """在所有视图中加载蛋白质"""
-        for view in [self.view1, self.view2, self.view3, self.view4]:
-            view.load_protein(pdb_path)
-
-        """设置每个视图的初始相机位置"""
-        # 视图1: 默认视角
-        self.view1.view.camera.azimuth = 30
-        self.view1.view.camera.elevation = 20
-        
-        # 视图2: 旋转90度
-        self.view2.view.camera.azimuth = 120
-        self.view2.view.camera.elevation = 20
-        
-        # 视图3: 俯视角度
-        self.view3.view.camera.azimuth = 30
-        self.view3.view.camera.elevation = 70
-        
-        # 视图4: 侧视角度
-        self.view4.view.camera.azimuth = -60
-        self.view4.view.camera.elevation = 0
-    
-    def load_protein(self, pdb_path: str):
-        """在所有视图中加载蛋白质"""
-        for view in [self.view1, self.view2, self.view3, self.view4]:
-            view.load_protein(pdb_path)
+        for view, (azimuth, elevation) in zip(self.views, STANDARD_CAMERA_VIEWS):
+            view.view.camera.azimuth = azimuth
+            view.view.camera.elevation = elevation
+    
+    def open_files(self, paths: Optional[Sequence[str]] = None):
+        """
+        把文件设为工作区的文件列表并显示: 一个文件显示在所有视图中，多个文件依次
+        分配给各视图 (视图i显示第 i % n 个)，其余文件可用上一个/下一个或结构列表切换
+        
+        参数:
+            paths: 结构文件路径，None 时弹出打开对话框
+        """
+        if paths is None:
+            paths, _ = QFileDialog.getOpenFileNames(
+                self, "打开结构", "",
+                "结构 (*.pdb *.ent *.cif *.mmcif *.bcif *.gz);;所有文件 (*)")
+        if not paths:
+            return
+        self.workspace.set_files(paths)
+        files = self.workspace.files
+        if len(files) == 1:
+            self.load_protein(files[0])
+            return
+        for index in range(len(self.views)):
+            self.load_protein(files[index % len(files)], [index])
+    
+    def show_in_current_view(self, pdb_path: str):
+        """在当前视图 (及与其显示同一文件的视图) 中显示结构"""
+        current = self.view_paths[self.current_view]
+        indices = [index for index, path in enumerate(self.view_paths)
+                   if current is not None and path == current]
+        self.load_protein(pdb_path, indices or [self.current_view])
+    
+    def step_structure(self, step: int):
+        """在当前视图中切换到文件列表中的上一个 (-1) 或下一个 (1) 结构"""
+        path = self.view_paths[self.current_view]
+        neighbor = None if path is None else self.workspace.neighbor(path, step)
+        if neighbor is not None:
+            self.show_in_current_view(neighbor)
+    
+    def load_protein(self, pdb_path: str, view_indices: Optional[Sequence[int]] = None):
+        """
+        在视图中显示结构: 工作区中已缓存的结构立即切换 (恢复该视图上次显示它时的相机)，
+        否则在后台线程中解析并分阶段显示
+        
+        原子坐标就绪后立即显示，键连和边界框在拓扑计算完成后补充。
+        不再被任何视图请求的加载会被取消 (预加载除外)。
+        
+        参数:
+            pdb_path: 结构文件路径
+            view_indices: 视图序号 (0-3)，None 表示全部视图
+        """
+        key = self.workspace.add_file(pdb_path)
+        indices = range(len(self.views)) if view_indices is None else list(view_indices)
+        for index in indices:
+            self.view_paths[index] = key
+        # 被视图请求后不再是预加载，显示加载进度
+        self._prefetching.discard(key)
+        
+        entry = self.workspace.get(key)
+        if entry is not None and entry.structure is not None:
+            self._ensure_visualizer(entry)
+            if entry.visualizer.structure is None:
+                entry.visualizer.set_structure(entry.structure)
+            self._display(entry, indices)
+        if entry is None or not entry.loaded:
+            self._start_load(key)
+        else:
+            self._prefetch_after(key)
+        self._cancel_unrequested()
+        self._evict()
+    
+    def _start_load(self, key: str, prefetch: bool = False):
+        """在后台线程中加载文件 (已在加载时不重复启动)"""
+        if key in self._loads:
+            return
+        worker, thread = create_load_thread(key, self)
+        worker.progress.connect(self._on_load_progress)
+        worker.atoms_ready.connect(self._on_atoms_ready)
+        worker.finished.connect(self._on_structure_loaded)
+        worker.trajectory_ready.connect(self._on_trajectory_ready)
+        worker.failed.connect(self._on_load_failed)
+        thread.finished.connect(self._prune_load_threads)
+        
+        self._loads[key] = worker
+        if prefetch:
+            self._prefetching.add(key)
+        self._load_threads.append((thread, worker))
+        thread.start()
+    
+    def _prefetch_after(self, key: str):
+        """预先加载文件列表中排在 key 之后的结构 (工作区已达预算时不预加载)"""
+        if self.workspace.usage() >= self.workspace.budget:
+            return
+        for candidate in self.workspace.prefetch_candidates(key):
+            self._start_load(candidate, prefetch=True)
+    
+    def _cancel_unrequested(self):
+        """取消不再被任何视图请求的加载，未完成且未显示的缓存项一并移除"""
+        for key, worker in list(self._loads.items()):
+            if key in self.view_paths or key in self._prefetching:
+                continue
+            worker.cancel()
+            del self._loads[key]
+            entry = self.workspace.get(key, touch=False)
+            if entry is not None and not entry.loaded and entry not in self.view_entries:
+                self.workspace.discard(key)
+    
+    def cancel_loading(self, wait: bool = False):
+        """取消正在进行的加载和预加载"""
+        for worker in self._loads.values():
+            worker.cancel()
+        self._loads.clear()
+        self._prefetching.clear()
+        if wait:
+            for thread, _ in self._load_threads:
+                thread.wait()
+    
+    def _evict(self):
+        """工作区超出内存预算时淘汰最近最少使用、未显示也未在加载的结构"""
+        pinned = set(self.view_paths) | set(self._loads)
+        pinned.update(entry.path for entry in self.view_entries if entry is not None)
+        pinned.update(entry.path for overlays in self.view_overlays for entry, _ in overlays)
+        self.workspace.evict(pinned)
+        self._update_overlays()
+        self._update_workspace_controls()
+    
+    def _sender_key(self) -> Optional[str]:
+        """发出信号的加载任务对应的文件，任务已被取消或取代时返回None"""
+        worker = self.sender()
+        key = getattr(worker, 'pdb_file', None)
+        return key if key is not None and self._loads.get(key) is worker else None
+    
+    def _requesting(self, key: str):
+        """请求显示该文件的视图序号"""
+        return [index for index, path in enumerate(self.view_paths) if path == key]
+    
+    @pyqtSlot(int, str)
+    def _on_load_progress(self, percent: int, stage: str):
+        key = self._sender_key()
+        if key is None:
+            return
+        for index in self._requesting(key):
+            self.views[index].set_status(f"加载中 {percent}%: {stage}")
+    
+    @pyqtSlot(object)
+    def _on_atoms_ready(self, structure: ProteinStructure):
+        key = self._sender_key()
+        if key is None or not self._requesting(key):
+            return  # 预加载只保留完整结构
+        self._update_entry(self.workspace.add(key), structure)
+    
+    @pyqtSlot(object)
+    def _on_structure_loaded(self, structure: ProteinStructure):
+        key = self._sender_key()
+        if key is None:
+            return
+        del self._loads[key]
+        self._prefetching.discard(key)
+        entry = self.workspace.add(key)
+        self._update_entry(entry, structure)
+        if self._requesting(key):
+            self.structure_loaded.emit(structure)
+            self._prefetch_after(key)
+        else:
+            # 预加载的结构在空闲时创建隐藏的可视化对象，切换过去时无需再上传
+            QTimer.singleShot(0, lambda: self._build_prefetched(key))
+        self._evict()
+    
+    def _update_entry(self, entry: WorkspaceEntry, structure: ProteinStructure):
+        """把 (分阶段) 加载的结构交给缓存项的可视化器，并显示在请求它的视图中"""
+        entry.structure = structure
+        indices = self._requesting(entry.path)
+        if entry.visualizer is None and not indices:
+            return
+        self._ensure_visualizer(entry).set_structure(structure)
+        self._display(entry, indices)
+    
+    def _build_prefetched(self, key: str):
+        entry = self.workspace.get(key, touch=False)
+        if entry is None or entry.structure is None or entry.visualizer is not None:
+            return
+        self._ensure_visualizer(entry).set_structure(entry.structure)
+        self._evict()
+    
+    def _ensure_visualizer(self, entry: WorkspaceEntry) -> ProteinVisualizer:
+        """缓存项的可视化器，不存在时创建 (在所有视图中隐藏，按当前设置)"""
+        if entry.visualizer is None:
+            entry.visualizer = self._hidden_visualizer()
+        return entry.visualizer
+    
+    def _hidden_visualizer(self, interactions: bool = True) -> ProteinVisualizer:
+        """新建在所有视图中隐藏、按当前设置的可视化器 (interactions 见 _sync_settings)"""
+        visualizer = ProteinVisualizer([view.view for view in self.views])
+        for index in range(len(self.views)):
+            visualizer.show_in_view(index, False)
+        self._sync_settings(visualizer, interactions)
+        return visualizer
+    
+    def _display(self, entry: WorkspaceEntry, indices: Sequence[int]):
+        """
+        在视图中切换到缓存项: 只切换各结构图层的可见性，不重建或重新上传可视化对象
+        
+        参数:
+            entry: 已有可视化器的缓存项
+            indices: 视图序号
+        """
+        self._sync_settings(entry.visualizer)
+        for index in indices:
+            view = self.views[index]
+            previous = self.view_entries[index]
+            if previous is not entry:
+                self._clear_overlays(index)
+                camera = view.view.camera
+                if previous is not None and previous.visualizer is not None:
+                    previous.cameras[index] = (camera.get_state(), camera.distance)
+                    previous.visualizer.show_in_view(index, False)
+                # 先调整相机再挂上图层，相机变化不会传播到刚挂上的节点
+                if index in entry.cameras:
+                    state, distance = entry.cameras[index]
+                    camera.set_state(state)
+                    camera.distance = distance
+                else:
+                    entry.visualizer.reset_view(index)
+                self.view_entries[index] = entry
+                entry.visualizer.show_in_view(index, True)
+                view.set_title(entry.name)
+            if entry.loaded:
+                view.set_status(f"已加载: {entry.name}")
+        self._update_overlays()
+        if self.current_view in indices:
+            self._update_current_controls()
+    
+    def _update_overlays(self):
+        """按叠合开关和各视图显示的结构挂上、摘下或更新叠合显示的可视化器"""
+        for index, view in enumerate(self.views):
+            targets = self._overlay_targets(index)
+            wanted = {id(visualizer) for _, visualizer, _ in targets}
+            if not wanted and not self.view_overlays[index]:
+                continue
+            for _, visualizer in self.view_overlays[index]:
+                if id(visualizer) not in wanted and visualizer.layers:
+                    visualizer.show_in_view(index, False)
+                    visualizer.set_view_transform(index, None)
+                    visualizer.show_interactions_in_view(index, True)
+            primary = {id(entry.visualizer) for entry in self.view_entries if entry is not None}
+            for _, visualizer, matrix in targets:
+                self._sync_settings(visualizer, interactions=id(visualizer) in primary)
+                visualizer.show_interactions_in_view(index, False)
+                if visualizer.view_transforms[index] is not matrix:
+                    visualizer.set_view_transform(index, matrix)
+                visualizer.show_in_view(index, True)
+            self.view_overlays[index] = [(entry, visualizer) for entry, visualizer, _ in targets]
+            entry = self.view_entries[index]
+            if entry is not None and entry.loaded:
+                view.set_status(self._overlay_status(entry, targets))
+    
+    def _clear_overlays(self, index: int):
+        """摘下一个视图中叠合显示的可视化器 (视图切换到其他结构前)"""
+        for _, visualizer in self.view_overlays[index]:
+            if visualizer.layers:
+                visualizer.show_in_view(index, False)
+                visualizer.set_view_transform(index, None)
+                visualizer.show_interactions_in_view(index, True)
+        self.view_overlays[index] = []
+    
+    def _overlay_targets(self, index: int
+                         ) -> List[Tuple[WorkspaceEntry, ProteinVisualizer, Optional[np.ndarray]]]:
+        """
+        一个视图中要叠合显示的 (缓存项, 可视化器, 变换矩阵)
+        
+        多模型文件的其余模型已叠合在坐标中 (变换为None)；其他文件按对应的 Cα 原子
+        叠合，没有足够对应原子的结构不显示
+        """
+        entry = self.view_entries[index]
+        if not self.overlay or entry is None or not entry.loaded:
+            return []
+        targets = []
+        if entry.trajectory is not None and entry.trajectory.n_frames > 1:
+            targets.append((entry, self._ensure_ensemble(entry), None))
+        for path in self.workspace.files:
+            other = self.workspace.get(path, touch=False)
+            if other is None or other is entry or not other.loaded or other.visualizer is None:
+                continue
+            matrix = self._superposition(entry, other)
+            if matrix is not None:
+                targets.append((other, other.visualizer, matrix))
+        return targets
+    
+    def _overlay_status(self, entry: WorkspaceEntry, targets) -> str:
+        """视图状态: 叠合显示的模型数和各结构叠合后的 Cα RMSD"""
+        parts = []
+        for other, visualizer, matrix in targets:
+            if other is entry:
+                models = visualizer.structure.n_atoms // max(entry.structure.n_atoms, 1) + 1
+                parts.append(f"{models} 个模型")
+            else:
+                rmsd = entry.superpositions[other.path][1]
+                parts.append(f"{other.name} {rmsd:.2f} Å")
+        if not parts:
+            return f"已加载: {entry.name}"
+        return f"已加载: {entry.name}, 叠合: " + ", ".join(parts)
+    
+    def _superposition(self, entry: WorkspaceEntry, other: WorkspaceEntry) -> Optional[np.ndarray]:
+        """other 叠合到 entry 上的 (4,4) 变换，对应原子不足时为None；结果缓存在 entry 上"""
+        if other.path not in entry.superpositions:
+            reference, mobile = matched_atoms(entry.structure, other.structure)
+            result = None
+            if len(reference):
+                result = kabsch(other.structure.coords[mobile], entry.structure.coords[reference])
+            entry.superpositions[other.path] = result
+        result = entry.superpositions[other.path]
+        return None if result is None else result[0]
+    
+    def _ensure_ensemble(self, entry: WorkspaceEntry) -> ProteinVisualizer:
+        """
+        多模型文件其余模型 (至多 OVERLAY_MAX_FRAMES 个) 叠合到第0帧后拼成的结构的可视化器，
+        首次叠合显示时读取各帧并批量叠合，之后缓存在缓存项上
+        """
+        if entry.ensemble_visualizer is None:
+            structure = entry.structure
+            n_frames = entry.trajectory.n_frames
+            frames = np.unique(np.linspace(1, n_frames - 1, min(n_frames - 1, OVERLAY_MAX_FRAMES)
+                                           ).round().astype(int))
+            coords = read_frames(entry.trajectory, frames=frames)
+            atoms = alignment_atoms(structure)
+            matrices, _ = kabsch(coords[:, atoms], structure.coords[atoms])
+            visualizer = self._hidden_visualizer(interactions=False)
+            visualizer.set_structure(ensemble_structure(
+                structure, [apply_transform(frame, matrix) for frame, matrix in zip(coords, matrices)]))
+            entry.ensemble_visualizer = visualizer
+        return entry.ensemble_visualizer
+    
+    def _update_current_controls(self):
+        """按当前视图显示的结构更新组装体按钮、轨迹控件和结构列表"""
+        entry = self.view_entries[self.current_view]
+        structure = None if entry is None else entry.structure
+        self.assembly_btn.setEnabled(
+            structure is not None and assembly_instancing(structure) is not None)
+        trajectory = None if entry is None else entry.trajectory
+        if entry is not self._player_entry or self.player.trajectory is not trajectory:
+            self._player_entry = entry
+            self.player.set_trajectory(trajectory)
+            self._set_trajectory_controls(trajectory)
+            if trajectory is not None and entry.frame:
+                self.player.seek(entry.frame)
+        self._update_workspace_controls()
+    
+    def _update_workspace_controls(self):
+        """刷新结构列表、上一个/下一个按钮和工作区内存占用提示"""
+        files = self.workspace.files
+        if [self.structure_box.itemData(i) for i in range(self.structure_box.count())] != files:
+            self.structure_box.clear()
+            for path in files:
+                self.structure_box.addItem(os.path.basename(path), path)
+        path = self.view_paths[self.current_view]
+        self.structure_box.setCurrentIndex(files.index(path) if path in files else -1)
+        self.structure_box.setToolTip(
+            f"工作区: {len(self.workspace)} 个结构, {self.workspace.nbytes / (1 << 20):.0f}"
+            f" / {self.workspace.budget / (1 << 20):.0f} MB")
+        self.prev_btn.setEnabled(path is not None and self.workspace.neighbor(path, -1) is not None)
+        self.next_btn.setEnabled(path is not None and self.workspace.neighbor(path, 1) is not None)
+    
+    @pyqtSlot(object)
+    def _on_trajectory_ready(self, trajectory: Trajectory):
+        # finished之后才发出，以缓存项中的结构判断是否已被新的加载取代
+        entry = self.workspace.get(trajectory.pdb_file, touch=False)
+        if entry is None or trajectory.structure is not entry.structure:
+            return
+        entry.trajectory = trajectory
+        if entry is self.view_entries[self.current_view]:
+            self._update_current_controls()
+        if self.overlay and entry in self.view_entries:
+            self._update_overlays()
+    
+    def _set_trajectory_controls(self, trajectory):
+        """根据轨迹帧数启用或禁用播放控件"""
+        n_frames = 0 if trajectory is None else trajectory.n_frames
+        self.play_btn.setEnabled(n_frames > 1)
+        self.frame_slider.setEnabled(n_frames > 1)
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setRange(0, max(n_frames - 1, 0))
+        self.frame_slider.setValue(0)
+        self.frame_slider.blockSignals(False)
+        self.frame_label.setText(f"帧 1/{n_frames}" if n_frames > 1 else "")
+    
+    @pyqtSlot(int, object, object)
+    def _on_frame_changed(self, index: int, coords, bond_segments):
+        """把当前视图结构的同一帧坐标原地更新到共用的缓冲，显示该结构的视图同步"""
+        entry = self._player_entry
+        if entry is None or entry.visualizer is None:
+            return
+        entry.frame = index
+        if self.overlay and coords is not entry.structure.coords:
+            # 叠合显示时当前帧叠合到第0帧，与其余模型对齐
+            atoms = alignment_atoms(entry.structure)
+            matrix, _ = kabsch(coords[atoms], entry.structure.coords[atoms])
+            coords = apply_transform(coords, matrix)
+            if bond_segments is not None:
+                bond_segments = apply_transform(bond_segments, matrix)
+        entry.visualizer.set_frame(coords, bond_segments)
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setValue(index)
+        self.frame_slider.blockSignals(False)
+        self.frame_label.setText(f"帧 {index + 1}/{self.player.n_frames}")
+    
+    @pyqtSlot(bool)
+    def _on_play_state_changed(self, playing: bool):
+        self.play_btn.setText("暂停" if playing else "播放")
+    
+    @pyqtSlot(str)
+    def _on_load_failed(self, message: str):
+        key = self._sender_key()
+        if key is None:
+            return
+        del self._loads[key]
+        self._prefetching.discard(key)
+        print(message)
+        for index in self._requesting(key):
+            self.views[index].set_status("加载失败")
+        entry = self.workspace.get(key, touch=False)
+        if entry is not None and entry not in self.view_entries:
+            self.workspace.discard(key)
+    
+    @pyqtSlot()
+    def _prune_load_threads(self):
+        # 线程结束信号排在worker所有信号之后，此时可以安全释放worker
+        self._load_threads = [(t, w) for t, w in self._load_threads if not t.isFinished()]
@@ -0,0 +1,451 @@
+import gzip
+import os
+import numpy as np
+from typing import Callable, Iterator, List, Optional
+from element_data import ELEMENT_SYMBOLS
+from bond_detection import unique_bonds
+from assembly import Assembly, parse_biomt
+
+# 每次处理的字节数，限制解析时的峰值内存
+CHUNK_BYTES = 4 << 20
+# PDB 固定列宽
+LINE_WIDTH = 80
+# gzip 文件头
+GZIP_MAGIC = b'\x1f\x8b'
+# 估计解压后大小用的 PDB 文本典型压缩比
+GZIP_RATIO = 4
+_SPACE = ord(' ')
+
+
+def _build_element_table() -> np.ndarray:
+    """两字节元素符号 (大写，右侧或左侧补空格) -> 元素编码 的查找表"""
+    table = np.zeros(1 << 16, dtype=np.uint8)
+    for code, symbol in enumerate(ELEMENT_SYMBOLS):
+        if code == 0:
+            continue
+        sym = symbol.upper().encode('ascii')
+        if len(sym) == 1:
+            table[sym[0] << 8 | _SPACE] = code
+            table[_SPACE << 8 | sym[0]] = code
+        else:
+            table[sym[0] << 8 | sym[1]] = code
+    table[ord('D') << 8 | _SPACE] = table[_SPACE << 8 | ord('D')] = 1  # 氘
+    return table
+
+
+_ELEMENT_TABLE = _build_element_table()
+# 每个原子一个值的列 (不含 conect 和 assembly)
+_ATOM_COLUMNS = ('coords', 'element_codes', 'atom_names', 'res_names', 'res_ids', 'ins_codes',
+                 'chain_ids', 'serials', 'occupancies', 'b_factors', 'hetero')
+
+
+def chain_order(chain_ids: np.ndarray) -> Optional[np.ndarray]:
+    """
+    按链分组的原子顺序: 链按首次出现排序，同一链内保持文件顺序
+
+    与 Biopython 的结构层级展开顺序一致 (例如排在所有链之后的水分子和配体归回各自的链)。
+
+    参数:
+        chain_ids: (N,) 文件顺序的链标识
+
+    返回:
+        (N,) 原子索引，已按链分组时返回None
+    """
+    if len(chain_ids) == 0:
+        return None
+    seg_starts = np.concatenate(([0], np.flatnonzero(chain_ids[1:] != chain_ids[:-1]) + 1))
+    chains, first, inverse = np.unique(chain_ids[seg_starts], return_index=True, return_inverse=True)
+    if len(chains) == len(seg_starts):
+        return None
+    rank = np.empty(len(chains), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(chains))
+    seg_order = np.argsort(rank[inverse.ravel()], kind='stable')
+    lengths = np.diff(np.append(seg_starts, len(chain_ids)))[seg_order]
+    out_starts = np.cumsum(lengths) - lengths
+    # 下标用 int32 (原子数允许时)，减少重排时的额外内存
+    dtype = np.int32 if len(chain_ids) < 2**31 else np.int64
+    order = np.arange(len(chain_ids), dtype=dtype)
+    order += np.repeat((seg_starts[seg_order] - out_starts).astype(dtype), lengths)
+    return order
+
+
+class PDBColumns:
+    def __init__(self, coords: np.ndarray, element_codes: np.ndarray,
+                 atom_names: np.ndarray, res_names: np.ndarray, res_ids: np.ndarray,
+                 ins_codes: np.ndarray, chain_ids: np.ndarray, serials: np.ndarray,
+                 b_factors: np.ndarray, occupancies: np.ndarray, hetero: np.ndarray,
+                 conect: np.ndarray, assembly: Optional[Assembly] = None):
+        """
+        列式存储的 PDB 原子数据，每列一个定长 numpy 数组
+
+        参数:
+            coords: (N,3) float32 原子坐标
+            element_codes: (N,) uint8 元素编码
+            atom_names: (N,) S4 原子名称
+            res_names: (N,) S4 残基名称
+            res_ids: (N,) int32 残基序号
+            ins_codes: (N,) S1 插入码
+            chain_ids: (N,) S4 链标识
+            serials: (N,) int32 原子序号
+            b_factors: (N,) float32 温度因子
+            occupancies: (N,) float32 占有率
+            hetero: (N,) bool 是否为 HETATM 记录
+            conect: (K,2) int32 CONECT 记录给出的键连 (原子索引)
+            assembly: 文件给出的生物组装体 (REMARK 350 或 mmCIF 组装体类别)，没有时为None
+        """
+        self.coords = coords
+        self.element_codes = element_codes
+        self.atom_names = atom_names
+        self.res_names = res_names
+        self.res_ids = res_ids
+        self.ins_codes = ins_codes
+        self.chain_ids = chain_ids
+        self.serials = serials
+        self.b_factors = b_factors
+        self.occupancies = occupancies
+        self.hetero = hetero
+        self.conect = conect
+        self.assembly = assembly
+
+    @property
+    def n_atoms(self) -> int:
+        return len(self.coords)
+
+    def group_by_chain(self) -> 'PDBColumns':
+        """把原子原地重排为按链分组的顺序 (见 chain_order)，CONECT 键连随之重新编号"""
+        order = chain_order(self.chain_ids)
+        if order is None:
+            return self
+        for name in _ATOM_COLUMNS:
+            setattr(self, name, getattr(self, name)[order])
+        if len(self.conect):
+            new_index = np.empty(len(order), dtype=order.dtype)
+            new_index[order] = np.arange(len(order), dtype=order.dtype)
+            self.conect = unique_bonds(new_index[self.conect], len(order))
+        return self
+
+
+def _field(block: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """取出定长列并视为字节串数组"""
+    return np.ascontiguousarray(block[:, start:stop]).view(f'S{stop - start}').ravel()
+
+
+def _numeric(block: np.ndarray, start: int, stop: int, dtype) -> np.ndarray:
+    """将定长数字列解析为数值，空白列视为0"""
+    field = np.ascontiguousarray(block[:, start:stop])
+    blank = np.all(field == _SPACE, axis=1)
+    field[blank, -1] = ord('0')
+    return field.view(f'S{stop - start}').ravel().astype(dtype)
+
+
+def _strip(values: np.ndarray, width: int) -> np.ndarray:
+    """去除字节串两侧空白"""
+    return np.char.strip(values).astype(f'S{width}')
+
+
+def _element_codes(block: np.ndarray) -> np.ndarray:
+    """按元素列 (77-78) 查表得到元素编码，缺失时从原子名称推断"""
+    elem = block[:, 76:78].astype(np.int64)
+    elem = np.where((elem >= ord('a')) & (elem <= ord('z')), elem - 32, elem)
+    codes = _ELEMENT_TABLE[elem[:, 0] << 8 | elem[:, 1]]
+
+    missing = codes == 0
+    if np.any(missing):
+        name = block[missing, 12:14].astype(np.int64)
+        first_blank = (name[:, 0] == _SPACE) | ((name[:, 0] >= ord('0')) & (name[:, 0] <= ord('9')))
+        pair = np.where(first_blank, _SPACE << 8 | name[:, 1], name[:, 0] << 8 | name[:, 1])
+        guess = _ELEMENT_TABLE[pair]
+        guess = np.where(guess == 0, _ELEMENT_TABLE[_SPACE << 8 | name[:, 0]], guess)
+        codes[missing] = guess
+    return codes
+
+
+class _ChunkParser:
+    """逐块解析 PDB 字节流，跨块保存模型和交替构象状态"""
+
+    def __init__(self, coords_only: bool = False, capacity: int = 0):
+        """
+        参数:
+            coords_only: 只解析坐标 (和用于排序的链标识)
+            capacity: 预估的原子数，输出列按此一次分配，不足时原地扩容
+        """
+        self.coords_only = coords_only
+        self.capacity = capacity
+        self.first_model_done = False
+        self.altloc = None
+        self.columns: Optional[dict] = None
+        self.n_atoms = 0
+        self.conect: List[np.ndarray] = []
+        self.biomt: List[bytes] = []
+
+    def feed(self, chunk: np.ndarray):
+        newlines = np.flatnonzero(chunk == ord('\n'))
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [len(chunk)]))
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        ends = ends - (chunk[np.maximum(ends - 1, 0)] == ord('\r'))
+
+        # 把每一行整理为 80 列定宽矩阵，行尾以外的列补空格 (块末尾补齐一次，各次取列共用)
+        chunk = np.concatenate((chunk, np.full(LINE_WIDTH, _SPACE, dtype=np.uint8)))
+        prefix = self._gather(chunk, starts, ends, 0, 6)
+        record = prefix.view('S6').ravel()
+        is_atom = (record == b'ATOM  ') | (record == b'HETATM')
+        is_conect = record == b'CONECT'
+        is_remark = record == b'REMARK'
+
+        # 只保留第一个模型
+        if self.first_model_done:
+            is_atom[:] = False
+        else:
+            model_end = np.flatnonzero(record == b'ENDMDL')
+            if len(model_end):
+                is_atom[model_end[0]:] = False
+                self.first_model_done = True
+
+        if np.any(is_atom):
+            block = self._gather(chunk, starts[is_atom], ends[is_atom], 0, LINE_WIDTH)
+            self._parse_atoms(block)
+        if np.any(is_conect) and not self.coords_only:
+            block = self._gather(chunk, starts[is_conect], ends[is_conect], 0, 31)
+            self._parse_conect(block)
+        if np.any(is_remark) and not self.coords_only:
+            # 生物组装体的变换 (REMARK 350)，行数很少，逐行保存
+            for start, end in zip(starts[is_remark], ends[is_remark]):
+                if bytes(chunk[start + 6:start + 10]) == b' 350':
+                    self.biomt.append(bytes(chunk[start:end]))
+
+    @staticmethod
+    def _gather(padded: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                col_start: int, col_stop: int) -> np.ndarray:
+        # 在末尾补齐 LINE_WIDTH 个空格的字节流上建立零拷贝滑动窗口视图，按行号一次取出
+        width = col_stop - col_start
+        windows = np.lib.stride_tricks.sliding_window_view(padded, width)
+        block = windows[starts + col_start]
+
+        # 行尾以外的列补空格
+        short = np.flatnonzero(ends - starts < col_stop)
+        if len(short):
+            cols = np.arange(col_start, col_stop)
+            beyond = cols[None, :] >= (ends - starts)[short, None]
+            block[short] = np.where(beyond, _SPACE, block[short])
+        return block
+
+    def _parse_atoms(self, block: np.ndarray):
+        # 交替构象: 保留无标记原子和文件中出现的第一种构象
+        altloc = block[:, 16]
+        if self.altloc is None:
+            marked = altloc[altloc != _SPACE]
+            if len(marked):
+                self.altloc = marked[0]
+        keep = altloc == _SPACE
+        if self.altloc is not None:
+            keep |= altloc == self.altloc
+        if not np.all(keep):
+            block = block[keep]
+
+        coords = np.stack([_numeric(block, 30, 38, np.float32),
+                           _numeric(block, 38, 46, np.float32),
+                           _numeric(block, 46, 54, np.float32)], axis=1)
+        if self.coords_only:
+            # 链标识用于把各帧重排为与拓扑相同的按链分组顺序
+            self._append({'coords': coords, 'chain_ids': _field(block, 21, 22)})
+            return
+        try:
+            serials = _numeric(block, 6, 11, np.int32)
+        except ValueError:
+            # hybrid-36 编号 (超过 99999 个原子)，CONECT 无法对应，按顺序编号
+            serials = np.full(len(block), -1, dtype=np.int32)
+
+        self._append({
+            'coords': coords,
+            'element_codes': _element_codes(block),
+            'atom_names': _strip(_field(block, 12, 16), 4),
+            'res_names': _strip(_field(block, 17, 20), 4),
+            'res_ids': _numeric(block, 22, 26, np.int32),
+            'ins_codes': _field(block, 26, 27),
+            'chain_ids': _field(block, 21, 22).astype('S4'),
+            'serials': serials,
+            'occupancies': _numeric(block, 54, 60, np.float32),
+            'b_factors': _numeric(block, 60, 66, np.float32),
+            'hetero': block[:, 0] == ord('H'),
+        })
+
+    def _parse_conect(self, block: np.ndarray):
+        fields = np.stack([_numeric(block, start, start + 5, np.int64)
+                           for start in range(6, 31, 5)], axis=1)
+        origin = np.repeat(fields[:, 0], 4)
+        target = fields[:, 1:].ravel()
+        valid = (origin > 0) & (target > 0)
+        self.conect.append(np.stack([origin[valid], target[valid]], axis=1))
+
+    def _append(self, values: dict):
+        # 各块直接写入预分配的输出列，避免缓存全部块再拼接 (峰值约为最终大小的两倍)
+        n = len(values['coords'])
+        if self.columns is None:
+            size = max(self.capacity, n)
+            self.columns = {name: np.empty((size,) + value.shape[1:], dtype=value.dtype)
+                            for name, value in values.items()}
+        elif self.n_atoms + n > len(self.columns['coords']):
+            # 预估不足时按 1.5 倍原地扩容 (大块内存的 realloc 通常不需要复制)
+            self._resize(max(self.n_atoms + n, len(self.columns['coords']) * 3 // 2))
+        for name, value in values.items():
+            self.columns[name][self.n_atoms:self.n_atoms + n] = value
+        self.n_atoms += n
+
+    def _resize(self, size: int):
+        for array in self.columns.values():
+            array.resize((size,) + array.shape[1:], refcheck=False)
+
+    def take_columns(self) -> Optional[dict]:
+        """取出已解析的列 (截断到实际原子数)，没有原子时返回None"""
+        if self.columns is not None:
+            self._resize(self.n_atoms)
+        columns, self.columns = self.columns, None
+        return columns
+
+    def finish(self) -> PDBColumns:
+        columns = self.take_columns()
+        if columns is None:
+            columns = {
+                'coords': np.zeros((0, 3), dtype=np.float32),
+                'element_codes': np.zeros(0, dtype=np.uint8),
+                'atom_names': np.zeros(0, dtype='S4'), 'res_names': np.zeros(0, dtype='S4'),
+                'res_ids': np.zeros(0, dtype=np.int32), 'ins_codes': np.zeros(0, dtype='S1'),
+                'chain_ids': np.zeros(0, dtype='S4'), 'serials': np.zeros(0, dtype=np.int32),
+                'occupancies': np.zeros(0, dtype=np.float32),
+                'b_factors': np.zeros(0, dtype=np.float32), 'hetero': np.zeros(0, dtype=bool),
+            }
+        columns['conect'] = self._map_conect(columns['serials'])
+        columns['assembly'] = parse_biomt(self.biomt) if self.biomt else None
+        result = PDBColumns(**columns)
+        # 不再引用原列，按链重排时旧列可逐列释放
+        columns.clear()
+        return result.group_by_chain()
+
+    def _map_conect(self, serials: np.ndarray) -> np.ndarray:
+        """将 CONECT 中的原子序号映射为原子索引并去重"""
+        if not self.conect or len(serials) == 0:
+            return np.empty((0, 2), dtype=np.int32)
+        pairs = np.concatenate(self.conect)
+        order = np.argsort(serials, kind='stable')
+        sorted_serials = serials[order]
+        pos = np.minimum(np.searchsorted(sorted_serials, pairs), len(serials) - 1)
+        found = np.all(sorted_serials[pos] == pairs, axis=1)
+        return unique_bonds(order[pos[found]], len(serials))
+
+
+def read_pdb_columns(pdb_file: str, chunk_bytes: int = CHUNK_BYTES,
+                     progress: Optional[Callable[[float], None]] = None) -> PDBColumns:
+    """
+    直接按固定列解析 PDB 的 ATOM/HETATM/CONECT 记录，不构建 Biopython 对象
+
+    文件通过内存映射按块读取 (.gz 文件边解压边解析)，峰值内存只与块大小和输出列有关。
+    多模型文件只读取第一个模型。原子按链分组输出 (见 chain_order)，与 Biopython 解析的顺序相同。
+
+    参数:
+        pdb_file: PDB文件路径 (可以是 gzip 压缩的)
+        chunk_bytes: 每块字节数
+        progress: 每处理完一块后以已读比例 (0~1) 回调，可在回调中抛出异常中止解析
+
+    返回:
+        PDBColumns对象
+    """
+    parser = _ChunkParser(capacity=estimate_atoms(pdb_file))
+    for chunk in iter_file_chunks(pdb_file, chunk_bytes, progress):
+        parser.feed(chunk)
+    return parser.finish()
+
+
+def estimate_atoms(path: str) -> int:
+    """按文件大小估计原子数 (每条记录一行 81 字节，gzip 文件按约 4 倍压缩比估计)"""
+    size = os.path.getsize(path)
+    if size and is_gzipped(path):
+        size *= GZIP_RATIO
+    return size // (LINE_WIDTH + 1)
+
+
+def is_gzipped(path: str) -> bool:
+    """按文件头判断是否为 gzip 压缩文件"""
+    with open(path, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def iter_file_chunks(path: str, chunk_bytes: int = CHUNK_BYTES,
+                     progress: Optional[Callable[[float], None]] = None) -> Iterator[np.ndarray]:
+    """
+    按块读取文本文件，块边界对齐到换行符
+
+    未压缩文件通过内存映射零拷贝切块；gzip 文件流式解压，任何时刻只有一块解压数据在内存中。
+
+    参数:
+        path: 文件路径
+        chunk_bytes: 每块字节数
+        progress: 每产出一块后以已读比例 (0~1，压缩文件按已读的压缩字节计) 回调
+
+    返回:
+        (B,) uint8 字节块的迭代器
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    if not is_gzipped(path):
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        yield from _iter_chunks(data, chunk_bytes, progress)
+        return
+
+    with open(path, 'rb') as raw, gzip.GzipFile(fileobj=raw) as stream:
+        tail = b''
+        while True:
+            block = stream.read(chunk_bytes)
+            if not block:
+                break
+            # 不完整的最后一行留到下一块
+            cut = block.rfind(b'\n') + 1
+            if cut == 0:
+                tail += block
+                continue
+            yield np.frombuffer(tail + block[:cut], dtype=np.uint8)
+            tail = block[cut:]
+            if progress is not None:
+                progress(raw.tell() / size)
+        if tail:
+            yield np.frombuffer(tail, dtype=np.uint8)
+
+
+def read_pdb_coords(data: np.ndarray, chunk_bytes: int = CHUNK_BYTES) -> np.ndarray:
+    """
+    只解析一段 PDB 字节中第一个模型的原子坐标，用于逐帧读取轨迹
+
+    参数:
+        data: (B,) uint8 字节数组 (通常是内存映射文件的一个切片)
+        chunk_bytes: 每块字节数
+
+    返回:
+        (N,3) float32 坐标，与 read_pdb_columns 相同的按链分组顺序
+    """
+    parser = _ChunkParser(coords_only=True, capacity=len(data) // (LINE_WIDTH + 1))
+    for chunk in _iter_chunks(data, chunk_bytes):
+        parser.feed(chunk)
+    columns = parser.take_columns()
+    if columns is None:
+        return np.zeros((0, 3), dtype=np.float32)
+    order = chain_order(columns['chain_ids'])
+    return columns['coords'] if order is None else columns['coords'][order]
+
+
+def _iter_chunks(data: np.ndarray, chunk_bytes: int,
+                 progress: Optional[Callable[[float], None]] = None) -> Iterator[np.ndarray]:
+    """把字节数组按块切分，块边界对齐到换行符"""
+    size = len(data)
+    start = 0
+    while start < size:
+        stop = min(start + chunk_bytes, size)
+        if stop < size:
+            newline = np.flatnonzero(data[start:stop] == ord('\n'))
+            if len(newline):
+                stop = start + int(newline[-1]) + 1
+        yield np.asarray(data[start:stop])
+        start = stop
+        if progress is not None:
+            progress(start / size)
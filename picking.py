@@ -0,0 +1,256 @@
+import numpy as np
+from typing import Optional, Tuple
+from vispy import scene
+from protein_structure import ProteinStructure
+from styling import (REPRESENTATION_BALL_AND_STICK, REPRESENTATION_POINTS, REPRESENTATION_SAS,
+                     REPRESENTATION_SPACEFILL, REPRESENTATION_SURFACE)
+from impostors import atom_radii
+
+# 拾取网格的最小单元边长 (Å)；单元边长至少为最大拾取直径，每个原子球最多跨 2x2x2 个单元
+PICK_CELL_SIZE = 4.0
+# 点精灵和卡通模式下原子的拾取半径 (Å)
+POINT_PICK_RADIUS = 1.2
+# 沿射线每批处理的单元数，逐批加倍直到找到最近的原子
+_FIRST_BATCH = 16
+
+_CORNERS = np.array([(dx, dy, dz) for dx in (0, 1) for dy in (0, 1) for dz in (0, 1)],
+                    dtype=np.int64)
+
+
+class AtomPicker:
+    def __init__(self, coords: np.ndarray, radii: np.ndarray):
+        """
+        原子拾取: 每个原子登记在其球体包围盒覆盖的所有网格单元中，查询时沿射线由近及远
+        只遍历射线穿过的单元，在第一个含有击中点的单元处停止
+
+        网格每个结构 (或轨迹帧) 只建一次，由所有视图共用。
+
+        参数:
+            coords: (N,3) 原子坐标
+            radii: (N,) 拾取半径 (Å)
+        """
+        self.coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        self.radii = np.asarray(radii, dtype=np.float32)
+        n_atoms = len(self.coords)
+        max_radius = float(self.radii.max()) if n_atoms else 0.0
+        self.cell_size = max(PICK_CELL_SIZE, 2 * max_radius)
+        if n_atoms == 0:
+            return
+        self.lower = self.coords.min(axis=0).astype(np.float64) - max_radius
+        self.upper = self.coords.max(axis=0).astype(np.float64) + max_radius
+        self.origin = self.lower
+
+        # 球体包围盒的起止单元；单元边长不小于直径，每个轴最多跨两个单元
+        radius = self.radii[:, None]
+        origin = self.origin.astype(np.float32)
+        first = ((self.coords - radius - origin) // np.float32(self.cell_size)).astype(np.int64)
+        spans = ((self.coords + radius - origin) // np.float32(self.cell_size)).astype(np.int64) > first
+        self.dims = first.max(axis=0) + 2
+        base = self._cell_keys(first)
+        keys, atoms = [], []
+        for corner in _CORNERS:
+            inside = np.ones(n_atoms, dtype=bool)
+            for axis in np.flatnonzero(corner):
+                inside &= spans[:, axis]
+            index = np.flatnonzero(inside)
+            keys.append(base[index] + int(self._cell_keys(corner[None])[0]))
+            atoms.append(index.astype(np.int32))
+        keys = np.concatenate(keys)
+        order = np.argsort(keys)
+        self.atoms = np.concatenate(atoms)[order]
+        keys = keys[order]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        self.cell_keys = keys[starts]
+        self.cell_bounds = np.append(starts, len(keys))
+
+    def _cell_keys(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def pick(self, origin: np.ndarray, direction: np.ndarray,
+             mask: Optional[np.ndarray] = None) -> Optional[Tuple[int, float]]:
+        """
+        射线拾取
+
+        参数:
+            origin: (3,) 射线起点
+            direction: (3,) 射线方向
+            mask: (N,) bool 可被拾取的原子 (如未隐藏的原子)，None 表示全部
+
+        返回:
+            (原子下标, 沿射线的距离)，未击中时返回None
+        """
+        if len(self.coords) == 0:
+            return None
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+
+        # 射线与 (按最大半径扩展的) 包围盒求交
+        parallel = direction == 0
+        if np.any(parallel & ((origin < self.lower) | (origin > self.upper))):
+            return None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t1 = (self.lower - origin) / direction
+            t2 = (self.upper - origin) / direction
+        t_near = max(float(np.max(np.where(parallel, -np.inf, np.minimum(t1, t2)))), 0.0)
+        t_far = float(np.min(np.where(parallel, np.inf, np.maximum(t1, t2))))
+        if t_far < t_near:
+            return None
+
+        # 射线穿过的单元: 各轴单元边界的交点把射线分成若干段，每段位于一个单元内
+        size = self.cell_size
+        crossings = [np.array([t_near, t_far])]
+        for axis in np.flatnonzero(~parallel):
+            a = (origin[axis] + t_near * direction[axis] - self.origin[axis]) / size
+            b = (origin[axis] + t_far * direction[axis] - self.origin[axis]) / size
+            planes = np.arange(np.ceil(min(a, b)), np.floor(max(a, b)) + 1)
+            crossings.append((self.origin[axis] + planes * size - origin[axis]) / direction[axis])
+        t = np.sort(np.concatenate(crossings))
+        t = t[(t >= t_near) & (t <= t_far)]
+        middle = origin + ((t[:-1] + t[1:]) / 2)[:, None] * direction
+        cells = np.floor((middle - self.origin) / size).astype(np.int64)
+        inside = np.all((cells >= 0) & (cells < self.dims), axis=1)
+        keys = np.where(inside, self._cell_keys(np.maximum(cells, 0)), -1)
+
+        # 由近及远分批检查: 击中点一定落在登记了该原子的单元内，
+        # 最近击中点在已检查的射线段以内时即可停止
+        start, batch = 0, _FIRST_BATCH
+        best = None
+        while start < len(keys):
+            stop = min(start + batch, len(keys))
+            chunk = keys[start:stop]
+            pos = np.minimum(np.searchsorted(self.cell_keys, chunk), len(self.cell_keys) - 1)
+            found = pos[(chunk >= 0) & (self.cell_keys[pos] == chunk)]
+            if len(found):
+                counts = self.cell_bounds[found + 1] - self.cell_bounds[found]
+                flat = np.repeat(self.cell_bounds[found] - np.cumsum(counts) + counts, counts)
+                atoms = self.atoms[flat + np.arange(len(flat))]
+                if mask is not None:
+                    atoms = atoms[mask[atoms]]
+                hit = self._nearest_hit(atoms, origin, direction)
+                if hit is not None and (best is None or hit[1] < best[1]):
+                    best = hit
+            if best is not None and best[1] <= t[stop]:
+                break
+            start, batch = stop, batch * 2
+        return None if best is None else (int(best[0]), float(best[1]))
+
+    def pick_instances(self, origin: np.ndarray, direction: np.ndarray, instances: np.ndarray,
+                       mask: Optional[np.ndarray] = None) -> Optional[Tuple[int, int, float]]:
+        """
+        实例化绘制的组装体拾取: 射线变换到每个拷贝的局部坐标后在同一份网格中查找，
+        拷贝按包围球与射线的交点由近及远检查，最近击中点比下一个包围球更近时停止
+
+        参数:
+            origin: (3,) 射线起点
+            direction: (3,) 射线方向
+            instances: (K,4,4) 拷贝的变换矩阵 (列向量约定)
+            mask: (N,) bool 可被拾取的原子，None 表示全部
+
+        返回:
+            (原子下标, 拷贝序号, 沿射线的距离)，未击中时返回None
+        """
+        if len(self.coords) == 0:
+            return None
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+
+        # 包围盒已按最大半径扩展，其外接球包含全部原子球
+        center = (self.lower + self.upper) / 2
+        rotations = instances[:, :3, :3]
+        radius = np.linalg.norm(self.upper - self.lower) / 2 * np.linalg.norm(rotations, ord=2, axis=(1, 2))
+        offset = rotations @ center + instances[:, :3, 3] - origin
+        along = offset @ direction
+        perpendicular_sq = np.einsum('ij,ij->i', offset, offset) - along * along
+        crossed = perpendicular_sq <= radius * radius
+        entry = along - np.sqrt(np.maximum(radius * radius - perpendicular_sq, 0.0))
+        exit_ = along + np.sqrt(np.maximum(radius * radius - perpendicular_sq, 0.0))
+        candidates = np.flatnonzero(crossed & (exit_ >= 0))
+        candidates = candidates[np.argsort(entry[candidates])]
+
+        inverse = np.linalg.inv(instances[candidates])
+        best = None
+        for copy, matrix in zip(candidates, inverse):
+            if best is not None and best[2] <= entry[copy]:
+                break
+            hit = self.pick(matrix[:3, :3] @ origin + matrix[:3, 3], matrix[:3, :3] @ direction, mask)
+            if hit is not None and (best is None or hit[1] < best[2]):
+                best = (hit[0], int(copy), hit[1])
+        return best
+
+    def _nearest_hit(self, atoms: np.ndarray, origin: np.ndarray, direction: np.ndarray
+                     ) -> Optional[Tuple[int, float]]:
+        """一组原子中射线最先击中的原子球 (起点在球内的原子不计)"""
+        if len(atoms) == 0:
+            return None
+        offset = self.coords[atoms] - origin
+        along = offset @ direction
+        perpendicular_sq = np.einsum('ij,ij->i', offset, offset) - along * along
+        radius_sq = self.radii[atoms].astype(np.float64) ** 2
+        entry = along - np.sqrt(np.maximum(radius_sq - perpendicular_sq, 0.0))
+        hit = (perpendicular_sq <= radius_sq) & (entry >= 0)
+        if not np.any(hit):
+            return None
+        candidates = np.flatnonzero(hit)
+        nearest = candidates[np.argmin(entry[candidates])]
+        return atoms[nearest], entry[nearest]
+
+
+def view_ray(view: scene.ViewBox, pos: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    画布像素位置在视图数据坐标中对应的射线 (透视和正交相机均适用)
+
+    参数:
+        view: ViewBox
+        pos: 画布坐标 (逻辑像素)
+
+    返回:
+        tuple: (起点 (3,), 单位方向 (3,))，起点在近裁剪面上
+    """
+    transform = view.scene.node_transform(view.canvas.scene)
+    near = transform.imap([pos[0], pos[1], -1, 1])
+    far = transform.imap([pos[0], pos[1], 1, 1])
+    near = near[:3] / near[3]
+    far = far[:3] / far[3]
+    direction = far - near
+    return near, direction / np.linalg.norm(direction)
+
+
+def pick_radii(structure: ProteinStructure, representation: str) -> np.ndarray:
+    """拾取半径: 球棍和空间填充模型取显示半径，点精灵和卡通取固定半径"""
+    if representation in (REPRESENTATION_BALL_AND_STICK, REPRESENTATION_SPACEFILL):
+        return atom_radii(structure, representation)
+    return np.full(structure.n_atoms, POINT_PICK_RADIUS, dtype=np.float32)
+
+
+def atom_picker(structure: ProteinStructure, representation: str,
+                coords: Optional[np.ndarray] = None) -> AtomPicker:
+    """
+    拾取索引: 结构自身坐标的索引按表示方式缓存在共享结构上，所有视图共用；轨迹帧坐标每次新建
+
+    参数:
+        structure: 结构
+        representation: 表示方式 (决定拾取半径)
+        coords: (N,3) 轨迹帧坐标，None 使用结构自身坐标
+    """
+    if representation in (REPRESENTATION_SURFACE, REPRESENTATION_SAS):
+        # 表面按范德华球拾取
+        representation = REPRESENTATION_SPACEFILL
+    elif representation not in (REPRESENTATION_BALL_AND_STICK, REPRESENTATION_SPACEFILL):
+        representation = REPRESENTATION_POINTS
+    if coords is None or coords is structure.coords:
+        return structure.derived(
+            f'atom_picker:{representation}',
+            lambda: AtomPicker(structure.coords, pick_radii(structure, representation)))
+    return AtomPicker(coords, pick_radii(structure, representation))
+
+
+def describe_atom(structure: ProteinStructure, index: int) -> str:
+    """状态栏显示的原子信息: 链、残基、原子名、元素和温度因子"""
+    chain = structure.chain_ids[index].decode(errors='replace').strip() or '-'
+    res_name = structure.res_names[index].decode(errors='replace').strip()
+    ins_code = structure.ins_codes[index].decode(errors='replace').strip()
+    atom_name = structure.atom_names[index].decode(errors='replace').strip()
+    return (f"{chain}:{res_name}{structure.res_ids[index]}{ins_code} {atom_name} "
+            f"({structure.elements[index]}) B={structure.b_factors[index]:.2f}")
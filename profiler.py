@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+from typing import Deque, Dict, List, Optional, Tuple
+
+# 保留的事件数上限，超出后丢弃最早的事件
+DEFAULT_MAX_EVENTS = 200_000
+# 每个视图用于统计平均/最大帧时间的最近帧数
+FRAME_WINDOW = 60
+
+# 阶段类别: 后台加载 (解析、拓扑、缓存)、可视化对象构建、逐视图绘制
+CATEGORY_LOAD = 'load'
+CATEGORY_DISPLAY = 'display'
+CATEGORY_FRAME = 'frame'
+
+# 停用时所有 stage() 返回同一个空上下文，不计时也不分配
+_NULL_STAGE = nullcontext()
+
+# (名称, 秒, 净分配字节或None, 嵌套深度)
+StageSummary = Tuple[str, float, Optional[int], int]
+
+
+class _Stage:
+    """一个计时阶段: 退出时记录耗时，跟踪分配时记录净分配和峰值"""
+
+    __slots__ = ('profiler', 'name', 'category', 'args', 'start', 'memory', 'peak', 'children')
+
+    def __init__(self, profiler: 'Profiler', name: str, category: str, args: dict):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.peak = 0
+        self.children = []
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if tracemalloc.is_tracing():
+            # 峰值计数器是全局的: 重置前把已有峰值计入外层阶段
+            self.memory, peak = tracemalloc.get_traced_memory()
+            for outer in stack:
+                outer.peak = max(outer.peak, peak)
+            tracemalloc.reset_peak()
+        else:
+            self.memory = None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+        args = dict(self.args)
+        if self.memory is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            args['alloc_bytes'] = current - self.memory
+            args['peak_bytes'] = self.peak - self.memory
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        summary = [(self.name, duration, args.get('alloc_bytes'), len(stack))] + self.children
+        if stack:
+            stack[-1].children.extend(summary)
+            self.profiler.record(self.name, self.category, self.start, duration, args, summary=False)
+        else:
+            self.profiler.record(self.name, self.category, self.start, duration, args, summary=summary)
+        return False
+
+
+class Profiler:
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        """
+        低开销的阶段计时器: 记录加载各阶段的耗时和内存分配、各视图的帧时间，
+        可导出为 Chrome/Perfetto 跟踪 JSON。停用时 stage() 返回空上下文，不产生开销
+
+        参数:
+            max_events: 保留的事件数上限
+        """
+        self.enabled = False
+        self.track_allocations = True
+        self._events: Deque[dict] = deque(maxlen=max_events)
+        self._frames: Dict[int, Deque[float]] = {}
+        # 每个类别最近一次顶层阶段及其子阶段: 类别 -> [(名称, 秒, 净分配字节或None, 深度)]
+        self._latest: Dict[str, List[StageSummary]] = {}
+        self._threads: Dict[int, str] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._started_tracemalloc = False
+
+    def enable(self, enabled: bool = True, allocations: Optional[bool] = None):
+        """
+        运行时开启或关闭记录
+
+        参数:
+            enabled: 是否记录
+            allocations: 是否用 tracemalloc 跟踪每个阶段的内存分配 (会拖慢分配密集的代码)，
+                         None 保持当前设置
+        """
+        if allocations is not None:
+            self.track_allocations = allocations
+        self.enabled = enabled
+        tracing = enabled and self.track_allocations
+        if tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        elif not tracing and self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def stage(self, name: str, category: str = CATEGORY_LOAD, **args):
+        """
+        计时上下文: with profiler.stage('parse'): ...
+
+        参数:
+            name: 阶段名称
+            category: 类别 (CATEGORY_LOAD、CATEGORY_DISPLAY 等)
+            args: 附加在跟踪事件上的参数 (如原子数)
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, category, args)
+
+    def instant(self, name: str, category: str = CATEGORY_LOAD, **args):
+        """记录瞬时事件 (如加载失败)"""
+        if not self.enabled:
+            return
+        self._append({'name': name, 'cat': category, 'ph': 'i', 's': 't',
+                      'ts': self._timestamp(time.perf_counter()), 'args': args})
+
+    def record(self, name: str, category: str, start: float, duration: float,
+               args: Optional[dict] = None, summary=True):
+        """
+        记录一个已完成的阶段
+
+        参数:
+            name: 阶段名称
+            category: 类别
+            start: 开始时刻 (time.perf_counter())
+            duration: 耗时 (秒)
+            args: 附加参数
+            summary: 作为类别最近一次阶段显示在摘要中的 [StageSummary]；
+                     True 表示只有本阶段，False 表示不更新摘要 (嵌套的子阶段)
+        """
+        args = args or {}
+        self._append({'name': name, 'cat': category, 'ph': 'X', 'ts': self._timestamp(start),
+                      'dur': duration * 1e6, 'args': args})
+        if summary is True:
+            summary = [(name, duration, args.get('alloc_bytes'), 0)]
+        if summary:
+            with self._lock:
+                self._latest[category] = summary
+
+    def frame(self, view_index: int, start: float, duration: float):
+        """记录一个视图的一次绘制"""
+        self.record(f'view{view_index + 1}', CATEGORY_FRAME, start, duration)
+        with self._lock:
+            frames = self._frames.setdefault(view_index, deque(maxlen=FRAME_WINDOW))
+            frames.append(duration)
+
+    def frame_stats(self, view_index: int) -> Optional[Tuple[float, float]]:
+        """视图最近若干帧的 (平均, 最大) 绘制时间 (秒)，没有记录时返回None"""
+        with self._lock:
+            frames = list(self._frames.get(view_index, ()))
+        if not frames:
+            return None
+        return sum(frames) / len(frames), max(frames)
+
+    def latest_stages(self, category: str = CATEGORY_LOAD) -> List[StageSummary]:
+        """
+        类别中最近一次顶层阶段及其子阶段
+
+        返回:
+            [(名称, 秒, 净分配字节或None, 深度)]，顶层阶段在前
+        """
+        with self._lock:
+            return list(self._latest.get(category, ()))
+
+    def overlay_text(self, view_index: int) -> Optional[str]:
+        """
+        视图状态标签中显示的摘要: 帧时间，最近一次加载和构建的总耗时及最慢的阶段
+
+        返回:
+            多行文本，没有任何记录时返回None
+        """
+        lines = []
+        stats = self.frame_stats(view_index)
+        if stats is not None:
+            lines.append(f"帧 {stats[0] * 1e3:.1f} ms (最大 {stats[1] * 1e3:.1f} ms)")
+        for category, label in ((CATEGORY_LOAD, "加载"), (CATEGORY_DISPLAY, "构建")):
+            stages = self.latest_stages(category)
+            if not stages:
+                continue
+            text = f"{label} {stages[0][1] * 1e3:.0f} ms"
+            children = [stage for stage in stages if stage[3] == 1] or stages
+            slowest = max(children, key=lambda stage: stage[1])
+            text += f" ({slowest[0]} {slowest[1] * 1e3:.0f} ms"
+            if slowest[2] is not None:
+                text += f", {slowest[2] / (1 << 20):+.1f} MB"
+            lines.append(text + ")")
+        return "\n".join(lines) if lines else None
+
+    def trace_events(self) -> List[dict]:
+        """Chrome 跟踪格式的事件列表 (含线程名元数据)"""
+        pid = os.getpid()
+        with self._lock:
+            events = [dict(event, pid=pid) for event in self._events]
+            threads = dict(self._threads)
+        meta = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                for tid, name in threads.items()]
+        return meta + events
+
+    def export_trace(self, path: str):
+        """
+        写出 Chrome/Perfetto 可打开的跟踪 JSON (chrome://tracing 或 ui.perfetto.dev)
+
+        参数:
+            path: 输出文件路径
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
+
+    def clear(self):
+        """清除已记录的事件和统计"""
+        with self._lock:
+            self._events.clear()
+            self._frames.clear()
+            self._latest.clear()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _timestamp(self, moment: float) -> float:
+        return (moment - self._origin) * 1e6
+
+    def _append(self, event: dict):
+        thread = threading.current_thread()
+        event['tid'] = thread.ident
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self._events.append(event)
+
+
+_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+    """
+    进程内共享的性能记录器；环境变量 PROTEINCODE_PROFILE=1 时启动即开启
+    (PROTEINCODE_PROFILE=time 只计时，不跟踪内存分配)
+    """
+    return _profiler
+
+
+if os.environ.get('PROTEINCODE_PROFILE'):
+    _profiler.enable(True, allocations=os.environ['PROTEINCODE_PROFILE'] != 'time')
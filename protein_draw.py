@@ -1,21 +1,36 @@
-from Bio.PDB import PDBParser, Selection, NeighborSearch
-from Bio.PDB.PDBExceptions import PDBConstructionWarning
+import gzip
 import warnings
 import numpy as np
-from collections import defaultdict
-from typing import Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
+from protein_structure import ProteinStructure
+from pdb_reader import PDBColumns, is_gzipped
+from structure_formats import FORMAT_BCIF, FORMAT_MMCIF, detect_format, read_structure_columns
+from residue_topology import build_topology
+from secondary_structure import secondary_structure
+from hierarchy import hierarchy_index
+from structure_cache import StructureCache, get_default_cache
+from profiler import get_profiler
+
+class LoadCancelled(Exception):
+    """加载过程被取消"""
+
 
 class ProteinDataLoader:
-    def __init__(self, pdb_file: str):
+    def __init__(self, pdb_file: str, cache: Optional[StructureCache] = None,
+                 use_cache: bool = True):
         """
         升级版蛋白质数据加载器
         
         参数:
             pdb_file: PDB文件路径
+            cache: 结构缓存，默认使用 get_default_cache()
+            use_cache: 为False时不读写缓存
         """
         self.pdb_file = pdb_file
-        self.structure = None
+        self.cache = (cache or get_default_cache()) if use_cache else None
+        self.structure = None  # Biopython对象模型，仅在get_structure()时构建
         self._atom_cache = None
+        self.columns = None
         
     def parse_pdb(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
@@ -27,125 +42,157 @@ class ProteinDataLoader:
                   元素类型: (N,) numpy数组
                   键连关系: (M,2) numpy数组
         """
+        structure = self.load_structure()
+        if structure is None:
+            return None, None, None
+        return structure.coords, structure.elements, structure.bonds
+    
+    def load_structure(self, progress: Optional[Callable[[int, str], None]] = None,
+                       on_atoms: Optional[Callable[[ProteinStructure], None]] = None
+                       ) -> Optional[ProteinStructure]:
+        """
+        解析PDB文件并构建可在多个视图间共享的结构对象
+        
+        参数:
+            progress: 进度回调 (百分比, 阶段名称)，在回调中抛出LoadCancelled可中止加载
+            on_atoms: 原子坐标解析完成、键连尚未计算时的回调，用于分阶段显示
+        
+        返回:
+            ProteinStructure对象，解析失败时返回None
+        """
+        report = progress or (lambda percent, stage: None)
+        profiler = get_profiler()
         try:
-            # 解析PDB文件
-            self._parse_structure()
-            
-            # 获取所有原子
-            atoms = self._get_atoms()
-            
-            # 提取原子坐标和元素类型
-            atom_coords = np.array([atom.get_coord() for atom in atoms])
-            elements = np.array([atom.element for atom in atoms])
-            
-            # 提取键连关系
-            bonds = self._extract_bonds(atoms)
-            
-            return atom_coords, elements, bonds
+            with profiler.stage('load_structure', file=self.pdb_file):
+                # 优先使用缓存
+                with profiler.stage('cache_read'):
+                    cached = self._load_cached()
+                if cached is not None:
+                    report(100, "完成")
+                    return cached
+                
+                # 按列快速解析原子记录
+                report(0, "解析")
+                with profiler.stage('parse'):
+                    columns = self.read_columns(
+                        progress=lambda fraction: report(int(fraction * 60), "解析"))
+                
+                # 原子已就绪，拓扑仍在计算
+                atoms_only = ProteinStructure.from_columns(columns, None, source=self.pdb_file)
+                if on_atoms is not None:
+                    with profiler.stage('on_atoms', n_atoms=atoms_only.n_atoms):
+                        on_atoms(atoms_only)
+                
+                # 提取键连关系
+                report(60, "键连")
+                with profiler.stage('bonds'):
+                    bonds = self._extract_bonds(columns)
+                
+                structure = atoms_only.with_bonds(bonds)
+                with profiler.stage('cache_write'):
+                    self._store_cached(structure)
+                
+                report(100, "完成")
+                return structure
             
+        except LoadCancelled:
+            profiler.instant('load_cancelled', file=self.pdb_file)
+            raise
         except Exception as e:
+            profiler.instant('load_failed', file=self.pdb_file, error=str(e))
             print(f"Error parsing PDB file: {e}")
-            return None, None, None
+            return None
+    
+    def _load_cached(self) -> Optional[ProteinStructure]:
+        """从缓存读取结构，未命中时返回None"""
+        if self.cache is None:
+            return None
+        return self.cache.load(self.pdb_file)
+    
+    def _store_cached(self, structure: ProteinStructure):
+        """写入缓存，缓存失败不影响加载"""
+        if self.cache is None:
+            return
+        try:
+            self.cache.store(self.pdb_file, structure)
+        except OSError as e:
+            print(f"Warning: could not write structure cache: {e}")
+    
+    def read_columns(self, progress: Optional[Callable[[float], None]] = None) -> PDBColumns:
+        """直接解析原子记录 (PDB、mmCIF、BinaryCIF，可 gzip 压缩)，不经过Biopython"""
+        if self.columns is None:
+            self.columns = read_structure_columns(self.pdb_file, progress=progress)
+        return self.columns
+    
+    def get_structure(self):
+        """
+        获取Biopython对象模型，只有调用方显式需要时才导入并解析
+        
+        返回:
+            Bio.PDB.Structure对象
+        """
+        if self.structure is None:
+            self._parse_structure()
+        return self.structure
     
     def _parse_structure(self):
-        """解析PDB结构"""
+        """解析PDB或mmCIF结构 (BinaryCIF没有对应的Biopython解析器)"""
+        from Bio.PDB import MMCIFParser, PDBParser
+        from Bio.PDB.PDBExceptions import PDBConstructionWarning
+        
         warnings.simplefilter('ignore', PDBConstructionWarning)
-        parser = PDBParser(QUIET=True)
-        self.structure = parser.get_structure("protein", self.pdb_file)
+        file_format = detect_format(self.pdb_file)
+        if file_format == FORMAT_BCIF:
+            raise ValueError(f"Biopython cannot parse BinaryCIF: {self.pdb_file}")
+        parser = MMCIFParser(QUIET=True) if file_format == FORMAT_MMCIF else PDBParser(QUIET=True)
+        opener = gzip.open if is_gzipped(self.pdb_file) else open
+        with opener(self.pdb_file, 'rt') as handle:
+            self.structure = parser.get_structure("protein", handle)
         self._atom_cache = None  # 清除缓存
     
     def _get_atoms(self):
         """获取所有原子并缓存"""
+        from Bio.PDB import Selection
+        
         if self._atom_cache is None:
-            self._atom_cache = list(Selection.unfold_entities(self.structure, 'A'))
+            self._atom_cache = list(Selection.unfold_entities(self.get_structure(), 'A'))
         return self._atom_cache
     
-    def _extract_bonds(self, atoms) -> np.ndarray:
+    def _extract_bonds(self, columns: PDBColumns) -> np.ndarray:
         """
-        提取键连关系，优先使用CONECT记录，否则自动检测
+        提取键连关系: 标准残基按模板成键，残基间连接按链内顺序和距离判断，
+        HETATM的CONECT记录合并进来，只有未知残基才做距离检测
         
         参数:
-            atoms: 原子列表
+            columns: 列式原子数据
             
         返回:
             (M,2) numpy数组，表示原子间的键连
         """
-        # 尝试从CONECT记录中获取
-        conect_bonds = self._get_conect_bonds(atoms)
-        if len(conect_bonds) > 0:
-            return conect_bonds
-            
-        # 如果没有CONECT记录，使用距离自动检测
-        return self._detect_bonds_by_distance(atoms)
-    
-    def _get_conect_bonds(self, atoms) -> np.ndarray:
-        """从CONECT记录中提取键连关系"""
-        atom_dict = {atom.get_serial_number(): idx for idx, atom in enumerate(atoms)}
-        bonds = []
-        
-        for model in self.structure:
-            for chain in model:
-                for residue in chain:
-                    for atom in residue:
-                        if hasattr(atom, 'xtra') and 'CONECT' in atom.xtra:
-                            atom1 = atom.get_serial_number()
-                            if atom1 in atom_dict:
-                                for atom2 in atom.xtra['CONECT']:
-                                    if atom2 in atom_dict and atom1 != atom2:
-                                        bond = sorted([atom_dict[atom1], atom_dict[atom2]])
-                                        if bond not in bonds:
-                                            bonds.append(bond)
-        
-        return np.array(bonds) if bonds else np.empty((0, 2), dtype=int)
+        return build_topology(columns)
     
-    def _detect_bonds_by_distance(self, atoms, max_bond_length=1.8) -> np.ndarray:
-        """根据原子间距离自动检测键连关系，排除氢原子之间的键联"""
-        coords = np.array([atom.get_coord() for atom in atoms])
-        ns = NeighborSearch(atoms)
-        bonds = set()
-        
-        for i, atom in enumerate(atoms):
-            # 跳过氢原子作为键连起点的情况
-            if atom.element == 'H':
-                continue
-                
-            # 搜索半径内的邻近原子
-            for neighbor in ns.search(atom.get_coord(), max_bond_length, level='A'):
-                j = atoms.index(neighbor)
-                
-                # 排除氢原子之间的键联
-                if i < j and not (atom.element == 'H' and neighbor.element == 'H'):
-                    bonds.add((i, j))
-        
-        # 添加肽键 (C-N)
-        self._add_peptide_bonds(atoms, bonds)
+    def get_secondary_structure(self) -> Optional[np.ndarray]:
+        """
+        获取二级结构信息 (由主链氢键计算，不依赖HELIX/SHEET记录)
         
-        return np.array(sorted(bonds), dtype=int) if bonds else np.empty((0, 2), dtype=int)
-
+        返回:
+            (R,) uint8 每个残基的二级结构编码 (见 secondary_structure.SS_LETTERS)，
+            解析失败时返回None
+        """
+        structure = self.load_structure()
+        if structure is None:
+            return None
+        return secondary_structure(structure)
     
-    def _add_peptide_bonds(self, atoms, bonds):
-        """添加肽键连接"""
-        residues = list(Selection.unfold_entities(self.structure, 'R'))
+    def get_chain_info(self) -> Optional[List[Dict]]:
+        """
+        获取链信息 (由层级索引汇总，不遍历逐个原子的对象)
         
-        for i in range(len(residues) - 1):
-            try:
-                # 当前残基的C原子
-                c_atom = residues[i]['C']
-                # 下一个残基的N原子
-                n_atom = residues[i+1]['N']
-                
-                c_idx = atoms.index(c_atom)
-                n_idx = atoms.index(n_atom)
-                bonds.add((c_idx, n_idx))
-            except KeyError:
-                continue
-    
-    def get_secondary_structure(self):
-        """获取二级结构信息"""
-        # 实现二级结构解析逻辑
-        pass
-    
-    def get_chain_info(self):
-        """获取链信息"""
-        # 实现链信息解析逻辑
-        pass
+        返回:
+            每个链段一项 {'chain', 'residues', 'atoms', 'first_residue', 'last_residue'}，
+            解析失败时返回None
+        """
+        structure = self.load_structure()
+        if structure is None:
+            return None
+        return hierarchy_index(structure).chain_info()
@@ -0,0 +1,250 @@
+import copy
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, Optional
+from element_data import element_symbols
+
+
+def _freeze(array: np.ndarray) -> np.ndarray:
+    """返回只读的连续数组视图，防止共享数据被某个视图意外修改 (调用者的数组本身保持可写)"""
+    array = np.ascontiguousarray(array).view()
+    array.flags.writeable = False
+    return array
+
+
+def hierarchy_offsets(chain_ids: np.ndarray, res_ids: np.ndarray, ins_codes: np.ndarray):
+    """
+    计算 链 -> 残基 -> 原子 的CSR式偏移数组 (要求同一残基的原子连续存放)
+
+    参数:
+        chain_ids: (N,) 链标识
+        res_ids: (N,) 残基序号
+        ins_codes: (N,) 插入码
+
+    返回:
+        tuple: (residue_offsets, chain_offsets)
+               residue_offsets: (R+1,) int64，第r个残基的原子为 [offsets[r], offsets[r+1])
+               chain_offsets: (C+1,) int64，第c个链段的残基为 [offsets[c], offsets[c+1])
+               (链标识相同的连续原子组成一个链段，读取器已按链分组，每条链通常只有一个链段)
+    """
+    n_atoms = len(chain_ids)
+    if n_atoms == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    new_chain = np.ones(n_atoms, dtype=bool)
+    new_chain[1:] = chain_ids[1:] != chain_ids[:-1]
+    new_residue = new_chain.copy()
+    new_residue[1:] |= (res_ids[1:] != res_ids[:-1]) | (ins_codes[1:] != ins_codes[:-1])
+
+    residue_starts = np.flatnonzero(new_residue)
+    residue_offsets = np.append(residue_starts, n_atoms)
+    chain_offsets = np.append(np.flatnonzero(new_chain[residue_starts]), len(residue_starts))
+    return residue_offsets.astype(np.int64), chain_offsets.astype(np.int64)
+
+
+def _nbytes(value, seen: set, depth: int = 2) -> int:
+    """数组及容器/对象中 (向下 depth 层) 数组的字节数，同一数组 (包括同一数据的只读视图) 只计一次"""
+    if isinstance(value, np.ndarray):
+        key = (value.__array_interface__['data'][0], value.nbytes)
+        if key in seen:
+            return 0
+        seen.add(key)
+        return value.nbytes
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if depth == 0:
+        return 0
+    if isinstance(value, dict):
+        values = value.values()
+    elif isinstance(value, (list, tuple)):
+        values = value
+    elif hasattr(value, '__dict__'):
+        values = vars(value).values()
+    else:
+        return 0
+    return sum(_nbytes(item, seen, depth - 1) for item in values)
+
+
+class ProteinStructure:
+    def __init__(self, coords: np.ndarray, element_codes: np.ndarray, bonds: Optional[np.ndarray],
+                 atom_names: Optional[np.ndarray] = None,
+                 res_names: Optional[np.ndarray] = None,
+                 res_ids: Optional[np.ndarray] = None,
+                 chain_ids: Optional[np.ndarray] = None,
+                 ins_codes: Optional[np.ndarray] = None,
+                 serials: Optional[np.ndarray] = None,
+                 b_factors: Optional[np.ndarray] = None,
+                 occupancies: Optional[np.ndarray] = None,
+                 hetero: Optional[np.ndarray] = None,
+                 source: Optional[str] = None,
+                 assembly=None):
+        """
+        不可变的蛋白质结构数据，每个文件只解析一次，由所有视图共享
+
+        参数:
+            coords: (N,3) 原子坐标
+            element_codes: (N,) uint8 元素编码
+            bonds: (M,2) 键连关系(原子索引)，为None表示拓扑尚未计算完成
+            atom_names: (N,) 原子名称
+            res_names: (N,) 所属残基名称
+            res_ids: (N,) 所属残基序号
+            chain_ids: (N,) 所属链标识
+            ins_codes: (N,) 残基插入码
+            serials: (N,) 原子序号
+            b_factors: (N,) 温度因子
+            occupancies: (N,) 占有率
+            hetero: (N,) 是否为 HETATM 记录
+            source: 来源文件路径
+            assembly: 生物组装体 (assembly.Assembly)，原子只存不对称单元一份，没有时为None
+        """
+        n_atoms = len(coords)
+        self.coords = _freeze(np.asarray(coords, dtype=np.float32).reshape(n_atoms, 3))
+        self.element_codes = _freeze(np.asarray(element_codes, dtype=np.uint8))
+        self.has_topology = bonds is not None
+        if bonds is None:
+            bonds = np.empty((0, 2), dtype=np.int32)
+        self.bonds = _freeze(np.asarray(bonds, dtype=np.int32).reshape(-1, 2))
+
+        # 层级信息 (链 -> 残基 -> 原子)，按原子展开
+        self.atom_names = _freeze(self._column(atom_names, n_atoms, b'', 'S4'))
+        self.res_names = _freeze(self._column(res_names, n_atoms, b'', 'S4'))
+        self.res_ids = _freeze(self._column(res_ids, n_atoms, 0, np.int32))
+        self.chain_ids = _freeze(self._column(chain_ids, n_atoms, b'', 'S4'))
+        self.ins_codes = _freeze(self._column(ins_codes, n_atoms, b' ', 'S1'))
+
+        # 原子属性
+        self.serials = _freeze(self._column(serials, n_atoms, 0, np.int32))
+        self.b_factors = _freeze(self._column(b_factors, n_atoms, 0, np.float32))
+        self.occupancies = _freeze(self._column(occupancies, n_atoms, 1, np.float32))
+        self.hetero = _freeze(self._column(hetero, n_atoms, False, bool))
+
+        self.source = source
+        self.assembly = assembly
+
+        # 派生数据缓存 (颜色、尺寸、键线段等渲染缓冲)
+        self._derived: Dict[str, Any] = {}
+        self._bond_keys = set()
+        self._derived_lock = threading.Lock()
+        # 正在构建的派生数据各自的锁，同一键只构建一次，不同键可以并行构建
+        self._building: Dict[str, threading.RLock] = {}
+
+    @classmethod
+    def from_columns(cls, columns, bonds: Optional[np.ndarray], source: Optional[str] = None
+                     ) -> 'ProteinStructure':
+        """由 pdb_reader.PDBColumns 列数据构建结构"""
+        return cls(
+            columns.coords, columns.element_codes, bonds,
+            atom_names=columns.atom_names,
+            res_names=columns.res_names,
+            res_ids=columns.res_ids,
+            chain_ids=columns.chain_ids,
+            ins_codes=columns.ins_codes,
+            serials=columns.serials,
+            b_factors=columns.b_factors,
+            occupancies=columns.occupancies,
+            hetero=columns.hetero,
+            source=source,
+            assembly=columns.assembly
+        )
+
+    @staticmethod
+    def _column(values, n_atoms: int, fill, dtype=None) -> np.ndarray:
+        """规范化按原子展开的列，缺失时用默认值填充"""
+        if values is None:
+            return np.full(n_atoms, fill, dtype=dtype)
+        return np.asarray(values, dtype=dtype)
+
+    @property
+    def elements(self) -> np.ndarray:
+        """(N,) 元素符号"""
+        return self.derived('elements', lambda: element_symbols(self.element_codes))
+
+    @property
+    def residue_offsets(self) -> np.ndarray:
+        """(R+1,) 残基 -> 原子 偏移数组"""
+        return self._hierarchy()[0]
+
+    @property
+    def chain_offsets(self) -> np.ndarray:
+        """(C+1,) 链段 -> 残基 偏移数组"""
+        return self._hierarchy()[1]
+
+    def _hierarchy(self):
+        return self.derived('hierarchy', lambda: tuple(
+            _freeze(a) for a in hierarchy_offsets(self.chain_ids, self.res_ids, self.ins_codes)))
+
+    @property
+    def n_atoms(self) -> int:
+        return len(self.coords)
+
+    @property
+    def n_bonds(self) -> int:
+        return len(self.bonds)
+
+    @property
+    def nbytes(self) -> int:
+        """原子列、键连和已缓存派生数据 (颜色、层级索引、卡通网格等) 占用的内存字节数"""
+        seen = set()
+        total = sum(_nbytes(value, seen) for value in vars(self).values()
+                    if isinstance(value, np.ndarray))
+        with self._derived_lock:
+            derived = list(self._derived.values())
+        return total + sum(_nbytes(value, seen) for value in derived)
+
+    def with_bonds(self, bonds: np.ndarray) -> 'ProteinStructure':
+        """
+        返回共享全部原子数据、仅键连不同的新结构，用于分阶段加载
+
+        与键连无关的派生数据会被继承，不需要重新计算。
+
+        参数:
+            bonds: (M,2) 键连关系
+
+        返回:
+            新的ProteinStructure对象
+        """
+        structure = copy.copy(self)
+        structure.has_topology = True
+        structure.bonds = _freeze(np.asarray(bonds, dtype=np.int32).reshape(-1, 2))
+        with self._derived_lock:
+            structure._derived = {key: value for key, value in self._derived.items()
+                                  if key not in self._bond_keys}
+        structure._bond_keys = set()
+        structure._derived_lock = threading.Lock()
+        structure._building = {}
+        return structure
+
+    def derived(self, key: str, factory: Callable[[], Any], uses_bonds: bool = False) -> Any:
+        """
+        获取派生数据，首次访问时构建并缓存，之后所有视图复用同一份结果
+
+        参数:
+            key: 缓存键
+            factory: 无参构建函数
+            uses_bonds: 数据是否依赖键连 (依赖键连的数据不会被with_bonds继承)
+
+        返回:
+            缓存的派生数据
+        """
+        with self._derived_lock:
+            if key in self._derived:
+                return self._derived[key]
+            key_lock = self._building.setdefault(key, threading.RLock())
+
+        # 构建在键锁内、全局锁外进行，耗时的构建 (如表面) 不会阻塞其他键的读取和构建
+        with key_lock:
+            with self._derived_lock:
+                if key in self._derived:
+                    return self._derived[key]
+            value = factory()
+            if isinstance(value, np.ndarray):
+                value = _freeze(value)
+            with self._derived_lock:
+                self._derived[key] = value
+                if uses_bonds:
+                    self._bond_keys.add(key)
+                self._building.pop(key, None)
+            return value
+
+    def __repr__(self) -> str:
+        return f"ProteinStructure(source={self.source!r}, atoms={self.n_atoms}, bonds={self.n_bonds})"
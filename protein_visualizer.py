@@ -1,17 +1,90 @@
 import numpy as np
 from vispy import scene, visuals
+from vispy.visuals.transforms import NullTransform
 from protein_draw import ProteinDataLoader
-from typing import Optional, Tuple
+from protein_structure import ProteinStructure
+from lod import LOD_MIN_ATOMS, LODRenderer
+from styling import (COLOR_SCHEMES, REPRESENTATIONS, REPRESENTATION_BALL_AND_STICK,
+                     REPRESENTATION_CARTOON, REPRESENTATION_POINTS, REPRESENTATION_SAS,
+                     REPRESENTATION_SURFACE, SCHEME_ELEMENT, StyleEngine, recolor_markers)
+from shared_visuals import SegmentsVisual, SharedVisual, ViewLayer, instance_transform
+from impostors import AtomTextures, CylinderImpostorVisual, SphereImpostorVisual, atom_radii
+from cartoon import (CartoonVisual, build_cartoon, cartoon_level, cartoon_ligand_atoms,
+                     cartoon_ligand_bonds, cartoon_mesh)
+from secondary_structure import backbone_atoms
+from hierarchy import hierarchy_index
+from selection import select_atoms
+from picking import AtomPicker, atom_picker, view_ray
+from assembly import assembly_bounds, assembly_instancing
+from profiler import CATEGORY_DISPLAY, get_profiler
+from element_data import element_codes
+from interactions import INTERACTION_KINDS, InteractionAnalyzer, Interactions, overlay_segments
+from surface import (SURFACE_MOLECULAR, SURFACE_SOLVENT_ACCESSIBLE, SurfaceVisual, build_surface,
+                     surface_atoms, surface_level, surface_mesh)
+from typing import Optional, Sequence, Tuple, Union
+
+# 四个标准视角 (方位角, 仰角)，多视图窗口和批量渲染共用
+STANDARD_CAMERA_VIEWS = (
+    (30, 20),    # 视图1: 默认视角
+    (120, 20),   # 视图2: 旋转90度
+    (30, 70),    # 视图3: 俯视角度
+    (-60, 0),    # 视图4: 侧视角度
+)
+
+# 表面表示方式对应的表面类型
+SURFACE_REPRESENTATIONS = {REPRESENTATION_SURFACE: SURFACE_MOLECULAR,
+                           REPRESENTATION_SAS: SURFACE_SOLVENT_ACCESSIBLE}
+
+# 着色器预热用的合成肽段: 理想 α 螺旋上的丙氨酸主链 (N、CA、C、O)，
+# 每个原子的 (柱面半径 Å, 相位角 度, 高度 Å)，每个残基转 100 度、上升 1.5 Å
+_WARM_UP_RESIDUES = 6
+_WARM_UP_BACKBONE = (('N', 'N', 1.55, -28.0, -0.9), ('CA', 'C', 2.3, 0.0, 0.0),
+                     ('C', 'C', 1.6, 28.0, 0.9), ('O', 'O', 2.0, 45.0, 2.1))
+
+def _warm_up_structure() -> ProteinStructure:
+    """用于预热着色器的几个残基的合成结构 (含主链键连，可生成卡通)"""
+    n_atoms = len(_WARM_UP_BACKBONE)
+    residue = np.repeat(np.arange(_WARM_UP_RESIDUES), n_atoms)
+    radius, phase, rise = (np.tile([atom[k] for atom in _WARM_UP_BACKBONE], _WARM_UP_RESIDUES)
+                           for k in (2, 3, 4))
+    angle = np.radians(residue * 100.0 + phase)
+    coords = np.stack([radius * np.cos(angle), radius * np.sin(angle), residue * 1.5 + rise], axis=1)
+    start = np.arange(_WARM_UP_RESIDUES) * n_atoms
+    bonds = np.concatenate([np.stack([start, start + 1], axis=1),          # N-CA
+                            np.stack([start + 1, start + 2], axis=1),      # CA-C
+                            np.stack([start + 2, start + 3], axis=1),      # C=O
+                            np.stack([start[:-1] + 2, start[1:]], axis=1)  # 肽键
+                            ]).astype(np.int32)
+    return ProteinStructure(
+        coords.astype(np.float32),
+        np.tile(element_codes([atom[1] for atom in _WARM_UP_BACKBONE]), _WARM_UP_RESIDUES),
+        bonds,
+        atom_names=np.tile(np.array([atom[0] for atom in _WARM_UP_BACKBONE], dtype='S4'),
+                           _WARM_UP_RESIDUES),
+        res_names=np.full(len(residue), b'ALA', dtype='S4'),
+        res_ids=(residue + 1).astype(np.int32),
+        chain_ids=np.full(len(residue), b'A', dtype='S4'))
 
 class ProteinVisualizer:
-    def __init__(self, view: scene.ViewBox):
+    def __init__(self, views: Union[scene.ViewBox, Sequence[scene.ViewBox]]):
         """
         独立的蛋白质3D可视化器(无坐标轴)
         
+        传入同一画布上的多个ViewBox时，顶点数据只上传一次，由各视图的相机分别绘制。
+        
         参数:
-            view: vispy的ViewBox对象
+            views: vispy的ViewBox对象，或同一画布上的多个ViewBox
         """
-        self.view = view
+        self.views = [views] if isinstance(views, scene.ViewBox) else list(views)
+        self.view = self.views[0]
+        # 可视化对象挂在每个视图的图层节点下: 图层从视图中摘下即停止在该视图中显示本结构，
+        # GPU缓冲保留，多结构工作区切换回来时无需重建
+        self.layers = [ViewLayer(parent=view.scene) for view in self.views]
+        self.shown = [True] * len(self.views)
+        # 各视图中图层的刚体变换 (列向量约定的 (4,4)，叠合显示到另一结构上)，None 为不变换
+        self.view_transforms = [None] * len(self.views)
+        # 各视图中是否显示相互作用连线 (叠合到另一结构上显示时不画)
+        self.interaction_views = [True] * len(self.views)
         self._setup_visuals()
         
     def _setup_visuals(self):
@@ -27,10 +100,45 @@ class ProteinVisualizer:
             'OTHERS': (0.8, 0.2, 0.8, 1) # 紫色
         }
         
-        # 可视化对象
+        # 查找表配色引擎和当前配色方案
+        self.styles = StyleEngine(self.element_colors)
+        self.color_scheme = SCHEME_ELEMENT
+        self.bond_color = (0.7, 0.7, 0.7, 1)
+        # 原子表示方式: 点精灵，按原子半径光线求交的球棍/空间填充模型，卡通，或表面
+        self.representation = REPRESENTATION_POINTS
+        
+        # 当前显示的共享结构
+        self.structure = None
+        
+        # 可视化对象 (SharedVisual，每个视图各有一个节点)
         self.atoms_visual = None
         self.bonds_visual = None
         self.bounding_box = None
+        # 球棍/空间填充模型共用的原子纹理 (坐标、半径、颜色)，点精灵模式为None
+        self.atom_textures = None
+        # 卡通模式的主链网格，其余模式为None
+        self.cartoon_visual = None
+        # 表面模式的表面网格 (按原子着色)，其余模式为None
+        self.surface_visual = None
+        # 点精灵模式下大结构的细节层次渲染器，小结构为None
+        self.lod = None
+        # 交互期间 (拖动相机) 使用低开销绘制
+        self.interactive = False
+        # 选择: 显示的原子掩码 (None 表示全部显示)，以及按顺序叠加在配色方案上的 (掩码, 颜色)
+        self.atom_mask = None
+        self.selection_styles = []
+        # 当前轨迹帧坐标 (None 为结构自身坐标) 及其拾取网格
+        self.frame_coords = None
+        self._frame_picker = None
+        # 生物组装体: 是否显示全部拷贝，当前实例化绘制的 (K,4,4) 变换 (None 为只画不对称单元)
+        # 及参与组装的原子 (None 表示全部)
+        self.show_assembly = True
+        self.instances = None
+        self.assembly_mask = None
+        # 相互作用叠加层: 显示的分析类型、按当前帧坐标增量更新的分析器和连线可视化对象
+        self.interaction_kinds = ()
+        self.interaction_analyzer = None
+        self.interactions_visual = None
     
     def load_protein(self, pdb_file: str) -> bool:
         """
@@ -42,71 +150,722 @@ class ProteinVisualizer:
         返回:
             bool: 是否加载成功
         """
-        self._clear_visuals()
-        
         loader = ProteinDataLoader(pdb_file)
-        coords, elements, bonds = loader.parse_pdb()
+        structure = loader.load_structure()
         
-        if coords is None:
+        if structure is None:
+            self._clear_visuals()
             return False
         
-        self._create_atoms(coords, elements)
-        self._create_bonds(coords, bonds)
-        self._create_bounding_box(coords)
-        self._auto_zoom(coords)
+        self.set_structure(structure)
+        return True
+    
+    def set_structure(self, structure: ProteinStructure):
+        """
+        显示已解析的共享结构，不会重新解析或重新计算键连
         
+        支持分阶段显示: 先传入仅含原子的结构，拓扑完成后再传入
+        共享同一坐标数组的完整结构，此时只补充键连和边界框。
+        
+        参数:
+            structure: 由ProteinDataLoader构建的结构对象
+        """
+        staged = self.structure is not None and self.structure.coords is structure.coords
+        if staged and self.structure.has_topology and not structure.has_topology:
+            return  # 已显示完整结构，忽略迟到的原子阶段
+        profiler = get_profiler()
+        with profiler.stage('set_structure', CATEGORY_DISPLAY, n_atoms=structure.n_atoms,
+                            representation=self.representation):
+            if not staged:
+                self._clear_visuals()
+                self.atom_mask = None
+                self.selection_styles = []
+                self.frame_coords = None
+                self._frame_picker = None
+                self.interaction_analyzer = None
+                self._update_instancing(structure)
+                with profiler.stage('auto_zoom', CATEGORY_DISPLAY):
+                    self._auto_zoom(structure)
+                self._create_atoms_timed(structure)
+            self.structure = structure
+            
+            if structure.has_topology and self.bounding_box is None:
+                self._create_topology_timed(structure)
+    
+    def warm_up(self) -> bool:
+        """
+        尚未显示结构时，用合成肽段按当前表示方式创建可视化对象并离屏绘制一个像素，
+        让 vispy 的着色器代码生成和驱动的着色器编译在结构加载期间完成，随后清除并恢复相机
+        
+        返回:
+            bool: 是否执行了预热 (已显示结构或视图不在画布上时不执行)
+        """
+        canvas = self.view.canvas
+        if self.structure is not None or canvas is None:
+            return False
+        cameras = [(view.camera.get_state(), view.camera.distance) for view in self.views]
+        with get_profiler().stage('warm_up', CATEGORY_DISPLAY, representation=self.representation):
+            self.set_structure(_warm_up_structure())
+            try:
+                canvas.render(region=(0, 0, 1, 1))
+            finally:
+                self._clear_visuals()
+                for view, (state, distance) in zip(self.views, cameras):
+                    view.camera.set_state(state)
+                    view.camera.distance = distance
         return True
     
+    def set_representation(self, representation: str):
+        """
+        切换原子表示方式，保留当前结构和相机，只重建原子和键连的可视化对象
+        
+        参数:
+            representation: 表示方式，见 styling.REPRESENTATIONS
+        """
+        if representation not in REPRESENTATIONS:
+            raise ValueError(f"unknown representation: {representation!r}")
+        if representation == self.representation:
+            return
+        self.representation = representation
+        self._rebuild_visuals()
+    
+    def set_show_assembly(self, show: bool):
+        """
+        显示生物组装体的全部拷贝 (同一份数据按各拷贝的变换实例化绘制) 或只显示不对称单元，
+        保留当前结构，重建可视化对象并重新调整视角
+
+        参数:
+            show: 是否显示组装体
+        """
+        if show == self.show_assembly:
+            return
+        self.show_assembly = show
+        if self.structure is None:
+            return
+        self._update_instancing(self.structure)
+        self._auto_zoom(self.structure)
+        self._rebuild_visuals()
+    
+    def set_interactions(self, kinds: Sequence[str]):
+        """
+        在结构上叠加显示相互作用连线 (残基接触、链间界面、氢键和盐桥候选、空间冲突)，
+        轨迹播放时随帧坐标增量更新；拓扑完成后才显示
+        
+        参数:
+            kinds: 要显示的分析类型 (见 interactions.INTERACTION_KINDS)，空序列隐藏叠加层
+        """
+        unknown = set(kinds) - set(INTERACTION_KINDS)
+        if unknown:
+            raise ValueError(f"unknown interaction kinds: {sorted(unknown)}")
+        kinds = tuple(kind for kind in INTERACTION_KINDS if kind in kinds)
+        if kinds == self.interaction_kinds:
+            return
+        self.interaction_kinds = kinds
+        self._update_interactions()
+    
+    def show_interactions_in_view(self, index: int, shown: bool):
+        """
+        在一个视图中显示或隐藏相互作用连线，不影响其他视图 (如本结构在该视图中只是叠合显示)
+
+        参数:
+            index: 视图序号
+            shown: 是否显示
+        """
+        self.interaction_views[index] = shown
+        if self.interactions_visual is not None:
+            self.interactions_visual.set_visible(shown, index)
+    
+    def interactions(self) -> Optional[Interactions]:
+        """
+        当前结构在当前帧坐标下的相互作用分析结果 (数组见 interactions.Interactions)，
+        没有结构或拓扑尚未完成时为None
+        """
+        structure = self.structure
+        if structure is None or not structure.has_topology:
+            return None
+        if self.interaction_analyzer is None or self.interaction_analyzer.structure is not structure:
+            self.interaction_analyzer = InteractionAnalyzer(structure)
+        coords = structure.coords if self.frame_coords is None else self.frame_coords
+        return self.interaction_analyzer.update(coords)
+    
+    def _update_interactions(self):
+        """按显示的分析类型、显示掩码和当前坐标创建或原地更新相互作用连线"""
+        result = self.interactions() if self.interaction_kinds else None
+        if result is None:
+            if self.interactions_visual is not None:
+                self.interactions_visual.detach()
+                self.interactions_visual = None
+            return
+        pairs, colors = overlay_segments(result, self.interaction_kinds, self._display_mask())
+        if self.interactions_visual is not None:
+            self.interactions_visual.set_enabled(len(pairs) > 0)
+        if len(pairs) == 0:
+            return
+        pos = result.coords[pairs].reshape(-1, 3)
+        colors = np.repeat(colors, 2, axis=0)
+        if self.interactions_visual is None:
+            # 连线大多两端都在原子球内，关闭深度测试画在原子之上
+            segments = SegmentsVisual(pos=pos, color=colors, width=2.0)
+            segments.update_gl_state(depth_test=False)
+            self.interactions_visual = SharedVisual(segments, self.layers, self.instances)
+            for index, shown in enumerate(self.interaction_views):
+                self.interactions_visual.set_visible(shown, index)
+        else:
+            self.interactions_visual.visual.set_data(pos=pos, color=colors)
+    
+    def _update_instancing(self, structure: ProteinStructure):
+        """按结构的组装体和显示开关确定实例变换和参与组装的原子"""
+        instancing = assembly_instancing(structure) if self.show_assembly else None
+        self.assembly_mask, self.instances = (None, None) if instancing is None else instancing
+    
+    def select(self, expression: str) -> np.ndarray:
+        """
+        按选择表达式求值当前结构的原子掩码 (语法见 selection.Selection)，结果缓存在结构上
+        
+        参数:
+            expression: 选择表达式，如 'chain A and resname LYS'
+            
+        返回:
+            (N,) bool 数组
+        """
+        if self.structure is None:
+            return np.zeros(0, dtype=bool)
+        return select_atoms(self.structure, expression)
+    
+    def show(self, selection: Union[str, np.ndarray]):
+        """
+        显示选中的原子，其余原子保持当前的显示状态
+        
+        参数:
+            selection: 选择表达式或 (N,) bool 掩码
+        """
+        if self.structure is None or self.atom_mask is None:
+            return
+        self.atom_mask = self.atom_mask | self._selection_mask(selection)
+        if self.atom_mask.all():
+            self.atom_mask = None
+        self._rebuild_visuals()
+    
+    def hide(self, selection: Union[str, np.ndarray]):
+        """
+        隐藏选中的原子 (及一端被隐藏的键)，只重新上传顶点数据，不重新解析
+        
+        参数:
+            selection: 选择表达式或 (N,) bool 掩码
+        """
+        if self.structure is None:
+            return
+        mask = self._selection_mask(selection)
+        if not mask.any():
+            return
+        shown = np.ones(self.structure.n_atoms, dtype=bool) if self.atom_mask is None else self.atom_mask
+        self.atom_mask = shown & ~mask
+        self._rebuild_visuals()
+    
+    def color_selection(self, selection: Union[str, np.ndarray], color: Tuple[float, ...]):
+        """
+        用指定颜色覆盖选中原子的配色 (卡通按残基着色)，原地改写颜色缓冲；
+        切换配色方案后仍然保留
+        
+        参数:
+            selection: 选择表达式或 (N,) bool 掩码
+            color: RGBA 颜色
+        """
+        if self.structure is None:
+            return
+        self.selection_styles.append((self._selection_mask(selection),
+                                      np.asarray(color, dtype=np.float32)))
+        self.set_color_scheme(self.color_scheme)
+    
+    def clear_selections(self):
+        """恢复全部原子显示并移除选择着色"""
+        hidden = self.atom_mask is not None
+        self.atom_mask = None
+        styled = bool(self.selection_styles)
+        self.selection_styles = []
+        if self.structure is None:
+            return
+        if hidden:
+            self._rebuild_visuals()
+        elif styled:
+            self.set_color_scheme(self.color_scheme)
+    
+    def pick(self, view_index: int, pos: Tuple[float, float]) -> Optional[int]:
+        """
+        拾取画布位置下最近的可见原子: 从视图相机发出射线，在共享的网格索引中由近及远查找
+        
+        参数:
+            view_index: 视图序号
+            pos: 画布坐标 (逻辑像素)
+            
+        返回:
+            原子下标，未击中时返回None
+        """
+        hit = self.pick_instance(view_index, pos)
+        return None if hit is None else hit[0]
+    
+    def pick_instance(self, view_index: int, pos: Tuple[float, float]) -> Optional[Tuple[int, int]]:
+        """
+        同 pick，显示组装体时还给出击中的拷贝: 射线变换到各拷贝的局部坐标，共用同一份网格索引
+        
+        返回:
+            (原子下标, 拷贝序号)，未显示组装体时拷贝序号为0；未击中时返回None
+        """
+        if self.structure is None or self.structure.n_atoms == 0:
+            return None
+        origin, direction = view_ray(self.views[view_index], pos)
+        matrix = self.view_transforms[view_index]
+        if matrix is not None:
+            # 射线变换回结构自身的坐标系
+            rotation = matrix[:3, :3]
+            origin, direction = (origin - matrix[:3, 3]) @ rotation, direction @ rotation
+        if self.instances is None:
+            hit = self._picker().pick(origin, direction, self._display_mask())
+            return None if hit is None else (hit[0], 0)
+        hit = self._picker().pick_instances(origin, direction, self.instances, self._display_mask())
+        return None if hit is None else hit[:2]
+    
+    def _picker(self) -> AtomPicker:
+        """当前表示方式和坐标的拾取索引: 结构坐标的索引缓存在结构上，轨迹帧按需重建一次"""
+        if self.frame_coords is None:
+            return atom_picker(self.structure, self.representation)
+        cached = self._frame_picker
+        if cached is None or cached[0] is not self.frame_coords or cached[1] != self.representation:
+            cached = (self.frame_coords, self.representation,
+                      atom_picker(self.structure, self.representation, self.frame_coords))
+            self._frame_picker = cached
+        return cached[2]
+    
+    def _selection_mask(self, selection: Union[str, np.ndarray]) -> np.ndarray:
+        if isinstance(selection, str):
+            return select_atoms(self.structure, selection)
+        mask = np.asarray(selection, dtype=bool)
+        if mask.shape != (self.structure.n_atoms,):
+            raise ValueError(f"selection mask must have shape ({self.structure.n_atoms},)")
+        return mask
+    
+    def _rebuild_visuals(self):
+        """保留当前结构和相机，按当前表示方式和显示掩码重建原子和键连的可视化对象"""
+        structure = self.structure
+        if structure is None:
+            return
+        
+        with get_profiler().stage('rebuild_visuals', CATEGORY_DISPLAY, n_atoms=structure.n_atoms,
+                                  representation=self.representation):
+            self._clear_visuals()
+            self._create_atoms_timed(structure)
+            self.structure = structure
+            if structure.has_topology:
+                self._create_topology_timed(structure)
+    
+    def _create_atoms_timed(self, structure: ProteinStructure):
+        """创建原子可视化对象，性能记录开启时计入 create_atoms 阶段"""
+        with get_profiler().stage('create_atoms', CATEGORY_DISPLAY):
+            self._create_atoms(structure)
+    
+    def _create_topology_timed(self, structure: ProteinStructure):
+        """创建键连和边界框，性能记录开启时分别计时"""
+        profiler = get_profiler()
+        with profiler.stage('create_bonds', CATEGORY_DISPLAY, n_bonds=len(structure.bonds)):
+            self._create_bonds(structure)
+        with profiler.stage('bounding_box', CATEGORY_DISPLAY):
+            self._create_bounding_box(structure.coords)
+        if self.interaction_kinds:
+            with profiler.stage('interactions', CATEGORY_DISPLAY):
+                self._update_interactions()
+    
+    def set_frame(self, coords: np.ndarray, bond_segments: Optional[np.ndarray] = None):
+        """
+        原地更新现有原子和键连可视化的坐标 (轨迹播放)，不重建可视化对象
+
+        参数:
+            coords: (N,3) 当前帧原子坐标，原子数须与当前结构一致
+            bond_segments: (2M,3) 当前帧键线段端点，由调用方计算一次后在视图间共享
+        """
+        if self.structure is None or len(coords) != self.structure.n_atoms:
+            return
+        self.frame_coords = None if coords is self.structure.coords else coords
+        if self.interactions_visual is not None:
+            self._update_interactions()
+        if self.cartoon_visual is not None:
+            # 网格随坐标重新扫掠，二级结构沿用首帧的缓存
+            self.cartoon_visual.visual.set_mesh(
+                build_cartoon(self.structure, self._cartoon_level(self.structure), coords))
+        if self.surface_visual is not None:
+            # 结构自身坐标取缓存的表面，其他帧按当前坐标重新生成 (不缓存)
+            kind = SURFACE_REPRESENTATIONS[self.representation]
+            level = self._surface_level(self.structure)
+            self.surface_visual.visual.set_mesh(
+                surface_mesh(self.structure, kind, level) if self.frame_coords is None
+                else build_surface(self.structure, kind, level, coords=coords))
+        if self.atom_textures is not None:
+            # 球和键都从同一张坐标纹理读取端点，只需上传一次坐标
+            self.atom_textures.set_coords(coords)
+            return
+        if self.lod is not None:
+            self.lod.set_frame(coords)
+            return
+        if self.atoms_visual is None:
+            return
+
+        # Markers.set_data 会重置全部属性，需要重新传入颜色和尺寸
+        colors, sizes = self._atom_style(self.structure)
+        shown = self._shown_atoms()
+        self.atoms_visual.visual.set_data(
+            pos=coords[shown],
+            size=sizes[shown],
+            face_color=colors[shown],
+            edge_color=(0, 0, 0, 0.5),
+            edge_width=0.3
+        )
+        if self.bonds_visual is not None and bond_segments is not None:
+            self.bonds_visual.visual.set_data(
+                pos=self._per_bond(bond_segments, self._bond_mask(self.structure.bonds)))
+
+    def set_interactive(self, interactive: bool):
+        """
+        切换交互画质: 交互期间原子关闭抗锯齿和球面着色并隐藏键连 (球棍模型的键
+        只关闭高光)，结束后恢复完整画质
+
+        参数:
+            interactive: 是否处于交互中
+        """
+        if interactive == self.interactive:
+            return
+        self.interactive = interactive
+        if self.lod is not None:
+            self.lod.set_interactive(interactive)
+        if self.cartoon_visual is not None:
+            self.cartoon_visual.set_draft(interactive)
+        if self.surface_visual is not None:
+            self.surface_visual.set_draft(interactive)
+        if self.atoms_visual is not None:
+            self.atoms_visual.set_draft(interactive)
+        if self.bonds_visual is not None:
+            if self.atom_textures is not None:
+                self.bonds_visual.set_draft(interactive)
+            else:
+                self.bonds_visual.set_enabled(not interactive)
+
+    def set_view_active(self, index: int, active: bool):
+        """
+        暂停或恢复一个视图的绘制工作 (如单视图模式下被隐藏的视图)
+
+        参数:
+            index: 视图序号
+            active: 是否参与绘制
+        """
+        self.views[index].visible = active
+        if self.lod is not None:
+            self.lod.set_view_active(index, active and self.shown[index])
+    
+    def show_in_view(self, index: int, shown: bool):
+        """
+        在一个视图中显示或隐藏本结构 (各视图可以显示工作区中的不同结构)，
+        只挂上或摘下图层，不重建可视化对象。隐藏的图层不在视图的场景图中，
+        相机变化不会传播到其中的节点
+
+        参数:
+            index: 视图序号
+            shown: 是否在该视图中显示
+        """
+        if shown == self.shown[index]:
+            return
+        self.shown[index] = shown
+        self.layers[index].parent = self.views[index].scene if shown else None
+        if self.lod is not None:
+            self.lod.set_view_active(index, shown and self.views[index].visible)
+    
+    def set_view_transform(self, index: int, matrix: Optional[np.ndarray]):
+        """
+        对一个视图中的本结构施加刚体变换 (如叠合到该视图显示的另一结构上)，
+        只改变图层节点的变换，不改写顶点数据，其他视图不受影响
+
+        参数:
+            index: 视图序号
+            matrix: (4,4) 变换矩阵 (列向量约定)，None 取消变换
+        """
+        if matrix is None and self.view_transforms[index] is None:
+            return
+        self.view_transforms[index] = None if matrix is None else np.asarray(matrix, dtype=np.float64)
+        self.layers[index].transform = NullTransform() if matrix is None else instance_transform(matrix)
+        if self.lod is not None and self.shown[index]:
+            # 按新的变换重新剔除分块
+            self.lod.set_view_active(index, self.views[index].visible)
+    
+    def reset_view(self, index: int):
+        """按当前结构重新调整一个视图的相机"""
+        if self.structure is not None:
+            self._auto_zoom(self.structure, [index])
+    
+    def clear(self):
+        """移除当前结构的全部可视化对象并释放其GPU缓冲，图层和相机保留，之后可以加载下一个结构"""
+        self._clear_visuals()
+    
+    def release(self):
+        """移除全部可视化对象和各视图中的图层，释放GPU缓冲 (之后不能再使用本对象)"""
+        self.clear()
+        for layer in self.layers:
+            layer.parent = None
+        self.layers = []
+
+    @property
+    def nbytes(self) -> int:
+        """当前可视化对象占用的GPU缓冲和纹理字节数 (结构本身的数组见 ProteinStructure.nbytes)"""
+        total = 0 if self.lod is None else self.lod.nbytes
+        if self.atom_textures is not None:
+            total += self.atom_textures.nbytes
+        for visual in [self.atoms_visual, self.bonds_visual, self.bounding_box,
+                       self.cartoon_visual, self.surface_visual, self.interactions_visual]:
+            if visual is not None:
+                total += visual.nbytes
+        return total
+
     def _clear_visuals(self):
         """清除现有的可视化对象"""
-        for visual in [self.atoms_visual, self.bonds_visual, self.bounding_box]:
+        if self.lod is not None:
+            self.lod.clear()
+            self.lod = None
+        for visual in [self.atoms_visual, self.bonds_visual, self.bounding_box,
+                       self.cartoon_visual, self.surface_visual, self.interactions_visual]:
             if visual is not None:
-                self.view.remove(visual)
-    
-    def _create_atoms(self, coords: np.ndarray, elements: np.ndarray):
-        """创建原子球体可视化"""
-        colors = []
-        sizes = []
-        for elem in elements:
-            elem_str = str(elem).strip().upper()
-            colors.append(self.element_colors.get(elem_str, self.element_colors['OTHERS']))
-            sizes.append(5 if elem_str == 'H' else 8)
-        
-        self.atoms_visual = scene.visuals.Markers(
-            pos=coords,
-            size=np.array(sizes),
-            face_color=colors,
+                visual.detach()
+        self.interactions_visual = None
+        self.cartoon_visual = None
+        self.surface_visual = None
+        self.atoms_visual = None
+        self.bonds_visual = None
+        self.bounding_box = None
+        self.atom_textures = None
+        self.structure = None
+    
+    def set_color_scheme(self, scheme: str):
+        """
+        切换配色方案，原地改写现有可视化对象的颜色缓冲，不重建可视化对象
+        
+        参数:
+            scheme: 配色方案，见 styling.COLOR_SCHEMES
+        """
+        if scheme not in COLOR_SCHEMES:
+            raise ValueError(f"unknown color scheme: {scheme!r}")
+        self.color_scheme = scheme
+        if self.structure is None:
+            return
+        
+        colors, sizes = self._atom_style(self.structure)
+        if self.cartoon_visual is not None:
+            self.cartoon_visual.visual.set_colors(self._residue_colors(self.structure))
+        if self.surface_visual is not None:
+            self.surface_visual.visual.set_colors(colors)
+        if self.atom_textures is not None:
+            # 球棍模型的键按两端原子的颜色着色，同样从颜色纹理读取
+            self.atom_textures.set_colors(colors)
+            return
+        shown = self._shown_atoms()
+        if self.lod is not None:
+            self.lod.set_colors(colors, self._lod_bond_color())
+        elif (self.atoms_visual is not None
+              and not recolor_markers(self.atoms_visual.visual, colors[shown])):
+            self.atoms_visual.visual.set_data(pos=self.structure.coords[shown], size=sizes[shown],
+                                              face_color=colors[shown], edge_color=(0, 0, 0, 0.5),
+                                              edge_width=0.3)
+        if self.bonds_visual is not None:
+            self.bonds_visual.visual.set_data(color=self._per_bond(
+                self._bond_colors(self.structure), self._bond_mask(self.structure.bonds)))
+    
+    def _atom_style(self, structure: ProteinStructure) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按当前配色方案查表得到原子颜色和尺寸 (缓存在共享结构上，四个视图共用)，
+        有选择着色时在副本上叠加
+        """
+        colors = self.styles.colors(structure, self.color_scheme)
+        if self.selection_styles:
+            colors = colors.copy()
+            for mask, color in self.selection_styles:
+                colors[mask] = color
+        return colors, self.styles.sizes(structure)
+    
+    def _residue_colors(self, structure: ProteinStructure) -> np.ndarray:
+        """卡通的残基颜色，选择着色覆盖含有被选原子的整个残基"""
+        colors = self.styles.residue_colors(structure, self.color_scheme)
+        if self.selection_styles:
+            colors = colors.copy()
+            index = hierarchy_index(structure)
+            for mask, color in self.selection_styles:
+                colors[index.residue_any(mask)] = color
+        return colors
+    
+    def _bond_colors(self, structure: ProteinStructure):
+        """键线段颜色: 按元素配色时统一灰色，其他方案取两端原子的颜色"""
+        colors = self.styles.bond_colors(structure, self.color_scheme)
+        if colors is None:
+            return self.bond_color
+        if self.selection_styles:
+            colors = self._atom_style(structure)[0][structure.bonds].reshape(-1, 4)
+        return colors
+    
+    def _lod_bond_color(self):
+        """细节层次分块键连的统一颜色: 与 _bond_colors 一致，按元素配色时灰色，否则 None 取两端原子的颜色"""
+        return self.bond_color if self.color_scheme == SCHEME_ELEMENT else None
+    
+    def _display_mask(self) -> Optional[np.ndarray]:
+        """显示的原子: 未被隐藏且参与组装 (显示组装体时)，全部显示时为None"""
+        if self.assembly_mask is None:
+            return self.atom_mask
+        if self.atom_mask is None:
+            return self.assembly_mask
+        return self.atom_mask & self.assembly_mask
+    
+    def _shown_atoms(self):
+        """显示的原子下标，全部显示时为 slice(None) (不复制数组)"""
+        mask = self._display_mask()
+        return slice(None) if mask is None else np.flatnonzero(mask)
+    
+    def _bond_mask(self, bonds: np.ndarray):
+        """两端原子都显示的键，全部显示时为 slice(None)"""
+        mask = self._display_mask()
+        if mask is None:
+            return slice(None)
+        return mask[bonds[:, 0]] & mask[bonds[:, 1]]
+    
+    @staticmethod
+    def _per_bond(values, keep):
+        """按键筛选每个键两个端点一行的数组 (线段端点、颜色)，统一颜色原样返回"""
+        if not isinstance(values, np.ndarray) or values.ndim != 2 or isinstance(keep, slice):
+            return values
+        width = values.shape[1]
+        return values.reshape(-1, 2, width)[keep].reshape(-1, width)
+    
+    def _create_atoms(self, structure: ProteinStructure):
+        """按当前表示方式创建原子球体可视化"""
+        # 颜色和尺寸缓存在结构上，顶点缓冲只上传一次，所有视图共用；
+        # 组装体的各拷贝也共用这一份缓冲，只是变换不同
+        colors, sizes = self._atom_style(structure)
+        mask = self._display_mask()
+        
+        if self.representation == REPRESENTATION_CARTOON:
+            # 主链画成按残基着色的卡通网格，配体等其余非水原子仍画成球棍
+            cartoon = CartoonVisual(cartoon_mesh(structure, self._cartoon_level(structure)),
+                                    self._residue_colors(structure))
+            if mask is not None:
+                cartoon.set_residue_mask(hierarchy_index(structure).residue_any(mask))
+            self.cartoon_visual = SharedVisual(cartoon, self.layers, self.instances)
+            self.cartoon_visual.set_draft(self.interactive)
+            ligands = cartoon_ligand_atoms(structure)
+            if mask is not None:
+                ligands = ligands[mask[ligands]]
+            if len(ligands) == 0:
+                return
+            self.atom_textures = AtomTextures(
+                structure.coords, colors, atom_radii(structure, REPRESENTATION_BALL_AND_STICK))
+            self.atoms_visual = SharedVisual(
+                SphereImpostorVisual(self.atom_textures, ligands), self.layers, self.instances)
+            self.atoms_visual.set_draft(self.interactive)
+            return
+        if self.representation in SURFACE_REPRESENTATIONS:
+            # 表面顶点按所属原子着色，隐藏的原子只去掉对应三角形，不重新生成表面
+            surface = SurfaceVisual(
+                surface_mesh(structure, SURFACE_REPRESENTATIONS[self.representation],
+                             self._surface_level(structure)), colors)
+            if mask is not None:
+                surface.set_residue_mask(mask)
+            self.surface_visual = SharedVisual(surface, self.layers, self.instances)
+            self.surface_visual.set_draft(self.interactive)
+            return
+        if mask is not None and not mask.any():
+            return
+        if self.representation != REPRESENTATION_POINTS:
+            # 光线求交的球体一次绘制全部原子，开销主要在屏幕像素上，大结构也不需要细节层次
+            self.atom_textures = AtomTextures(structure.coords, colors,
+                                              atom_radii(structure, self.representation))
+            indices = None if mask is None else np.flatnonzero(mask)
+            self.atoms_visual = SharedVisual(SphereImpostorVisual(self.atom_textures, indices),
+                                             self.layers, self.instances)
+            self.atoms_visual.set_draft(self.interactive)
+            return
+        n_copies = 1 if self.instances is None else len(self.instances)
+        if structure.n_atoms * n_copies >= LOD_MIN_ATOMS:
+            self.lod = LODRenderer(self.views, structure, colors, sizes, mask, self.instances,
+                                   parents=self.layers, shown=self.shown,
+                                   bond_color=self._lod_bond_color())
+            if self.interactive:
+                self.lod.set_interactive(True)
+            return
+        
+        shown = self._shown_atoms()
+        self.atoms_visual = SharedVisual(visuals.MarkersVisual(
+            pos=structure.coords[shown],
+            size=sizes[shown],
+            face_color=colors[shown],
             edge_color=(0, 0, 0, 0.5),
             edge_width=0.3,
             spherical=True,
-            antialias=1,
-            parent=self.view.scene
-        )
+            antialias=1
+        ), self.layers, self.instances)
+        self.atoms_visual.set_draft(self.interactive)
+    
+    def _cartoon_level(self, structure: ProteinStructure) -> int:
+        """卡通细分级别: 按实际绘制的残基数 (组装体为全部拷贝) 选择"""
+        n_copies = 1 if self.instances is None else len(self.instances)
+        return cartoon_level(len(backbone_atoms(structure)[0]) * n_copies)
     
-    def _create_bonds(self, coords: np.ndarray, bonds: np.ndarray):
+    def _surface_level(self, structure: ProteinStructure) -> int:
+        """表面分辨率级别: 按参与表面的原子数 (组装体为全部拷贝) 选择"""
+        n_copies = 1 if self.instances is None else len(self.instances)
+        return surface_level(len(surface_atoms(structure)) * n_copies)
+    
+    def _create_bonds(self, structure: ProteinStructure):
         """创建键连圆柱体可视化"""
-        if len(bonds) == 0:
+        if self.lod is not None:
+            self.lod.set_structure(structure)
+            return
+        if structure.n_bonds == 0:
+            return
+        if self.atom_textures is not None:
+            # 空间填充模型不画键；球棍模型的键按原子下标读取坐标纹理，不复制端点坐标
+            if self.representation == REPRESENTATION_BALL_AND_STICK:
+                bonds = structure.bonds
+            elif self.representation == REPRESENTATION_CARTOON:
+                bonds = cartoon_ligand_bonds(structure)
+            else:
+                return
+            bonds = bonds[self._bond_mask(bonds)]
+            if len(bonds):
+                self.bonds_visual = SharedVisual(
+                    CylinderImpostorVisual(self.atom_textures, bonds), self.layers, self.instances)
+                self.bonds_visual.set_draft(self.interactive)
+            return
+        if (self.representation == REPRESENTATION_CARTOON
+                or self.representation in SURFACE_REPRESENTATIONS):
             return
             
-        bond_pos = np.array([(coords[b[0]], coords[b[1]]) for b in bonds]).reshape(-1, 3)
+        bond_pos = structure.derived(
+            'bond_segments',
+            lambda: structure.coords[structure.bonds].reshape(-1, 3),
+            uses_bonds=True)
         
-        self.bonds_visual = scene.visuals.Line(
+        keep = self._bond_mask(structure.bonds)
+        bond_pos = self._per_bond(bond_pos, keep)
+        if len(bond_pos) == 0:
+            return
+        self.bonds_visual = SharedVisual(SegmentsVisual(
             pos=bond_pos,
-            color=(0.7, 0.7, 0.7, 1),
+            color=self._per_bond(self._bond_colors(structure), keep),
             width=2.5,
-            connect='segments',
-            method='gl',
-            antialias=True,
-            parent=self.view.scene
-        )
+            antialias=True
+        ), self.layers, self.instances)
+        self.bonds_visual.set_enabled(not self.interactive)
     
     def _create_bounding_box(self, coords: np.ndarray):
-        """创建蛋白质边界线框"""
+        """创建蛋白质边界线框 (显示组装体时包围全部拷贝)"""
         if len(coords) == 0:
             return
             
-        min_coords = np.min(coords, axis=0)
-        max_coords = np.max(coords, axis=0)
+        if self.instances is not None:
+            min_coords, max_coords = self._assembly_extent(self.structure)[:2]
+        else:
+            min_coords = np.min(coords, axis=0)
+            max_coords = np.max(coords, axis=0)
         center = (min_coords + max_coords) / 2
         size = max_coords - min_coords
         
@@ -124,23 +883,40 @@ class ProteinVisualizer:
             [0, 4], [1, 5], [2, 6], [3, 7]   # 侧面
         ], dtype=np.uint32)
         
-        self.bounding_box = scene.visuals.Line(
+        self.bounding_box = SharedVisual(SegmentsVisual(
             pos=vertices,
             connect=edges,
             color=(0.5, 0.5, 0.5, 0.8),
-            width=1.5,
-            method='gl',
-            parent=self.view.scene
-        )
+            width=1.5
+        ), self.layers)
     
-    def _auto_zoom(self, coords: np.ndarray):
-        """自动调整视角"""
-        if len(coords) == 0:
+    def _auto_zoom(self, structure: ProteinStructure, indices: Optional[Sequence[int]] = None):
+        """自动调整视角 (indices 为要调整的视图序号，None 为显示本结构的全部视图)"""
+        if structure.n_atoms == 0:
             return
-            
-        center = np.mean(coords, axis=0)
-        max_dist = np.max(np.linalg.norm(coords - center, axis=1))
         
-        self.view.camera.center = center
-        self.view.camera.scale_factor = max_dist * 2.2
-        self.view.camera.distance = max_dist * 3
+        # 中心和半径对所有视图相同，只计算一次
+        def extent():
+            coords = structure.coords
+            center = np.mean(coords, axis=0)
+            return center, float(np.max(np.linalg.norm(coords - center, axis=1)))
+        if self.instances is not None:
+            center, max_dist = self._assembly_extent(structure)[2:]
+        else:
+            center, max_dist = structure.derived('extent', extent)
+        
+        if indices is None:
+            indices = [index for index, shown in enumerate(self.shown) if shown]
+        for index in indices:
+            view = self.views[index]
+            matrix = self.view_transforms[index]
+            view.camera.center = center if matrix is None else matrix[:3, :3] @ center + matrix[:3, 3]
+            view.camera.scale_factor = max_dist * 2.2
+            view.camera.distance = max_dist * 3
+    
+    def _assembly_extent(self, structure: ProteinStructure):
+        """组装体全部拷贝的 (最小角, 最大角, 中心, 半径)，逐个拷贝计算后缓存在结构上"""
+        def extent():
+            coords = structure.coords if self.assembly_mask is None else structure.coords[self.assembly_mask]
+            return assembly_bounds(coords, self.instances)
+        return structure.derived('assembly_extent', extent)
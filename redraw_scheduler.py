@@ -0,0 +1,256 @@
+import time
+import numpy as np
+from typing import Callable, List, Optional, Sequence, Set
+from vispy import app, scene
+from profiler import get_profiler
+
+# 合并重绘请求后的最高帧率
+DEFAULT_MAX_FPS = 60
+# 最后一次鼠标输入后经过该时间视为交互结束，恢复完整画质
+INTERACTION_IDLE_SECONDS = 0.25
+
+
+class ScheduledCanvas(scene.SceneCanvas):
+    def __init__(self, *args, max_fps: float = DEFAULT_MAX_FPS, **kwargs):
+        """
+        带脏区跟踪的共享画布: 各视图的重绘请求合并为每帧最多一次绘制，
+        帧缓冲在两次绘制间保留时只清除并重绘请求过更新的视图
+
+        参数:
+            max_fps: 最高帧率，更密集的请求合并到下一帧
+            其余参数同 scene.SceneCanvas
+        """
+        # SceneCanvas 初始化过程中就会请求重绘，状态须先于父类初始化
+        self.views: List[scene.ViewBox] = []
+        self.partial_redraw = False
+        self.frame_interval = 1.0 / max_fps
+        self._dirty: Set[scene.ViewBox] = set()
+        self._full_redraw = True
+        self._rendering = False
+        self._last_draw = 0.0
+        self._frame_timer = None
+        super().__init__(*args, **kwargs)
+        self.unfreeze()
+        self._frame_timer = app.Timer(interval=self.frame_interval, iterations=1,
+                                      connect=self._on_frame_timer, app=self.app)
+        self.freeze()
+        self.events.resize.connect(self.request_full_redraw)
+
+    def set_views(self, views: Sequence[scene.ViewBox]):
+        """登记参与脏区跟踪的视图 (互不重叠的ViewBox)"""
+        self.views = list(views)
+        self.request_full_redraw()
+
+    def request_full_redraw(self, event=None):
+        """下一帧清除并重绘整个画布 (布局变化、尺寸变化等)"""
+        self._full_redraw = True
+        self.update()
+
+    def update(self, node=None):
+        """
+        记录请求重绘的视图，并按帧间隔合并为一次绘制
+
+        参数:
+            node: 发出请求的节点，None 或不属于任何视图时重绘整个画布
+        """
+        if self._rendering or getattr(self, '_drawing', False):
+            return
+        view = self._view_of(node)
+        if view is None:
+            self._full_redraw = True
+        else:
+            self._dirty.add(view)
+        if self._frame_timer is None or self._frame_timer.running:
+            return
+        delay = self._last_draw + self.frame_interval - time.perf_counter()
+        if delay > 0:
+            self._frame_timer.start(delay)
+        else:
+            super().update()
+
+    def _on_frame_timer(self, event=None):
+        super().update()
+
+    def _view_of(self, node) -> Optional[scene.ViewBox]:
+        """节点所属的已登记视图"""
+        while node is not None:
+            if node in self.views:
+                return node
+            node = node.parent
+        return None
+
+    def render(self, *args, **kwargs):
+        """离屏渲染总是完整绘制，且不消耗屏幕绘制的脏区状态"""
+        self._rendering = True
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            self._rendering = False
+
+    def _draw_scene(self, bgcolor=None):
+        if self._rendering:
+            return super()._draw_scene(bgcolor)
+        self._last_draw = time.perf_counter()
+        dirty, full = self._dirty, self._full_redraw
+        self._dirty, self._full_redraw = set(), False
+        # 没有记录到请求的绘制 (如窗口暴露) 同样完整重绘
+        full = full or not dirty or not self.partial_redraw
+        if full and not (get_profiler().enabled and self.views):
+            return super()._draw_scene(bgcolor)
+
+        if bgcolor is None:
+            bgcolor = self._bgcolor
+        if full:
+            dirty = set(self.views)
+            self.context.clear(color=bgcolor, depth=True)
+        else:
+            for view in dirty:
+                self._clear_region(view, bgcolor)
+        self._draw_views(dirty)
+
+    def _draw_views(self, views: Set[scene.ViewBox]):
+        """
+        绘制指定的视图，其余视图保留帧缓冲中的上一帧，绘制期间跳过其子树；
+        性能记录开启时逐个视图绘制并等待GPU完成，记录每个视图的帧时间
+        """
+        profiler = get_profiler()
+        if not profiler.enabled:
+            clean = [view for view in self.views if view not in views and view.visible]
+            for view in clean:
+                view._visible = False
+            try:
+                self.draw_visual(self.scene)
+            finally:
+                for view in clean:
+                    view._visible = True
+            return
+
+        shown = [view for view in self.views if view.visible]
+        for view in shown:
+            view._visible = False
+        try:
+            for index, view in enumerate(self.views):
+                if view not in views or view not in shown:
+                    continue
+                view._visible = True
+                start = time.perf_counter()
+                self.draw_visual(self.scene)
+                self.context.finish()
+                profiler.frame(index, start, time.perf_counter() - start)
+                view._visible = False
+        finally:
+            for view in shown:
+                view._visible = True
+
+    def _clear_region(self, view: scene.ViewBox, bgcolor):
+        """只清除一个视图所占的帧缓冲区域"""
+        scale = self.pixel_scale
+        x, y = view.pos
+        width, height = view.size
+        fb_height = self.physical_size[1]
+        self.context.set_scissor(int(x * scale), int(fb_height - (y + height) * scale),
+                                 int(np.ceil(width * scale)), int(np.ceil(height * scale)))
+        self.context.set_state(scissor_test=True)
+        self.context.clear(color=bgcolor, depth=True)
+        self.context.set_state(scissor_test=False)
+
+
+class InteractionTracker:
+    def __init__(self, canvas: scene.SceneCanvas, views: Sequence[scene.ViewBox],
+                 on_interaction: Callable[[bool], None],
+                 idle_seconds: float = INTERACTION_IDLE_SECONDS):
+        """
+        跟踪画布上的相机交互: 鼠标拖动或滚轮开始时通知降低画质，输入停止一段时间后恢复；
+        联动模式下把被操作相机的变化量同步到其他视图的相机
+
+        参数:
+            canvas: 所有视图共用的画布
+            views: 视图 (各自带 TurntableCamera)
+            on_interaction: 交互开始时以 True、结束时以 False 调用
+            idle_seconds: 最后一次输入后多久视为交互结束
+        """
+        self.canvas = canvas
+        self.views = list(views)
+        self.on_interaction = on_interaction
+        self.linked = False
+        self.interacting = False
+        self._pressed = False
+        self._syncing = False
+        self._states = [self._camera_state(view.camera) for view in self.views]
+
+        self._idle_timer = app.Timer(interval=idle_seconds, iterations=1,
+                                     connect=self._on_idle, app=canvas.app)
+        canvas.events.mouse_press.connect(self._on_mouse_press)
+        canvas.events.mouse_release.connect(self._on_mouse_release)
+        canvas.events.mouse_wheel.connect(self._on_input)
+        for index, view in enumerate(self.views):
+            view.events.update.connect(lambda event, index=index: self._on_view_update(index))
+
+    def set_linked(self, linked: bool):
+        """开启或关闭相机联动，各视图保持当前的相对角度"""
+        self.linked = linked
+        self._states = [self._camera_state(view.camera) for view in self.views]
+
+    @staticmethod
+    def _camera_state(camera) -> tuple:
+        return (camera.azimuth, camera.elevation, camera.roll, camera.scale_factor,
+                camera.distance, tuple(camera.center))
+
+    def _on_mouse_press(self, event):
+        self._pressed = True
+        self._on_input(event)
+
+    def _on_mouse_release(self, event):
+        self._pressed = False
+        self._idle_timer.start()
+
+    def _on_input(self, event=None):
+        if not self.interacting:
+            self.interacting = True
+            self.on_interaction(True)
+        self._idle_timer.start()
+
+    def _on_idle(self, event=None):
+        if self._pressed:
+            # 按住鼠标但暂时没有移动，仍在交互中
+            self._idle_timer.start()
+            return
+        if self.interacting:
+            self.interacting = False
+            self.on_interaction(False)
+
+    def _on_view_update(self, index: int):
+        """视图更新 (相机变化等) 后记录相机状态，联动时把变化量施加到其他相机"""
+        if self._syncing:
+            return
+        camera = self.views[index].camera
+        state = self._camera_state(camera)
+        previous, self._states[index] = self._states[index], state
+        if state == previous:
+            return
+        if self.interacting:
+            self._idle_timer.start()
+            if self.linked:
+                self._apply_delta(index, previous, state)
+
+    def _apply_delta(self, source: int, previous: tuple, state: tuple):
+        """把源相机的旋转、缩放和平移变化量同步到其他视图"""
+        d_azimuth, d_elevation, d_roll = (state[k] - previous[k] for k in range(3))
+        zoom = state[3] / previous[3] if previous[3] else 1.0
+        d_center = np.subtract(state[5], previous[5])
+        self._syncing = True
+        try:
+            for index, view in enumerate(self.views):
+                if index == source or not view.visible:
+                    continue
+                camera = view.camera
+                camera.azimuth += d_azimuth
+                camera.elevation += d_elevation
+                camera.roll += d_roll
+                camera.scale_factor *= zoom
+                if camera.distance is not None and state[4] is not None and previous[4]:
+                    camera.distance *= state[4] / previous[4]
+                camera.center = tuple(np.add(camera.center, d_center))
+                self._states[index] = self._camera_state(camera)
+        finally:
+            self._syncing = False
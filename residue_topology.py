@@ -0,0 +1,289 @@
+import numpy as np
+from typing import Dict, List, Tuple
+from element_data import COVALENT_RADII, ELEMENT_H
+from spatial_grid import CellGrid
+from bond_detection import DEFAULT_BOND_TOLERANCE, MIN_BOND_DISTANCE, detect_bonds, unique_bonds
+from protein_structure import hierarchy_offsets
+
+# 残基间连接的最大键长 (Å)，超过即视为链断裂
+PEPTIDE_BOND_MAX = 1.9
+PHOSPHODIESTER_BOND_MAX = 2.0
+DISULFIDE_BOND_MAX = 2.5
+
+
+def _chain(*names: str) -> List[Tuple[str, str]]:
+    """按顺序相连的原子链"""
+    return list(zip(names[:-1], names[1:]))
+
+
+def _ring(*names: str) -> List[Tuple[str, str]]:
+    """首尾相连的原子环"""
+    return _chain(*names) + [(names[-1], names[0])]
+
+
+# 标准氨基酸: 主链 + 侧链重原子键 (氢原子按距离就近归属)
+_AMINO_BACKBONE = _chain('N', 'CA', 'C', 'O') + [('C', 'OXT'), ('CA', 'CB')]
+_AMINO_SIDE_CHAINS = {
+    'ALA': [],
+    'ARG': _chain('CB', 'CG', 'CD', 'NE', 'CZ', 'NH1') + [('CZ', 'NH2')],
+    'ASN': _chain('CB', 'CG', 'OD1') + [('CG', 'ND2')],
+    'ASP': _chain('CB', 'CG', 'OD1') + [('CG', 'OD2')],
+    'CYS': [('CB', 'SG')],
+    'GLN': _chain('CB', 'CG', 'CD', 'OE1') + [('CD', 'NE2')],
+    'GLU': _chain('CB', 'CG', 'CD', 'OE1') + [('CD', 'OE2')],
+    'GLY': [],
+    'HIS': [('CB', 'CG')] + _ring('CG', 'ND1', 'CE1', 'NE2', 'CD2'),
+    'ILE': _chain('CB', 'CG1', 'CD1') + [('CB', 'CG2')],
+    'LEU': _chain('CB', 'CG', 'CD1') + [('CG', 'CD2')],
+    'LYS': _chain('CB', 'CG', 'CD', 'CE', 'NZ'),
+    'MET': _chain('CB', 'CG', 'SD', 'CE'),
+    'MSE': _chain('CB', 'CG', 'SE', 'CE'),
+    'PHE': [('CB', 'CG')] + _ring('CG', 'CD1', 'CE1', 'CZ', 'CE2', 'CD2'),
+    'PRO': _chain('CB', 'CG', 'CD', 'N'),
+    'SER': [('CB', 'OG')],
+    'THR': [('CB', 'OG1'), ('CB', 'CG2')],
+    'TRP': ([('CB', 'CG')] + _ring('CG', 'CD1', 'NE1', 'CE2', 'CD2')
+            + _ring('CD2', 'CE2', 'CZ2', 'CH2', 'CZ3', 'CE3')),
+    'TYR': [('CB', 'CG')] + _ring('CG', 'CD1', 'CE1', 'CZ', 'CE2', 'CD2') + [('CZ', 'OH')],
+    'VAL': [('CB', 'CG1'), ('CB', 'CG2')],
+}
+
+# 核苷酸: 磷酸-糖骨架 + 碱基
+_SUGAR_PHOSPHATE = ([('P', 'OP1'), ('P', 'OP2'), ('P', 'OP3'), ('P', 'O1P'), ('P', 'O2P')]
+                    + _chain('P', "O5'", "C5'", "C4'", "C3'", "O3'")
+                    + _ring("C4'", "O4'", "C1'", "C2'", "C3'"))
+_PURINE = ([("C1'", 'N9')] + _ring('N9', 'C8', 'N7', 'C5', 'C4')
+           + _ring('C5', 'C6', 'N1', 'C2', 'N3', 'C4'))
+_PYRIMIDINE = [("C1'", 'N1')] + _ring('N1', 'C2', 'N3', 'C4', 'C5', 'C6') + [('C2', 'O2')]
+_BASES = {
+    'A': _PURINE + [('C6', 'N6')],
+    'G': _PURINE + [('C6', 'O6'), ('C2', 'N2')],
+    'C': _PYRIMIDINE + [('C4', 'N4')],
+    'U': _PYRIMIDINE + [('C4', 'O4')],
+    'T': _PYRIMIDINE + [('C4', 'O4'), ('C5', 'C7'), ('C5', 'C5M')],
+}
+
+
+def _build_templates() -> Dict[str, List[Tuple[str, str]]]:
+    templates = {}
+    for name, side_chain in _AMINO_SIDE_CHAINS.items():
+        backbone = [bond for bond in _AMINO_BACKBONE if name != 'GLY' or 'CB' not in bond]
+        templates[name] = backbone + side_chain
+    for base in 'ACGU':
+        templates[base] = _SUGAR_PHOSPHATE + [("C2'", "O2'")] + _BASES[base]
+    for base in 'ACGT':
+        templates['D' + base] = _SUGAR_PHOSPHATE + _BASES[base]
+    return templates
+
+
+RESIDUE_TEMPLATES = _build_templates()
+
+
+def _pack(res_names: np.ndarray, atom_names: np.ndarray) -> np.ndarray:
+    """把 (残基名, 原子名) 两个 S4 字段打包为一个 uint64 键"""
+    res = np.ascontiguousarray(np.asarray(res_names, dtype='S4')).view(np.uint32)
+    atom = np.ascontiguousarray(np.asarray(atom_names, dtype='S4')).view(np.uint32)
+    return res.astype(np.uint64) << np.uint64(32) | atom.astype(np.uint64)
+
+
+def _compile_templates():
+    """
+    将模板编译为查找表: 排序后的 (残基名, 原子名) 键 -> 槽位，
+    以及按残基类型分组的 槽位-槽位 键列表
+    """
+    keys, slots = [], []
+    res_keys, bond_res, bond_a, bond_b = [], [], [], []
+    for res_name, bonds in RESIDUE_TEMPLATES.items():
+        names = list(dict.fromkeys(name for bond in bonds for name in bond))
+        slot_of = {name: slot for slot, name in enumerate(names)}
+        keys.extend(_pack([res_name] * len(names), names))
+        slots.extend(range(len(names)))
+        res_keys.append(_pack([res_name], [''])[0])
+        for a, b in bonds:
+            bond_res.append(len(res_keys) - 1)
+            bond_a.append(slot_of[a])
+            bond_b.append(slot_of[b])
+
+    keys = np.array(keys, dtype=np.uint64)
+    order = np.argsort(keys)
+    return (keys[order], np.array(slots, dtype=np.int64)[order],
+            np.array(res_keys, dtype=np.uint64),
+            np.array(bond_res, dtype=np.int64), np.array(bond_a, dtype=np.int64),
+            np.array(bond_b, dtype=np.int64))
+
+
+(_ATOM_KEYS, _ATOM_SLOTS, _RESIDUE_KEYS,
+ _BOND_RESIDUE, _BOND_SLOT_A, _BOND_SLOT_B) = _compile_templates()
+_MAX_SLOTS = int(_ATOM_SLOTS.max()) + 1
+
+
+class ResidueTopology:
+    def __init__(self, columns, tolerance: float = DEFAULT_BOND_TOLERANCE):
+        """
+        基于残基模板构建键连: 标准残基查表得到键，不做空间搜索
+
+        参数:
+            columns: pdb_reader.PDBColumns 或具有相同列的对象 (可含 conect)
+            tolerance: 距离兜底检测时共价半径之和的允许误差 (Å)
+        """
+        self.columns = columns
+        self.tolerance = tolerance
+        self.n_atoms = len(columns.coords)
+        self.residue_offsets, self.chain_offsets = hierarchy_offsets(
+            columns.chain_ids, columns.res_ids, columns.ins_codes)
+        n_residues = len(self.residue_offsets) - 1
+        self.residue = np.repeat(np.arange(n_residues), np.diff(self.residue_offsets))
+        # 每个残基所属的链段
+        self.segment = np.repeat(np.arange(len(self.chain_offsets) - 1), np.diff(self.chain_offsets))
+
+        # 残基类型: 在模板中的编号，-1 表示未知残基
+        first = self.residue_offsets[:-1]
+        res_keys = _pack(columns.res_names[first], np.zeros(n_residues, dtype='S4'))
+        sorter = np.argsort(_RESIDUE_KEYS)
+        pos = np.minimum(np.searchsorted(_RESIDUE_KEYS[sorter], res_keys), len(sorter) - 1)
+        kind = sorter[pos]
+        self.residue_kind = np.where(_RESIDUE_KEYS[kind] == res_keys, kind, -1)
+
+    def build(self) -> np.ndarray:
+        """
+        生成完整键连: 模板键 + 氢原子 + 残基间连接 + HETATM的CONECT + 未知残基的距离检测
+
+        返回:
+            (M,2) int32 数组，每行 i < j，按行排序
+        """
+        if self.n_atoms == 0:
+            return np.empty((0, 2), dtype=np.int32)
+        parts = [self.template_bonds(), self.hydrogen_bonds(), self.link_bonds(),
+                 self.conect_bonds(), self.fallback_bonds()]
+        return unique_bonds(np.concatenate(parts), self.n_atoms)
+
+    def _slot_matrix(self) -> np.ndarray:
+        """(R, S) 每个残基每个模板槽位对应的原子下标，缺失为 -1"""
+        columns = self.columns
+        keys = _pack(columns.res_names, columns.atom_names)
+        pos = np.minimum(np.searchsorted(_ATOM_KEYS, keys), len(_ATOM_KEYS) - 1)
+        known = _ATOM_KEYS[pos] == keys
+        atoms = np.flatnonzero(known)
+
+        matrix = np.full((len(self.residue_kind), _MAX_SLOTS), -1, dtype=np.int64)
+        # 同名原子重复时保留第一个 (倒序赋值让靠前的覆盖靠后的)
+        atoms = atoms[::-1]
+        matrix[self.residue[atoms], _ATOM_SLOTS[pos[atoms]]] = atoms
+        return matrix
+
+    def template_bonds(self) -> np.ndarray:
+        """标准残基内部的重原子键"""
+        matrix = self._slot_matrix()
+        templated = np.flatnonzero(self.residue_kind >= 0)
+        if len(templated) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+
+        # 按残基类型分组，每组对该类型的全部模板键做一次向量化取值
+        found = []
+        kinds = self.residue_kind[templated]
+        order = np.argsort(kinds, kind='stable')
+        groups, starts = np.unique(kinds[order], return_index=True)
+        for kind, residues in zip(groups, np.split(templated[order], starts[1:])):
+            select = _BOND_RESIDUE == kind
+            a = matrix[residues[:, None], _BOND_SLOT_A[select][None, :]].ravel()
+            b = matrix[residues[:, None], _BOND_SLOT_B[select][None, :]].ravel()
+            ok = (a >= 0) & (b >= 0)
+            found.append(np.stack([a[ok], b[ok]], axis=1))
+        return np.concatenate(found)
+
+    def hydrogen_bonds(self) -> np.ndarray:
+        """标准残基中的氢原子连接到同一残基内最近的重原子"""
+        codes = self.columns.element_codes
+        hydrogens = np.flatnonzero((codes == ELEMENT_H) & (self.residue_kind[self.residue] >= 0))
+        if len(hydrogens) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+
+        # 候选重原子: 含氢原子的标准残基中的全部非氢原子
+        has_hydrogen = np.zeros(len(self.residue_kind), dtype=bool)
+        has_hydrogen[self.residue[hydrogens]] = True
+        candidates = np.flatnonzero(has_hydrogen[self.residue] & (codes != ELEMENT_H))
+        if len(candidates) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+        radius = float(COVALENT_RADII[ELEMENT_H] + COVALENT_RADII[codes[candidates]].max()) + self.tolerance
+
+        coords = self.columns.coords
+        grid = CellGrid(coords[candidates], radius)
+        q, local, dist_sq = grid.query_radius(coords[hydrogens], radius)
+        h, heavy = hydrogens[q], candidates[local]
+        limit = COVALENT_RADII[codes[h]] + COVALENT_RADII[codes[heavy]] + self.tolerance
+        ok = (self.residue[h] == self.residue[heavy]) & (dist_sq <= limit * limit)
+        ok &= dist_sq >= MIN_BOND_DISTANCE ** 2
+        h, heavy, dist_sq = h[ok], heavy[ok], dist_sq[ok]
+
+        # 每个氢原子只保留距离最近的一个
+        order = np.lexsort((dist_sq, h))
+        h, heavy = h[order], heavy[order]
+        first = np.concatenate(([True], h[1:] != h[:-1])) if len(h) else np.zeros(0, dtype=bool)
+        return np.stack([h[first], heavy[first]], axis=1)
+
+    def _atom_per_residue(self, name: bytes) -> np.ndarray:
+        """每个残基中给定名称原子的下标，缺失为 -1"""
+        atom = np.full(len(self.residue_kind), -1, dtype=np.int64)
+        idx = np.flatnonzero(self.columns.atom_names == name)[::-1]
+        atom[self.residue[idx]] = idx
+        return atom
+
+    def _sequential_links(self, head: bytes, tail: bytes, max_length: float) -> np.ndarray:
+        """同一链段内相邻残基 head(i) - tail(i+1) 的连接，距离超过 max_length 视为链断裂"""
+        a = self._atom_per_residue(head)[:-1]
+        b = self._atom_per_residue(tail)[1:]
+        ok = (a >= 0) & (b >= 0) & (self.segment[:-1] == self.segment[1:])
+        a, b = a[ok], b[ok]
+        diff = self.columns.coords[a] - self.columns.coords[b]
+        close = np.einsum('ij,ij->i', diff, diff) <= max_length * max_length
+        return np.stack([a[close], b[close]], axis=1)
+
+    def link_bonds(self) -> np.ndarray:
+        """残基间连接: 肽键 C-N、磷酸二酯键 O3'-P 和二硫键 SG-SG"""
+        links = [self._sequential_links(b'C', b'N', PEPTIDE_BOND_MAX),
+                 self._sequential_links(b"O3'", b'P', PHOSPHODIESTER_BOND_MAX)]
+
+        sulfur = np.flatnonzero((self.columns.atom_names == b'SG')
+                                & (self.columns.res_names == b'CYS'))
+        if len(sulfur) > 1:
+            grid = CellGrid(self.columns.coords[sulfur], DISULFIDE_BOND_MAX)
+            for i, j, _ in grid.pairs_within(DISULFIDE_BOND_MAX):
+                links.append(np.stack([sulfur[i], sulfur[j]], axis=1))
+        return np.concatenate(links)
+
+    def conect_bonds(self) -> np.ndarray:
+        """CONECT 记录中涉及 HETATM 或未知残基原子的键 (标准残基之间的键以模板为准)"""
+        conect = np.asarray(getattr(self.columns, 'conect', np.empty((0, 2))), dtype=np.int64)
+        if len(conect) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+        outside = self.columns.hetero | (self.residue_kind[self.residue] < 0)
+        return conect[outside[conect[:, 0]] | outside[conect[:, 1]]]
+
+    def fallback_bonds(self) -> np.ndarray:
+        """未知残基中没有任何 CONECT 记录的原子，按共价半径做距离检测"""
+        unknown = self.residue_kind[self.residue] < 0
+        conect = np.asarray(getattr(self.columns, 'conect', np.empty((0, 2))), dtype=np.int64)
+        if len(conect):
+            # 残基只要有一个原子出现在 CONECT 中，就认为文件已给出该残基的键连
+            covered = np.zeros(len(self.residue_kind), dtype=bool)
+            covered[self.residue[conect.ravel()]] = True
+            unknown &= ~covered[self.residue]
+        subset = np.flatnonzero(unknown)
+        if len(subset) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+        return detect_bonds(self.columns.coords, self.columns.element_codes,
+                            tolerance=self.tolerance, subset=subset)
+
+
+def build_topology(columns, tolerance: float = DEFAULT_BOND_TOLERANCE) -> np.ndarray:
+    """
+    由残基模板、残基间连接、CONECT 记录和距离兜底构建键连
+
+    参数:
+        columns: pdb_reader.PDBColumns 列数据
+        tolerance: 距离兜底检测时共价半径之和的允许误差 (Å)
+
+    返回:
+        (M,2) int32 数组
+    """
+    return ResidueTopology(columns, tolerance).build()
@@ -0,0 +1,243 @@
+import numpy as np
+from typing import Optional, Tuple
+from protein_structure import ProteinStructure
+from spatial_grid import CellGrid
+
+# 二级结构编码 (每个残基一个 uint8)，SS_LETTERS[code] 为对应的单字母
+SS_COIL = 0
+SS_HELIX = 1
+SS_STRAND = 2
+SS_TURN = 3
+SS_LETTERS = 'CHET'
+
+# DSSP 静电模型 (Kabsch & Sander 1983): E = f·q1·q2·(1/rON + 1/rCH - 1/rOH - 1/rCN)，
+# f·q1·q2 = 332 × 0.42 × 0.20 kcal/mol·Å，能量低于 HBOND_MAX_ENERGY 视为氢键
+HBOND_COUPLING = 27.888
+HBOND_MAX_ENERGY = -0.5
+HBOND_MIN_ENERGY = -9.9
+HBOND_MIN_DISTANCE = 0.5
+# 只计算 CA 距离不超过该值的残基对
+HBOND_CA_CUTOFF = 9.0
+# 相邻残基 C-N 距离超过该值视为链断裂
+PEPTIDE_BOND_MAX = 2.5
+
+_BACKBONE_NAMES = (b'N', b'CA', b'C', b'O')
+
+
+def backbone_atoms(structure: ProteinStructure) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    具有完整主链 (N、CA、C、O) 的残基及其主链原子，缓存在共享结构上
+
+    返回:
+        tuple: (残基下标 (K,), 主链原子下标 (K,4) 按 N、CA、C、O 排列)
+    """
+    def build():
+        offsets = structure.residue_offsets
+        n_residues = len(offsets) - 1
+        residue = np.repeat(np.arange(n_residues), np.diff(offsets))
+        atoms = np.full((n_residues, 4), -1, dtype=np.int64)
+        for column, name in enumerate(_BACKBONE_NAMES):
+            # 倒序写入，同名原子 (替代构象) 取第一个
+            idx = np.flatnonzero(structure.atom_names == name)[::-1]
+            atoms[residue[idx], column] = idx
+        complete = np.flatnonzero(np.all(atoms >= 0, axis=1))
+        return complete, atoms[complete]
+    return structure.derived('backbone_atoms', build)
+
+
+def backbone_links(structure: ProteinStructure, residues: np.ndarray, atoms: np.ndarray,
+                   coords: np.ndarray) -> np.ndarray:
+    """
+    主链残基 k 与 k+1 是否以肽键直接相连 (同一链段、残基相邻且 C-N 距离正常)
+
+    返回:
+        (K-1,) bool 数组
+    """
+    if len(residues) < 2:
+        return np.zeros(0, dtype=bool)
+    segment = np.repeat(np.arange(len(structure.chain_offsets) - 1),
+                        np.diff(structure.chain_offsets))
+    diff = coords[atoms[1:, 0]] - coords[atoms[:-1, 2]]
+    close = np.einsum('ij,ij->i', diff, diff) <= PEPTIDE_BOND_MAX * PEPTIDE_BOND_MAX
+    return ((residues[1:] == residues[:-1] + 1)
+            & (segment[residues[1:]] == segment[residues[:-1]])
+            & close)
+
+
+def backbone_hbonds(coords: np.ndarray, atoms: np.ndarray, linked: np.ndarray,
+                    proline: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算主链 N-H···O=C 氢键: 全部残基一次向量化计算 (含链间氢键)，
+    每个供体保留能量最低的两个受体 (同 DSSP)
+
+    参数:
+        coords: (N,3) 原子坐标
+        atoms: (K,4) 主链原子下标 (N、CA、C、O)
+        linked: (K-1,) 相邻主链残基是否相连
+        proline: (K,) 是否为脯氨酸 (没有酰胺氢，不能作供体)
+
+    返回:
+        tuple: (供体残基, 受体残基, 能量 kcal/mol)，下标为主链残基序号
+    """
+    n_res = len(atoms)
+    empty = np.zeros(0, dtype=np.int64)
+    if n_res < 2:
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    n, ca, c, o = (coords[atoms[:, k]].astype(np.float64) for k in range(4))
+
+    # 酰胺氢: 由 N 沿上一残基 C=O 的方向偏移 1 Å；链首残基没有可用的氢
+    donor_ok = np.zeros(n_res, dtype=bool)
+    donor_ok[1:] = linked
+    donor_ok &= ~proline
+    h = n.copy()
+    carbonyl = c[:-1] - o[:-1]
+    h[1:] += carbonyl / np.linalg.norm(carbonyl, axis=1)[:, None]
+
+    # 候选残基对: CA 距离不超过阈值，两个方向分别作为供体
+    firsts, seconds = [], []
+    for i, j, _ in CellGrid(ca, HBOND_CA_CUTOFF).pairs_within(HBOND_CA_CUTOFF):
+        firsts.append(i)
+        seconds.append(j)
+    if not firsts:
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    i, j = np.concatenate(firsts), np.concatenate(seconds)
+    donor = np.concatenate([i, j])
+    acceptor = np.concatenate([j, i])
+    # 残基不与紧邻的上一个残基的羰基成氢键
+    keep = donor_ok[donor] & (donor != acceptor + 1)
+    donor, acceptor = donor[keep], acceptor[keep]
+
+    def inverse_distance(a, b):
+        return 1.0 / np.maximum(np.linalg.norm(a - b, axis=1), 1e-6)
+
+    d_on = np.linalg.norm(n[donor] - o[acceptor], axis=1)
+    d_ch = np.linalg.norm(h[donor] - c[acceptor], axis=1)
+    d_oh = np.linalg.norm(h[donor] - o[acceptor], axis=1)
+    d_cn = np.linalg.norm(n[donor] - c[acceptor], axis=1)
+    energy = HBOND_COUPLING * (1 / d_on + 1 / d_ch - 1 / d_oh - 1 / d_cn)
+    too_close = np.minimum.reduce([d_on, d_ch, d_oh, d_cn]) < HBOND_MIN_DISTANCE
+    energy = np.where(too_close, HBOND_MIN_ENERGY, np.maximum(energy, HBOND_MIN_ENERGY))
+
+    bonded = energy < HBOND_MAX_ENERGY
+    donor, acceptor, energy = donor[bonded], acceptor[bonded], energy[bonded]
+    # 每个供体按能量排序，只保留最强的两个
+    order = np.lexsort((energy, donor))
+    donor, acceptor, energy = donor[order], acceptor[order], energy[order]
+    first = np.searchsorted(donor, donor)
+    best = np.arange(len(donor)) - first < 2
+    return donor[best], acceptor[best], energy[best].astype(np.float32)
+
+
+def _windows(starts: np.ndarray, length: int, size: int) -> np.ndarray:
+    """把若干 [start, start+length) 区间标记为 (size,) bool 数组"""
+    mark = np.zeros(size + 1, dtype=np.int64)
+    np.add.at(mark, starts, 1)
+    np.add.at(mark, np.minimum(starts + length, size), -1)
+    return np.cumsum(mark[:-1]) > 0
+
+
+def assign_backbone(donor: np.ndarray, acceptor: np.ndarray, linked: np.ndarray) -> np.ndarray:
+    """
+    由主链氢键判定二级结构 (DSSP规则，归并为螺旋/折叠/转角/无规卷曲四类)
+
+    n-转角: 残基 i+n 的 NH 与 i 的 CO 成氢键；连续两个 n-转角构成螺旋
+    (n=4 为 α 螺旋，优先；3 和 5 只在整段尚未指定时计为螺旋)；
+    平行/反平行桥 (含孤立桥) 计为折叠；其余转角内的残基计为转角
+
+    参数:
+        donor, acceptor: 氢键的供体/受体主链残基序号
+        linked: (K-1,) 相邻主链残基是否相连
+
+    返回:
+        (K,) uint8 二级结构编码
+    """
+    n_res = len(linked) + 1
+    ss = np.full(n_res, SS_COIL, dtype=np.uint8)
+    if n_res < 3:
+        return ss
+    keys = np.unique(donor * n_res + acceptor)
+    run = np.concatenate(([0], np.cumsum(~linked)))
+
+    def bond(d, a):
+        valid = (d >= 0) & (d < n_res) & (a >= 0) & (a < n_res)
+        key = np.where(valid, d * n_res + a, -1)
+        pos = np.minimum(np.searchsorted(keys, key), max(len(keys) - 1, 0))
+        return valid & (len(keys) > 0) & (keys[pos] == key)
+
+    def unbroken(a, b):
+        valid = (a >= 0) & (b < n_res)
+        return valid & (run[np.clip(a, 0, n_res - 1)] == run[np.clip(b, 0, n_res - 1)])
+
+    index = np.arange(n_res)
+    turns = {n: bond(index + n, index) & unbroken(index, index + n) for n in (3, 4, 5)}
+
+    def helix_starts(n):
+        return np.flatnonzero(turns[n][:-1] & turns[n][1:]) + 1
+
+    # α 螺旋
+    helix = _windows(helix_starts(4), 4, n_res)
+    ss[helix] = SS_HELIX
+
+    # β 桥: 候选残基对由氢键推出 (每个桥条件的第一项必须成立)，再检查完整条件
+    x, y = donor, acceptor
+    cand_i = np.concatenate([x - 1, y, x - 1, y])
+    cand_j = np.concatenate([y, x - 1, y + 1, x])
+    keep = cand_j - cand_i >= 3
+    pairs = np.unique(cand_i[keep] * n_res + cand_j[keep])
+    i, j = pairs // n_res, pairs % n_res
+    ok = unbroken(i - 1, i + 1) & unbroken(j - 1, j + 1)
+    parallel = (bond(i + 1, j) & bond(j, i - 1)) | (bond(j + 1, i) & bond(i, j - 1))
+    antiparallel = (bond(i + 1, j - 1) & bond(j + 1, i - 1)) | (bond(j, i) & bond(i, j))
+    bridge = ok & (parallel | antiparallel)
+    strand = np.zeros(n_res, dtype=bool)
+    strand[i[bridge]] = True
+    strand[j[bridge]] = True
+    ss[strand & ~helix] = SS_STRAND
+
+    # 3-10 螺旋和 π 螺旋: 整段都未指定时才计入
+    for n in (3, 5):
+        starts = helix_starts(n)
+        assigned = np.concatenate(([0], np.cumsum(ss != SS_COIL)))
+        free = assigned[np.minimum(starts + n, n_res)] - assigned[starts] == 0
+        ss[_windows(starts[free], n, n_res)] = SS_HELIX
+
+    # 转角: n-转角 i 覆盖的残基 i+1..i+n-1
+    turn = np.zeros(n_res, dtype=bool)
+    for n in (3, 4, 5):
+        turn |= _windows(np.flatnonzero(turns[n]) + 1, n - 1, n_res)
+    ss[turn & (ss == SS_COIL)] = SS_TURN
+    return ss
+
+
+def assign_secondary_structure(structure: ProteinStructure,
+                               coords: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    计算每个残基的二级结构 (没有完整主链的残基为无规卷曲)
+
+    参数:
+        structure: 结构
+        coords: (N,3) 使用的坐标 (轨迹帧)，None 使用结构自身坐标
+
+    返回:
+        (R,) uint8 二级结构编码
+    """
+    coords = structure.coords if coords is None else coords
+    residues, atoms = backbone_atoms(structure)
+    ss = np.full(len(structure.residue_offsets) - 1, SS_COIL, dtype=np.uint8)
+    if len(residues) == 0:
+        return ss
+    linked = backbone_links(structure, residues, atoms, coords)
+    proline = structure.res_names[atoms[:, 1]] == b'PRO'
+    donor, acceptor, _ = backbone_hbonds(coords, atoms, linked, proline)
+    ss[residues] = assign_backbone(donor, acceptor, linked)
+    return ss
+
+
+def secondary_structure(structure: ProteinStructure) -> np.ndarray:
+    """每个残基的二级结构编码，缓存在共享结构上"""
+    return structure.derived('secondary_structure', lambda: assign_secondary_structure(structure))
+
+
+def secondary_structure_string(codes: np.ndarray) -> str:
+    """二级结构编码转换为单字母字符串 (如 'CCHHHHTTEEEC')"""
+    return ''.join(np.asarray(list(SS_LETTERS))[codes])
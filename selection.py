@@ -0,0 +1,408 @@
+import re
+import fnmatch
+import numpy as np
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+from element_data import ELEMENT_H, ELEMENT_SYMBOLS
+from hierarchy import HierarchyIndex, hierarchy_index
+from protein_structure import ProteinStructure
+from secondary_structure import (SS_COIL, SS_HELIX, SS_STRAND, SS_TURN, backbone_atoms,
+                                 secondary_structure)
+from spatial_grid import CellGrid
+
+# 距离查询网格的最小单元边长 (Å)，避免很小的距离产生过多空单元
+MIN_GRID_CELL = 4.0
+
+_WATER_NAMES = (b'HOH', b'WAT', b'DOD')
+_NUCLEIC_NAMES = (b'A', b'C', b'G', b'U', b'I', b'DA', b'DC', b'DG', b'DT', b'DI')
+_PROTEIN_BACKBONE = (b'N', b'CA', b'C', b'O', b'OXT')
+_NUCLEIC_BACKBONE = (b'P', b'OP1', b'OP2', b'OP3', b'O1P', b'O2P', b'O3P',
+                     b"O5'", b"C5'", b"C4'", b"C3'", b"O3'")
+
+# 词法: 比较运算符和括号、双引号字符串、其余不含空白和运算符的单词 (可含 ' * ? - : .)
+_TOKEN = re.compile(r'\s*(?:(<=|>=|==|!=|=|<|>|\(|\))|"([^"]*)"|([^\s()<>=!"]+))')
+
+
+class SelectionError(ValueError):
+    """选择表达式语法错误"""
+
+
+class _Context:
+    def __init__(self, structure: ProteinStructure, coords: np.ndarray):
+        """一次求值共用的数据: 结构、坐标、层级索引和按距离建好的网格"""
+        self.structure = structure
+        self.coords = coords
+        self.index: HierarchyIndex = hierarchy_index(structure)
+        self.n_atoms = structure.n_atoms
+        self._grids: Dict[float, CellGrid] = {}
+
+    def grid(self, cell_size: float) -> CellGrid:
+        if self.coords is self.structure.coords:
+            return self.structure.derived(
+                f'cell_grid:{cell_size:g}', lambda: CellGrid(self.coords, cell_size))
+        if cell_size not in self._grids:
+            self._grids[cell_size] = CellGrid(self.coords, cell_size)
+        return self._grids[cell_size]
+
+    def protein_residues(self) -> np.ndarray:
+        """(R,) 具有完整主链的残基"""
+        mask = np.zeros(self.index.n_residues, dtype=bool)
+        mask[backbone_atoms(self.structure)[0]] = True
+        return mask
+
+
+_Evaluator = Callable[[_Context], np.ndarray]
+
+
+def _match_table(table: np.ndarray, patterns: List[str]) -> np.ndarray:
+    """驻留名称表中与任一值匹配的项，支持 * 和 ? 通配符"""
+    names = [name.decode(errors='replace').strip() for name in table]
+    hit = np.zeros(len(table), dtype=bool)
+    for pattern in patterns:
+        if any(ch in pattern for ch in '*?['):
+            hit |= np.array([fnmatch.fnmatchcase(name, pattern) for name in names], dtype=bool)
+        else:
+            hit |= np.array([name == pattern for name in names], dtype=bool)
+    return hit
+
+
+def _flag(name: str) -> _Evaluator:
+    """不带参数的关键字"""
+    def water(ctx):
+        index = ctx.index
+        return index.residue_atoms(np.isin(index.res_name_table, _WATER_NAMES)[index.res_name_codes])
+
+    def protein(ctx):
+        return ctx.index.residue_atoms(ctx.protein_residues())
+
+    def nucleic(ctx):
+        index = ctx.index
+        return index.residue_atoms(
+            np.isin(index.res_name_table, _NUCLEIC_NAMES)[index.res_name_codes])
+
+    def atom_names(ctx, names):
+        index = ctx.index
+        return np.isin(index.atom_name_table, names)[index.atom_name_codes]
+
+    def backbone(ctx):
+        return ((protein(ctx) & atom_names(ctx, _PROTEIN_BACKBONE))
+                | (nucleic(ctx) & atom_names(ctx, _NUCLEIC_BACKBONE)))
+
+    def secondary(code):
+        def evaluate(ctx):
+            ss = secondary_structure(ctx.structure)
+            return protein(ctx) & ctx.index.residue_atoms(ss == code)
+        return evaluate
+
+    flags = {
+        'all': lambda ctx: np.ones(ctx.n_atoms, dtype=bool),
+        'none': lambda ctx: np.zeros(ctx.n_atoms, dtype=bool),
+        'protein': protein,
+        'nucleic': nucleic,
+        'water': water,
+        'backbone': backbone,
+        'sidechain': lambda ctx: protein(ctx) & ~backbone(ctx),
+        'hetero': lambda ctx: ctx.structure.hetero.copy(),
+        'hydrogen': lambda ctx: ctx.structure.element_codes == ELEMENT_H,
+        'heavy': lambda ctx: ctx.structure.element_codes != ELEMENT_H,
+        'ligand': lambda ctx: ctx.structure.hetero & ~water(ctx) & ~protein(ctx),
+        'helix': secondary(SS_HELIX),
+        'strand': secondary(SS_STRAND),
+        'turn': secondary(SS_TURN),
+        'coil': secondary(SS_COIL),
+    }
+    return flags[name]
+
+
+def _names(name: str, patterns: List[str]) -> _Evaluator:
+    """按名称选择: 在驻留名称表上匹配一次，再按编码展开"""
+    def evaluate(ctx):
+        index = ctx.index
+        if name == 'chain':
+            return index.chain_atoms(_match_table(index.chain_id_table, patterns)[index.chain_codes])
+        if name == 'resname':
+            return index.residue_atoms(
+                _match_table(index.res_name_table, patterns)[index.res_name_codes])
+        if name == 'name':
+            return _match_table(index.atom_name_table, patterns)[index.atom_name_codes]
+        # 元素符号不区分大小写
+        symbols = np.array([symbol.upper().encode() for symbol in ELEMENT_SYMBOLS])
+        hit = _match_table(symbols, [pattern.upper() for pattern in patterns])
+        return hit[ctx.structure.element_codes]
+    return evaluate
+
+
+def _numeric_values(name: str, ctx: _Context) -> np.ndarray:
+    """数值属性按原子展开"""
+    structure = ctx.structure
+    if name == 'resid':
+        return structure.res_ids
+    if name == 'index':
+        return np.arange(ctx.n_atoms)
+    if name == 'serial':
+        return structure.serials
+    if name == 'bfactor':
+        return structure.b_factors
+    if name == 'occupancy':
+        return structure.occupancies
+    return ctx.coords[:, 'xyz'.index(name)]
+
+
+def _numbers(name: str, values: List[float], ranges: List[Tuple[float, float]]) -> _Evaluator:
+    """数值属性等于列表中的值或落在闭区间内"""
+    def evaluate(ctx):
+        data = _numeric_values(name, ctx)
+        mask = np.isin(data, values)
+        for low, high in ranges:
+            mask |= (data >= low) & (data <= high)
+        return mask
+    return evaluate
+
+
+def _compare(name: str, op: str, value: float) -> _Evaluator:
+    ops = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+           '==': np.equal, '=': np.equal, '!=': np.not_equal}
+
+    def evaluate(ctx):
+        return ops[op](_numeric_values(name, ctx), value)
+    return evaluate
+
+
+def _within(distance: float, inner: _Evaluator, exclude: bool) -> _Evaluator:
+    """与选择中任一原子距离不超过 distance 的原子，网格建在全部原子上，只查询被选原子"""
+    def evaluate(ctx):
+        mask = inner(ctx)
+        result = np.zeros(ctx.n_atoms, dtype=bool)
+        selected = np.flatnonzero(mask)
+        if len(selected) == 0:
+            return result
+        grid = ctx.grid(max(float(distance), MIN_GRID_CELL))
+        _, atoms, _ = grid.query_radius(ctx.coords[selected], distance)
+        result[atoms] = True
+        return result & ~mask if exclude else result | mask
+    return evaluate
+
+
+def _byres(inner: _Evaluator) -> _Evaluator:
+    def evaluate(ctx):
+        return ctx.index.residue_atoms(ctx.index.residue_any(inner(ctx)))
+    return evaluate
+
+
+def _bychain(inner: _Evaluator) -> _Evaluator:
+    """扩展到链标识相同的全部原子 (同一链标识的 HETATM 链段也包括在内)"""
+    def evaluate(ctx):
+        index = ctx.index
+        hit = np.zeros(len(index.chain_id_table), dtype=bool)
+        hit[index.chain_codes[index.chain_any(index.residue_any(inner(ctx)))]] = True
+        return index.chain_atoms(hit[index.chain_codes])
+    return evaluate
+
+
+_FLAGS = ('all', 'none', 'protein', 'nucleic', 'water', 'backbone', 'sidechain', 'hetero',
+          'hydrogen', 'heavy', 'ligand', 'helix', 'strand', 'turn', 'coil')
+_NAME_PROPERTIES = ('chain', 'resname', 'name', 'element')
+_INT_PROPERTIES = ('resid', 'index', 'serial')
+_FLOAT_PROPERTIES = ('bfactor', 'occupancy', 'x', 'y', 'z')
+_RESERVED = set(_FLAGS + _NAME_PROPERTIES + _INT_PROPERTIES + _FLOAT_PROPERTIES
+                + ('and', 'or', 'not', 'of', 'to', 'byres', 'bychain', 'within', 'around'))
+_RANGE = re.compile(r'^(-?\d+(?:\.\d*)?)[-:](-?\d+(?:\.\d*)?)$')
+
+
+class _Parser:
+    def __init__(self, text: str):
+        """递归下降解析器，把表达式编译为掩码求值函数"""
+        self.text = text
+        self.tokens: List[Tuple[str, str]] = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if match is None or match.end() == pos:
+                raise SelectionError(f"unexpected character at {pos}: {text[pos:]!r}")
+            op, quoted, word = match.groups()
+            if op is not None:
+                self.tokens.append(('op', op))
+            elif quoted is not None:
+                self.tokens.append(('value', quoted))
+            else:
+                kind = 'keyword' if word.lower() in _RESERVED else 'value'
+                self.tokens.append((kind, word.lower() if kind == 'keyword' else word))
+            pos = match.end()
+        self.pos = 0
+
+    def parse(self) -> _Evaluator:
+        if not self.tokens:
+            raise SelectionError("empty selection")
+        node = self._or()
+        if self.pos < len(self.tokens):
+            raise SelectionError(f"unexpected {self.tokens[self.pos][1]!r} in {self.text!r}")
+        return node
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        if token is None:
+            raise SelectionError(f"unexpected end of selection {self.text!r}")
+        self.pos += 1
+        return token
+
+    def _accept(self, kind: str, text: str) -> bool:
+        if self._peek() == (kind, text):
+            self.pos += 1
+            return True
+        return False
+
+    def _number(self) -> float:
+        kind, text = self._next()
+        try:
+            return float(text)
+        except ValueError:
+            raise SelectionError(f"expected a number, got {text!r}") from None
+
+    def _or(self) -> _Evaluator:
+        node = self._and()
+        while self._accept('keyword', 'or'):
+            left, right = node, self._and()
+            node = lambda ctx, a=left, b=right: a(ctx) | b(ctx)
+        return node
+
+    def _and(self) -> _Evaluator:
+        node = self._unary()
+        while self._accept('keyword', 'and'):
+            left, right = node, self._unary()
+            node = lambda ctx, a=left, b=right: a(ctx) & b(ctx)
+        return node
+
+    def _unary(self) -> _Evaluator:
+        if self._accept('keyword', 'not'):
+            inner = self._unary()
+            return lambda ctx: ~inner(ctx)
+        if self._accept('keyword', 'byres'):
+            return _byres(self._unary())
+        if self._accept('keyword', 'bychain'):
+            return _bychain(self._unary())
+        for word in ('within', 'around'):
+            if self._accept('keyword', word):
+                distance = self._number()
+                if distance < 0:
+                    raise SelectionError(f"negative distance in {self.text!r}")
+                if not self._accept('keyword', 'of'):
+                    raise SelectionError(f"expected 'of' after '{word} {distance:g}'")
+                return _within(distance, self._unary(), exclude=word == 'around')
+        return self._primary()
+
+    def _primary(self) -> _Evaluator:
+        kind, text = self._next()
+        if (kind, text) == ('op', '('):
+            node = self._or()
+            if not self._accept('op', ')'):
+                raise SelectionError(f"missing ')' in {self.text!r}")
+            return node
+        if kind != 'keyword':
+            raise SelectionError(f"unknown selection keyword: {text!r}")
+        if text in _FLAGS:
+            return _flag(text)
+        if text in _NAME_PROPERTIES:
+            return _names(text, self._values(text))
+        if text in _INT_PROPERTIES or text in _FLOAT_PROPERTIES:
+            token = self._peek()
+            if token is not None and token[0] == 'op' and token[1] not in '()':
+                self.pos += 1
+                return _compare(text, token[1], self._number())
+            return self._numeric(text)
+        raise SelectionError(f"unexpected {text!r} in {self.text!r}")
+
+    def _values(self, keyword: str) -> List[str]:
+        values = []
+        while self._peek() is not None and self._peek()[0] == 'value':
+            values.append(self._next()[1])
+        if not values:
+            raise SelectionError(f"'{keyword}' needs at least one value")
+        return values
+
+    def _numeric(self, keyword: str) -> _Evaluator:
+        """数值列表: 单值、a-b / a:b 区间或 a to b"""
+        values, ranges = [], []
+        while self._peek() is not None and self._peek()[0] == 'value':
+            text = self._next()[1]
+            match = _RANGE.match(text)
+            try:
+                if match:
+                    ranges.append((float(match.group(1)), float(match.group(2))))
+                elif self._accept('keyword', 'to'):
+                    ranges.append((float(text), self._number()))
+                else:
+                    values.append(float(text))
+            except ValueError:
+                raise SelectionError(f"expected a number after '{keyword}', got {text!r}") from None
+        if not values and not ranges:
+            raise SelectionError(f"'{keyword}' needs at least one value")
+        return _numbers(keyword, values, ranges)
+
+
+class Selection:
+    def __init__(self, text: str):
+        """
+        已编译的原子选择表达式，可对任意结构反复求值
+
+        语法 (关键字不区分大小写，and 优先于 or):
+            布尔组合: and、or、not、括号
+            类别: all none protein nucleic water backbone sidechain hetero hydrogen heavy
+                  ligand helix strand turn coil
+            名称 (可多个值，支持 * ? 通配符): chain A B、resname LYS ARG、name CA、element C
+            数值: resid 10 12-20 30 to 40、index、serial；bfactor > 50、occupancy、x y z
+            距离: within 5 of <选择> (含自身)、around 4 of <选择> (不含自身)
+            扩展: byres <选择>、bychain <选择>
+
+        参数:
+            text: 选择表达式，如 'byres around 4 of chain B'
+        """
+        self.text = text
+        self._evaluate = _Parser(text).parse()
+
+    def evaluate(self, structure: ProteinStructure, coords: Optional[np.ndarray] = None
+                 ) -> np.ndarray:
+        """
+        求值为原子掩码
+
+        参数:
+            structure: 结构
+            coords: (N,3) 距离条件使用的坐标 (轨迹帧)，None 使用结构自身坐标
+
+        返回:
+            (N,) bool 数组
+        """
+        coords = structure.coords if coords is None else coords
+        mask = self._evaluate(_Context(structure, coords))
+        return np.asarray(mask, dtype=bool).reshape(structure.n_atoms)
+
+    def __repr__(self) -> str:
+        return f"Selection({self.text!r})"
+
+
+@lru_cache(maxsize=256)
+def parse_selection(text: str) -> Selection:
+    """编译选择表达式，相同文本只解析一次"""
+    return Selection(text)
+
+
+def select_atoms(structure: ProteinStructure, text: str,
+                 coords: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    按选择表达式得到原子掩码；使用结构自身坐标时结果缓存在共享结构上
+
+    参数:
+        structure: 结构
+        text: 选择表达式
+        coords: (N,3) 轨迹帧坐标，None 使用结构自身坐标
+
+    返回:
+        (N,) bool 数组 (缓存的结果为只读)
+    """
+    selection = parse_selection(text)
+    if coords is None:
+        return structure.derived(f'selection:{text}', lambda: selection.evaluate(structure))
+    return selection.evaluate(structure, coords)
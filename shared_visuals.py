@@ -0,0 +1,265 @@
+import numpy as np
+from typing import List, Optional, Sequence, Union
+from vispy import gloo, scene, visuals
+from vispy.scene.visuals import VisualNode
+from vispy.visuals.transforms import MatrixTransform
+from vispy.visuals.visual import Visual, VisualView
+
+# 视图节点共用源可视化对象的着色器程序和GPU缓冲，只拥有各自的变换和滤镜
+# (ViewBox裁剪、透明度等)，因此同一份顶点数据可以从多个相机绘制
+
+
+def clip_matrix(view) -> np.ndarray:
+    """
+    视图从数据坐标到裁剪坐标的完整变换矩阵 (含ViewBox在画布中的位置)
+
+    返回:
+        (4,4) float64 矩阵，行向量约定: clip = [x, y, z, 1] @ M
+        (按 float32 上传为 GLSL mat4 后即为列向量约定的同一变换)
+    """
+    return np.asarray(view.transforms.get_transform().map(np.eye(4)), dtype=np.float64)
+
+
+def gpu_nbytes(obj) -> int:
+    """
+    可视化对象直接持有的GPU缓冲、纹理和顶点数组的字节数 (估计显存和对应内存副本)
+
+    参数:
+        obj: 可视化对象，或单个 gloo 缓冲/纹理
+    """
+    if isinstance(obj, gloo.buffer.DataBuffer):
+        return obj.nbytes
+    if isinstance(obj, gloo.texture.BaseTexture):
+        itemsize = 4 if (obj.internalformat or '').endswith('32f') else 1
+        return int(np.prod(obj.shape)) * itemsize
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if not isinstance(obj, Visual):
+        return 0
+    return sum(gpu_nbytes(value) for value in vars(obj).values()
+               if isinstance(value, (gloo.buffer.DataBuffer, gloo.texture.BaseTexture, np.ndarray)))
+
+
+class SegmentsVisual(Visual):
+    """
+    线段可视化: 顶点和颜色缓冲绑定在共享程序上，可被多个视图节点共用
+    (vispy的 LineVisual 把缓冲绑定在自身程序上，其视图无法看到数据)
+    """
+
+    _vertex_shader = """
+        varying vec4 v_color;
+        void main(void) {
+            gl_Position = $transform(vec4($position, 1.0));
+            v_color = $color;
+        }
+    """
+    _fragment_shader = """
+        varying vec4 v_color;
+        void main() {
+            gl_FragColor = v_color;
+        }
+    """
+
+    def __init__(self, pos: np.ndarray, color=(0.7, 0.7, 0.7, 1), width: float = 1.0,
+                 connect: Optional[np.ndarray] = None, antialias: bool = False):
+        """
+        参数:
+            pos: (V,3) 顶点坐标
+            color: 统一颜色或 (V,4) 逐顶点颜色
+            width: 线宽 (像素)
+            connect: (M,2) 顶点下标对，None 表示相邻两个顶点构成一条线段
+            antialias: 是否开启线段平滑
+        """
+        self._pos_vbo = gloo.VertexBuffer()
+        self._color_vbo = gloo.VertexBuffer()
+        self._connect_ibo = gloo.IndexBuffer()
+        self._width = width
+        self._antialias = antialias
+        self._n_vertices = 0
+        Visual.__init__(self, vcode=self._vertex_shader, fcode=self._fragment_shader)
+        self.set_gl_state('translucent', line_smooth=antialias)
+        self._draw_mode = 'lines'
+        self.set_data(pos=pos, color=color, connect=connect)
+
+    def set_antialias(self, antialias: bool):
+        """开启或关闭线段平滑 (只对创建时开启平滑的线段生效)"""
+        self.update_gl_state(line_smooth=antialias and self._antialias)
+        self.update()
+
+    def set_data(self, pos: Optional[np.ndarray] = None, color=None,
+                 connect: Optional[np.ndarray] = None):
+        """更新顶点、颜色或连接关系，未传入的部分保持不变"""
+        if pos is not None:
+            pos = np.ascontiguousarray(pos, dtype=np.float32)
+            self._n_vertices = len(pos)
+            self._pos_vbo.set_data(pos)
+            self.shared_program.vert['position'] = self._pos_vbo
+        if color is not None:
+            color = np.asarray(color, dtype=np.float32)
+            if color.ndim == 1:
+                self.shared_program.vert['color'] = tuple(color)
+            else:
+                self._color_vbo.set_data(np.ascontiguousarray(color))
+                self.shared_program.vert['color'] = self._color_vbo
+        if connect is not None:
+            self._connect_ibo.set_data(np.ascontiguousarray(connect, dtype=np.uint32))
+            self._index_buffer = self._connect_ibo
+        self._bounds_changed()
+        self.update()
+
+    def _prepare_transforms(self, view):
+        view.view_program.vert['transform'] = view.transforms.get_transform()
+
+    def _prepare_draw(self, view):
+        if self._n_vertices == 0:
+            return False
+        width = view.transforms.pixel_scale * self._width
+        self.update_gl_state(line_width=max(width, 1.0))
+
+    def _compute_bounds(self, axis, view):
+        return None
+
+
+def _view_node_class(name: str, **attributes) -> type:
+    """为可视化视图 (VisualView) 创建可加入场景图的节点类"""
+    def __init__(self, visual, parent=None):
+        self._visual_superclass = VisualView
+        VisualView.__init__(self, visual)
+        self.unfreeze()
+        VisualNode.__init__(self, parent=parent)
+        self.freeze()
+        # 源对象不在场景图中，数据变化时由它通知各视图节点重绘
+        visual.events.update.connect(self._on_source_update)
+
+    def _on_source_update(self, event=None):
+        self.update()
+
+    def draw(self):
+        # 源对象的 visible 对全部视图节点生效 (节点自身的 visible 只控制本视图)
+        if self._vshare.visible:
+            VisualNode.draw(self)
+
+    def _prepare_draw(self, view=None):
+        # VisualView 丢弃源对象的返回值；源对象返回 False (没有可绘制的数据) 时跳过本视图的绘制
+        return self._visual._prepare_draw(view=view)
+
+    def attach(self, filt, view=None):
+        # 滤镜 (ViewBox裁剪等) 只作用于本节点，不扩散到同一源的其他视图
+        VisualView.attach(self, filt, view=self)
+
+    def detach(self, filt, view=None):
+        VisualView.detach(self, filt, view=self)
+
+    namespace = {'__init__': __init__, '_on_source_update': _on_source_update,
+                 'draw': draw, '_prepare_draw': _prepare_draw, 'attach': attach, 'detach': detach}
+    namespace.update(attributes)
+    return type(name, (VisualNode, VisualView), namespace)
+
+
+# MarkersVisual 的变换准备会读取视图的 _scaling。固定像素尺寸时 vispy 的球面深度把
+# 场景坐标与可视化坐标相减，节点带变换 (叠合显示的图层) 时深度出错，改为在可视化坐标中计算
+_MarkersViewNode = _view_node_class(
+    'MarkersViewNode', _scaling=property(
+        lambda self: 'visual' if self._visual._scaling == 'fixed' else self._visual._scaling))
+_ViewNode = _view_node_class('ViewNode')
+
+
+def instance_transform(matrix: np.ndarray) -> MatrixTransform:
+    """列向量约定的 (4,4) 变换矩阵 (x' = R x + t) 对应的 vispy 变换 (vispy 为行向量约定)"""
+    return MatrixTransform(np.asarray(matrix, dtype=np.float64).T)
+
+
+class ViewLayer(scene.Node):
+    """
+    视图中的图层节点，可整体从视图的场景中摘下和重新挂上。vispy 只在可视化节点自身
+    挂入场景时向上查找 ViewBox 的裁剪滤镜，普通节点不会把裁剪转交给子节点；图层转交，
+    在摘下期间创建的节点挂回视图后同样被裁剪在视图矩形内
+    """
+
+    def _set_clipper(self, node, clipper):
+        # 摘下图层时保留子节点的裁剪 (挂回同一视图时无需重新附加滤镜)
+        if clipper is None:
+            return
+        for child in self.children:
+            if getattr(child, '_clippers', {}).get(node) is not clipper:
+                child._set_clipper(node, clipper)
+
+
+class SharedVisual:
+    def __init__(self, visual: Visual, views: Sequence[Union[scene.ViewBox, scene.Node]],
+                 instances: Optional[np.ndarray] = None):
+        """
+        一个源可视化对象 (数据上传一次、着色器编译一次) 在每个ViewBox中各有一个视图节点
+
+        给出实例变换时每个视图每个实例各一个节点 (如生物组装体的对称拷贝)，节点只带
+        自己的变换矩阵，顶点缓冲、纹理和着色器仍只有一份。vispy 默认的 gl2 后端没有
+        实例化绘制，每个实例是一次绘制调用。
+
+        参数:
+            visual: 不在场景图中的源可视化对象 (visuals.MarkersVisual、SegmentsVisual 或冒名顶替体)
+            views: 要显示的ViewBox，或各视图中作为父节点的场景节点 (如按视图开关的图层)
+            instances: (K,4,4) 实例变换矩阵 (列向量约定)，None 表示只绘制一份
+        """
+        self.visual = visual
+        self.instances = instances
+        node_class = _MarkersViewNode if isinstance(visual, visuals.MarkersVisual) else _ViewNode
+        # 每个视图一组节点，未实例化时每组只有一个节点
+        self.nodes: List[List[VisualNode]] = []
+        for view in views:
+            parent = view.scene if isinstance(view, scene.ViewBox) else view
+            if instances is None:
+                self.nodes.append([node_class(visual, parent=parent)])
+                continue
+            group = []
+            for matrix in instances:
+                node = node_class(visual, parent=parent)
+                node.transform = instance_transform(matrix)
+                group.append(node)
+            self.nodes.append(group)
+
+    def set_visible(self, visible: Union[bool, np.ndarray], index: Optional[int] = None):
+        """
+        显示或隐藏视图节点
+
+        参数:
+            visible: 是否可见，或 (K,) bool 数组逐个实例指定
+            index: 视图序号，None 表示全部视图
+        """
+        groups = self.nodes if index is None else [self.nodes[index]]
+        for group in groups:
+            shown = np.broadcast_to(visible, len(group))
+            for node, node_visible in zip(group, shown):
+                node.visible = bool(node_visible)
+
+    @property
+    def nbytes(self) -> int:
+        """源可视化对象的GPU缓冲字节数 (各视图节点共用，不重复计算)"""
+        return gpu_nbytes(self.visual)
+
+    def set_enabled(self, enabled: bool):
+        """在全部视图中启用或停用绘制，不改变各视图自身的可见性选择"""
+        self.visual.visible = enabled
+
+    def set_draft(self, draft: bool):
+        """
+        切换低开销绘制 (交互期间): 原子关闭抗锯齿和球面着色，线段关闭平滑，
+        其他可视化对象 (如冒名顶替体) 调用自身的 set_draft
+
+        参数:
+            draft: True 为低开销绘制，False 恢复完整画质
+        """
+        if isinstance(self.visual, visuals.MarkersVisual):
+            self.visual.antialias = 0 if draft else 1
+            self.visual.spherical = not draft
+        elif isinstance(self.visual, SegmentsVisual):
+            self.visual.set_antialias(not draft)
+        else:
+            self.visual.set_draft(draft)
+
+    def detach(self):
+        """从所有视图中移除"""
+        for group in self.nodes:
+            for node in group:
+                self.visual.events.update.disconnect(node._on_source_update)
+                node.parent = None
+        self.nodes = []
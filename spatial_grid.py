@@ -0,0 +1,169 @@
+import numpy as np
+from typing import Iterator, Tuple
+
+# 半壳邻居偏移: 与自身单元一起覆盖全部 27 个邻居单元，且每对单元只访问一次
+_HALF_SHELL = np.array(
+    [(dx, dy, dz)
+     for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+     if (dx, dy, dz) > (0, 0, 0)],
+    dtype=np.int64
+)
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将若干 [start, start+count) 区间展开为扁平下标
+
+    返回:
+        tuple: (区间编号, 展开后的下标)
+    """
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + local
+
+
+class CellGrid:
+    def __init__(self, coords: np.ndarray, cell_size: float):
+        """
+        基于排序单元列表(cell list)的均匀空间网格，构建和查询均为近线性复杂度
+
+        参数:
+            coords: (N,3) 原子坐标
+            cell_size: 网格单元边长 (Å)
+        """
+        self.coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+
+        if len(self.coords):
+            self.origin = self.coords.min(axis=0).astype(np.float64)
+        else:
+            self.origin = np.zeros(3)
+        cells = self._cell_coords(self.coords)
+        self.dims = cells.max(axis=0) + 1 if len(cells) else np.ones(3, dtype=np.int64)
+
+        # 按单元键排序原子，同一单元内的原子在 order 中连续
+        keys = self._cell_keys(cells)
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(
+            sorted_keys, return_index=True, return_counts=True)
+        self._cells = cells[self.order[self.cell_starts]]
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def _cell_coords(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _cell_keys(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def _lookup(self, cells: np.ndarray) -> np.ndarray:
+        """查找单元在已占用单元表中的位置，不存在或越界时返回 -1"""
+        inside = np.all((cells >= 0) & (cells < self.dims), axis=1)
+        keys = self._cell_keys(np.where(inside[:, None], cells, 0))
+        pos = np.searchsorted(self.cell_keys, keys)
+        pos = np.minimum(pos, len(self.cell_keys) - 1)
+        found = inside & (self.cell_keys[pos] == keys)
+        return np.where(found, pos, -1)
+
+    def pairs_within(self, cutoff: float, chunk_pairs: int = 1 << 22
+                     ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        分块枚举距离不超过 cutoff 的所有原子对 (i < j)
+
+        参数:
+            cutoff: 距离阈值，不得大于 cell_size
+            chunk_pairs: 每块最多检查的候选原子对数量，用于限制内存
+
+        返回:
+            迭代器，每次产出 (i, j, 距离平方)
+        """
+        if cutoff > self.cell_size:
+            raise ValueError("cutoff must not exceed the grid cell size")
+        if len(self.cell_keys) == 0:
+            return
+        cutoff_sq = cutoff * cutoff
+
+        # 收集相邻单元对: 自身单元 + 半壳邻居
+        n_cells = len(self.cell_keys)
+        first = [np.arange(n_cells)]
+        second = [np.arange(n_cells)]
+        for offset in _HALF_SHELL:
+            neighbor = self._lookup(self._cells + offset)
+            hit = neighbor >= 0
+            first.append(np.flatnonzero(hit))
+            second.append(neighbor[hit])
+        first = np.concatenate(first)
+        second = np.concatenate(second)
+        same = first == second
+
+        sizes = self.cell_counts[first] * self.cell_counts[second]
+        bounds = np.cumsum(sizes)
+        splits = np.searchsorted(bounds, np.arange(chunk_pairs, bounds[-1], chunk_pairs))
+        for part in np.split(np.arange(len(first)), splits):
+            if len(part) == 0:
+                continue
+            c1, c2 = first[part], second[part]
+            n2 = self.cell_counts[c2]
+            owner, flat = _expand_ranges(np.zeros(len(part), dtype=np.int64), sizes[part])
+            a = flat // n2[owner]
+            b = flat % n2[owner]
+            keep = ~same[part][owner] | (a < b)
+            owner, a, b = owner[keep], a[keep], b[keep]
+
+            i = self.order[self.cell_starts[c1][owner] + a]
+            j = self.order[self.cell_starts[c2][owner] + b]
+            diff = self.coords[i] - self.coords[j]
+            dist_sq = np.einsum('ij,ij->i', diff, diff)
+            close = dist_sq <= cutoff_sq
+            i, j, dist_sq = i[close], j[close], dist_sq[close]
+            yield np.minimum(i, j), np.maximum(i, j), dist_sq
+
+    def query_radius(self, points: np.ndarray, radius: float, chunk_points: int = 1 << 16
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        查找每个查询点半径范围内的所有原子
+
+        参数:
+            points: (K,3) 查询点
+            radius: 搜索半径 (Å)，可以大于 cell_size
+            chunk_points: 每块处理的查询点数量
+
+        返回:
+            tuple: (查询点下标, 原子下标, 距离平方)
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        # 按单元键排序查询点，使单元查找的访问顺序连续
+        visit = np.argsort(self._cell_keys(self._cell_coords(points)), kind='stable')
+        points = points[visit]
+        span = int(np.ceil(radius / self.cell_size))
+        r = np.arange(-span, span + 1)
+        offsets = np.stack(np.meshgrid(r, r, r, indexing='ij'), axis=-1).reshape(-1, 3)
+        radius_sq = radius * radius
+
+        out_q, out_a, out_d = [], [], []
+        for start in range(0, len(points), chunk_points):
+            chunk = points[start:start + chunk_points]
+            base = self._cell_coords(chunk)
+            for offset in offsets:
+                cell = self._lookup(base + offset)
+                hit = np.flatnonzero(cell >= 0)
+                if len(hit) == 0:
+                    continue
+                owner, flat = _expand_ranges(self.cell_starts[cell[hit]],
+                                             self.cell_counts[cell[hit]])
+                q = hit[owner]
+                atoms = self.order[flat]
+                diff = self.coords[atoms] - chunk[q]
+                dist_sq = np.einsum('ij,ij->i', diff, diff)
+                close = dist_sq <= radius_sq
+                out_q.append(q[close] + start)
+                out_a.append(atoms[close])
+                out_d.append(dist_sq[close])
+
+        if not out_q:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float32)
+        return visit[np.concatenate(out_q)], np.concatenate(out_a), np.concatenate(out_d)
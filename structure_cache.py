@@ -0,0 +1,336 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+from protein_structure import ProteinStructure
+from assembly import Assembly
+
+# 缓存格式版本，格式或解析/拓扑逻辑变化时递增，旧缓存会自动失效
+CACHE_FORMAT_VERSION = 4
+
+_MAGIC = b'PCSCACHE'
+_PREAMBLE = struct.Struct('<8sII')   # magic, 版本, 头部长度
+_ALIGN = 64
+_SUFFIX = '.pcs'
+
+# 需要缓存的结构列
+_STRUCTURE_ARRAYS = ('coords', 'element_codes', 'bonds', 'atom_names', 'res_names', 'res_ids',
+                     'chain_ids', 'ins_codes', 'serials', 'b_factors', 'occupancies', 'hetero')
+
+DEFAULT_MAX_BYTES = 4 << 30
+
+
+def default_cache_dir() -> str:
+    """默认缓存目录，可通过环境变量 PROTEINCODE_CACHE_DIR 覆盖"""
+    if os.environ.get('PROTEINCODE_CACHE_DIR'):
+        return os.environ['PROTEINCODE_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'proteincodeshell')
+
+
+class StructureCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 key_mode: str = 'stat'):
+        """
+        已解析结构和拓扑的磁盘缓存，每个结构存为一个可内存映射的二进制包
+
+        参数:
+            cache_dir: 缓存目录，默认为 default_cache_dir()
+            max_bytes: 缓存总大小上限，超出时按最近最少使用淘汰
+            key_mode: 'stat' 以 路径+修改时间+大小 为键 (快)，'content' 以文件内容哈希为键
+        """
+        if key_mode not in ('stat', 'content'):
+            raise ValueError(f"unknown key_mode: {key_mode!r}")
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.key_mode = key_mode
+        self._lock = threading.Lock()
+
+    def key(self, path: str) -> str:
+        """计算结构文件的缓存键"""
+        digest = hashlib.sha1()
+        if self.key_mode == 'content':
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        else:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}".encode())
+        digest.update(f"|v{CACHE_FORMAT_VERSION}".encode())
+        return digest.hexdigest()
+
+    def _bundle_path(self, path: str) -> str:
+        return os.path.join(self.cache_dir, self.key(path) + _SUFFIX)
+
+    def load(self, path: str) -> Optional[ProteinStructure]:
+        """
+        从缓存读取结构，数组以只读内存映射方式打开
+
+        参数:
+            path: 结构文件路径
+
+        返回:
+            ProteinStructure对象，未命中或缓存无效时返回None
+        """
+        try:
+            bundle = self._bundle_path(path)
+            if not os.path.exists(bundle):
+                return None
+            arrays, meta = self._read_bundle(bundle)
+        except (OSError, ValueError, KeyError):
+            return None
+        if arrays is None:
+            self._remove(bundle)
+            return None
+
+        # 更新修改时间作为LRU访问记录
+        try:
+            os.utime(bundle)
+        except OSError:
+            pass
+
+        structure = ProteinStructure(
+            arrays['coords'], arrays['element_codes'], arrays['bonds'],
+            atom_names=arrays['atom_names'], res_names=arrays['res_names'],
+            res_ids=arrays['res_ids'], chain_ids=arrays['chain_ids'],
+            ins_codes=arrays['ins_codes'], serials=arrays['serials'],
+            b_factors=arrays['b_factors'], occupancies=arrays['occupancies'],
+            hetero=arrays['hetero'], source=path,
+            assembly=Assembly.from_dict(meta['assembly']) if meta.get('assembly') else None
+        )
+        structure.derived('hierarchy', lambda: (arrays['residue_offsets'], arrays['chain_offsets']))
+        return structure
+
+    def store(self, path: str, structure: ProteinStructure):
+        """
+        写入结构到缓存 (先写临时文件再原子替换)，随后按大小上限淘汰旧条目
+
+        参数:
+            path: 结构文件路径
+            structure: 含拓扑的结构
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays = {name: getattr(structure, name) for name in _STRUCTURE_ARRAYS}
+        arrays['residue_offsets'] = structure.residue_offsets
+        arrays['chain_offsets'] = structure.chain_offsets
+        meta = {'source': os.path.abspath(path), 'n_atoms': structure.n_atoms}
+        if structure.assembly is not None:
+            meta['assembly'] = structure.assembly.to_dict()
+
+        bundle = self._bundle_path(path)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self._write_bundle(f, arrays, meta)
+            os.replace(tmp, bundle)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def _derived_path(self, path: str, name: str) -> str:
+        digest = hashlib.sha1(name.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self.key(path)}-{digest}{_SUFFIX}")
+
+    def load_arrays(self, path: str, name: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        读取随结构文件缓存的派生数组 (如表面网格)，与结构条目同样以只读内存映射方式打开
+
+        参数:
+            path: 结构文件路径
+            name: 派生数据名称，同一文件的不同派生数据 (类型、分辨率、选择) 各存一个条目
+
+        返回:
+            数组字典，未命中或缓存无效时返回None
+        """
+        try:
+            bundle = self._derived_path(path, name)
+            if not os.path.exists(bundle):
+                return None
+            arrays, meta = self._read_bundle(bundle)
+        except (OSError, ValueError, KeyError):
+            return None
+        if arrays is None or meta.get('name') != name:
+            self._remove(bundle)
+            return None
+        try:
+            os.utime(bundle)
+        except OSError:
+            pass
+        return arrays
+
+    def store_arrays(self, path: str, name: str, arrays: Dict[str, np.ndarray]):
+        """
+        写入结构文件的派生数组，结构文件变化后键随之变化，旧条目由大小上限淘汰
+
+        参数:
+            path: 结构文件路径
+            name: 派生数据名称
+            arrays: 要缓存的数组
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        bundle = self._derived_path(path, name)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self._write_bundle(f, arrays, {'source': os.path.abspath(path), 'name': name})
+            os.replace(tmp, bundle)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    @staticmethod
+    def _write_bundle(f, arrays: Dict[str, np.ndarray], meta: dict):
+        # 头部记录每个数组的类型、形状和对齐后的偏移
+        entries = {}
+        offset = 0
+        for name, array in arrays.items():
+            offset = -(-offset // _ALIGN) * _ALIGN
+            entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += array.nbytes
+        header = json.dumps({'arrays': entries, 'meta': meta}).encode()
+        data_start = -(-(_PREAMBLE.size + len(header)) // _ALIGN) * _ALIGN
+
+        f.write(_PREAMBLE.pack(_MAGIC, CACHE_FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    @staticmethod
+    def _read_bundle(bundle: str):
+        """读取缓存包，版本不符时返回 (None, None)"""
+        with open(bundle, 'rb') as f:
+            magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != _MAGIC or version != CACHE_FORMAT_VERSION:
+                return None, None
+            header = json.loads(f.read(header_len))
+        data_start = -(-(_PREAMBLE.size + header_len) // _ALIGN) * _ALIGN
+
+        arrays = {}
+        for name, entry in header['arrays'].items():
+            shape = tuple(entry['shape'])
+            dtype = np.dtype(entry['dtype'])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(bundle, dtype=dtype, mode='r', shape=shape,
+                                         offset=data_start + entry['offset'])
+        return arrays, header['meta']
+
+    def _entries(self) -> List[os.DirEntry]:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [e for e in os.scandir(self.cache_dir) if e.name.endswith(_SUFFIX)]
+
+    def size(self) -> int:
+        """缓存当前占用的字节数"""
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def evict(self):
+        """按最近访问时间淘汰条目，直到总大小不超过上限"""
+        with self._lock:
+            entries = []
+            for entry in self._entries():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, bundle in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(bundle)
+                total -= size
+
+    def clear(self):
+        """删除所有缓存条目"""
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def prewarm(self, paths: Iterable[str], progress=None) -> int:
+        """
+        预先解析结构并写入缓存
+
+        参数:
+            paths: 结构文件路径
+            progress: 每处理完一个文件后以 (路径, 是否成功) 回调
+
+        返回:
+            新写入缓存的文件数
+        """
+        from protein_draw import ProteinDataLoader
+
+        added = 0
+        for path in paths:
+            if self.load(path) is not None:
+                ok = True
+            else:
+                ok = ProteinDataLoader(path, cache=self).load_structure() is not None
+                added += ok
+            if progress is not None:
+                progress(path, ok)
+        return added
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_default_cache = None
+
+
+def get_default_cache() -> Optional[StructureCache]:
+    """
+    进程内共享的默认缓存，设置环境变量 PROTEINCODE_NO_CACHE=1 可禁用
+
+    返回:
+        StructureCache对象或None
+    """
+    global _default_cache
+    if os.environ.get('PROTEINCODE_NO_CACHE'):
+        return None
+    if _default_cache is None:
+        _default_cache = StructureCache()
+    return _default_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ProteinCodeShell structure cache")
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--max-gb', type=float, default=DEFAULT_MAX_BYTES / 2**30)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    prewarm = sub.add_parser('prewarm', help="parse all structures in a directory into the cache")
+    prewarm.add_argument('directory')
+    prewarm.add_argument('--pattern', default='*.pdb')
+    prewarm.add_argument('--recursive', action='store_true')
+    sub.add_parser('info', help="show cache location and size")
+    sub.add_parser('clear', help="remove all cached structures")
+
+    args = parser.parse_args()
+    cache = StructureCache(args.cache_dir, max_bytes=int(args.max_gb * 2**30))
+    if args.command == 'prewarm':
+        pattern = os.path.join(args.directory, '**' if args.recursive else '', args.pattern)
+        paths = sorted(glob.glob(pattern, recursive=args.recursive))
+        added = cache.prewarm(paths, progress=lambda path, ok: print(f"{'ok' if ok else 'FAILED'}  {path}"))
+        print(f"{added} added, {len(paths)} files, cache size {cache.size() / 2**20:.1f} MB")
+    elif args.command == 'info':
+        print(f"{cache.cache_dir}: {len(cache._entries())} entries, {cache.size() / 2**20:.1f} MB")
+    elif args.command == 'clear':
+        cache.clear()
+
+
+if __name__ == "__main__":
+    main()
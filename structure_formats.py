@@ -0,0 +1,54 @@
+import gzip
+from typing import Callable, Optional
+from pdb_reader import PDBColumns, is_gzipped, read_pdb_columns
+from cif_reader import read_bcif_columns, read_mmcif_columns
+
+FORMAT_PDB = 'pdb'
+FORMAT_MMCIF = 'mmcif'
+FORMAT_BCIF = 'bcif'
+
+# 按内容判断格式时读取的 (解压后) 字节数
+_SNIFF_BYTES = 4096
+# msgpack map 的首字节: fixmap、map16、map32
+_MSGPACK_MAP = set(range(0x80, 0x90)) | {0xde, 0xdf}
+
+
+def detect_format(path: str) -> str:
+    """
+    按文件内容 (而不是扩展名) 判断结构文件格式，gzip 文件按解压后的内容判断
+
+    返回:
+        FORMAT_PDB、FORMAT_MMCIF 或 FORMAT_BCIF
+    """
+    opener = gzip.open if is_gzipped(path) else open
+    with opener(path, 'rb') as f:
+        head = f.read(_SNIFF_BYTES)
+    if head and head[0] in _MSGPACK_MAP and b'dataBlocks' in head:
+        return FORMAT_BCIF
+    # mmCIF 以 data_ 块开头，前面只可能有注释和空行
+    for line in head.splitlines():
+        line = line.strip()
+        if not line or line.startswith(b'#'):
+            continue
+        return FORMAT_MMCIF if line[:5].lower() == b'data_' else FORMAT_PDB
+    return FORMAT_PDB
+
+
+def read_structure_columns(path: str,
+                           progress: Optional[Callable[[float], None]] = None) -> PDBColumns:
+    """
+    读取 PDB、mmCIF 或 BinaryCIF 文件 (均可 gzip 压缩) 的原子数据，格式按内容判断
+
+    参数:
+        path: 结构文件路径
+        progress: 以已读比例 (0~1) 回调，可在回调中抛出异常中止解析
+
+    返回:
+        PDBColumns对象，各格式输出相同的列
+    """
+    file_format = detect_format(path)
+    if file_format == FORMAT_BCIF:
+        return read_bcif_columns(path, progress=progress)
+    if file_format == FORMAT_MMCIF:
+        return read_mmcif_columns(path, progress=progress)
+    return read_pdb_columns(path, progress=progress)
@@ -0,0 +1,228 @@
+import numpy as np
+from typing import Dict, Optional
+from element_data import ELEMENT_SYMBOLS, ELEMENT_H
+from protein_structure import ProteinStructure
+from secondary_structure import backbone_atoms, secondary_structure
+
+# 可用的配色方案
+SCHEME_ELEMENT = 'element'
+SCHEME_CHAIN = 'chain'
+SCHEME_BFACTOR = 'bfactor'
+SCHEME_RESIDUE = 'residue'
+COLOR_SCHEMES = (SCHEME_ELEMENT, SCHEME_CHAIN, SCHEME_BFACTOR, SCHEME_RESIDUE)
+
+# 原子表示方式: 点精灵 (固定像素尺寸)、球棍模型、空间填充模型、二级结构卡通、
+# 分子表面和溶剂可及表面
+REPRESENTATION_POINTS = 'points'
+REPRESENTATION_BALL_AND_STICK = 'ball_and_stick'
+REPRESENTATION_SPACEFILL = 'spacefill'
+REPRESENTATION_CARTOON = 'cartoon'
+REPRESENTATION_SURFACE = 'surface'
+REPRESENTATION_SAS = 'sas'
+REPRESENTATIONS = (REPRESENTATION_POINTS, REPRESENTATION_BALL_AND_STICK, REPRESENTATION_SPACEFILL,
+                   REPRESENTATION_CARTOON, REPRESENTATION_SURFACE, REPRESENTATION_SAS)
+
+# 选择高亮颜色
+SELECTION_HIGHLIGHT_COLOR = (0.2, 1.0, 0.3, 1)
+
+# 链配色循环使用的调色板
+CHAIN_PALETTE = np.array([
+    (0.12, 0.47, 0.71, 1), (1.00, 0.50, 0.05, 1), (0.17, 0.63, 0.17, 1),
+    (0.84, 0.15, 0.16, 1), (0.58, 0.40, 0.74, 1), (0.55, 0.34, 0.29, 1),
+    (0.89, 0.47, 0.76, 1), (0.50, 0.50, 0.50, 1), (0.74, 0.74, 0.13, 1),
+    (0.09, 0.75, 0.81, 1),
+], dtype=np.float32)
+
+# 温度因子渐变 (蓝 -> 白 -> 红)，量化为 256 级
+BFACTOR_LEVELS = 256
+_BFACTOR_STOPS = np.array([(0.2, 0.3, 1.0, 1), (1.0, 1.0, 1.0, 1), (1.0, 0.2, 0.2, 1)],
+                          dtype=np.float32)
+
+# 残基类型分类及其颜色
+_RESIDUE_CATEGORIES = {
+    'hydrophobic': ((0.9, 0.8, 0.4, 1), ('ALA', 'VAL', 'LEU', 'ILE', 'MET', 'MSE', 'PHE', 'TRP', 'PRO')),
+    'polar': ((0.3, 0.8, 0.5, 1), ('SER', 'THR', 'ASN', 'GLN', 'TYR', 'CYS', 'GLY', 'HIS')),
+    'acidic': ((0.9, 0.2, 0.2, 1), ('ASP', 'GLU')),
+    'basic': ((0.2, 0.4, 1.0, 1), ('LYS', 'ARG')),
+    'nucleic': ((1.0, 0.6, 0.1, 1), ('A', 'C', 'G', 'U', 'DA', 'DC', 'DG', 'DT')),
+    'water': ((0.6, 0.8, 1.0, 1), ('HOH', 'WAT', 'DOD')),
+}
+_OTHER_RESIDUE_COLOR = (0.8, 0.2, 0.8, 1)
+
+# 二级结构颜色，按 secondary_structure.SS_* 编码索引 (卷曲、螺旋、折叠、转角)
+SECONDARY_STRUCTURE_TABLE = np.array([
+    (0.85, 0.85, 0.85, 1), (0.90, 0.25, 0.45, 1), (0.95, 0.80, 0.20, 1), (0.55, 0.75, 0.90, 1),
+], dtype=np.float32)
+RESIDUE_CATEGORY_TABLE = np.array(
+    [color for color, _ in _RESIDUE_CATEGORIES.values()] + [_OTHER_RESIDUE_COLOR], dtype=np.float32)
+_RESIDUE_CATEGORY = {name.encode(): index
+                     for index, (_, names) in enumerate(_RESIDUE_CATEGORIES.values())
+                     for name in names}
+
+
+def element_color_table(element_colors: Dict[str, tuple]) -> np.ndarray:
+    """
+    由 元素符号 -> 颜色 字典构建按元素编码索引的颜色查找表
+
+    参数:
+        element_colors: 元素颜色字典，'OTHERS' 为未列出元素的颜色
+
+    返回:
+        (len(ELEMENT_SYMBOLS), 4) float32 数组
+    """
+    other = element_colors.get('OTHERS', _OTHER_RESIDUE_COLOR)
+    return np.array([element_colors.get(symbol.upper(), other) for symbol in ELEMENT_SYMBOLS],
+                    dtype=np.float32)
+
+
+def element_size_table(hydrogen: float = 5, other: float = 8) -> np.ndarray:
+    """按元素编码索引的原子尺寸查找表"""
+    table = np.full(len(ELEMENT_SYMBOLS), other, dtype=np.float32)
+    table[ELEMENT_H] = hydrogen
+    return table
+
+
+def bfactor_gradient(levels: int = BFACTOR_LEVELS) -> np.ndarray:
+    """温度因子渐变查找表"""
+    t = np.linspace(0, 1, levels)
+    stops = np.linspace(0, 1, len(_BFACTOR_STOPS))
+    return np.stack([np.interp(t, stops, _BFACTOR_STOPS[:, k]) for k in range(4)],
+                    axis=1).astype(np.float32)
+
+
+def chain_codes(structure: ProteinStructure) -> np.ndarray:
+    """(N,) 每个原子的链编号 (按链标识去重，同一标识的多个链段编号相同)"""
+    def build():
+        residue_offsets, chain_offsets = structure.residue_offsets, structure.chain_offsets
+        first_atom = residue_offsets[chain_offsets[:-1]]
+        _, segment_code = np.unique(structure.chain_ids[first_atom], return_inverse=True)
+        atoms_per_segment = np.diff(residue_offsets[chain_offsets])
+        return np.repeat(segment_code.reshape(-1), atoms_per_segment).astype(np.int32)
+    return structure.derived('chain_codes', build)
+
+
+def residue_category_codes(structure: ProteinStructure) -> np.ndarray:
+    """(N,) 每个原子所属残基的类型编号 (RESIDUE_CATEGORY_TABLE 的下标)"""
+    def build():
+        residue_offsets = structure.residue_offsets
+        names, inverse = np.unique(structure.res_names[residue_offsets[:-1]], return_inverse=True)
+        other = len(RESIDUE_CATEGORY_TABLE) - 1
+        category = np.array([_RESIDUE_CATEGORY.get(bytes(name), other) for name in names],
+                            dtype=np.uint8)
+        return np.repeat(category[inverse.reshape(-1)], np.diff(residue_offsets))
+    return structure.derived('residue_category_codes', build)
+
+
+def bfactor_codes(structure: ProteinStructure, levels: int = BFACTOR_LEVELS) -> np.ndarray:
+    """(N,) 按结构内 B 因子范围归一化并量化后的渐变级别"""
+    def build():
+        b = structure.b_factors
+        if len(b) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        lo, hi = float(b.min()), float(b.max())
+        scale = (levels - 1) / (hi - lo) if hi > lo else 0.0
+        return ((b - lo) * scale).astype(np.uint8)
+    return structure.derived('bfactor_codes', build)
+
+
+class StyleEngine:
+    def __init__(self, element_colors: Dict[str, tuple]):
+        """
+        向量化配色引擎: 把整数编码 (元素、链、残基类型、B因子级别) 通过查找表
+        一次映射为颜色和尺寸，结果缓存在共享结构上
+
+        参数:
+            element_colors: 元素颜色字典 (按元素配色时使用)
+        """
+        self.element_colors = element_colors
+        self.size_table = element_size_table()
+        self._bfactor_table = bfactor_gradient()
+
+    def colors(self, structure: ProteinStructure, scheme: str = SCHEME_ELEMENT) -> np.ndarray:
+        """
+        计算原子颜色
+
+        参数:
+            structure: 结构
+            scheme: 配色方案，见 COLOR_SCHEMES
+
+        返回:
+            (N,4) float32 只读数组
+        """
+        if scheme == SCHEME_ELEMENT:
+            table = element_color_table(self.element_colors)
+            key = f'colors:{scheme}:{hash(table.tobytes())}'
+            return structure.derived(key, lambda: table[structure.element_codes])
+        if scheme == SCHEME_CHAIN:
+            return structure.derived(
+                f'colors:{scheme}',
+                lambda: CHAIN_PALETTE[chain_codes(structure) % len(CHAIN_PALETTE)])
+        if scheme == SCHEME_BFACTOR:
+            return structure.derived(
+                f'colors:{scheme}', lambda: self._bfactor_table[bfactor_codes(structure)])
+        if scheme == SCHEME_RESIDUE:
+            return structure.derived(
+                f'colors:{scheme}',
+                lambda: RESIDUE_CATEGORY_TABLE[residue_category_codes(structure)])
+        raise ValueError(f"unknown color scheme: {scheme!r}")
+
+    def sizes(self, structure: ProteinStructure) -> np.ndarray:
+        """(N,) float32 原子尺寸 (按元素)"""
+        return structure.derived('sizes', lambda: self.size_table[structure.element_codes])
+
+    def residue_colors(self, structure: ProteinStructure, scheme: str = SCHEME_ELEMENT
+                       ) -> np.ndarray:
+        """
+        残基颜色 (卡通): 按元素配色时按二级结构着色，其他方案取残基 CA 原子
+        (没有 CA 时取第一个原子) 的颜色
+
+        返回:
+            (R,4) float32 只读数组
+        """
+        if scheme == SCHEME_ELEMENT:
+            return structure.derived(
+                'residue_colors:ss',
+                lambda: SECONDARY_STRUCTURE_TABLE[secondary_structure(structure)])
+        colors = self.colors(structure, scheme)
+
+        def build():
+            representative = structure.residue_offsets[:-1].copy()
+            residues, atoms = backbone_atoms(structure)
+            representative[residues] = atoms[:, 1]
+            return colors[representative]
+        return structure.derived(f'residue_colors:{scheme}', build)
+
+    def bond_colors(self, structure: ProteinStructure, scheme: str = SCHEME_ELEMENT
+                    ) -> Optional[np.ndarray]:
+        """
+        键线段顶点颜色 (每个端点取所连原子的颜色)，按元素配色时返回None表示统一灰色
+
+        返回:
+            (2M,4) float32 数组或None
+        """
+        if scheme == SCHEME_ELEMENT:
+            return None
+        colors = self.colors(structure, scheme)
+        return structure.derived(f'bond_colors:{scheme}',
+                                 lambda: colors[structure.bonds].reshape(-1, 4),
+                                 uses_bonds=True)
+
+
+def recolor_markers(visual, colors: np.ndarray) -> bool:
+    """
+    原地替换 Markers 可视化的填充颜色，只改写已有的顶点缓冲，不重新整理其他属性
+
+    参数:
+        visual: vispy Markers 可视化对象
+        colors: (N,4) 颜色，N须与已有点数一致
+
+    返回:
+        bool: 是否成功 (可视化对象尚无数据或点数不一致时返回False)
+    """
+    data = getattr(visual, '_data', None)
+    if data is None or len(data) != len(colors) or 'a_bg_color' not in data.dtype.names:
+        return False
+    data['a_bg_color'] = colors
+    visual._vbo.set_data(data)
+    visual.update()
+    return True
@@ -0,0 +1,284 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Tuple
+from protein_structure import ProteinStructure
+from selection import select_atoms
+
+# 默认按 Cα 原子叠合和计算RMSD
+DEFAULT_SELECTION = 'name CA'
+# 至少需要三个不共线的点才能确定旋转
+MIN_ALIGNED_ATOMS = 3
+# 全对全RMSD矩阵按 (块, 块) 分块计算，每块的中间数组约为 块大小² × 20 个 float64
+RMSD_BLOCK = 256
+# QCP 求最大特征值的牛顿迭代: 最大次数和相对收敛精度
+_QCP_MAX_ITERATIONS = 50
+_QCP_PRECISION = 1e-11
+
+
+def alignment_atoms(structure: ProteinStructure, selection: str = DEFAULT_SELECTION) -> np.ndarray:
+    """
+    参与叠合的原子下标，选择不足三个原子时退回全部原子，结果缓存在共享结构上
+
+    参数:
+        structure: 结构
+        selection: 选择表达式 (语法见 selection.Selection)
+
+    返回:
+        (n,) 原子下标
+    """
+    def atoms():
+        index = np.flatnonzero(select_atoms(structure, selection))
+        return index if len(index) >= MIN_ALIGNED_ATOMS else np.arange(structure.n_atoms)
+    return structure.derived(f'alignment_atoms:{selection}', atoms)
+
+
+def matched_atoms(reference: ProteinStructure, mobile: ProteinStructure,
+                  selection: str = DEFAULT_SELECTION) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    两个不同文件的结构 (如同一蛋白的不同构象) 中相互对应的原子: 按 (链, 残基序号,
+    插入码, 原子名) 配对，各取选择中的原子
+
+    参数:
+        reference: 参考结构
+        mobile: 要叠合到参考结构上的结构
+        selection: 选择表达式
+
+    返回:
+        tuple: (参考结构中的下标, 移动结构中的下标)，按参考结构的原子顺序；
+               对应原子不足三个时为两个空数组
+    """
+    def keys(structure: ProteinStructure, index: np.ndarray) -> np.ndarray:
+        return np.rec.fromarrays([structure.chain_ids[index], structure.res_ids[index],
+                                  structure.ins_codes[index], structure.atom_names[index]])
+
+    ref_index = np.flatnonzero(select_atoms(reference, selection))
+    mob_index = np.flatnonzero(select_atoms(mobile, selection))
+    _, ref_pos, mob_pos = np.intersect1d(keys(reference, ref_index), keys(mobile, mob_index),
+                                         assume_unique=False, return_indices=True)
+    if len(ref_pos) < MIN_ALIGNED_ATOMS:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.argsort(ref_pos)
+    return ref_index[ref_pos[order]], mob_index[mob_pos[order]]
+
+
+def kabsch(mobile: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量 Kabsch 叠合: 全部帧的协方差用一次 einsum 求出，旋转由批量 SVD 得到 (含镜像校正)
+
+    参数:
+        mobile: (F,n,3) 各帧中参与叠合的原子坐标，或单帧 (n,3)
+        target: (n,3) 参考坐标
+
+    返回:
+        tuple: (变换矩阵 (F,4,4) 列向量约定 x' = R x + t, 叠合后的RMSD (F,))；
+               单帧输入时为 ((4,4), 标量)
+    """
+    mobile = np.asarray(mobile, dtype=np.float64)
+    single = mobile.ndim == 2
+    frames = mobile[None] if single else mobile
+    target = np.asarray(target, dtype=np.float64)
+    n_atoms = target.shape[0]
+
+    frame_centers = frames.mean(axis=1)
+    target_center = target.mean(axis=0)
+    centered = frames - frame_centers[:, None, :]
+    reference = target - target_center
+    covariance = np.einsum('fni,nj->fij', centered, reference)
+    u, s, vt = np.linalg.svd(covariance)
+    # 行列式为负时翻转最小奇异值对应的轴，得到旋转而不是镜像
+    sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    sign[sign == 0] = 1.0
+    u[:, :, 2] *= sign[:, None]
+    rotations = np.einsum('fji,fkj->fik', vt, u)
+
+    matrices = np.tile(np.eye(4), (len(frames), 1, 1))
+    matrices[:, :3, :3] = rotations
+    matrices[:, :3, 3] = target_center - np.einsum('fij,fj->fi', rotations, frame_centers)
+    residual = (np.einsum('fni,fni->f', centered, centered) + np.sum(reference * reference)
+                - 2.0 * (s[:, 0] + s[:, 1] + sign * s[:, 2]))
+    rmsd = np.sqrt(np.maximum(residual, 0.0) / max(n_atoms, 1))
+    return (matrices[0], float(rmsd[0])) if single else (matrices, rmsd)
+
+
+def apply_transform(coords: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    对坐标施加列向量约定的 (4,4) 刚体变换
+
+    参数:
+        coords: (N,3) 坐标
+        matrix: (4,4) 变换矩阵
+
+    返回:
+        (N,3) float32 变换后的坐标
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    return (coords @ matrix[:3, :3].T + matrix[:3, 3]).astype(np.float32)
+
+
+def read_frames(trajectory, atoms: Optional[np.ndarray] = None,
+                frames: Optional[Sequence[int]] = None,
+                workers: Optional[int] = None) -> np.ndarray:
+    """
+    从 trajectory.Trajectory 读取多帧中选定原子的坐标，各帧在线程池中并行解析
+
+    参数:
+        trajectory: 轨迹
+        atoms: 原子下标，None 表示全部原子
+        frames: 帧序号，None 表示全部帧
+        workers: 线程数，默认为CPU核数
+
+    返回:
+        (F,n,3) float32 坐标
+    """
+    frames = range(trajectory.n_frames) if frames is None else frames
+    atoms = slice(None) if atoms is None else atoms
+
+    def read(index: int) -> np.ndarray:
+        return trajectory.frame(index)[atoms]
+
+    workers = min(len(frames), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(read, frames))
+    else:
+        parts = [read(index) for index in frames]
+    if not parts:
+        return np.zeros((0, 0, 3), dtype=np.float32)
+    return np.stack(parts).astype(np.float32, copy=False)
+
+
+def _qcp_rmsd(covariance: np.ndarray, g_a: np.ndarray, g_b: np.ndarray, n_atoms: int) -> np.ndarray:
+    """
+    QCP 方法 (Theobald 2005): 由 3x3 协方差矩阵的元素直接求 4x4 关键矩阵的最大特征值，
+    不做逐对 SVD，全部帧对一起做逐元素牛顿迭代
+
+    参数:
+        covariance: (3, 3, ...) 已中心化的两帧坐标的协方差 sum(a_i b_j)，分量在前
+        g_a, g_b: (...) 两帧各自的坐标平方和 (可广播)
+        n_atoms: 原子数
+
+    返回:
+        (...) 最优叠合后的RMSD
+    """
+    (sxx, sxy, sxz), (syx, syy, syz), (szx, szy, szz) = covariance
+    c0_shape = np.broadcast_shapes(np.shape(sxx), np.shape(g_a), np.shape(g_b))
+    sxx2, syy2, szz2 = sxx * sxx, syy * syy, szz * szz
+    sxy2, syz2, sxz2 = sxy * sxy, syz * syz, sxz * sxz
+    syx2, szy2, szx2 = syx * syx, szy * szy, szx * szx
+
+    syzszy_syyszz2 = 2.0 * (syz * szy - syy * szz)
+    sxx2syy2szz2syz2szy2 = syy2 + szz2 - sxx2 + syz2 + szy2
+    c2 = -2.0 * (sxx2 + syy2 + szz2 + sxy2 + syx2 + sxz2 + szx2 + syz2 + szy2)
+    c1 = 8.0 * (sxx * syz * szy + syy * szx * sxz + szz * sxy * syx
+                - sxx * syy * szz - syz * szx * sxy - szy * syx * sxz)
+
+    sxzpszx, syzpszy, sxypsyx = sxz + szx, syz + szy, sxy + syx
+    syzmszy, sxzmszx, sxymsyx = syz - szy, sxz - szx, sxy - syx
+    sxxpsyy, sxxmsyy = sxx + syy, sxx - syy
+    sxy2sxz2syx2szx2 = sxy2 + sxz2 - syx2 - szx2
+    c0 = (sxy2sxz2syx2szx2 * sxy2sxz2syx2szx2
+          + (sxx2syy2szz2syz2szy2 + syzszy_syyszz2) * (sxx2syy2szz2syz2szy2 - syzszy_syyszz2)
+          + (-sxzpszx * syzmszy + sxymsyx * (sxxmsyy - szz))
+          * (-sxzmszx * syzpszy + sxymsyx * (sxxmsyy + szz))
+          + (-sxzpszx * syzpszy - sxypsyx * (sxxpsyy - szz))
+          * (-sxzmszx * syzmszy - sxypsyx * (sxxpsyy + szz))
+          + (sxypsyx * syzpszy + sxzpszx * (sxxmsyy + szz))
+          * (-sxymsyx * syzmszy + sxzpszx * (sxxpsyy + szz))
+          + (sxypsyx * syzmszy + sxzmszx * (sxxmsyy - szz))
+          * (-sxymsyx * syzpszy + sxzmszx * (sxxpsyy - szz)))
+
+    # 从上界 (G_a + G_b) / 2 出发，牛顿迭代单调收敛到最大特征值；
+    # 已收敛的帧对移出迭代，RMSD大的少数帧对不会拖慢整块
+    e0 = np.broadcast_to((g_a + g_b) * 0.5, c0.shape).ravel()
+    eigen = e0.copy()
+    active = np.arange(eigen.size)
+    c0, c1, c2 = c0.ravel(), c1.ravel(), c2.ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(_QCP_MAX_ITERATIONS):
+            x = eigen[active]
+            x2 = x * x
+            b = (x2 + c2) * x
+            a = b + c1
+            delta = (a * x + c0) / (2.0 * x2 * x + b + a)
+            delta[~np.isfinite(delta)] = 0.0
+            x -= delta
+            eigen[active] = x
+            pending = np.abs(delta) > _QCP_PRECISION * np.abs(x)
+            if not pending.any():
+                break
+            if pending.sum() < len(active) // 2:
+                active, c0, c1, c2 = active[pending], c0[pending], c1[pending], c2[pending]
+    return np.sqrt(np.abs(2.0 * (e0 - eigen)) / max(n_atoms, 1)).reshape(c0_shape)
+
+
+def rmsd_matrix(frames: np.ndarray, block: int = RMSD_BLOCK,
+                workers: Optional[int] = None) -> np.ndarray:
+    """
+    全对全最优叠合RMSD矩阵: 各帧中心化一次，每块帧对的协方差由一次矩阵乘法 (BLAS)
+    得到，再用 QCP 逐元素求RMSD；只计算上三角的块，分块在线程池中并行，内存只与块大小有关
+
+    参数:
+        frames: (F,n,3) 各帧中参与比较的原子坐标 (如 read_frames 的结果)
+        block: 块大小 (帧数)
+        workers: 线程数，默认为CPU核数
+
+    返回:
+        (F,F) float32 对称矩阵，对角线为0
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    n_frames, n_atoms = frames.shape[:2]
+    centered = frames - frames.mean(axis=1, keepdims=True)
+    squares = np.einsum('fni,fni->f', centered, centered)
+    # (分量, 帧, 原子): 一块帧对的协方差分量 S_kl 即两个连续切片的矩阵乘积
+    components = np.ascontiguousarray(centered.transpose(2, 0, 1))
+    result = np.zeros((n_frames, n_frames), dtype=np.float32)
+
+    def compute(span: Tuple[int, int]):
+        i0, j0 = span
+        i1, j1 = min(i0 + block, n_frames), min(j0 + block, n_frames)
+        covariance = [[components[k, i0:i1] @ components[l, j0:j1].T for l in range(3)]
+                      for k in range(3)]
+        rmsd = _qcp_rmsd(covariance, squares[i0:i1, None], squares[None, j0:j1], n_atoms)
+        result[i0:i1, j0:j1] = rmsd
+        result[j0:j1, i0:i1] = rmsd.T
+
+    spans = [(i0, j0) for i0 in range(0, n_frames, block) for j0 in range(i0, n_frames, block)]
+    workers = min(len(spans), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(compute, spans))
+    else:
+        for span in spans:
+            compute(span)
+    np.fill_diagonal(result, 0.0)
+    return result
+
+
+def ensemble_structure(structure: ProteinStructure, frames: Sequence[np.ndarray]) -> ProteinStructure:
+    """
+    把同一拓扑的多帧坐标 (如叠合后的NMR模型) 拼成一个结构同时显示: 各列和键连按帧重复
+
+    参数:
+        structure: 提供拓扑的结构
+        frames: 各帧 (N,3) 坐标
+
+    返回:
+        新的ProteinStructure对象 (F*N 个原子，没有组装体)
+    """
+    copies = len(frames)
+    n_atoms = structure.n_atoms
+    coords = np.concatenate(frames) if copies else np.zeros((0, 3), dtype=np.float32)
+    atoms = np.tile(np.arange(n_atoms), copies)
+    bonds = None
+    if structure.has_topology:
+        offsets = np.repeat(np.arange(copies) * n_atoms, structure.n_bonds)
+        bonds = np.tile(structure.bonds, (copies, 1)) + offsets[:, None]
+    return ProteinStructure(
+        coords, structure.element_codes[atoms], bonds,
+        atom_names=structure.atom_names[atoms], res_names=structure.res_names[atoms],
+        res_ids=structure.res_ids[atoms], chain_ids=structure.chain_ids[atoms],
+        ins_codes=structure.ins_codes[atoms], serials=structure.serials[atoms],
+        b_factors=structure.b_factors[atoms], occupancies=structure.occupancies[atoms],
+        hetero=structure.hetero[atoms], source=structure.source
+    )
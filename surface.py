@@ -0,0 +1,306 @@
+import hashlib
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from vispy.geometry.isosurface import isosurface
+from cartoon import CartoonMesh, CartoonVisual
+from element_data import VDW_RADII
+from hierarchy import hierarchy_index
+from protein_structure import ProteinStructure
+from selection import select_atoms
+from structure_cache import get_default_cache
+
+# 表面类型: 分子表面 (范德华球的高斯近似，接近溶剂排除表面) 和溶剂可及表面 (半径加探针)
+SURFACE_MOLECULAR = 'molecular'
+SURFACE_SOLVENT_ACCESSIBLE = 'sas'
+SURFACE_KINDS = (SURFACE_MOLECULAR, SURFACE_SOLVENT_ACCESSIBLE)
+PROBE_RADIUS = 1.4
+
+# 高斯密度 ρ(x) = Σ exp(-b (|x-c|²/r² - 1)) 取等值面 ρ=1: 孤立原子的表面正好在半径 r 处，
+# 相邻原子之间的窄缝被填平。b 越大越贴近球面并集；溶剂可及表面的半径已含探针，取更大的 b
+SURFACE_BLOBBINESS = {SURFACE_MOLECULAR: 2.0, SURFACE_SOLVENT_ACCESSIBLE: 4.0}
+ISOVALUE = 1.0
+# 单个原子的贡献低于该值时截断
+DENSITY_CUTOFF = 0.01
+
+# 默认参与表面的原子
+DEFAULT_SURFACE_SELECTION = 'not water and not hydrogen'
+
+# 网格间距 (Å)，级别越高越粗糙；参与原子数达到阈值时默认使用更粗糙的级别
+SURFACE_SPACINGS = (0.6, 0.9, 1.2, 2.0)
+SURFACE_LEVEL_ATOMS = (8_000, 30_000, 300_000)
+# 空间分块的边长 (网格单元数)，各块在线程池中独立泼溅密度并提取等值面
+SURFACE_BLOCK_CELLS = 64
+# 泼溅时每批 (原子数 x 模板点数) 的上限，限制每个线程的临时内存
+SPLAT_CHUNK = 1 << 20
+
+# 磁盘缓存条目的格式版本，表面算法或参数变化时递增
+SURFACE_CACHE_VERSION = 1
+
+
+class SurfaceMesh(CartoonMesh):
+    def __init__(self, vertices: np.ndarray, normals: np.ndarray, faces: np.ndarray,
+                 residues: np.ndarray, atoms: np.ndarray):
+        """
+        表面三角网格，字段与卡通网格相同，另记录每个顶点所属的原子
+
+        参数:
+            vertices: (V,3) float32 顶点坐标
+            normals: (V,3) float32 顶点法线 (密度梯度的反方向)
+            faces: (F,3) uint32 三角形顶点下标
+            residues: (V,) int64 顶点所属残基
+            atoms: (V,) int64 顶点所属原子 (贡献最大的原子，用于按原子着色和隐藏)
+        """
+        super().__init__(vertices, normals, faces, residues)
+        self.atoms = atoms
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in
+                   (self.vertices, self.normals, self.faces, self.residues, self.atoms))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """写入磁盘缓存的数组"""
+        return {'vertices': self.vertices, 'normals': self.normals, 'faces': self.faces,
+                'residues': self.residues, 'atoms': self.atoms}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'SurfaceMesh':
+        return cls(arrays['vertices'], arrays['normals'], arrays['faces'],
+                   arrays['residues'], arrays['atoms'])
+
+
+def _empty_mesh() -> SurfaceMesh:
+    return SurfaceMesh(np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32),
+                       np.zeros((0, 3), np.uint32), np.zeros(0, np.int64), np.zeros(0, np.int64))
+
+
+def surface_level(n_atoms: int) -> int:
+    """按参与表面的原子数选择默认级别 (SURFACE_SPACINGS 的下标)"""
+    return int(np.searchsorted(SURFACE_LEVEL_ATOMS, n_atoms, side='right'))
+
+
+def surface_atoms(structure: ProteinStructure, selection: Optional[str] = None) -> np.ndarray:
+    """参与表面的原子下标，selection 为 None 时使用 DEFAULT_SURFACE_SELECTION"""
+    return np.flatnonzero(select_atoms(structure, selection or DEFAULT_SURFACE_SELECTION))
+
+
+def _edge_gradient(gradient: Tuple[np.ndarray, ...], vertices: np.ndarray) -> np.ndarray:
+    """
+    等值面顶点处的密度梯度: marching cubes 的顶点都在网格边上，在边的两个端点间线性插值
+
+    参数:
+        gradient: 各轴梯度分量，与顶点坐标使用相同的网格下标
+        vertices: (V,3) 顶点的网格下标坐标 (至多一个分量不是整数)
+    """
+    lower = np.floor(vertices).astype(np.int64)
+    t = vertices - lower
+    axis = np.argmax(t, axis=1)
+    frac = t[np.arange(len(t)), axis]
+    upper = lower.copy()
+    upper[np.arange(len(t)), axis] += frac > 0
+    result = np.empty((len(vertices), 3), dtype=np.float64)
+    for i, component in enumerate(gradient):
+        a = component[lower[:, 0], lower[:, 1], lower[:, 2]]
+        b = component[upper[:, 0], upper[:, 1], upper[:, 2]]
+        result[:, i] = a + (b - a) * frac
+    return result
+
+
+def build_surface(structure: ProteinStructure, kind: str = SURFACE_MOLECULAR, level: int = 0,
+                  selection: Optional[str] = None, coords: Optional[np.ndarray] = None,
+                  workers: Optional[int] = None) -> SurfaceMesh:
+    """
+    生成表面网格: 原子的高斯密度泼溅到均匀网格上，用 marching cubes 提取等值面。
+    网格按 SURFACE_BLOCK_CELLS 分块，每块只泼溅截断球与它相交的原子，在线程池中并行
+    (每块的时间主要花在大数组的 NumPy 运算上，运算期间释放 GIL)
+
+    参数:
+        structure: 结构
+        kind: 表面类型，见 SURFACE_KINDS
+        level: 分辨率级别，SURFACE_SPACINGS 的下标
+        selection: 参与表面的原子的选择表达式，None 使用 DEFAULT_SURFACE_SELECTION
+        coords: (N,3) 使用的坐标 (轨迹帧)，None 使用结构自身坐标
+        workers: 线程数，默认为CPU核数
+
+    返回:
+        SurfaceMesh (相邻块的接缝处顶点不合并)
+    """
+    if kind not in SURFACE_KINDS:
+        raise ValueError(f"unknown surface kind: {kind!r}")
+    coords = structure.coords if coords is None else coords
+    atoms = surface_atoms(structure, selection)
+    if len(atoms) == 0:
+        return _empty_mesh()
+    spacing = SURFACE_SPACINGS[level]
+    blobbiness = SURFACE_BLOBBINESS[kind]
+    centers = coords[atoms].astype(np.float64)
+    radii = VDW_RADII[structure.element_codes[atoms]].astype(np.float64)
+    if kind == SURFACE_SOLVENT_ACCESSIBLE:
+        radii = radii + PROBE_RADIUS
+    inv_radius_sq = blobbiness / radii ** 2
+    cutoff = float(radii.max() * np.sqrt(1 + np.log(1 / DENSITY_CUTOFF) / blobbiness))
+
+    # 全局网格包住全部截断球并各向外多留一个单元，块在其上按单元划分
+    origin = centers.min(axis=0) - cutoff - spacing
+    n_cells = np.ceil((centers.max(axis=0) + cutoff + spacing - origin) / spacing).astype(np.int64)
+    block = SURFACE_BLOCK_CELLS
+    n_blocks = -(-n_cells // block)
+    # 原子到最近网格点每轴至多半个单元，模板取以最近网格点为中心的 (2k+1)³ 立方体
+    k = int(np.floor(cutoff / spacing + 0.5))
+    nearest = np.rint((centers - origin) / spacing).astype(np.int64)
+
+    # 块 b 计算梯度需要网格点 [bB-1, bB+B+1]，原子影响 [nearest-k, nearest+k]
+    first = np.clip(-((block + 1 + k - nearest) // block), 0, n_blocks - 1)
+    last = np.clip((nearest + k + 1) // block, 0, n_blocks - 1)
+    counts = last - first + 1
+    per_atom = counts.prod(axis=1)
+    pair_atom = np.repeat(np.arange(len(atoms)), per_atom)
+    local = np.arange(len(pair_atom)) - np.repeat(np.cumsum(per_atom) - per_atom, per_atom)
+    cy, cz = counts[pair_atom, 1], counts[pair_atom, 2]
+    bx = first[pair_atom, 0] + local // (cy * cz)
+    by = first[pair_atom, 1] + (local // cz) % cy
+    bz = first[pair_atom, 2] + local % cz
+    keys = (bx * n_blocks[1] + by) * n_blocks[2] + bz
+    order = np.argsort(keys, kind='stable')
+    block_keys, starts = np.unique(keys[order], return_index=True)
+    block_members = np.split(pair_atom[order], starts[1:])
+
+    offsets = np.arange(-k, k + 1)
+
+    def splat(members: np.ndarray, low: np.ndarray, shape: np.ndarray
+              ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        把原子密度累加到从网格点 low 开始的局部网格，越界的模板点收进最外层 (随后丢弃)；
+        同时记录每个网格点贡献最大的原子
+
+        返回:
+            tuple: (密度, 贡献最大的原子在 members 中的位置)
+        """
+        size = int(shape.prod())
+        density = np.zeros(size, dtype=np.float64)
+        # float32 贡献值的位模式 (正数的大小顺序与整数一致) 放在高位、原子位置放在低位，
+        # 取最大值即得贡献最大的原子
+        owner = np.zeros(size, dtype=np.int64)
+        stride = np.array([shape[1] * shape[2], shape[2], 1])
+        chunk = max(1, SPLAT_CHUNK // len(offsets) ** 3)
+        for start in range(0, len(members), chunk):
+            part = members[start:start + chunk]
+            points = nearest[part][:, :, None] + offsets          # (A,3,K) 全局网格下标
+            delta = origin[None, :, None] + spacing * points - centers[part][:, :, None]
+            # 高斯核可分离: exp(b - e) = Πaxis exp(b/3 - e_axis)，立方体模板由三个一维因子外积得到
+            gauss = np.exp(blobbiness / 3 - inv_radius_sq[part][:, None, None] * delta ** 2
+                           ).astype(np.float32)
+            index = (np.clip(points - low[None, :, None], 0, (shape - 1)[None, :, None])
+                     * stride[None, :, None])
+            values = (gauss[:, 0, :, None, None] * gauss[:, 1, None, :, None]
+                      * gauss[:, 2, None, None, :]).ravel()
+            flat = (index[:, 0, :, None, None] + index[:, 1, None, :, None]
+                    + index[:, 2, None, None, :]).ravel()
+            density += np.bincount(flat, values, minlength=size)
+            keys = values.view(np.int32).astype(np.int64) << 32
+            keys |= np.repeat(np.arange(start, start + len(part)), len(offsets) ** 3)
+            np.maximum.at(owner, flat, keys)
+        owner &= (1 << 32) - 1
+        return density.reshape(tuple(shape)).astype(np.float32), owner.reshape(tuple(shape))
+
+    def extract(job):
+        key, members = job
+        index = np.array([key // (n_blocks[1] * n_blocks[2]), (key // n_blocks[2]) % n_blocks[1],
+                          key % n_blocks[2]])
+        start = index * block
+        stop = np.minimum(start + block, n_cells)
+        # 局部网格点 [start-2, stop+2]: 内层一圈用于中心差分梯度，最外层收集越界的模板点
+        density, owner = splat(members, start - 2, stop - start + 5)
+        core = density[2:-2, 2:-2, 2:-2]
+        if not (core.max() >= ISOVALUE > core.min()):
+            return None
+        # vispy 的边表偏移是 uint8，块边长小于 256 时回绕后的切片仍然正确
+        with np.errstate(over='ignore'):
+            vertices, faces = isosurface(core, ISOVALUE)
+        if len(faces) == 0:
+            return None
+        vertices = vertices.astype(np.float64)
+        gradient = np.gradient(density[1:-1, 1:-1, 1:-1])
+        normals = -_edge_gradient(gradient, vertices + 1)
+        normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+        # 顶点取所在边上较近网格点的归属原子
+        point = np.rint(vertices).astype(np.int64) + 2
+        vertex_atoms = members[owner[point[:, 0], point[:, 1], point[:, 2]]]
+        return origin + spacing * (start + vertices), normals, faces, vertex_atoms
+
+    jobs = list(zip(block_keys, block_members))
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = [part for part in pool.map(extract, jobs) if part is not None]
+    else:
+        parts = [part for part in map(extract, jobs) if part is not None]
+    if not parts:
+        return _empty_mesh()
+
+    vertex_offsets = np.cumsum([0] + [len(part[0]) for part in parts[:-1]])
+    vertex_atoms = atoms[np.concatenate([part[3] for part in parts])]
+    return SurfaceMesh(
+        np.concatenate([part[0] for part in parts]).astype(np.float32),
+        np.concatenate([part[1] for part in parts]).astype(np.float32),
+        np.concatenate([part[2] + offset for part, offset in zip(parts, vertex_offsets)]
+                       ).astype(np.uint32),
+        hierarchy_index(structure).atom_residue[vertex_atoms].astype(np.int64),
+        vertex_atoms.astype(np.int64))
+
+
+def surface_cache_name(structure: ProteinStructure, kind: str, level: int,
+                selection: Optional[str]) -> str:
+    """磁盘缓存条目名: 表面参数加参与原子坐标和元素的摘要 (同一文件的子集结构不会混用)"""
+    atoms = surface_atoms(structure, selection)
+    digest = hashlib.sha1(np.ascontiguousarray(structure.coords[atoms]).tobytes())
+    digest.update(np.ascontiguousarray(structure.element_codes[atoms]).tobytes())
+    return (f"surface:v{SURFACE_CACHE_VERSION}:{kind}:{SURFACE_SPACINGS[level]:g}:"
+            f"{selection or DEFAULT_SURFACE_SELECTION}:{digest.hexdigest()}")
+
+
+def surface_mesh(structure: ProteinStructure, kind: str = SURFACE_MOLECULAR,
+                 level: Optional[int] = None, selection: Optional[str] = None) -> SurfaceMesh:
+    """
+    表面网格，按类型、分辨率和选择缓存在共享结构上 (各视图共用)；来自文件的结构
+    同时写入磁盘缓存，之后的会话直接内存映射读取
+
+    参数:
+        structure: 结构
+        kind: 表面类型，见 SURFACE_KINDS
+        level: 分辨率级别，None 按参与原子数选择
+        selection: 参与表面的原子的选择表达式，None 使用 DEFAULT_SURFACE_SELECTION
+    """
+    if level is None:
+        level = surface_level(len(surface_atoms(structure, selection)))
+
+    def build():
+        cache = get_default_cache()
+        source = structure.source
+        if cache is None or source is None or not os.path.isfile(source):
+            return build_surface(structure, kind, level, selection)
+        name = surface_cache_name(structure, kind, level, selection)
+        arrays = cache.load_arrays(source, name)
+        if arrays is not None:
+            return SurfaceMesh.from_arrays(arrays)
+        mesh = build_surface(structure, kind, level, selection)
+        try:
+            cache.store_arrays(source, name, mesh.arrays())
+        except OSError:
+            pass
+        return mesh
+
+    return structure.derived(
+        f'surface:{kind}:{level}:{selection or DEFAULT_SURFACE_SELECTION}', build)
+
+
+class SurfaceVisual(CartoonVisual):
+    """
+    表面可视化: 与卡通共用着色器和缓冲布局，顶点按所属原子着色，
+    set_colors 和 set_residue_mask 的参数按原子给出
+    """
+
+    def _owners(self) -> np.ndarray:
+        return self.mesh.atoms
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 模块都在仓库根目录下，测试直接按模块名导入
+sys.path.insert(0, ROOT)
+# 测试不读写用户的结构缓存，缓存相关测试使用临时目录
+os.environ['PROTEINCODE_NO_CACHE'] = '1'
+
+
+@pytest.fixture(scope='session')
+def pdb_1ake() -> str:
+    """仓库根目录下的 1ake.pdb (腺苷酸激酶二聚体，含配体和水，3804 个原子)"""
+    return os.path.join(ROOT, '1ake.pdb')
+
+
+@pytest.fixture(scope='session')
+def structure_1ake(pdb_1ake):
+    """含拓扑的 1ake 结构 (不经过磁盘缓存)"""
+    from protein_draw import ProteinDataLoader
+    return ProteinDataLoader(pdb_1ake, use_cache=False).load_structure()
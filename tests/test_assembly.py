@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+from assembly import Assembly, assembly_from_cif, expand_structure, parse_biomt, parse_oper_expression
+from protein_draw import ProteinDataLoader
+from pdb_reader import read_pdb_columns
+
+
+def rotation_z(degrees: float) -> np.ndarray:
+    angle = np.radians(degrees)
+    return np.array([[np.cos(angle), -np.sin(angle), 0],
+                     [np.sin(angle), np.cos(angle), 0],
+                     [0, 0, 1]])
+
+
+def biomt_lines(chains: str, matrices) -> list:
+    """按 PDB 固定列格式写出一个生物分子的 REMARK 350 记录"""
+    lines = ['REMARK 350 BIOMOLECULE: 1',
+             f'REMARK 350 APPLY THE FOLLOWING TO CHAINS: {chains}']
+    for serial, matrix in enumerate(matrices, start=1):
+        for row in range(3):
+            a, b, c, t = matrix[row]
+            lines.append(f'REMARK 350   BIOMT{row + 1}{serial:4d}{a:10.6f}{b:10.6f}{c:10.6f}     {t:10.5f}')
+    return lines
+
+
+def transform(rotation: np.ndarray, translation) -> np.ndarray:
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation
+    matrix[:3, 3] = translation
+    return matrix
+
+
+MATRICES = [np.eye(4), transform(rotation_z(90), (10.0, -5.0, 2.5)), transform(rotation_z(180), (0, 0, 30))]
+
+
+def test_parse_biomt():
+    lines = biomt_lines('A, B', MATRICES)
+    # 第二个生物分子不读取
+    lines += ['REMARK 350 BIOMOLECULE: 2'] + biomt_lines('A', MATRICES[:1])[1:]
+    assembly = parse_biomt([line.encode() for line in lines])
+    assert assembly.name == '1'
+    assert assembly.n_copies == 3
+    chains, matrices = assembly.generators[0]
+    assert chains == frozenset({b'A', b'B'})
+    np.testing.assert_allclose(matrices, MATRICES, atol=1e-5)
+
+
+def test_parse_biomt_without_matrices():
+    assert parse_biomt([b'REMARK 350 BIOMOLECULE: 1']) is None
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('1', [('1',)]),
+    ('1,2,5', [('1',), ('2',), ('5',)]),
+    ('(1-3)', [('1',), ('2',), ('3',)]),
+    ('(1,2)(3-5)', [('1', '3'), ('1', '4'), ('1', '5'), ('2', '3'), ('2', '4'), ('2', '5')]),
+    ('P', [('P',)]),
+])
+def test_parse_oper_expression(expression, expected):
+    assert parse_oper_expression(expression) == expected
+
+
+def test_parse_oper_expression_range():
+    combos = parse_oper_expression('(1-60)')
+    assert combos == [(str(i),) for i in range(1, 61)]
+
+
+def oper_list(matrices) -> dict:
+    """_pdbx_struct_oper_list 的各列"""
+    table = {'id': [str(i) for i in range(1, len(matrices) + 1)]}
+    for i in range(3):
+        for j in range(3):
+            table[f'matrix[{i + 1}][{j + 1}]'] = [str(m[i, j]) for m in matrices]
+        table[f'vector[{i + 1}]'] = [str(m[i, 3]) for m in matrices]
+    return table
+
+
+def test_assembly_from_cif():
+    assembly_gen = {'assembly_id': ['1', '1', '2'],
+                    'oper_expression': ['(1,2)(3)', '1', '2'],
+                    'asym_id_list': ['A,C', 'B', 'A']}
+    assembly = assembly_from_cif(assembly_gen, oper_list(MATRICES), {b'A': b'A', b'B': b'B', b'C': b'A'})
+    assert assembly.name == '1'
+    assert assembly.n_copies == 3
+    (chains_1, matrices_1), (chains_2, matrices_2) = assembly.generators
+    assert chains_1 == frozenset({b'A'}) and chains_2 == frozenset({b'B'})
+    # 组合中靠右的操作先作用
+    np.testing.assert_allclose(matrices_1, [MATRICES[0] @ MATRICES[2], MATRICES[1] @ MATRICES[2]])
+    np.testing.assert_allclose(matrices_2, [MATRICES[0]])
+
+
+def test_assembly_from_cif_missing_columns():
+    assert assembly_from_cif({'assembly_id': ['1']}, {}, {}) is None
+
+
+def test_dict_round_trip():
+    assembly = Assembly([([b'A'], MATRICES[:2]), (None, MATRICES[2:])], name='7')
+    restored = Assembly.from_dict(assembly.to_dict())
+    assert restored.name == '7'
+    for (chains, matrices), (chains_r, matrices_r) in zip(assembly.generators, restored.generators):
+        assert chains == chains_r
+        np.testing.assert_array_equal(matrices, matrices_r)
+
+
+@pytest.fixture
+def assembly_file(tmp_path, pdb_1ake):
+    """在 1ake 的原子记录前加上 REMARK 350 (两条链，三个拷贝)"""
+    with open(pdb_1ake) as f:
+        records = [line for line in f if line.startswith(('ATOM  ', 'HETATM', 'CONECT', 'END'))]
+    path = tmp_path / 'assembly.pdb'
+    path.write_text('\n'.join(biomt_lines('A, B', MATRICES)) + '\n' + ''.join(records))
+    return str(path)
+
+
+def test_reader_keeps_assembly(assembly_file):
+    assembly = read_pdb_columns(assembly_file).assembly
+    assert assembly is not None and assembly.n_copies == 3
+
+
+def test_expand_structure(assembly_file):
+    structure = ProteinDataLoader(assembly_file, use_cache=False).load_structure()
+    expanded = expand_structure(structure)
+    n_atoms = structure.n_atoms
+    assert expanded.assembly is None
+    assert expanded.n_atoms == n_atoms * len(MATRICES)
+    assert expanded.n_bonds == structure.n_bonds * len(MATRICES)
+    for copy, matrix in enumerate(MATRICES):
+        atoms = slice(copy * n_atoms, (copy + 1) * n_atoms)
+        expected = structure.coords.astype(np.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+        np.testing.assert_allclose(expanded.coords[atoms], expected, atol=1e-3)
+        assert np.array_equal(expanded.atom_names[atoms], structure.atom_names)
+        assert np.array_equal(expanded.bonds[copy * structure.n_bonds:(copy + 1) * structure.n_bonds],
+                              structure.bonds + copy * n_atoms)
+
+
+def test_expand_subset_of_chains(structure_1ake):
+    structure = structure_1ake.with_bonds(structure_1ake.bonds)
+    structure.assembly = Assembly([([b'A'], MATRICES[:2])])
+    expanded = expand_structure(structure)
+    chain_a = np.flatnonzero(structure.chain_ids == b'A')
+    assert expanded.n_atoms == 2 * len(chain_a)
+    assert np.all(expanded.chain_ids == b'A')
+    np.testing.assert_allclose(expanded.coords[len(chain_a):],
+                               structure.coords[chain_a] @ MATRICES[1][:3, :3].T + MATRICES[1][:3, 3],
+                               atol=1e-3)
+
+
+def test_file_assembly(structure_1ake):
+    """1ake 的生物分子 1 只含链 A (单个恒等变换)"""
+    expanded = expand_structure(structure_1ake)
+    chain_a = structure_1ake.chain_ids == b'A'
+    assert expanded.n_atoms == np.count_nonzero(chain_a)
+    np.testing.assert_allclose(expanded.coords, structure_1ake.coords[chain_a], atol=1e-3)
+
+
+def test_expand_without_assembly(structure_1ake):
+    structure = structure_1ake.with_bonds(structure_1ake.bonds)
+    structure.assembly = None
+    assert expand_structure(structure) is structure
@@ -0,0 +1,57 @@
+import numpy as np
+from bond_detection import DEFAULT_BOND_TOLERANCE, MIN_BOND_DISTANCE, detect_bonds
+from element_data import COVALENT_RADII, ELEMENT_H
+from pdb_reader import read_pdb_columns
+from residue_topology import ResidueTopology, build_topology
+
+
+def bond_set(bonds: np.ndarray) -> set:
+    return set(map(tuple, np.sort(bonds, axis=1).tolist()))
+
+
+def brute_force_bonds(coords: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """逐对比较距离与共价半径之和的参照实现"""
+    coords = coords.astype(np.float64)
+    radii = COVALENT_RADII[codes]
+    i, j = np.triu_indices(len(coords), k=1)
+    dist = np.linalg.norm(coords[i] - coords[j], axis=1)
+    ok = (dist <= radii[i] + radii[j] + DEFAULT_BOND_TOLERANCE) & (dist >= MIN_BOND_DISTANCE)
+    ok &= ~((codes[i] == ELEMENT_H) & (codes[j] == ELEMENT_H))
+    return np.stack([i[ok], j[ok]], axis=1)
+
+
+def test_detected_bonds_match_template_and_conect(pdb_1ake):
+    """1ake 没有异常几何: 按距离检测的键与残基模板 + 肽键 + CONECT 给出的拓扑完全相同"""
+    columns = read_pdb_columns(pdb_1ake)
+    topology = build_topology(columns)
+    detected = detect_bonds(columns.coords, columns.element_codes)
+    assert len(topology) == 3484
+    assert bond_set(detected) == bond_set(topology)
+
+
+def test_topology_covers_conect(pdb_1ake):
+    columns = read_pdb_columns(pdb_1ake)
+    topology = ResidueTopology(columns)
+    assert len(topology.fallback_bonds()) == 0
+    assert bond_set(topology.conect_bonds()) <= bond_set(build_topology(columns))
+
+
+def test_detect_bonds_matches_brute_force(pdb_1ake):
+    columns = read_pdb_columns(pdb_1ake)
+    detected = detect_bonds(columns.coords, columns.element_codes, chunk_pairs=1 << 12)
+    assert detected.dtype == np.int32
+    assert np.all(detected[:, 0] < detected[:, 1])
+    assert bond_set(detected) == bond_set(brute_force_bonds(columns.coords, columns.element_codes))
+
+
+def test_subset_bonds(pdb_1ake):
+    columns = read_pdb_columns(pdb_1ake)
+    full = detect_bonds(columns.coords, columns.element_codes)
+    subset = np.arange(100, 200)
+    expected = full[np.isin(full, subset).any(axis=1)]
+    assert bond_set(detect_bonds(columns.coords, columns.element_codes, subset=subset)) == bond_set(expected)
+
+
+def test_loader_bonds(structure_1ake, pdb_1ake):
+    assert structure_1ake.has_topology
+    assert bond_set(structure_1ake.bonds) == bond_set(build_topology(read_pdb_columns(pdb_1ake)))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from pdb_reader import read_pdb_columns
+from protein_draw import ProteinDataLoader
+from structure_formats import read_structure_columns
+
+
+@pytest.fixture(scope='module')
+def biopython_atoms(pdb_1ake):
+    """原先基于 Biopython 的 parse_pdb 给出的原子顺序、坐标和元素"""
+    PDB = pytest.importorskip('Bio.PDB')
+    structure = PDB.PDBParser(QUIET=True).get_structure('protein', pdb_1ake)
+    atoms = PDB.Selection.unfold_entities(structure, 'A')
+    coords = np.array([atom.get_coord() for atom in atoms], dtype=np.float32)
+    elements = np.array([atom.element for atom in atoms])
+    return structure, coords, elements
+
+
+def assert_same_atoms(columns, coords):
+    assert columns.n_atoms == len(coords)
+    np.testing.assert_allclose(columns.coords, coords, atol=1e-3)
+
+
+def test_pdb_matches_biopython_order(pdb_1ake, biopython_atoms):
+    """HETATM 排在所有链之后时仍按链分组，与 Biopython 的顺序相同"""
+    _, coords, _ = biopython_atoms
+    assert_same_atoms(read_pdb_columns(pdb_1ake), coords)
+
+
+def test_parse_pdb_matches_biopython(pdb_1ake, biopython_atoms):
+    _, coords, elements = biopython_atoms
+    atom_coords, atom_elements, bonds = ProteinDataLoader(pdb_1ake, use_cache=False).parse_pdb()
+    np.testing.assert_allclose(atom_coords, coords, atol=1e-3)
+    assert np.array_equal(np.char.upper(atom_elements.astype(str)), elements)
+    assert bonds.ndim == 2 and bonds.shape[1] == 2
+
+
+def test_mmcif_matches_biopython_order(tmp_path, biopython_atoms):
+    PDB = pytest.importorskip('Bio.PDB')
+    structure, coords, _ = biopython_atoms
+    io = PDB.MMCIFIO()
+    io.set_structure(structure)
+    path = str(tmp_path / '1ake.cif')
+    io.save(path)
+    assert_same_atoms(read_structure_columns(path), coords)
+
+
+def test_bcif_matches_biopython_order(tmp_path, pdb_1ake, biopython_atoms):
+    pytest.importorskip('msgpack')
+    pdb = pytest.importorskip('biotite.structure.io.pdb')
+    pdbx = pytest.importorskip('biotite.structure.io.pdbx')
+    _, coords, _ = biopython_atoms
+    atoms = pdb.PDBFile.read(pdb_1ake).get_structure(model=1, altloc='first',
+                                                      extra_fields=['b_factor', 'occupancy', 'atom_id'])
+    bcif = pdbx.BinaryCIFFile()
+    pdbx.set_structure(bcif, atoms, include_bonds=False)
+    path = str(tmp_path / '1ake.bcif')
+    bcif.write(path)
+    assert_same_atoms(read_structure_columns(path), coords)
+
+
+def test_conect_follows_reordering(pdb_1ake):
+    """按链重排后 CONECT 键连仍指向原来的原子序号 (未保留的交替构象原子除外)"""
+    columns = read_pdb_columns(pdb_1ake)
+    serial_pairs = {tuple(sorted(pair)) for pair in columns.serials[columns.conect].tolist()}
+    with open(pdb_1ake) as f:
+        records = [line for line in f if line.startswith('CONECT')]
+    kept = set(columns.serials.tolist())
+    expected = set()
+    for line in records:
+        origin = int(line[6:11])
+        for start in range(11, 31, 5):
+            field = line[start:start + 5].strip()
+            if field and int(field) != origin and {origin, int(field)} <= kept:
+                expected.add(tuple(sorted((origin, int(field)))))
+    assert serial_pairs == expected
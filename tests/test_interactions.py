@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from interactions import InteractionAnalyzer, analyze_interactions
+
+
+def assert_same(result, reference):
+    assert np.array_equal(result.residue_pairs, reference.residue_pairs)
+    np.testing.assert_allclose(result.residue_distances, reference.residue_distances, atol=1e-5)
+    for kind in ('clashes', 'hbonds', 'salt_bridges'):
+        rows = set(map(tuple, getattr(result, kind).tolist()))
+        assert rows == set(map(tuple, getattr(reference, kind).tolist())), kind
+    assert result.counts() == reference.counts()
+
+
+def moved_coords(structure, residues, shift):
+    """把若干残基的原子整体平移"""
+    offsets = structure.residue_offsets
+    atoms = np.concatenate([np.arange(offsets[r], offsets[r + 1]) for r in residues])
+    coords = np.array(structure.coords)
+    coords[atoms] += np.asarray(shift, dtype=np.float32)
+    return coords, atoms
+
+
+def test_full_analysis(structure_1ake):
+    counts = analyze_interactions(structure_1ake).counts()
+    assert counts == {'contacts': 2070, 'interfaces': 17, 'hbonds': 864,
+                      'salt_bridges': 74, 'clashes': 2}
+
+
+@pytest.mark.parametrize('residues, shift', [
+    ([10, 11, 12], (0.8, -0.5, 0.3)),
+    ([50, 150, 300], (2.5, 0.0, -1.5)),
+])
+def test_incremental_update_matches_full(structure_1ake, residues, shift):
+    analyzer = InteractionAnalyzer(structure_1ake)
+    analyzer.analyze()
+    coords, atoms = moved_coords(structure_1ake, residues, shift)
+    assert_same(analyzer.update(coords, atoms), analyze_interactions(structure_1ake, coords))
+
+    # 网格中已有过时原子时再移动一次 (不传 moved，逐原子比较)
+    coords2, _ = moved_coords(structure_1ake, [residues[0], 200], (-1.0, 1.0, 0.5))
+    assert_same(analyzer.update(coords2), analyze_interactions(structure_1ake, coords2))
+
+    # 恢复原坐标
+    assert_same(analyzer.update(structure_1ake.coords), analyze_interactions(structure_1ake))
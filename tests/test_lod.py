@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from lod import (spatial_chunks, chunk_bonds, choose_level, ATOM_BUDGET, CHUNK_ATOMS,
+                 MAX_CHUNKS_PER_AXIS, ATOM_PIXELS_PER_ANGSTROM, BEAD_PIXELS_PER_ANGSTROM,
+                 LEVEL_TRACE, LEVEL_BEADS, LEVEL_ATOMS)
+
+
+@pytest.mark.parametrize('n_atoms, target_atoms', [(1, CHUNK_ATOMS), (5000, 500),
+                                                   (200_000, CHUNK_ATOMS), (50_000, 1)])
+def test_spatial_chunks_partition(n_atoms, target_atoms):
+    rng = np.random.default_rng(n_atoms)
+    coords = (rng.random((n_atoms, 3)) * [300, 120, 60]).astype(np.float32)
+    chunks, boxes = spatial_chunks(coords, target_atoms)
+    assert len(chunks) == len(boxes) <= MAX_CHUNKS_PER_AXIS ** 3
+    assert boxes.shape == (len(chunks), 2, 3)
+    # 每个原子恰好属于一个分块
+    members = np.concatenate(chunks)
+    assert len(members) == n_atoms
+    np.testing.assert_array_equal(np.sort(members), np.arange(n_atoms))
+    # 每个包围盒恰好包住其中的原子
+    for atoms, (lo, hi) in zip(chunks, boxes):
+        assert len(atoms) > 0
+        assert np.all(coords[atoms] >= lo) and np.all(coords[atoms] <= hi)
+        np.testing.assert_array_equal(coords[atoms].min(axis=0), lo)
+        np.testing.assert_array_equal(coords[atoms].max(axis=0), hi)
+
+
+def test_spatial_chunks_flat(structure_1ake):
+    """所有原子共面 (某一轴跨度为0) 时仍能划分"""
+    coords = np.asarray(structure_1ake.coords, dtype=np.float32).copy()
+    coords[:, 2] = 1.0
+    chunks, boxes = spatial_chunks(coords, 100)
+    assert sum(len(c) for c in chunks) == len(coords)
+    np.testing.assert_array_equal(boxes[:, :, 2], 1.0)
+
+
+def test_chunk_bonds(structure_1ake):
+    coords = structure_1ake.coords
+    bonds = structure_1ake.bonds
+    chunks, _ = spatial_chunks(coords, 500)
+    per_chunk = chunk_bonds(chunks, bonds, len(coords))
+    assert len(per_chunk) == len(chunks)
+    assert sum(len(b) for b in per_chunk) == len(bonds)
+    for atoms, chunk_bond in zip(chunks, per_chunk):
+        assert np.all(np.isin(chunk_bond[:, 0], atoms))
+    assert all(len(b) == 0 for b in chunk_bonds(chunks, bonds[:0], len(coords)))
+
+
+def test_choose_level_progression():
+    visible = ATOM_BUDGET * 10
+    pixels = np.geomspace(0.01, 100, 200)
+    levels = [choose_level(p, visible) for p in pixels]
+    order = {LEVEL_TRACE: 0, LEVEL_BEADS: 1, LEVEL_ATOMS: 2}
+    ranks = [order[level] for level in levels]
+    # 每埃像素数增大时只会从 trace 经 beads 走向 atoms
+    assert ranks == sorted(ranks)
+    assert levels[0] == LEVEL_TRACE and levels[-1] == LEVEL_ATOMS
+    assert LEVEL_BEADS in levels
+    assert choose_level(BEAD_PIXELS_PER_ANGSTROM * 0.99, visible) == LEVEL_TRACE
+    assert choose_level(BEAD_PIXELS_PER_ANGSTROM, visible) == LEVEL_BEADS
+    assert choose_level(ATOM_PIXELS_PER_ANGSTROM * 0.99, visible) == LEVEL_BEADS
+    assert choose_level(ATOM_PIXELS_PER_ANGSTROM, visible) == LEVEL_ATOMS
+
+
+def test_choose_level_within_budget():
+    """可见原子不超过预算时总是绘制全部原子"""
+    for pixels in (0.01, BEAD_PIXELS_PER_ANGSTROM, ATOM_PIXELS_PER_ANGSTROM):
+        assert choose_level(pixels, ATOM_BUDGET) == LEVEL_ATOMS
+    assert choose_level(0.01, ATOM_BUDGET + 1) == LEVEL_TRACE
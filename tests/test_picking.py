@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from picking import AtomPicker
+
+N_RAYS = 300
+
+
+def brute_force_pick(coords, radii, origin, direction, mask=None):
+    """逐原子求射线与原子球的最近交点 (起点在球内的原子不计)"""
+    direction = direction / np.linalg.norm(direction)
+    offset = coords.astype(np.float64) - origin
+    along = offset @ direction
+    perpendicular_sq = np.einsum('ij,ij->i', offset, offset) - along * along
+    radius_sq = radii.astype(np.float64) ** 2
+    entry = along - np.sqrt(np.maximum(radius_sq - perpendicular_sq, 0.0))
+    hit = (perpendicular_sq <= radius_sq) & (entry >= 0)
+    if mask is not None:
+        hit &= mask
+    if not hit.any():
+        return None
+    candidates = np.flatnonzero(hit)
+    nearest = candidates[np.argmin(entry[candidates])]
+    return int(nearest), float(entry[nearest])
+
+
+def random_rays(coords, rng, n_rays=N_RAYS):
+    """从包围球外射向随机原子附近的射线 (约一半擦过或错过原子)"""
+    center = coords.mean(axis=0)
+    extent = np.linalg.norm(coords - center, axis=1).max() + 10
+    for _ in range(n_rays):
+        origin = center + _unit(rng) * extent
+        target = coords[rng.integers(len(coords))] + rng.normal(scale=2.0, size=3)
+        yield origin, target - origin
+
+
+def _unit(rng):
+    v = rng.normal(size=3)
+    return v / np.linalg.norm(v)
+
+
+def assert_same_hit(result, expected, coords, radii):
+    if expected is None:
+        assert result is None
+        return
+    assert result is not None
+    atom, distance = result[0], result[-1]
+    assert distance == pytest.approx(expected[1], abs=1e-3)
+    # 距离相同的并列原子可以任取其一
+    if atom != expected[0]:
+        assert np.linalg.norm(coords[atom] - coords[expected[0]]) <= radii[atom] + radii[expected[0]]
+
+
+@pytest.fixture(scope='module')
+def atoms(structure_1ake):
+    rng = np.random.default_rng(11)
+    coords = np.asarray(structure_1ake.coords, dtype=np.float32)
+    radii = rng.uniform(0.8, 2.0, size=len(coords)).astype(np.float32)
+    return coords, radii
+
+
+def test_pick_matches_brute_force(atoms):
+    coords, radii = atoms
+    picker = AtomPicker(coords, radii)
+    rng = np.random.default_rng(5)
+    hits = 0
+    for origin, direction in random_rays(coords, rng):
+        expected = brute_force_pick(coords, radii, origin, direction)
+        assert_same_hit(picker.pick(origin, direction), expected, coords, radii)
+        hits += expected is not None
+    # 射线既有击中也有错过
+    assert 0 < hits < N_RAYS
+
+
+def test_pick_with_mask(atoms, structure_1ake):
+    coords, radii = atoms
+    picker = AtomPicker(coords, radii)
+    mask = structure_1ake.chain_ids == b'A'
+    assert 0 < mask.sum() < len(mask)
+    rng = np.random.default_rng(6)
+    for origin, direction in random_rays(coords, rng):
+        expected = brute_force_pick(coords, radii, origin, direction, mask)
+        result = picker.pick(origin, direction, mask)
+        assert_same_hit(result, expected, coords, radii)
+        if result is not None:
+            assert mask[result[0]]
+
+
+def test_pick_axis_aligned(atoms):
+    """平行于坐标轴的射线 (方向分量为0) 不经过除零的单元遍历"""
+    coords, radii = atoms
+    picker = AtomPicker(coords, radii)
+    for atom in (0, 1000, 3000):
+        for axis in range(3):
+            direction = np.zeros(3)
+            direction[axis] = 1.0
+            origin = coords[atom].astype(np.float64) - direction * 200
+            expected = brute_force_pick(coords, radii, origin, direction)
+            assert_same_hit(picker.pick(origin, direction), expected, coords, radii)
+
+
+def test_pick_misses_outside(atoms):
+    coords, radii = atoms
+    picker = AtomPicker(coords, radii)
+    origin = coords.max(axis=0) + 100
+    assert picker.pick(origin, np.array([1.0, 0.0, 0.0])) is None
+    assert AtomPicker(np.zeros((0, 3)), np.zeros(0)).pick(np.zeros(3), np.ones(3)) is None
+
+
+def test_pick_instances_matches_brute_force(atoms):
+    coords, radii = atoms
+    picker = AtomPicker(coords, radii)
+    shift = np.ptp(coords, axis=0)[0] + 15
+    instances = np.stack([np.eye(4), np.eye(4)])
+    instances[1, 0, 3] = shift
+    copies = np.concatenate([coords, coords + np.float32([shift, 0, 0])])
+    copy_radii = np.concatenate([radii, radii])
+    mask = np.zeros(len(coords), dtype=bool)
+    mask[::2] = True
+    rng = np.random.default_rng(9)
+    seen = set()
+    for use_mask in (False, True):
+        atom_mask = mask if use_mask else None
+        for origin, direction in random_rays(copies, rng):
+            expected = brute_force_pick(copies, copy_radii, origin, direction,
+                                        None if atom_mask is None else np.concatenate([mask, mask]))
+            result = picker.pick_instances(origin, direction, instances, atom_mask)
+            if expected is None:
+                assert result is None
+                continue
+            atom, copy, distance = result
+            seen.add(copy)
+            assert_same_hit((copy * len(coords) + atom, distance), expected, copies, copy_radii)
+    assert seen == {0, 1}
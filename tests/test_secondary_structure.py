@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from cartoon import CARTOON_LEVELS, cartoon_level, cartoon_mesh
+from secondary_structure import (SS_COIL, SS_HELIX, SS_STRAND, assign_secondary_structure,
+                                 backbone_atoms, secondary_structure, secondary_structure_string)
+
+# 与文件记录比较时，片段两端允许相差的残基数
+END_TOLERANCE = 2
+
+
+def file_secondary_structure(structure, pdb_file: str) -> np.ndarray:
+    """按 PDB 文件的 HELIX/SHEET 记录得到每个残基的二级结构"""
+    starts = structure.residue_offsets[:-1]
+    chains, res_ids = structure.chain_ids[starts], structure.res_ids[starts]
+    ss = np.full(len(starts), SS_COIL, dtype=np.uint8)
+    with open(pdb_file) as f:
+        for line in f:
+            if line.startswith('HELIX '):
+                chain, first, last, code = line[19], int(line[21:25]), int(line[33:37]), SS_HELIX
+            elif line.startswith('SHEET '):
+                chain, first, last, code = line[21], int(line[22:26]), int(line[33:37]), SS_STRAND
+            else:
+                continue
+            ss[(chains == chain.encode()) & (res_ids >= first) & (res_ids <= last)] = code
+    return ss
+
+
+def near_segment_end(mask: np.ndarray, tolerance: int) -> np.ndarray:
+    """距离片段起止不超过 tolerance 个残基的位置"""
+    near = np.zeros(len(mask), dtype=bool)
+    for change in np.flatnonzero(mask[1:] != mask[:-1]) + 1:
+        near[max(change - tolerance, 0):change + tolerance] = True
+    return near
+
+
+@pytest.fixture(scope='module')
+def assignments(structure_1ake, pdb_1ake):
+    return assign_secondary_structure(structure_1ake), file_secondary_structure(structure_1ake, pdb_1ake)
+
+
+@pytest.mark.parametrize('code, min_recall', [(SS_HELIX, 0.85), (SS_STRAND, 0.7)])
+def test_matches_file_records(assignments, code, min_recall):
+    """与 HELIX/SHEET 记录一致: 不一致的残基都在片段两端附近 (1ake 的 LID 结构域螺旋末端除外)"""
+    assigned, reference = assignments[0] == code, assignments[1] == code
+    differs = ((assigned != reference)
+               & ~near_segment_end(reference, END_TOLERANCE)
+               & ~near_segment_end(assigned, END_TOLERANCE))
+    assert np.count_nonzero(differs) <= 2
+    assert np.count_nonzero(assigned & reference) >= min_recall * np.count_nonzero(reference)
+
+
+def test_non_protein_residues_are_coil(structure_1ake, assignments):
+    residues, _ = backbone_atoms(structure_1ake)
+    other = np.ones(len(assignments[0]), dtype=bool)
+    other[residues] = False
+    assert np.any(other)
+    assert np.all(assignments[0][other] == SS_COIL)
+
+
+def test_cached_and_string(structure_1ake, assignments):
+    codes = secondary_structure(structure_1ake)
+    assert codes is secondary_structure(structure_1ake)
+    assert np.array_equal(codes, assignments[0])
+    text = secondary_structure_string(codes)
+    assert len(text) == len(codes) and set(text) <= set('CHET')
+
+
+def test_cartoon_mesh_cached_per_level(structure_1ake):
+    meshes = [cartoon_mesh(structure_1ake, level) for level in range(len(CARTOON_LEVELS))]
+    for level, mesh in enumerate(meshes):
+        assert cartoon_mesh(structure_1ake, level) is mesh
+    assert len({id(mesh) for mesh in meshes}) == len(meshes)
+    default = cartoon_level(len(backbone_atoms(structure_1ake)[0]))
+    assert cartoon_mesh(structure_1ake) is meshes[default]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from selection import SelectionError, parse_selection, select_atoms
+
+
+@pytest.mark.parametrize('text, count', [
+    ('backbone', 1714),
+    ('chain A and resname LYS', 162),
+    ('protein', 3312),
+    ('water', 378),
+    ('all', 3804),
+    ('none', 0),
+])
+def test_selection_counts(structure_1ake, text, count):
+    assert np.count_nonzero(select_atoms(structure_1ake, text)) == count
+
+
+def test_boolean_composition(structure_1ake):
+    lys = select_atoms(structure_1ake, 'resname LYS')
+    chain_a = select_atoms(structure_1ake, 'chain A')
+    assert np.array_equal(select_atoms(structure_1ake, 'chain A and resname LYS'), lys & chain_a)
+    assert np.array_equal(select_atoms(structure_1ake, 'not (chain A or resname LYS)'), ~(lys | chain_a))
+
+
+def test_names_match_columns(structure_1ake):
+    mask = select_atoms(structure_1ake, 'name CA and resid 10-20')
+    expected = ((structure_1ake.atom_names == b'CA')
+                & (structure_1ake.res_ids >= 10) & (structure_1ake.res_ids <= 20))
+    assert np.array_equal(mask, expected)
+
+
+def test_within_matches_distances(structure_1ake):
+    mask = select_atoms(structure_1ake, 'within 5 of resname AP5')
+    coords = structure_1ake.coords.astype(np.float64)
+    ligand = coords[structure_1ake.res_names == b'AP5']
+    dist = np.linalg.norm(coords[:, None] - ligand[None], axis=2).min(axis=1)
+    assert np.array_equal(mask, dist <= 5)
+
+
+def test_cached_result_is_read_only(structure_1ake):
+    mask = select_atoms(structure_1ake, 'backbone')
+    assert mask is select_atoms(structure_1ake, 'backbone')
+    assert not mask.flags.writeable
+
+
+def test_syntax_error():
+    with pytest.raises(SelectionError):
+        parse_selection('chain A and')
@@ -0,0 +1,78 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import structure_cache
+from structure_cache import StructureCache
+
+_COLUMNS = ('coords', 'element_codes', 'bonds', 'atom_names', 'res_names', 'res_ids',
+            'chain_ids', 'ins_codes', 'serials', 'b_factors', 'occupancies', 'hetero',
+            'residue_offsets', 'chain_offsets')
+
+
+@pytest.fixture
+def cached_file(tmp_path, pdb_1ake, structure_1ake):
+    """复制到临时目录的 1ake.pdb 及写入了该文件的缓存"""
+    path = str(tmp_path / '1ake.pdb')
+    shutil.copyfile(pdb_1ake, path)
+    cache = StructureCache(str(tmp_path / 'cache'))
+    cache.store(path, structure_1ake)
+    return path, cache
+
+
+def test_round_trip(cached_file, structure_1ake):
+    path, cache = cached_file
+    loaded = cache.load(path)
+    assert loaded is not None
+    assert loaded.source == path
+    for name in _COLUMNS:
+        assert np.array_equal(getattr(loaded, name), getattr(structure_1ake, name)), name
+    # 数组直接引用内存映射，不复制
+    assert not loaded.coords.flags.owndata
+    assert not loaded.coords.flags.writeable
+
+
+def test_derived_arrays_round_trip(cached_file):
+    path, cache = cached_file
+    arrays = {'vertices': np.arange(12, dtype=np.float32).reshape(4, 3),
+              'faces': np.zeros((0, 3), dtype=np.uint32)}
+    cache.store_arrays(path, 'surface:test', arrays)
+    loaded = cache.load_arrays(path, 'surface:test')
+    assert set(loaded) == set(arrays)
+    for name, array in arrays.items():
+        assert loaded[name].dtype == array.dtype and np.array_equal(loaded[name], array)
+    assert cache.load_arrays(path, 'surface:other') is None
+
+
+def test_version_change_invalidates(cached_file, monkeypatch):
+    path, cache = cached_file
+    bundle = cache._bundle_path(path)
+    monkeypatch.setattr(structure_cache, 'CACHE_FORMAT_VERSION', structure_cache.CACHE_FORMAT_VERSION + 1)
+    # 版本参与缓存键，旧条目不再命中；按旧键直接读取时头部版本不符同样视为无效
+    assert cache.load(path) is None
+    assert cache._read_bundle(bundle) == (None, None)
+
+
+def test_modified_file_invalidates(cached_file):
+    path, cache = cached_file
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.load(path) is None
+
+
+def test_content_key_survives_touch(tmp_path, pdb_1ake, structure_1ake):
+    path = str(tmp_path / '1ake.pdb')
+    shutil.copyfile(pdb_1ake, path)
+    cache = StructureCache(str(tmp_path / 'cache'), key_mode='content')
+    cache.store(path, structure_1ake)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.load(path) is not None
+
+
+def test_eviction(cached_file):
+    path, cache = cached_file
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.size() == 0
+    assert cache.load(path) is None
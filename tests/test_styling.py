@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from vispy import scene
+from element_data import ELEMENT_SYMBOLS
+from styling import (StyleEngine, COLOR_SCHEMES, SCHEME_ELEMENT, SCHEME_CHAIN, SCHEME_BFACTOR,
+                     SCHEME_RESIDUE, RESIDUE_CATEGORY_TABLE, recolor_markers)
+
+ELEMENT_COLORS = {
+    'C': (0.4, 0.4, 0.4, 1),
+    'N': (0.2, 0.2, 1.0, 1),
+    'O': (1.0, 0.2, 0.2, 1),
+    'OTHERS': (0.8, 0.2, 0.8, 1),
+}
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return StyleEngine(ELEMENT_COLORS)
+
+
+@pytest.mark.parametrize('scheme', COLOR_SCHEMES)
+def test_colors_shape(engine, structure_1ake, scheme):
+    colors = engine.colors(structure_1ake, scheme)
+    assert colors.shape == (structure_1ake.n_atoms, 4)
+    assert colors.dtype == np.float32
+    assert np.all((colors >= 0) & (colors <= 1))
+    assert not colors.flags.writeable
+    # 结果缓存在结构上，重复调用返回同一数组
+    assert engine.colors(structure_1ake, scheme) is colors
+
+
+def test_element_colors(engine, structure_1ake):
+    colors = engine.colors(structure_1ake, SCHEME_ELEMENT)
+    symbols = np.array(ELEMENT_SYMBOLS)[structure_1ake.element_codes]
+    for symbol, color in ELEMENT_COLORS.items():
+        if symbol != 'OTHERS':
+            np.testing.assert_allclose(colors[symbols == symbol], np.broadcast_to(
+                color, ((symbols == symbol).sum(), 4)))
+    assert engine.sizes(structure_1ake).shape == (structure_1ake.n_atoms,)
+
+
+def test_chain_colors(engine, structure_1ake):
+    colors = engine.colors(structure_1ake, SCHEME_CHAIN)
+    chain_ids = structure_1ake.chain_ids
+    chain_colors = []
+    for chain in np.unique(chain_ids):
+        in_chain = colors[chain_ids == chain]
+        # 同一条链颜色一致，不同链颜色互不相同
+        assert np.all(in_chain == in_chain[0])
+        chain_colors.append(tuple(in_chain[0]))
+    assert len(chain_colors) >= 2
+    assert len(set(chain_colors)) == len(chain_colors)
+
+
+def test_bfactor_colors(engine, structure_1ake):
+    colors = engine.colors(structure_1ake, SCHEME_BFACTOR)
+    b = structure_1ake.b_factors
+    # 渐变两端分别对应最低和最高 B 因子
+    np.testing.assert_allclose(colors[np.argmin(b)], (0.2, 0.3, 1.0, 1), atol=1e-6)
+    np.testing.assert_allclose(colors[np.argmax(b)], (1.0, 0.2, 0.2, 1), atol=1e-6)
+
+
+def test_residue_colors(engine, structure_1ake):
+    colors = engine.colors(structure_1ake, SCHEME_RESIDUE)
+    res_names = structure_1ake.res_names
+    np.testing.assert_allclose(colors[res_names == b'ASP'], np.broadcast_to(
+        (0.9, 0.2, 0.2, 1), ((res_names == b'ASP').sum(), 4)))
+    np.testing.assert_allclose(colors[res_names == b'HOH'][0], (0.6, 0.8, 1.0, 1))
+    # 配体 (AP5) 使用"其他"颜色
+    np.testing.assert_allclose(colors[res_names == b'AP5'][0], RESIDUE_CATEGORY_TABLE[-1])
+    residue_colors = engine.residue_colors(structure_1ake, SCHEME_RESIDUE)
+    assert residue_colors.shape == (len(structure_1ake.residue_offsets) - 1, 4)
+
+
+@pytest.mark.parametrize('scheme', COLOR_SCHEMES)
+def test_bond_colors(engine, structure_1ake, scheme):
+    bond_colors = engine.bond_colors(structure_1ake, scheme)
+    if scheme == SCHEME_ELEMENT:
+        assert bond_colors is None
+        return
+    bonds = structure_1ake.bonds
+    assert bond_colors.shape == (2 * len(bonds), 4)
+    colors = engine.colors(structure_1ake, scheme)
+    np.testing.assert_array_equal(bond_colors[0::2], colors[bonds[:, 0]])
+    np.testing.assert_array_equal(bond_colors[1::2], colors[bonds[:, 1]])
+
+
+def test_unknown_scheme(engine, structure_1ake):
+    with pytest.raises(ValueError):
+        engine.colors(structure_1ake, 'rainbow')
+
+
+def test_recolor_markers(engine, structure_1ake):
+    markers = scene.visuals.Markers()
+    colors = engine.colors(structure_1ake, SCHEME_CHAIN)
+    # 尚无数据时不能原地替换
+    assert not recolor_markers(markers, colors)
+    markers.set_data(np.asarray(structure_1ake.coords, dtype=np.float32),
+                     face_color=engine.colors(structure_1ake, SCHEME_ELEMENT))
+    assert recolor_markers(markers, colors)
+    np.testing.assert_array_equal(markers._data['a_bg_color'], colors)
+    assert not recolor_markers(markers, colors[:-1])
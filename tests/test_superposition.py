@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from superposition import alignment_atoms, apply_transform, kabsch, rmsd_matrix
+
+
+def svd_rmsd(a: np.ndarray, b: np.ndarray) -> float:
+    """参照实现: 中心化后对协方差矩阵做 SVD 的 Kabsch 最优叠合 RMSD"""
+    a = a - a.mean(axis=0)
+    b = b - b.mean(axis=0)
+    u, s, vt = np.linalg.svd(a.T @ b)
+    d = np.sign(np.linalg.det(u @ vt))
+    msd = (np.sum(a * a) + np.sum(b * b) - 2 * (s[0] + s[1] + d * s[2])) / len(a)
+    return float(np.sqrt(max(msd, 0.0)))
+
+
+@pytest.fixture(scope='module')
+def ensemble(structure_1ake):
+    """以 1ake 的 CA 原子为基础、随机扰动并随机旋转平移的 24 帧"""
+    rng = np.random.default_rng(7)
+    ca = structure_1ake.coords[alignment_atoms(structure_1ake)].astype(np.float64)
+    frames = ca + rng.normal(scale=rng.uniform(0.1, 2.0, size=(24, 1, 1)), size=(24,) + ca.shape)
+    q, r = np.linalg.qr(rng.normal(size=(24, 3, 3)))
+    q *= np.sign(np.diagonal(r, axis1=1, axis2=2))[:, None, :]
+    q[np.linalg.det(q) < 0, :, 0] *= -1
+    return np.einsum('fij,fnj->fni', q, frames) + rng.normal(scale=20, size=(24, 1, 3))
+
+
+def test_rmsd_matrix_matches_svd(ensemble):
+    reference = np.array([[svd_rmsd(a, b) for b in ensemble] for a in ensemble])
+    # 块大小不整除帧数，覆盖对角块和边缘块
+    result = rmsd_matrix(ensemble, block=7, workers=2)
+    assert result.shape == reference.shape
+    np.testing.assert_allclose(result, reference, atol=2e-3)
+    assert np.array_equal(result, result.T)
+    assert np.all(np.diag(result) == 0)
+
+
+def test_kabsch_matches_svd(ensemble):
+    target = ensemble[0]
+    matrices, rmsd = kabsch(ensemble, target)
+    np.testing.assert_allclose(rmsd, [svd_rmsd(frame, target) for frame in ensemble], atol=1e-6)
+    for frame, matrix, value in zip(ensemble, matrices, rmsd):
+        moved = apply_transform(frame, matrix)
+        assert np.sqrt(np.mean(np.sum((moved - target) ** 2, axis=1))) == pytest.approx(value, abs=1e-5)
+
+
+def test_kabsch_single_frame(ensemble):
+    matrix, rmsd = kabsch(ensemble[3], ensemble[5])
+    assert matrix.shape == (4, 4)
+    assert rmsd == pytest.approx(svd_rmsd(ensemble[3], ensemble[5]), abs=1e-6)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from protein_draw import ProteinDataLoader
+from trajectory import Trajectory, index_models
+
+N_MODELS = 3
+
+
+@pytest.fixture(scope='module')
+def ensemble_file(tmp_path_factory, pdb_1ake):
+    """
+    由 1ake 原子记录写出的 3 模型 PDB，每个模型的坐标各自随机扰动
+
+    返回:
+        tuple: (文件路径, 每个模型 原子序号 -> 坐标 的字典)
+    """
+    with open(pdb_1ake) as f:
+        records = [line.rstrip('\n') for line in f
+                   if line.startswith(('ATOM  ', 'HETATM')) and line[16] in ' A']
+    rng = np.random.default_rng(3)
+    base = np.array([[float(line[30 + 8 * k:38 + 8 * k]) for k in range(3)] for line in records])
+    lines, models = [], []
+    for model in range(N_MODELS):
+        coords = base + rng.normal(scale=0.5, size=base.shape) if model else base
+        lines.append(f'MODEL     {model + 1:4d}')
+        for line, xyz in zip(records, coords):
+            lines.append(line[:30] + ''.join(f'{v:8.3f}' for v in xyz) + line[54:])
+        lines.append('ENDMDL')
+        models.append({int(line[6:11]): xyz for line, xyz in zip(records, np.round(coords, 3))})
+    lines.append('END')
+    path = tmp_path_factory.mktemp('trajectory') / 'ensemble.pdb'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path), models
+
+
+@pytest.fixture(scope='module')
+def trajectory(ensemble_file):
+    path, _ = ensemble_file
+    structure = ProteinDataLoader(path, use_cache=False).load_structure()
+    trajectory = Trajectory(structure)
+    yield trajectory
+    trajectory.close()
+
+
+def test_index_models(ensemble_file, pdb_1ake):
+    path, _ = ensemble_file
+    offsets = index_models(path)
+    assert len(offsets) == N_MODELS
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert all(data[offset:offset + 6] == b'MODEL ' for offset in offsets)
+    # 没有 MODEL 记录的文件只有一帧
+    assert index_models(pdb_1ake) == [0]
+
+
+def test_frames_follow_frame0_order(trajectory, ensemble_file):
+    _, models = ensemble_file
+    structure = trajectory.structure
+    assert trajectory.n_frames == len(trajectory) == N_MODELS
+    for index in range(N_MODELS):
+        frame = trajectory.frame(index)
+        assert frame.dtype == np.float32 and frame.shape == (structure.n_atoms, 3)
+        assert not frame.flags.writeable
+        # 帧内原子按第0帧结构的顺序排列 (按链分组，HETATM 归回各自的链)
+        expected = np.array([models[index][serial] for serial in structure.serials.tolist()])
+        np.testing.assert_allclose(frame, expected, atol=1e-3)
+    assert not np.allclose(trajectory.frame(1), trajectory.frame(2))
+
+
+def test_iteration(trajectory):
+    frames = list(trajectory)
+    assert len(frames) == N_MODELS
+    np.testing.assert_array_equal(frames[2], trajectory.frame(2))
+
+
+@pytest.mark.parametrize('index', [-1, N_MODELS, N_MODELS + 5])
+def test_out_of_range(trajectory, index):
+    with pytest.raises(IndexError):
+        trajectory.frame(index)
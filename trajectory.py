@@ -0,0 +1,96 @@
+import mmap
+import numpy as np
+from typing import Iterator, List, Optional
+from pdb_reader import is_gzipped, read_pdb_coords
+from structure_formats import FORMAT_PDB, detect_format
+from protein_structure import ProteinStructure
+
+
+def index_models(pdb_file: str) -> List[int]:
+    """
+    查找每个 MODEL 记录在文件中的字节偏移
+
+    参数:
+        pdb_file: PDB文件路径
+
+    返回:
+        各模型起始偏移的列表，没有 MODEL 记录或不是未压缩的 PDB 文件时返回 [0]
+    """
+    if is_gzipped(pdb_file) or detect_format(pdb_file) != FORMAT_PDB:
+        return [0]
+    offsets = []
+    with open(pdb_file, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空文件
+            return [0]
+        with mm:
+            if mm[:6] == b'MODEL ':
+                offsets.append(0)
+            pos = mm.find(b'\nMODEL ')
+            while pos >= 0:
+                offsets.append(pos + 1)
+                pos = mm.find(b'\nMODEL ', pos + 1)
+    return offsets or [0]
+
+
+class Trajectory:
+    def __init__(self, structure: ProteinStructure, pdb_file: Optional[str] = None):
+        """
+        多模型PDB (NMR系综、多帧轨迹) 的流式逐帧读取器
+
+        拓扑取自第0帧的结构，其余帧只在访问时解析坐标，
+        内存占用与帧数无关。
+
+        参数:
+            structure: 第0帧的结构 (含拓扑)
+            pdb_file: 轨迹文件路径，默认为 structure.source
+        """
+        self.structure = structure
+        self.pdb_file = pdb_file or structure.source
+        self.offsets = index_models(self.pdb_file)
+        self._data = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.offsets)
+
+    def _mapped(self) -> np.ndarray:
+        if self._data is None:
+            self._data = np.memmap(self.pdb_file, dtype=np.uint8, mode='r')
+        return self._data
+
+    def frame(self, index: int) -> np.ndarray:
+        """
+        读取一帧坐标
+
+        参数:
+            index: 帧序号 (0 ~ n_frames-1)
+
+        返回:
+            (N,3) float32 只读坐标数组
+        """
+        if not 0 <= index < self.n_frames:
+            raise IndexError(f"frame {index} out of range (0-{self.n_frames - 1})")
+        if index == 0:
+            return self.structure.coords
+
+        data = self._mapped()
+        stop = self.offsets[index + 1] if index + 1 < self.n_frames else len(data)
+        coords = read_pdb_coords(data[self.offsets[index]:stop])
+        if len(coords) != self.structure.n_atoms:
+            raise ValueError(f"frame {index} has {len(coords)} atoms, "
+                             f"expected {self.structure.n_atoms}")
+        coords.flags.writeable = False
+        return coords
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for index in range(self.n_frames):
+            yield self.frame(index)
+
+    def close(self):
+        """释放文件映射"""
+        self._data = None
@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Optional
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from trajectory import Trajectory
+
+DEFAULT_FPS = 15
+
+
+class TrajectoryPlayer(QObject):
+    """按目标帧率播放轨迹，每帧只读取和计算一次，结果通过信号分发给所有视图"""
+
+    # 帧序号, (N,3) 原子坐标, (2M,3) 键线段端点
+    frame_changed = pyqtSignal(int, object, object)
+    state_changed = pyqtSignal(bool)    # 是否正在播放
+
+    def __init__(self, parent: QObject = None, fps: float = DEFAULT_FPS, loop: bool = True):
+        super().__init__(parent)
+        self.trajectory = None
+        self.current = 0
+        self.loop = loop
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._advance)
+        self.set_fps(fps)
+
+    @property
+    def n_frames(self) -> int:
+        return 0 if self.trajectory is None else self.trajectory.n_frames
+
+    @property
+    def playing(self) -> bool:
+        return self._timer.isActive()
+
+    def set_trajectory(self, trajectory: Optional[Trajectory]):
+        """切换轨迹并回到第0帧，传入None表示没有轨迹"""
+        self.pause()
+        if self.trajectory is not None:
+            self.trajectory.close()
+        self.trajectory = trajectory
+        self.current = 0
+
+    def set_fps(self, fps: float):
+        """设置目标帧率，读取一帧慢于帧间隔时自动丢帧"""
+        self.fps = max(float(fps), 0.1)
+        self._timer.setInterval(int(round(1000 / self.fps)))
+
+    def play(self):
+        if self.n_frames > 1 and not self.playing:
+            self._timer.start()
+            self.state_changed.emit(True)
+
+    def pause(self):
+        if self.playing:
+            self._timer.stop()
+            self.state_changed.emit(False)
+
+    def toggle(self):
+        if self.playing:
+            self.pause()
+        else:
+            self.play()
+
+    def seek(self, index: int):
+        """
+        跳转到指定帧
+
+        参数:
+            index: 帧序号，超出范围时截断
+        """
+        if self.trajectory is None:
+            return
+        index = int(np.clip(index, 0, self.n_frames - 1))
+        try:
+            coords = self.trajectory.frame(index)
+        except (OSError, ValueError) as e:
+            print(f"Error reading frame {index}: {e}")
+            self.pause()
+            return
+        self.current = index
+        bonds = self.trajectory.structure.bonds
+        segments = coords[bonds].reshape(-1, 3) if len(bonds) else None
+        self.frame_changed.emit(index, coords, segments)
+
+    def _advance(self):
+        index = self.current + 1
+        if index >= self.n_frames:
+            if not self.loop:
+                self.pause()
+                return
+            index = 0
+        self.seek(index)
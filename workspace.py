@@ -0,0 +1,215 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 工作区缓存 (已解析结构及其GPU可视化对象) 的默认内存预算
+DEFAULT_BUDGET_BYTES = 2 << 30
+# 显示文件列表中的一项后预先加载其后的项数
+DEFAULT_PREFETCH = 2
+
+
+def default_budget() -> int:
+    """默认内存预算 (字节)，可通过环境变量 PROTEINCODE_WORKSPACE_MB 覆盖"""
+    if os.environ.get('PROTEINCODE_WORKSPACE_MB'):
+        return int(float(os.environ['PROTEINCODE_WORKSPACE_MB']) * (1 << 20))
+    return DEFAULT_BUDGET_BYTES
+
+
+def workspace_key(path: str) -> str:
+    """同一文件的不同写法 (相对路径、多余分隔符) 对应同一个缓存键"""
+    return os.path.normpath(os.path.abspath(path))
+
+
+class WorkspaceEntry:
+    def __init__(self, path: str):
+        """
+        工作区中的一个结构: 解析结果、可视化对象、轨迹以及各视图离开时的相机
+
+        参数:
+            path: 规范化的文件路径 (workspace_key)
+        """
+        self.path = path
+        # 仅含原子或含拓扑的结构，加载完成前为None
+        self.structure = None
+        # protein_visualizer.ProteinVisualizer，在GUI线程中创建和释放
+        self.visualizer = None
+        # 多模型文件的 trajectory.Trajectory 及播放到的帧
+        self.trajectory = None
+        self.frame = 0
+        # 视图序号 -> (相机状态, 相机距离)，切换回来时恢复
+        self.cameras: Dict[int, Tuple[dict, float]] = {}
+        # 叠合显示: 多模型文件其余模型叠合后的可视化器，以及其他文件叠合到本结构上的
+        # ((4,4) 变换, Cα RMSD)，按文件路径缓存 (对应原子不足时为None)
+        self.ensemble_visualizer = None
+        self.superpositions: Dict[str, Optional[Tuple[np.ndarray, float]]] = {}
+        self.nbytes = 0
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def loaded(self) -> bool:
+        """结构和拓扑是否都已就绪"""
+        return self.structure is not None and self.structure.has_topology
+
+    def measure(self) -> int:
+        """重新统计结构数组、派生数据和GPU缓冲占用的字节数"""
+        self.nbytes = 0 if self.structure is None else self.structure.nbytes
+        if self.visualizer is not None:
+            self.nbytes += self.visualizer.nbytes
+        if self.ensemble_visualizer is not None:
+            self.nbytes += self.ensemble_visualizer.nbytes + self.ensemble_visualizer.structure.nbytes
+        return self.nbytes
+
+    def release(self):
+        """释放可视化对象 (须在GUI线程中调用) 和轨迹文件映射"""
+        if self.visualizer is not None:
+            self.visualizer.release()
+            self.visualizer = None
+        if self.ensemble_visualizer is not None:
+            self.ensemble_visualizer.release()
+            self.ensemble_visualizer = None
+        if self.trajectory is not None:
+            self.trajectory.close()
+            self.trajectory = None
+        self.structure = None
+        self.nbytes = 0
+
+
+class Workspace:
+    def __init__(self, budget: Optional[int] = None, prefetch: int = DEFAULT_PREFETCH):
+        """
+        多结构工作区: 按文件缓存已解析的结构及其可视化对象，切换回最近看过的结构时
+        无需重新解析和上传；总占用超出预算时按最近最少使用淘汰未在显示的结构
+
+        参数:
+            budget: 内存预算 (字节)，默认为 default_budget()
+            prefetch: 显示文件列表中的一项后预先加载其后的项数
+        """
+        self.budget = default_budget() if budget is None else budget
+        self.prefetch = prefetch
+        # 打开的文件列表 (规范化路径)，决定上一个/下一个和预加载的顺序
+        self.files: List[str] = []
+        # 最近最少使用的在前
+        self._entries: 'OrderedDict[str, WorkspaceEntry]' = OrderedDict()
+
+    def set_files(self, paths: Iterable[str]):
+        """替换文件列表 (已缓存的结构保留，仍按预算淘汰)"""
+        self.files = list(dict.fromkeys(workspace_key(path) for path in paths))
+
+    def add_file(self, path: str) -> str:
+        """把文件追加到列表末尾 (已在列表中时不变)，返回规范化路径"""
+        key = workspace_key(path)
+        if key not in self.files:
+            self.files.append(key)
+        return key
+
+    def neighbor(self, path: str, step: int) -> Optional[str]:
+        """
+        文件列表中相邻的文件
+
+        参数:
+            path: 当前文件
+            step: 偏移 (-1 上一个，1 下一个)
+
+        返回:
+            规范化路径，超出列表两端或文件不在列表中时返回None
+        """
+        key = workspace_key(path)
+        if key not in self.files:
+            return None
+        index = self.files.index(key) + step
+        return self.files[index] if 0 <= index < len(self.files) else None
+
+    def prefetch_candidates(self, path: str) -> List[str]:
+        """文件列表中排在 path 之后、尚未缓存的至多 prefetch 个文件"""
+        key = workspace_key(path)
+        if key not in self.files:
+            return []
+        start = self.files.index(key) + 1
+        return [candidate for candidate in self.files[start:start + self.prefetch]
+                if candidate not in self._entries]
+
+    def __contains__(self, path: str) -> bool:
+        return workspace_key(path) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def entries(self) -> List[WorkspaceEntry]:
+        """全部缓存项，最近最少使用的在前"""
+        return list(self._entries.values())
+
+    def get(self, path: str, touch: bool = True) -> Optional[WorkspaceEntry]:
+        """
+        查找缓存项
+
+        参数:
+            path: 文件路径
+            touch: 是否标记为最近使用 (显示时为True，后台查询时为False)
+
+        返回:
+            WorkspaceEntry，未缓存时返回None
+        """
+        key = workspace_key(path)
+        entry = self._entries.get(key)
+        if entry is not None and touch:
+            self._entries.move_to_end(key)
+        return entry
+
+    def add(self, path: str) -> WorkspaceEntry:
+        """返回文件的缓存项，不存在时新建 (标记为最近使用)"""
+        key = workspace_key(path)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = WorkspaceEntry(key)
+        self._entries.move_to_end(key)
+        return entry
+
+    def discard(self, path: str):
+        """移除并释放缓存项"""
+        entry = self._entries.pop(workspace_key(path), None)
+        if entry is not None:
+            entry.release()
+
+    @property
+    def nbytes(self) -> int:
+        """上次统计 (usage 或 evict) 时的总占用 (字节)"""
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def usage(self) -> int:
+        """重新统计全部缓存项的总占用 (字节)"""
+        return sum(entry.measure() for entry in self._entries.values())
+
+    def evict(self, pinned: Iterable[str] = ()) -> List[str]:
+        """
+        总占用超出预算时，按最近最少使用释放缓存项，直到不超出预算或只剩固定项
+
+        参数:
+            pinned: 不能淘汰的文件 (正在显示或正在加载)
+
+        返回:
+            被淘汰的文件路径
+        """
+        pinned = {workspace_key(path) for path in pinned if path}
+        total = self.usage()
+        evicted = []
+        for key, entry in list(self._entries.items()):
+            if total <= self.budget:
+                break
+            if key in pinned:
+                continue
+            total -= entry.nbytes
+            del self._entries[key]
+            entry.release()
+            evicted.append(key)
+        return evicted
+
+    def clear(self):
+        """释放全部缓存项"""
+        for entry in self._entries.values():
+            entry.release()
+        self._entries.clear()